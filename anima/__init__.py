@@ -34,6 +34,8 @@ import datetime
 import tempfile
 import platform
 import logging
+import threading
+import time
 
 # create logger
 #logging.basicConfig()
@@ -45,12 +47,36 @@ logger.setLevel(logging_level)
 logging_formatter = \
     logging.Formatter('%(module)s: %(funcName)s: %(levelname)s: %(message)s')
 
+
+class LogFileHandler(logging.FileHandler):
+    """A FileHandler which opens the log file with the first log record
+    instead of on import, and makes the file writable by all the users.
+    """
+
+    def __init__(self, filename):
+        logging.FileHandler.__init__(self, filename, delay=True)
+
+    def _open(self):
+        stream = logging.FileHandler._open(self)
+        # fix file mod for log file
+        try:
+            os.chmod(
+                self.baseFilename,
+                stat.S_IRWXU + stat.S_IRWXG + stat.S_IRWXO -
+                stat.S_IXUSR - stat.S_IXGRP - stat.S_IXOTH
+            )
+        except OSError:
+            # the file belongs to another user
+            pass
+        return stream
+
+
 # create file handler
 log_file_path = os.path.join(
     tempfile.gettempdir(),
     'anima.log'
 )
-log_file_handler = logging.FileHandler(log_file_path)
+log_file_handler = LogFileHandler(log_file_path)
 log_file_handler.setFormatter(logging_formatter)
 
 # add file handler
@@ -63,13 +89,6 @@ logger.addHandler(log_file_handler)
 #logger.debug('started new anima instance on %s' % datetime.datetime.now())
 #logger.debug('***************************************************************')
 
-# fix file mod for log file
-os.chmod(
-    log_file_path,
-    stat.S_IRWXU + stat.S_IRWXG + stat.S_IRWXO -
-    stat.S_IXUSR - stat.S_IXGRP - stat.S_IXOTH
-)
-
 stalker_server_internal_address = ''
 stalker_server_external_address = ''
 try:
@@ -82,6 +101,11 @@ stalker_dummy_user_login = 'anima'
 stalker_dummy_user_pass = 'anima'
 local_cache_folder = '~/.cache/anima/'
 recent_file_name = 'recent_files'
+video_info_cache_folder_name = 'video_info'
+thumbnail_cache_folder_name = 'thumbnails'
+thumbnail_cache_max_size = 256 << 20  # in bytes
+thumbnail_cache_max_age = 300  # in seconds
+lookup_table_ttl = 300  # in seconds
 avid_media_file_path_storage = 'avid_media_file_path'
 
 normal_users_group_names = ['Normal Users']
@@ -111,37 +135,274 @@ status_colors = {
     'stop': [78, 89, 98],
 }
 
-status_colors_by_id = {}
-user_names_lut = {}  # a table for fast user name look up
 
+class LookupTable(object):
+    """A read only dictionary of database lookups which is filled on first
+    access.
 
-def fill_status_colors_by_id():
-    """fills the status_colors_by_id dictionary
+    The data is loaded by calling the given loader function the first time
+    any item is requested, so the database is not queried until it is
+    needed. The keys that are not in the loaded data (ex. a User created
+    after the data is loaded) are queried on access. The keys which are not
+    found are remembered, so they are not queried on every access. All the
+    data is loaded again, and the missing keys are forgotten, when it is
+    older than ``ttl`` seconds or after :meth:`.invalidate` is called. The
+    loading is thread safe.
+
+    :param loader: A callable returning a dictionary. It is called with
+      ``keys=None`` to load all the data or with a list of keys to load only
+      those keys.
+
+    :param ttl: The time in seconds until the data is loaded again. The
+      default is None and the data is kept until it is invalidated.
     """
-    if not status_colors_by_id:
+
+    def __init__(self, loader, ttl=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = None
+        self._missing_keys = set()
+        self._load_time = 0
+        self._lock = threading.RLock()
+
+    @property
+    def is_loaded(self):
+        """returns True if the data is loaded and not expired
+        """
+        if self._data is None:
+            return False
+        return self.ttl is None or time.time() - self._load_time < self.ttl
+
+    @property
+    def data(self):
+        """the loaded dictionary
+        """
+        data = self._data
+        if not self.is_loaded:
+            with self._lock:
+                data = self._data
+                if not self.is_loaded:
+                    data = self._load()
+        return data
+
+    def _load(self):
+        """loads all the data
+        """
+        with self._lock:
+            self._data = dict(self.loader(keys=None))
+            self._missing_keys = set()
+            self._load_time = time.time()
+            return self._data
+
+    def load(self):
+        """loads the data if it is not loaded yet
+        """
+        return self.data
+
+    def warm_up(self, keys=None):
+        """loads all the data or only the missing ones of the given keys with
+        one query, the keys which were not found before are skipped
+
+        :param keys: A list of keys. The default is None and all the data is
+          loaded again.
+        """
+        if keys is None:
+            return self._load()
+
+        data = self.data
+        with self._lock:
+            missing_keys = set(
+                key for key in keys
+                if key not in data and key not in self._missing_keys
+            )
+        missing_keys.discard(None)
+        if missing_keys:
+            with self._lock:
+                loaded_data = dict(self.loader(keys=list(missing_keys)))
+                self.data.update(loaded_data)
+                self._missing_keys.update(missing_keys - set(loaded_data))
+
+    def invalidate(self, key=None):
+        """clears the data, it will be loaded again on the next access
+
+        :param key: If given only the data of the given key is cleared.
+        """
+        with self._lock:
+            if key is None:
+                self._data = None
+                self._missing_keys = set()
+            else:
+                self._missing_keys.discard(key)
+                if self._data is not None:
+                    self._data.pop(key, None)
+
+    def reset_stats(self):
+        """resets the hit and miss counters
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __getitem__(self, key):
+        data = self.data
+        try:
+            value = data[key]
+        except KeyError:
+            pass
+        else:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+            if key in self._missing_keys:
+                raise KeyError(key)
+        self.warm_up([key])
+        return self.data[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        if self._data is None:
+            return '<%s (not loaded)>' % self.__class__.__name__
+        return '<%s %r>' % (self.__class__.__name__, self._data)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return self.data.values()
+
+    def items(self):
+        return self.data.items()
+
+
+def setup_db_if_needed():
+    """sets up the database if the session is not bound yet, so the lookup
+    tables can be loaded at any time without removing the current session
+    """
+    from stalker.db import DBSession
+    if DBSession.bind is None:
         from anima.utils import do_db_setup
         do_db_setup()
-        from stalker import StatusList
+
+
+def query_status_colors_by_id(keys=None):
+    """returns the status colors by the ids of the Task statuses
+
+    :param keys: A list of Status ids. If given only the colors of these
+      Statuses are returned.
+    """
+    setup_db_if_needed()
+    from stalker import Status, StatusList
+    if keys is None:
         task_status_list = \
             StatusList.query\
                 .filter(StatusList.target_entity_type == 'Task')\
                 .first()
+        statuses = task_status_list.statuses
+    else:
+        statuses = Status.query.filter(Status.id.in_(keys)).all()
+
+    return dict(
+        (status.id, status_colors[status.code.lower()])
+        for status in statuses
+        if status.code.lower() in status_colors
+    )
+
+
+def query_status_ids_by_code(keys=None):
+    """returns the Status ids by the Status codes
+
+    :param keys: A list of Status codes. If given only the ids of these
+      Statuses are returned.
+    """
+    setup_db_if_needed()
+    from stalker import db, Status
+    query = db.DBSession.query(Status.code, Status.id)
+    if keys is not None:
+        query = query.filter(Status.code.in_(keys))
+    return dict(query.all())
+
+
+def query_user_names(keys=None):
+    """returns the user names by the user ids
+
+    :param keys: A list of User ids. If given only the names of these Users
+      are returned.
+    """
+    setup_db_if_needed()
+    from stalker import db, User
+    query = db.DBSession.query(User.id, User.name)
+    if keys is not None:
+        query = query.filter(User.id.in_(keys))
+    return dict(query.all())
 
-        for status in task_status_list.statuses:
-            status_colors_by_id[status.id] = status_colors[status.code.lower()]
+
+def query_user_ids_by_name(keys=None):
+    """returns the user ids by the user names
+
+    :param keys: A list of User names. If given only the ids of these Users
+      are returned.
+    """
+    setup_db_if_needed()
+    from stalker import db, User
+    query = db.DBSession.query(User.name, User.id)
+    if keys is not None:
+        query = query.filter(User.name.in_(keys))
+    return dict(query.all())
+
+
+status_colors_by_id = \
+    LookupTable(query_status_colors_by_id, ttl=lookup_table_ttl)
+status_ids_by_code = \
+    LookupTable(query_status_ids_by_code, ttl=lookup_table_ttl)
+user_names_lut = LookupTable(query_user_names, ttl=lookup_table_ttl)
+user_ids_by_name = LookupTable(query_user_ids_by_name, ttl=lookup_table_ttl)
+
+lookup_tables = [
+    status_colors_by_id,
+    status_ids_by_code,
+    user_names_lut,
+    user_ids_by_name,
+]
+
+
+def invalidate_lookup_tables():
+    """invalidates all the lookup tables, use it when the Users or Statuses
+    are changed
+    """
+    for table in lookup_tables:
+        table.invalidate()
+
+
+def fill_status_colors_by_id():
+    """fills the status_colors_by_id dictionary
+    """
+    status_colors_by_id.load()
 
 
 def fill_user_names_lut():
     """fills the user_names_lut
     """
-    if not user_names_lut:
-        from anima.utils import do_db_setup
-        do_db_setup()
-        from stalker import db, User
-        map(
-            lambda x: user_names_lut.__setitem__(x[0], x[1]),
-            db.DBSession.query(User.id, User.name).all()
-        )
-
-fill_status_colors_by_id()
-fill_user_names_lut()
+    user_names_lut.load()
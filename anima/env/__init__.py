@@ -33,6 +33,294 @@ def empty_reference_resolution(root=None, leave=None, update=None, create=None):
     }
 
 
+class ReferenceResolver(object):
+    """Resolves the deep references of a Version in memory.
+
+    The whole input hierarchy of the Version and the latest published Version
+    of every (task, take) pair in the hierarchy are loaded with a few set
+    based queries (one query per depth level for the inputs, instead of one
+    query per Version and per ``latest_published_version`` call), then the
+    reference resolution is calculated without touching the database again.
+
+    The actions are the same as the ones calculated by walking the inputs
+    with :meth:`~stalker.models.version.Version.walk_inputs`, but the
+    Versions referenced more than once are listed only once.
+
+    :param int chunk_size: The maximum number of ids used in one ``IN``
+      clause.
+    """
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.versions = {}  # Version.id: Version
+        self.inputs = {}  # Version.id: [Version]
+        self.latest_published_versions = {}  # (task_id, take_name): Version
+        self.latest_published_input_ids = {}  # Version.id: set of input ids
+
+    def chunks(self, ids):
+        """yields the given ids in chunks of :attr:`.chunk_size`
+        """
+        ids = list(ids)
+        for i in range(0, len(ids), self.chunk_size):
+            yield ids[i:i + self.chunk_size]
+
+    def query_input_ids(self, version_ids):
+        """Returns the input ids of the given Versions.
+
+        :param version_ids: A list of Version ids
+        :return: dict Version.id: [input ids]
+        """
+        from stalker import db
+        from stalker.models.version import Version_Inputs
+
+        input_ids = dict((version_id, []) for version_id in version_ids)
+        for chunk in self.chunks(version_ids):
+            rows = db.DBSession\
+                .query(Version_Inputs.c.version_id, Version_Inputs.c.link_id)\
+                .filter(Version_Inputs.c.version_id.in_(chunk))\
+                .order_by(Version_Inputs.c.version_id,
+                          Version_Inputs.c.link_id)\
+                .all()
+            for version_id, input_id in rows:
+                input_ids[version_id].append(input_id)
+        return input_ids
+
+    def load_versions(self, version_ids):
+        """Loads the Versions with the given ids in to :attr:`.versions`.
+
+        :param version_ids: A list of Version ids
+        """
+        from stalker import Version
+        version_ids = [
+            version_id for version_id in set(version_ids)
+            if version_id not in self.versions
+        ]
+        for chunk in self.chunks(version_ids):
+            for version in Version.query.filter(Version.id.in_(chunk)).all():
+                self.versions[version.id] = version
+
+    def load_inputs(self, version):
+        """Loads the whole input hierarchy of the given Version with one query
+        per depth level.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        """
+        from sqlalchemy import inspect
+
+        self.versions[version.id] = version
+        level = [version]
+        while level:
+            # use the inputs already loaded in to the session, they may have
+            # changes that are not committed yet
+            to_query = []
+            for v in level:
+                if v.id in self.inputs:
+                    continue
+                if 'inputs' in inspect(v).dict:
+                    self.inputs[v.id] = list(v.inputs)
+                    for input_version in v.inputs:
+                        self.versions[input_version.id] = input_version
+                else:
+                    to_query.append(v.id)
+
+            input_ids = self.query_input_ids(to_query)
+            self.load_versions(
+                [input_id for ids in input_ids.values() for input_id in ids]
+            )
+            for version_id, ids in input_ids.items():
+                # skip the Links that are not Versions
+                self.inputs[version_id] = [
+                    self.versions[input_id] for input_id in ids
+                    if input_id in self.versions
+                ]
+
+            next_level = []
+            for v in level:
+                for input_version in self.inputs[v.id]:
+                    if input_version.id not in self.inputs:
+                        next_level.append(input_version)
+            level = next_level
+
+    def load_latest_published_versions(self):
+        """Loads the latest published Version of every (task, take) pair of
+        the loaded Versions, and the input ids of these latest published
+        Versions.
+        """
+        from sqlalchemy import and_, func
+        from stalker import db, Version
+
+        task_ids = set(v.task_id for v in self.versions.values())
+        for chunk in self.chunks(task_ids):
+            latest = db.DBSession\
+                .query(
+                    Version.task_id,
+                    Version.take_name,
+                    func.max(Version.version_number).label('version_number')
+                )\
+                .filter(Version.task_id.in_(chunk))\
+                .filter(Version.is_published == True)\
+                .group_by(Version.task_id, Version.take_name)\
+                .subquery()
+
+            latest_versions = Version.query\
+                .join(
+                    latest,
+                    and_(
+                        Version.task_id == latest.c.task_id,
+                        Version.take_name == latest.c.take_name,
+                        Version.version_number == latest.c.version_number
+                    )
+                ).all()
+
+            for version in latest_versions:
+                self.latest_published_versions[
+                    (version.task_id, version.take_name)
+                ] = version
+
+        # the input ids of the latest published versions are needed to check
+        # if they are already referencing the updated versions
+        latest_ids = [
+            v.id for v in self.latest_published_versions.values()
+            if v.id not in self.inputs
+        ]
+        input_ids = self.query_input_ids(latest_ids)
+        self.latest_published_input_ids = dict(
+            (version_id, set(ids)) for version_id, ids in input_ids.items()
+        )
+        for version_id, input_versions in self.inputs.items():
+            self.latest_published_input_ids[version_id] = \
+                set(v.id for v in input_versions)
+
+    def load(self, version):
+        """Loads all the data needed to resolve the references of the given
+        Version.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        """
+        self.load_inputs(version)
+        self.load_latest_published_versions()
+
+    def latest_published_version(self, version):
+        """Returns the latest published Version of the given Version from the
+        loaded data.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        :return: :class:`~stalker.models.version.Version` or None
+        """
+        return self.latest_published_versions.get(
+            (version.task_id, version.take_name)
+        )
+
+    def is_latest_published_version(self, version):
+        """Returns True if the given Version is the latest published Version
+        in the loaded data.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        :return: bool
+        """
+        if not version.is_published:
+            return False
+        latest_published_version = self.latest_published_version(version)
+        return latest_published_version is not None \
+            and latest_published_version.id == version.id
+
+    def sorted_inputs(self, version):
+        """Returns the loaded deep inputs of the given Version sorted from the
+        deepest to shallowest, so every Version comes after its inputs.
+
+        Unlike :meth:`~stalker.models.version.Version.walk_inputs` every
+        Version is listed once, even if it is referenced by many Versions.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        :return: list
+        """
+        sorted_versions = []
+        visited_ids = set([version.id])
+        # depth first post-order walk without recursion, the hierarchy can be
+        # deeper than the recursion limit
+        stack = [(version, iter(self.inputs.get(version.id, [])))]
+        while stack:
+            current_version, inputs = stack[-1]
+            for input_version in inputs:
+                if input_version.id not in visited_ids:
+                    visited_ids.add(input_version.id)
+                    stack.append(
+                        (input_version,
+                         iter(self.inputs.get(input_version.id, [])))
+                    )
+                    break
+            else:
+                stack.pop()
+                if stack:  # skip the version itself
+                    sorted_versions.append(current_version)
+        return sorted_versions
+
+    def resolve(self, version, root=None):
+        """Deeply checks all the references of the given Version and returns
+        a reference resolution dictionary (see
+        :func:`.empty_reference_resolution`).
+
+        All the Versions in the lists are sorted from the deepest to shallowest
+        reference, and every Version is listed once.
+
+        :param version: A :class:`~stalker.models.version.Version` instance
+        :param root: The Versions referenced directly to the root
+        :return: dict
+        """
+        reference_resolution = empty_reference_resolution(root=root)
+        self.load(version)
+
+        # ids of the versions in the 'update' and 'create' lists
+        changed_ids = set()
+
+        for v in self.sorted_inputs(version):
+            inputs = self.inputs.get(v.id, [])
+
+            # check inputs first
+            to_be_updated_list = [
+                ref_v for ref_v in inputs
+                if not self.is_latest_published_version(ref_v)
+            ]
+
+            if to_be_updated_list:
+                action = 'create'
+                # check if there is a new published version of this version
+                # that is using all the updated versions of the references
+                latest_published_version = self.latest_published_version(v)
+                if latest_published_version and \
+                   not self.is_latest_published_version(v):
+                    # so there is a new published version, if all the updated
+                    # versions are already referenced by it just update to
+                    # this latest published version
+                    latest_input_ids = self.latest_published_input_ids.get(
+                        latest_published_version.id, set()
+                    )
+                    if all(self.latest_published_version(ref_v) is not None
+                           and self.latest_published_version(ref_v).id
+                           in latest_input_ids
+                           for ref_v in to_be_updated_list):
+                        action = 'update'
+            else:
+                # nothing needs to be updated, so check if this version has a
+                # new version
+                if self.is_latest_published_version(v):
+                    action = 'leave'
+                else:
+                    action = 'update'
+
+                # if any of the inputs are updated or created then this one
+                # needs to be created too
+                if any(ref_v.id in changed_ids for ref_v in inputs):
+                    action = 'create'
+
+            # so append this v to the related action list
+            reference_resolution[action].append(v)
+            if action != 'leave':
+                changed_ids.add(v.id)
+
+        return reference_resolution
+
+
 def discover_env_vars(env_name=''):
     """Looks for an ``env.json`` file in the path shown with the $ANIMAPATH
     environment variable then creates the environment variables.
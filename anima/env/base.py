@@ -68,6 +68,11 @@ class EnvironmentBase(object):
     name = "EnvironmentBase"
     representations = ['Base']
 
+    # the key of the Version cache in the database session info
+    version_cache_key = 'anima.env.version_cache'
+    # the maximum number of paths in one IN query
+    max_query_paths = 500
+
     def __init__(self, name="", extensions=None, version=None):
         self._name = name
         if extensions is None:
@@ -153,19 +158,23 @@ class EnvironmentBase(object):
         return path
 
     @classmethod
-    def find_repo(cls, path):
+    def find_repo(cls, path, repos=None):
         """returns the repository from the given path
 
         :param str path: path in a repository
+        :param repos: The list of all the
+          :class:`~stalker.models.repository.Repository` instances, they are
+          queried if skipped.
         :return: stalker.models.repository.Repository
         """
         # path could be using environment variables so expand them
         # path = os.path.expandvars(path)
 
         # first find the repository
-        from stalker import Repository
+        if repos is None:
+            from stalker import Repository
+            repos = Repository.query.all()
 
-        repos = Repository.query.all()
         found_repo = None
         for repo in repos:
             if path.startswith(repo.path) \
@@ -214,6 +223,113 @@ class EnvironmentBase(object):
 
         return versions
 
+    @classmethod
+    def to_os_independent_path(cls, full_path, repos=None):
+        """Normalizes the given path to the os independent form that is used
+        in :attr:`~stalker.models.version.Version.full_path`.
+
+        :param str full_path: A path that can have environment variables
+        :param repos: The list of all the
+          :class:`~stalker.models.repository.Repository` instances, they are
+          queried if skipped.
+        :return str:
+        """
+        # convert '\\' to '/'
+        full_path = os.path.normpath(
+            os.path.expandvars(full_path)
+        ).replace('\\', '/')
+
+        # trim repo path
+        repo = cls.find_repo(full_path, repos)
+        if repo:
+            return '$%s/%s' % (repo.env_var, repo.make_relative(full_path))
+        return full_path
+
+    @classmethod
+    def get_version_cache(cls):
+        """Returns the Version lookup cache of the current database session.
+
+        The cache is a dictionary with "paths" and "versions" keys, holding
+        the os independent forms of the looked up paths, and the Versions (or
+        None) of the os independent paths.
+
+        The cache is stored in the session and it is cleared when the session
+        flushes, commits or rolls back, so the lookups are never older than
+        the session data.
+
+        :return dict:
+        """
+        from stalker import db
+        session = db.DBSession()
+        version_cache = session.info.get(cls.version_cache_key)
+        if version_cache is None:
+            version_cache = {'paths': {}, 'versions': {}}
+            session.info[cls.version_cache_key] = version_cache
+
+            def clear_version_cache(*args):
+                version_cache['paths'].clear()
+                version_cache['versions'].clear()
+
+            from sqlalchemy import event
+            for event_name in ['after_flush', 'after_commit',
+                               'after_rollback']:
+                event.listen(session, event_name, clear_version_cache)
+
+        return version_cache
+
+    @classmethod
+    def get_versions_from_full_paths(cls, full_paths):
+        """Finds the Version instances of the given full_path values.
+
+        The paths are normalized and the Versions that are not in the
+        session cache (see :meth:`.get_version_cache`) are queried with one
+        ``IN`` query.
+
+        :param full_paths: A list of full paths
+        :return dict: A dictionary of the given full paths and the matching
+          :class:`~stalker.models.version.Version` instances or None.
+        """
+        full_paths = set(full_paths)
+        version_cache = cls.get_version_cache()
+        os_independent_paths = version_cache['paths']
+
+        paths_to_convert = [
+            full_path for full_path in full_paths
+            if full_path not in os_independent_paths
+        ]
+        if paths_to_convert:
+            from stalker import Repository
+            repos = Repository.query.all()
+            for full_path in paths_to_convert:
+                os_independent_paths[full_path] = \
+                    cls.to_os_independent_path(full_path, repos)
+
+        versions = version_cache['versions']
+        paths_to_query = set(
+            os_independent_paths[full_path] for full_path in full_paths
+        ).difference(versions)
+
+        if paths_to_query:
+            paths_to_query = list(paths_to_query)
+            logger.debug('getting versions with paths: %s' % paths_to_query)
+            from stalker import Version
+            found_versions = {}
+            for i in range(0, len(paths_to_query), cls.max_query_paths):
+                query_paths = paths_to_query[i:i + cls.max_query_paths]
+                for version in Version.query\
+                        .filter(Version.full_path.in_(query_paths))\
+                        .order_by(Version.id):
+                    found_versions.setdefault(version.full_path, version)
+
+            for path in paths_to_query:
+                versions[path] = found_versions.get(path)
+
+        return dict(
+            (full_path,
+             versions.get(os_independent_paths.get(full_path)))
+            for full_path in full_paths
+        )
+
     @classmethod
     def get_version_from_full_path(cls, full_path):
         """Finds the Version instance from the given full_path value.
@@ -223,28 +339,16 @@ class EnvironmentBase(object):
 
         Returns None if it can't find any matching.
 
+        Use :meth:`.get_versions_from_full_paths` to find the Versions of many
+        paths at once.
+
         :param full_path: The full_path of the desired
             :class:`~stalker.models.version.Version` instance.
 
         :return: :class:`~stalker.models.version.Version`
         """
         logger.debug('full_path: %s' % full_path)
-        # convert '\\' to '/'
-        full_path = os.path.normpath(
-            os.path.expandvars(full_path)
-        ).replace('\\', '/')
-
-        # trim repo path
-        from stalker import Repository, Version
-        os_independent_path = Repository.to_os_independent_path(full_path)
-
-        # try to get a version with that info
-        logger.debug('getting a version with path: %s' % full_path)
-
-        version = Version.query\
-            .filter(Version.full_path == os_independent_path).first()
-        logger.debug('version: %s' % version)
-        return version
+        return cls.get_versions_from_full_paths([full_path])[full_path]
 
     def get_current_version(self):
         """Returns the current Version instance from the environment.
@@ -283,8 +387,9 @@ class EnvironmentBase(object):
             recent_files = None
 
         if recent_files is not None:
+            versions = self.get_versions_from_full_paths(recent_files)
             for recent_file in recent_files:
-                version = self.get_version_from_full_path(recent_file)
+                version = versions[recent_file]
                 if version is not None:
                     break
 
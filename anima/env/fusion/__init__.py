@@ -369,8 +369,9 @@ class Fusion(EnvironmentBase):
             recent_files = None
 
         if recent_files is not None:
-            for i in range(len(recent_files)):
-                version = self.get_version_from_full_path(recent_files[i])
+            versions = self.get_versions_from_full_paths(recent_files)
+            for recent_file in recent_files:
+                version = versions[recent_file]
                 if version is not None:
                     break
 
@@ -1161,23 +1161,25 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
                 'in total' % (parent_ref, ref_count)
             )
 
-        prev_path = ''
+        # get the versions of all the paths at once
+        versions_by_path = \
+            self.get_versions_from_full_paths([ref.path for ref in refs])
+
         versions = []
+        version_ids = set()
         logger.debug('loop through %i references' % ref_count)
         for ref in refs:
             logger.debug('checking ref: %s' % ref.path)
             path = ref.path
-            if path != prev_path:
-                # try to get a version with the given path
-                version = self.get_version_from_full_path(path)
-                if version:
-                    # check if this is a representation
-                    if Representation.repr_separator in version.take_name:
-                        # use the parent version
-                        version = version.parent
-                    if version not in versions:
-                        versions.append(version)
-                    prev_path = path
+            version = versions_by_path[path]
+            if version:
+                # check if this is a representation
+                if Representation.repr_separator in version.take_name:
+                    # use the parent version
+                    version = version.parent
+                if version.id not in version_ids:
+                    versions.append(version)
+                    version_ids.add(version.id)
             if caller is not None:
                 caller.step(message='path: %s' % path)
             logger.debug('stepping to next ref')
@@ -1242,9 +1244,11 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
         references = sorted(pm.listReferences(), key=lambda x: x.path)
 
         # optimize it:
-        #   do only one search for each references to the same version
-        previous_ref_path = None
-        previous_full_path = None
+        #   do only one search for all the references
+        versions = self.get_versions_from_full_paths(
+            [reference.path for reference in references]
+        )
+        full_paths = {}
 
         updated_references = False
 
@@ -1252,15 +1256,16 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
 
         for reference in references:
             path = reference.path
-            if path == previous_ref_path:
-                full_path = previous_full_path
+            if path in full_paths:
+                full_path = full_paths[path]
             else:
-                version = self.get_version_from_full_path(path)
+                version = versions[path]
                 if version in reference_resolution['update']:
                     latest_published_version = version.latest_published_version
                     full_path = latest_published_version.absolute_full_path
                 else:
                     full_path = None
+                full_paths[path] = full_path
 
             if full_path:
                 reference.replaceWith(
@@ -1588,7 +1593,9 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
         guarantee up to date info for the currently processed Version instance.
 
         Uses the top level references to get a Stalker Version instance and
-        then tracks all the changes from these Version instances.
+        then tracks all the changes from these Version instances with a
+        :class:`~anima.env.ReferenceResolver`, which loads the whole input
+        hierarchy with a few queries.
 
         :return: dictionary
         """
@@ -1606,85 +1613,18 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
             empty_reference_resolution(root=self.get_referenced_versions())
         caller.step()
 
-        # reverse walk in DFS
-        dfs_version_references = []
-
         version = self.get_current_version()
         if not version:
+            caller.end_progress()
             return reference_resolution
 
-        for v in version.walk_inputs():
-            dfs_version_references.append(v)
-        caller.step()
-
-        # pop the first element which is the current scene
-        dfs_version_references.pop(0)
-
-        caller.end_progress()
-
-        # register a new caller
-        caller = pdm.register(
-            len(dfs_version_references),
-            'Maya.check_referenced_versions()'
+        # load the whole input hierarchy and resolve it in memory
+        from anima.env import ReferenceResolver
+        resolver = ReferenceResolver()
+        reference_resolution = resolver.resolve(
+            version, root=reference_resolution['root']
         )
-
-        # iterate back in the list
-        for v in reversed(dfs_version_references):
-            # check inputs first
-            to_be_updated_list = []
-            for ref_v in v.inputs:
-                if not ref_v.is_latest_published_version():
-                    to_be_updated_list.append(ref_v)
-
-            if to_be_updated_list:
-                action = 'create'
-                # check if there is a new published version of this version
-                # that is using all the updated versions of the references
-                latest_published_version = v.latest_published_version
-                if latest_published_version and \
-                   not v.is_latest_published_version():
-                    # so there is a new published version
-                    # check if its children needs any update
-                    # and the updated child versions are already
-                    # referenced to the this published version
-                    if all([ref_v.latest_published_version
-                            in latest_published_version.inputs
-                            for ref_v in to_be_updated_list]):
-                        # so all new versions are referenced to this published
-                        # version, just update to this latest published version
-                        action = 'update'
-                    else:
-                        # not all references are in the inputs
-                        # so we need to create a new version as usual
-                        # and update the references to the latest versions
-                        action = 'create'
-            else:
-                # nothing needs to be updated,
-                # so check if this version has a new version,
-                # also there could be no reference under this referenced
-                # version
-                if v.is_latest_published_version():
-                    # do nothing
-                    action = 'leave'
-                else:
-                    # update to latest published version
-                    action = 'update'
-
-                # before setting the action check all the inputs in
-                # resolution_dictionary, if any of them are update, or create
-                # then set this one to 'create'
-                if any(rev_v in reference_resolution['update'] or
-                       rev_v in reference_resolution['create']
-                       for rev_v in v.inputs):
-                    action = 'create'
-
-            # so append this v to the related action list
-            reference_resolution[action].append(v)
-
-            # from stalker import Version
-            # assert isinstance(v, Version)
-            caller.step(message=v.nice_name)
-
+        caller.step()
         caller.end_progress()
 
         return reference_resolution
@@ -1744,8 +1684,10 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
         # order to the path
         references_list = sorted(references_list, key=lambda x: x.path)
 
-        prev_path = ''
-        prev_vers = None
+        # get the versions of all the references at once
+        versions = self.get_versions_from_full_paths(
+            [ref.path for ref in references_list]
+        )
 
         # use a progress window for that
         wrp = MayaMainProgressBarWrapper()
@@ -1758,15 +1700,8 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
             #current_ref = references_list.pop(0)
             current_ref = ref
 
-            current_ref_path = current_ref.path
-
-            if current_ref_path != prev_path:
-                # get current version
-                current_version = \
-                    self.get_version_from_full_path(current_ref_path)
-                prev_vers = current_version
-            else:
-                current_version = prev_vers
+            # get current version
+            current_version = versions[current_ref.path]
 
             # update to a new version if present
             if current_version in reference_resolution['update']:
@@ -1848,9 +1783,13 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
             updated_namespaces = True
 
         # replace first level reference namespaces
-        for ref in pm.listReferences():
+        references = pm.listReferences()
+        versions = self.get_versions_from_full_paths(
+            [ref.path for ref in references]
+        )
+        for ref in references:
             # replace any possible old namespace with current one
-            ref_version = self.get_version_from_full_path(ref.path)
+            ref_version = versions[ref.path]
             old_namespace = ref.namespace
             try:
                 new_namespace = ref_version.nice_name
@@ -1989,8 +1928,9 @@ workspace -fr "furAttrMap" "Outputs/data/renderData/fur/furAttrMap";
                                  'Maya.fix_reference_namespaces()')
 
             from stalker import Version
+            versions = self.get_versions_from_full_paths(to_update_paths)
             for path in to_update_paths:
-                vers = self.get_version_from_full_path(path)
+                vers = versions[path]
 
                 logger.debug('vers: %s' % vers)
                 if not vers:
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Reads and writes .asstoc files.
+
+An .asstoc file starts with the ``bounds`` line that the Arnold stand-ins are
+reading, and it is followed by one ``node`` line per node in the .ass file::
+
+  bounds -1.0 -1.0 -1.0 1.0 1.0 1.0
+  node "<name>" <type> <point_count> <primitive_count> <bounds> <offset>
+    <length>
+
+(in one line). The name is double quoted and the backslashes and the double
+quotes in it are escaped with a backslash, so it can have spaces.
+
+The offset and the length are in bytes and are relative to the uncompressed
+.ass data, so the data of a node can be read without parsing the .ass file
+with :func:`.read_node_data`.
+"""
+
+import gzip
+import os
+import shlex
+
+
+class AssTocNode(object):
+    """A node entry in an .asstoc file.
+
+    :param str name: The node name
+    :param str type: The Arnold node type (ex. polymesh, points, curves)
+    :param int point_count: The number of points
+    :param int primitive_count: The number of primitives
+    :param bounds: The bounding box as (min_x, min_y, min_z, max_x, max_y,
+      max_z)
+    :param int offset: The byte offset of the node in the uncompressed data
+    :param int length: The byte length of the node in the uncompressed data
+    """
+
+    def __init__(self, name, type, point_count=0, primitive_count=0,
+                 bounds=None, offset=0, length=0):
+        self.name = name
+        self.type = type
+        self.point_count = point_count
+        self.primitive_count = primitive_count
+        if bounds is None:
+            bounds = (0, 0, 0, 0, 0, 0)
+        self.bounds = tuple(bounds)
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return '<AssTocNode %s (%s)>' % (self.name, self.type)
+
+    def to_line(self):
+        """Returns the .asstoc line of this node
+        """
+        return 'node %s %s %i %i %s %i %i' % (
+            quote_name(self.name), self.type, self.point_count,
+            self.primitive_count,
+            ' '.join(map(str, self.bounds)), self.offset, self.length
+        )
+
+    @classmethod
+    def from_line(cls, line):
+        """Creates an AssTocNode from the given .asstoc line
+
+        :param str line: A line starting with "node"
+        :return: :class:`.AssTocNode`
+        """
+        try:
+            parts = shlex.split(line)
+        except ValueError:
+            parts = []
+        if len(parts) != 13 or parts[0] != 'node':
+            raise ValueError('Not a valid asstoc node line: %s' % line)
+
+        return cls(
+            name=parts[1],
+            type=parts[2],
+            point_count=int(parts[3]),
+            primitive_count=int(parts[4]),
+            bounds=map(float, parts[5:11]),
+            offset=int(parts[11]),
+            length=int(parts[12])
+        )
+
+
+class AssToc(object):
+    """The table of contents of an .ass file.
+
+    :param bounds: The bounding box of the whole file as (min_x, min_y, min_z,
+      max_x, max_y, max_z)
+    :param nodes: A list of :class:`.AssTocNode` instances
+    """
+
+    def __init__(self, bounds=None, nodes=None):
+        if bounds is None:
+            bounds = (0, 0, 0, 0, 0, 0)
+        self.bounds = tuple(bounds)
+        if nodes is None:
+            nodes = []
+        self.nodes = nodes
+
+    def __getitem__(self, name):
+        """Returns the node with the given name
+
+        :param str name: The node name
+        :return: :class:`.AssTocNode`
+        """
+        for node in self.nodes:
+            if node.name == name:
+                return node
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return any(node.name == name for node in self.nodes)
+
+    def write(self, path):
+        """Writes the table of contents to the given path
+
+        :param str path: The .asstoc file path
+        """
+        lines = ['bounds %s' % ' '.join(map(str, self.bounds))]
+        lines.extend([node.to_line() for node in self.nodes])
+        with open(path, 'w') as asstoc_file:
+            asstoc_file.write('\n'.join(lines))
+
+    @classmethod
+    def read(cls, path):
+        """Reads the .asstoc file in the given path. The files with only the
+        bounds line are also supported.
+
+        :param str path: The .asstoc file path
+        :return: :class:`.AssToc`
+        """
+        toc = cls()
+        with open(path) as asstoc_file:
+            for line in asstoc_file:
+                line = line.strip()
+                if line.startswith('bounds'):
+                    toc.bounds = tuple(map(float, line.split()[1:7]))
+                elif line.startswith('node'):
+                    toc.nodes.append(AssTocNode.from_line(line))
+        return toc
+
+
+def quote_name(name):
+    """Returns the given node name double quoted with the backslashes and the
+    double quotes escaped, as it is written in to the .asstoc files
+
+    :param str name: The node name
+    :return: str
+    """
+    return '"%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def get_asstoc_path(ass_path):
+    """Returns the .asstoc path of the given .ass or .ass.gz file path
+
+    :param str ass_path: The .ass file path
+    :return: str
+    """
+    basename, extension = os.path.splitext(ass_path)
+    if extension == '.gz':
+        basename = os.path.splitext(basename)[0]
+    return '%s.asstoc' % basename
+
+
+def read_node_data(ass_path, name, toc=None):
+    """Returns the data of the node with the given name from the given .ass
+    file by seeking to the offset stored in the .asstoc file.
+
+    The .ass file is not parsed, but the .ass.gz files still need to be
+    decompressed up to the offset of the node.
+
+    :param str ass_path: The .ass or .ass.gz file path
+    :param str name: The node name
+    :param toc: An :class:`.AssToc` instance, the .asstoc file next to the
+      .ass file is read if skipped.
+    :return: str
+    """
+    if toc is None:
+        toc = AssToc.read(get_asstoc_path(ass_path))
+
+    node = toc[name]
+
+    file_handler = open
+    if os.path.splitext(ass_path)[1] == '.gz':
+        file_handler = gzip.open
+
+    ass_file = file_handler(ass_path, 'rb')
+    try:
+        ass_file.seek(node.offset)
+        return ass_file.read(node.length)
+    finally:
+        ass_file.close()
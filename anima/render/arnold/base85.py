@@ -4,7 +4,14 @@
 # This module is part of anima-tools and is released under the BSD 2
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
+import os
 import struct
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 LUTS = {
@@ -93,9 +100,42 @@ LUTS = {
     },
 }
 
+# use the NumPy codec if NumPy is available
+use_numpy = numpy is not None
+
+# data smaller than this (in bytes) is handled by the pure Python codec, the
+# NumPy codec has a setup cost which is not worth paying for a few words
+numpy_threshold = 4096
+
+# number of 32-bit words converted at once by the NumPy codec, limits the size
+# of the temporary arrays
+numpy_chunk_size = 1 << 20
+
 
 def __b85_encode(data, lut, byte_order, special_values=None):
-    """Encodes the given string data in to Base85 using the given LUT
+    """Encodes the given string data in to Base85 using the given LUT.
+
+    Uses the NumPy codec if NumPy is available and the data is large enough,
+    falls back to the pure Python codec otherwise. Both codecs generate
+    exactly the same output.
+
+    :param str data: A string which contains a string to be encoded in Base85
+    :param list lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_values: If given, the words that are encoded to one of
+      the pre defined special values are replaced with the corresponding
+      special character. The replacement is done per word, so the special
+      values never match across word boundaries.
+    :returns: str
+    """
+    if use_numpy and numpy is not None and len(data) >= numpy_threshold:
+        return __b85_encode_numpy(data, lut, byte_order, special_values)
+    return __b85_encode_python(data, lut, byte_order, special_values)
+
+
+def __b85_encode_python(data, lut, byte_order, special_values=None):
+    """Encodes the given string data in to Base85 using the given LUT, one
+    32-bit word at a time.
 
     :param str data: A string which contains a string to be encoded in Base85
     :param dict lut: The lut to be used in encoding
@@ -112,7 +152,15 @@ def __b85_encode(data, lut, byte_order, special_values=None):
     number_of_chunks = len(data) // 4
     byte_format = '%s%sI' % (byte_order, number_of_chunks)
     unpack = struct.unpack
+    special_words = {}
+    if special_values:
+        special_words = __special_words(
+            special_values, dict((c, i) for i, c in enumerate(lut))
+        )
     for x in unpack(byte_format, data):
+        if x in special_words:
+            parts_append(special_words[x])
+            continue
         # network order (big endian), 32-bit unsigned integer
         # note: x86 is little endian
         parts_append(lut[(x // 52200625)])
@@ -120,44 +168,334 @@ def __b85_encode(data, lut, byte_order, special_values=None):
         parts_append(lut[(x // 7225) % 85])
         parts_append(lut[(x // 85) % 85])
         parts_append(lut[x % 85])
-    return_val = ''.join(parts)
+    return ''.join(parts)
+
+
+def __b85_encode_numpy(data, lut, byte_order, special_values=None):
+    """Encodes the given string data in to Base85 using the given LUT.
+
+    The 32-bit words are converted to base 85 digits as whole arrays, then the
+    digits are converted to characters with a single gather from the LUT byte
+    table.
+
+    :param str data: A string which contains a string to be encoded in Base85
+    :param list lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_values: If given, pre defined special values are going
+      to be replaced with corresponding special characters
+    :returns: str
+    """
+    # pad data
+    padding = (4 - len(data) % 4) % 4
+    if padding:
+        data = ''.join([data, '\0' * padding])
+
+    words = numpy.frombuffer(
+        data, dtype='%su4' % __numpy_byte_order(byte_order)
+    )
+    number_of_words = len(words)
+    digits = numpy.empty((number_of_words, 5), dtype=numpy.uint8)
+
+    # do the divmod in chunks to keep the temporary arrays small
+    for start in range(0, number_of_words, numpy_chunk_size):
+        end = start + numpy_chunk_size
+        x = words[start:end].astype(numpy.uint32)
+        chunk_digits = digits[start:end]
+        for i in (4, 3, 2, 1):
+            q = x // 85
+            chunk_digits[:, i] = x - q * 85
+            x = q
+        chunk_digits[:, 0] = x
+
+    encoded_data = __numpy_encode_table(lut).take(digits)
+    del digits
+
     if special_values:
-        for key in special_values.keys():
-            return_val = return_val.replace(key, special_values[key])
-            #return_val = special_values[key].join(return_val.split(key))
-    return return_val
+        # replace the whole word with the special character and drop the
+        # remaining 4 characters of that word
+        keep = None
+        special_words = __special_words(
+            special_values, dict((c, i) for i, c in enumerate(lut))
+        )
+        for value, char in special_words.items():
+            is_special = words == value
+            if not is_special.any():
+                continue
+            if keep is None:
+                keep = numpy.ones(encoded_data.shape, dtype=bool)
+            encoded_data[is_special, 0] = ord(char)
+            keep[is_special, 1:] = False
+        if keep is not None:
+            return encoded_data[keep].tobytes()
+
+    return encoded_data.tobytes()
+
+
+def __special_words(special_values, char_to_int):
+    """Returns a dictionary of the 32-bit word values of the given special
+    values and the corresponding special characters.
+
+    :param dict special_values: The special values dictionary where the keys
+      are the 5 character encoded values and the values are the special
+      characters.
+    :param dict char_to_int: The char to int LUT
+    :returns: dict
+    """
+    special_words = {}
+    for key, char in special_values.items():
+        value = 0
+        for c in key:
+            value = value * 85 + char_to_int[c]
+        special_words[value] = char
+    return special_words
 
 
-def __encode_multithreaded(f, data):
-    """The base function that runs the given function f in multithreaded
-    fashion.
+def __numpy_byte_order(byte_order):
+    """Converts the given struct byte order character to a NumPy byte order
+    character.
 
-    :param f: The function
-    :param data: The data
-    :return:
+    :param str byte_order: The byte order character for struct.unpack
+    :returns: str
     """
-    import multiprocessing
-    import platform
-    number_of_threads = multiprocessing.cpu_count() / 2
+    return '<' if byte_order in ('<', '=') else '>'
 
-    if platform.system() == 'Windows':
-        multiprocessing.set_executable('C:/Python27/pythonw.exe')
-    elif platform.system() == 'Linux':
-        multiprocessing.set_executable('/usr/bin/python')
 
-    p = multiprocessing.Pool(number_of_threads)
+__numpy_tables = {}
 
-    number_of_chunks = len(data) // 4
-    chunk_per_thread = number_of_chunks / number_of_threads
-    split_per_char = chunk_per_thread * 4
 
-    thread_data = []
-    for i in range(0, len(data), split_per_char):
-        thread_data.append(data[i:i + split_per_char])
+def __numpy_encode_table(lut):
+    """Returns the byte table of the given int to char LUT as a NumPy array.
+
+    :param list lut: The int to char LUT
+    :returns: numpy.ndarray
+    """
+    key = ('encode', id(lut))
+    cached = __numpy_tables.get(key)
+    if cached is None or cached[0] is not lut:
+        table = numpy.array([ord(c) for c in lut], dtype=numpy.uint8)
+        cached = (lut, table)
+        __numpy_tables[key] = cached
+    return cached[1]
+
+
+def __numpy_decode_table(lut):
+    """Returns the value table of the given char to int LUT as a NumPy array
+    indexed by the character code.
+
+    :param dict lut: The char to int LUT
+    :returns: numpy.ndarray
+    """
+    key = ('decode', id(lut))
+    cached = __numpy_tables.get(key)
+    if cached is None or cached[0] is not lut:
+        table = numpy.zeros(256, dtype=numpy.uint32)
+        for char, value in lut.items():
+            table[ord(char)] = value
+        cached = (lut, table)
+        __numpy_tables[key] = cached
+    return cached[1]
+
+
+def __encode_multithreaded(name, data):
+    """The base function that encodes the given data in multiple processes by
+    using the shared encoder pool.
+
+    :param str name: The LUT name, one of the keys of :data:`LUTS`
+    :param str data: The data
+    :return: str
+    """
+    return get_encoder_pool().encode(data, name)
+
+
+def _encode_chunk(args):
+    """Encodes a chunk of the shared input file and writes the result to the
+    shared output file. This is the function that runs in the worker
+    processes of the :class:`.B85EncoderPool`.
+
+    :param tuple args: A tuple of LUT name, input path, input offset, input
+      length, output path and output offset.
+    :returns: int
+    """
+    import mmap
+    name, input_path, input_offset, input_length, output_path, \
+        output_offset = args
+
+    with open(input_path, 'rb') as input_file:
+        input_file.seek(input_offset)
+        data = input_file.read(input_length)
+
+    encoded_data = ENCODERS[name](data)
+    del data
+
+    with open(output_path, 'r+b') as output_file:
+        output_map = mmap.mmap(output_file.fileno(), 0)
+        try:
+            output_map[output_offset:output_offset + len(encoded_data)] = \
+                encoded_data
+        finally:
+            output_map.close()
+
+    return len(encoded_data)
+
+
+class B85EncoderPool(object):
+    """A persistent pool of worker processes that encode data in to Base85.
+
+    The pool is started once and reused for every call. The data is handed to
+    the workers through a shared memory backed file (under ``/dev/shm`` if
+    available) and every worker writes its result directly in to its own
+    region of a preallocated output file, so neither the input nor the output
+    is pickled between the processes.
+
+    The number of workers and the chunk size is decided from the data size,
+    small data is encoded in the current process.
+
+    :param int processes: The maximum number of worker processes, defaults to
+      the CPU count.
+    :param str executable: The Python executable for the worker processes.
+      Only needed on platforms that spawn the workers (Windows) when the
+      current interpreter is embedded in a host application.
+    :param int min_chunk_size: The minimum number of bytes given to a worker
+      at once. Data that fits in to one chunk is encoded in the current
+      process.
+    """
+
+    def __init__(self, processes=None, executable=None,
+                 min_chunk_size=4 << 20):
+        import multiprocessing
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.processes = max(1, processes)
+        self.executable = executable
+        self.min_chunk_size = min_chunk_size - min_chunk_size % 4 or 4
+        self.pool = None
+        # the pool can be used from multiple threads (ex. batch exports)
+        self.lock = threading.Lock()
+
+        # shared memory folder
+        self.temp_dir = None
+        if os.path.isdir('/dev/shm'):
+            self.temp_dir = '/dev/shm'
+
+    def start(self):
+        """Starts the worker processes if they are not started yet.
+        """
+        with self.lock:
+            if self.pool is None:
+                import multiprocessing
+                if self.executable:
+                    multiprocessing.set_executable(self.executable)
+                self.pool = multiprocessing.Pool(self.processes)
+
+    def close(self):
+        """Stops the worker processes.
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def plan(self, data_size):
+        """Returns the worker count and the chunk size (in bytes) for the given
+        data size.
+
+        :param int data_size: The size of the data in bytes
+        :returns: (int, int)
+        """
+        # give each worker a few chunks to balance the load
+        chunk_size = -(-data_size // (self.processes * 4))
+        chunk_size += (4 - chunk_size % 4) % 4
+        chunk_size = max(chunk_size, self.min_chunk_size)
+        number_of_chunks = -(-data_size // chunk_size)
+        return min(self.processes, number_of_chunks), chunk_size
+
+    def encode(self, data, name='arnold'):
+        """Encodes the given data with the LUT with the given name.
+
+        :param str data: The data to be encoded
+        :param str name: The LUT name, one of the keys of :data:`LUTS`
+        :returns: str
+        """
+        encode = ENCODERS[name]
+        number_of_workers, chunk_size = self.plan(len(data))
+        if number_of_workers < 2:
+            return encode(data)
+
+        import tempfile
+        self.start()
+
+        input_fd, input_path = \
+            tempfile.mkstemp(prefix='b85_in_', dir=self.temp_dir)
+        output_fd, output_path = \
+            tempfile.mkstemp(prefix='b85_out_', dir=self.temp_dir)
+        try:
+            # a single write() call can write less than the given data
+            with os.fdopen(input_fd, 'wb') as input_file:
+                input_fd = None
+                input_file.write(data)
+            # only the last chunk can have an incomplete word
+            output_size = -(-len(data) // 4) * 5
+            os.ftruncate(output_fd, output_size)
+
+            tasks = [
+                (name, input_path, i, chunk_size, output_path, i // 4 * 5)
+                for i in range(0, len(data), chunk_size)
+            ]
+            lengths = self.pool.map(_encode_chunk, tasks, chunksize=1)
+
+            # the special values can make the chunks shorter than their
+            # region, so read only the used part of every region
+            parts = []
+            with os.fdopen(output_fd, 'rb') as output_file:
+                output_fd = None
+                for task, length in zip(tasks, lengths):
+                    output_file.seek(task[5])
+                    parts.append(output_file.read(length))
+            return ''.join(parts)
+        finally:
+            if input_fd is not None:
+                os.close(input_fd)
+            if output_fd is not None:
+                os.close(output_fd)
+            os.remove(input_path)
+            os.remove(output_path)
+
+
+# the Python executable of the shared encoder pool workers, set it when the
+# current interpreter is embedded in a host application (ex. Houdini) on a
+# platform that spawns the workers (Windows), otherwise the workers start the
+# host application
+encoder_pool_executable = None
+
+__encoder_pool = []
+__encoder_pool_lock = threading.Lock()
+
+
+def get_encoder_pool():
+    """Returns the shared :class:`.B85EncoderPool` instance, creates it in the
+    first call.
+
+    :returns: :class:`.B85EncoderPool`
+    """
+    with __encoder_pool_lock:
+        if not __encoder_pool:
+            import atexit
+            pool = B85EncoderPool(executable=encoder_pool_executable)
+            atexit.register(pool.close)
+            __encoder_pool.append(pool)
+    return __encoder_pool[0]
+
 
-    data = ''.join(p.map(f, thread_data))
-    p.close()
-    return data
+def b85_encode(data):
+    """Encodes the given string data in to Base85 using the standard LUT
+
+    :param str data: A string which contains a string to be encoded in Base85
+    :returns: str
+    """
+    lut = LUTS['standard']['int_to_char']
+    byte_order = LUTS['standard']['byte_order']
+    return __b85_encode(data, lut, byte_order)
 
 
 def rfc1924_b85_encode(data):
@@ -172,12 +510,13 @@ def rfc1924_b85_encode(data):
 
 
 def rfc1924_b85_encode_multithreaded(data):
-    """Encodes the given string data in to Base85 using the RFC1924 LUT
+    """Encodes the given string data in to Base85 using the RFC1924 LUT in
+    multiple processes by using the shared encoder pool.
 
     :param str data: A string which contains a string to be encoded in Base85
     :returns: str
     """
-    return __encode_multithreaded(rfc1924_b85_encode, data)
+    return __encode_multithreaded('rfc1924', data)
 
 
 def arnold_b85_encode(data):
@@ -189,42 +528,89 @@ def arnold_b85_encode(data):
     lut = LUTS['arnold']['int_to_char']
     byte_order = LUTS['arnold']['byte_order']
     special_values = LUTS['arnold']['special_values']
-    #return __b85_encode(data, lut, byte_order, special_values)
-    return __b85_encode(data, lut, byte_order)
+    return __b85_encode(data, lut, byte_order, special_values)
 
 
 def arnold_b85_encode_multithreaded(data):
-    """Encodes the given string data in to Base85 using arnold LUT.
+    """Encodes the given string data in to Base85 using arnold LUT in multiple
+    processes by using the shared encoder pool.
 
     :param str data: String to be encoded in Base85
     :return: str
     """
-    return __encode_multithreaded(arnold_b85_encode, data)
+    return __encode_multithreaded('arnold', data)
+
+
+# encode functions by LUT name, used by the encoder pool workers
+ENCODERS = {
+    'standard': b85_encode,
+    'rfc1924': rfc1924_b85_encode,
+    'arnold': arnold_b85_encode,
+}
 
 
 def __b85_decode(data, lut, byte_order, special_values=None):
     """Decodes the given string data by using the given LUT and byte order
 
+    Uses the NumPy codec if NumPy is available and the data is large enough,
+    falls back to the pure Python codec otherwise.
+
     :param str data: A string which contains the encoded data
     :param dict lut: A dict where the keys are encoded characters and the
       values are the integer correspondence of those characters and will be
       used to generate an integer number.
     :param str byte_order: The byte order character for struct.pack
-    :param bool unpack_z: replaces character "z" with appropriate characters
-      for the "0 special case" (where it is not converted to a 5 character
-      string but "z")
+    :param dict special_values: If given, every special character is expanded
+      to the corresponding pre defined special value. The expansion is done
+      per word.
     """
-    if special_values:
-        for key in special_values.keys():
-            # if the data is massive, then we are using twice the memory
-            # use key.join(data.split(special_values[key]))
-            data = data.replace(special_values[key], key)
-            #data = key.join(data.split(special_values[key]))
+    if use_numpy and numpy is not None and len(data) >= numpy_threshold:
+        return __b85_decode_numpy(data, lut, byte_order, special_values)
+    return __b85_decode_python(data, lut, byte_order, special_values)
 
+
+def __b85_decode_python(data, lut, byte_order, special_values=None):
+    """Decodes the given string data by using the given LUT and byte order,
+    one 5 character group at a time.
+
+    :param str data: A string which contains the encoded data
+    :param dict lut: A dict where the keys are encoded characters and the
+      values are the integer correspondence of those characters and will be
+      used to generate an integer number.
+    :param str byte_order: The byte order character for struct.pack
+    :param dict special_values: If given, every special character is expanded
+      to the corresponding pre defined special value.
+    """
     parts = []
     parts_append = parts.append
     pack = struct.pack
     byte_format = '%sI' % byte_order
+
+    special_words = {}
+    if special_values:
+        for value, char in __special_words(special_values, lut).items():
+            if char in data:
+                special_words[char] = value
+
+    if special_words:
+        # the groups are not aligned anymore, walk over the data
+        i = 0
+        length = len(data)
+        while i < length:
+            char = data[i]
+            if char in special_words:
+                parts_append(pack(byte_format, special_words[char]))
+                i += 1
+                continue
+            int_sum = 52200625 * lut[char] + \
+                614125 * lut[data[i + 1]] + \
+                7225 * lut[data[i + 2]] + \
+                85 * lut[data[i + 3]] + \
+                lut[data[i + 4]]
+            parts_append(pack(byte_format, int_sum))
+            i += 5
+        return ''.join(parts)
+
     for i in xrange(0, len(data), 5):
         int_sum = 52200625 * lut[data[i]] + \
             614125 * lut[data[i + 1]] + \
@@ -234,6 +620,72 @@ def __b85_decode(data, lut, byte_order, special_values=None):
         parts_append(pack(byte_format, int_sum))
     return ''.join(parts)
 
+
+def __b85_decode_numpy(data, lut, byte_order, special_values=None):
+    """Decodes the given string data by using the given LUT and byte order.
+
+    The characters are converted to base 85 digits with a single gather from
+    the LUT value table and the 32-bit words are assembled as whole arrays.
+
+    :param str data: A string which contains the encoded data
+    :param dict lut: A dict where the keys are encoded characters and the
+      values are the integer correspondence of those characters and will be
+      used to generate an integer number.
+    :param str byte_order: The byte order character for struct.pack
+    :param dict special_values: If given, every special character is expanded
+      to the corresponding pre defined special value.
+    """
+    table = __numpy_decode_table(lut)
+    codes = numpy.frombuffer(data, dtype=numpy.uint8)
+    if special_values:
+        codes = __numpy_expand_special_values(codes, special_values)
+    number_of_words = len(codes) // 5
+    words = numpy.empty(
+        number_of_words, dtype='%su4' % __numpy_byte_order(byte_order)
+    )
+
+    for start in range(0, number_of_words, numpy_chunk_size):
+        end = min(start + numpy_chunk_size, number_of_words)
+        digits = table.take(codes[start * 5:end * 5]).reshape(-1, 5)
+        x = digits[:, 0].copy()
+        for i in (1, 2, 3, 4):
+            x *= 85
+            x += digits[:, i]
+        words[start:end] = x
+
+    return words.tobytes()
+
+
+def __numpy_expand_special_values(codes, special_values):
+    """Expands the special characters in the given character codes to the 5
+    character special values.
+
+    :param codes: A NumPy array of character codes
+    :param dict special_values: The special values dictionary where the keys
+      are the 5 character encoded values and the values are the special
+      characters.
+    :returns: numpy.ndarray
+    """
+    is_special = numpy.zeros(len(codes), dtype=bool)
+    expansions = numpy.zeros((256, 5), dtype=numpy.uint8)
+    for key, char in special_values.items():
+        code = ord(char)
+        is_special |= codes == code
+        expansions[code] = [ord(c) for c in key]
+
+    special_positions = numpy.flatnonzero(is_special)
+    if not len(special_positions):
+        return codes
+
+    # every special character takes 4 more characters after expansion
+    expanded_codes = numpy.repeat(codes, numpy.where(is_special, 5, 1))
+    special_codes = codes[special_positions]
+    starts = special_positions + 4 * numpy.arange(len(special_positions))
+    for i in range(5):
+        expanded_codes[starts + i] = expansions[special_codes, i]
+    return expanded_codes
+
+
 def b85_decode(data):
     """Decodes the given string data by using the standard LUT and network (=
     big endian) byte order.
@@ -263,8 +715,135 @@ def arnold_b85_decode(data):
     lut = LUTS['arnold']['char_to_int']
     byte_order = LUTS['arnold']['byte_order']
     special_values = LUTS['arnold']['special_values']
-    #return __b85_decode(data, lut, byte_order, special_values)
-    return __b85_decode(data, lut, byte_order)
+    return __b85_decode(data, lut, byte_order, special_values)
+
+class B85Encoder(object):
+    """Incremental Base85 encoder.
+
+    Encodes the data given in arbitrary sized pieces. The bytes that are not
+    filling a complete 32-bit word are kept until the next piece arrives, so
+    the generated data is the same with encoding the whole data at once.
+
+    :param encode: The encode function, defaults to :func:`arnold_b85_encode`
+    """
+
+    def __init__(self, encode=None):
+        if encode is None:
+            encode = arnold_b85_encode
+        self.encode_function = encode
+        self.remainder = ''
+
+    def encode(self, data):
+        """Encodes the complete words of the given data together with the
+        bytes left from the previous call.
+
+        :param str data: The raw data
+        :returns: str
+        """
+        if self.remainder:
+            data = ''.join([self.remainder, data])
+        length = len(data)
+        remainder_length = length % 4
+        if remainder_length:
+            self.remainder = data[length - remainder_length:]
+            data = data[:length - remainder_length]
+        else:
+            self.remainder = ''
+        if not data:
+            return ''
+        return self.encode_function(data)
+
+    def flush(self):
+        """Encodes the remaining bytes by padding them to a complete word.
+
+        :returns: str
+        """
+        remainder = self.remainder
+        self.remainder = ''
+        if not remainder:
+            return ''
+        return self.encode_function(remainder)
+
+
+class B85Writer(object):
+    """Encodes data in to Base85 and writes it to the given file handler in
+    fixed width lines.
+
+    The raw data is encoded in chunks of ``chunk_size`` bytes and every
+    complete line is written directly to the file handler, so the memory used
+    is bounded by the chunk size and not by the size of the data. This works
+    with plain files and ``gzip`` streams alike::
+
+      writer = B85Writer(ass_file)
+      writer.write(point_positions)
+      writer.write(point_prime_positions)
+      writer.close()
+
+    :param file_handler: A file like object with a ``write`` method.
+    :param encode: The encode function, defaults to :func:`arnold_b85_encode`
+    :param int line_width: The number of characters per line, defaults to 500
+    :param int chunk_size: The number of raw bytes encoded at once, should be
+      a multiple of 4. Defaults to 1 MB.
+    """
+
+    def __init__(self, file_handler, encode=None, line_width=500,
+                 chunk_size=1 << 20):
+        self.file_handler = file_handler
+        self.encoder = B85Encoder(encode)
+        self.line_width = line_width
+        self.chunk_size = chunk_size - chunk_size % 4 or 4
+        self.line_remainder = ''
+        self.line_count = 0
+
+    def write(self, data):
+        """Encodes and writes the given raw data.
+
+        :param str data: The raw data
+        """
+        chunk_size = self.chunk_size
+        for i in range(0, len(data), chunk_size):
+            self.write_encoded(self.encoder.encode(data[i:i + chunk_size]))
+
+    def writelines(self, iterable):
+        """Encodes and writes the raw data pieces from the given iterable.
+
+        :param iterable: An iterable of raw data strings
+        """
+        for data in iterable:
+            self.write(data)
+
+    def write_encoded(self, encoded_data):
+        """Writes the given encoded data in fixed width lines, the characters
+        that are not filling a complete line are kept until the next call or
+        until :meth:`.close` is called.
+
+        :param str encoded_data: Base85 encoded data
+        """
+        if self.line_remainder:
+            encoded_data = ''.join([self.line_remainder, encoded_data])
+
+        line_width = self.line_width
+        length = len(encoded_data)
+        full_length = length - length % line_width
+        if full_length:
+            lines = [
+                encoded_data[i:i + line_width]
+                for i in range(0, full_length, line_width)
+            ]
+            lines.append('')
+            self.file_handler.write('\n'.join(lines))
+            self.line_count += len(lines) - 1
+        self.line_remainder = encoded_data[full_length:]
+
+    def close(self):
+        """Writes the remaining data and ends the last line.
+        """
+        self.write_encoded(self.encoder.flush())
+        if self.line_remainder or not self.line_count:
+            self.file_handler.write('%s\n' % self.line_remainder)
+            self.line_count += 1
+        self.line_remainder = ''
+
 
 def mapper(encoded_data, raw_data, special_values=None):
     """A simple utility to create a lut for known Base85 encoding
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Exports a frame range of geometry to .ass files in parallel.
+
+The geometry of every frame is read in to a :class:`.GeometrySnapshot` in the
+calling thread (HOM is not thread safe and changing the frame is global) and
+the encoding and the compression of the frames are done in a pool of worker
+threads, which only use the plain data of the snapshots. So reading the next
+frame overlaps with exporting the previous ones::
+
+  from anima.render.arnold import batch
+  exporter = batch.BatchExporter(
+      batch.houdini_geometry_provider('/obj/hair/OUT', export_type=0),
+      '$HIP/ass/hair.####.ass.gz',
+      'hair',
+      export_type=0,
+  )
+  exporter.export(1001, 1100)
+  print(exporter.report())
+
+Any callable that returns an object with ``geometry()`` and ``path()`` methods
+for a given frame can be used as the geometry provider.
+"""
+
+import multiprocessing
+import re
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from anima.render.arnold import h2a
+
+try:
+    import hou
+except ImportError:
+    hou = None
+
+
+STAGES = ['fetch', 'read', 'encode', 'write', 'asstoc']
+
+# the float attributes that h2a exports by attribute class
+snapshot_attribute_names = {
+    'point': ['P', 'pprime', 'color', 'pscale', 'particle_color', 'width',
+              'uv', 'N'],
+    'prim': ['uv_u', 'uv_v'],
+    'vertex': ['uv', 'N', 'width'],
+}
+
+
+class SnapshotAttrib(object):
+    """A stand-in for ``hou.Attrib`` in a :class:`.GeometrySnapshot`
+
+    :param str name: The attribute name
+    :param int size: The number of components
+    """
+
+    def __init__(self, name, size):
+        self._name = name
+        self._size = size
+
+    def name(self):
+        return self._name
+
+    def size(self):
+        return self._size
+
+
+class GeometrySnapshot(object):
+    """Holds the data of a ``hou.Geometry`` that h2a exports as plain Python
+    data, and implements the ``hou.Geometry`` methods that h2a uses to read
+    them.
+
+    The snapshot is created in the thread that owns HOM and can be exported in
+    any thread. The polygon index attributes are computed while creating the
+    snapshot (see :func:`.h2a.get_polygon_indices`), so the primitives are not
+    iterated in the worker threads. For curves without a point or vertex
+    "width" attribute the vertex widths are read while creating the snapshot
+    too (see :func:`.h2a.get_curve_vertex_widths`).
+
+    Like HOM, reading the values of a missing attribute raises
+    ``hou.OperationFailed``.
+
+    :param geo: A ``hou.Geometry`` instance
+    :param int export_type: The export type, 0: curves, 1: polygons, 2:
+      particles
+    """
+
+    def __init__(self, geo, export_type=1):
+        intrinsic_values = geo.intrinsicValueDict()
+        self.intrinsic_values = dict(
+            (name, intrinsic_values[name])
+            for name in ['primitivecount', 'pointcount', 'vertexcount']
+        )
+        self.detail_values = dict(
+            (name, geo.attribValue(name))
+            for name in ['bound_min', 'bound_max']
+        )
+
+        # attribute class -> name -> (size, packed values)
+        self.attributes = {}
+        finders = {
+            'point': geo.findPointAttrib,
+            'prim': geo.findPrimAttrib,
+            'vertex': geo.findVertexAttrib,
+        }
+        getters = {
+            'point': geo.pointFloatAttribValuesAsString,
+            'prim': geo.primFloatAttribValuesAsString,
+            'vertex': geo.vertexFloatAttribValuesAsString,
+        }
+        for attribute_class, names in snapshot_attribute_names.items():
+            attributes = self.attributes[attribute_class] = {}
+            for name in names:
+                attribute = finders[attribute_class](name)
+                if attribute is not None:
+                    attributes[name] = (
+                        attribute.size(), getters[attribute_class](name)
+                    )
+
+        if export_type == 0:
+            self.attributes['prim'][h2a.vertex_count_attribute_name] = \
+                (1, h2a.get_curve_point_counts(geo).tostring())
+            if 'width' not in self.attributes['point'] \
+               and 'width' not in self.attributes['vertex']:
+                self.attributes['vertex']['width'] = \
+                    (1, h2a.get_curve_vertex_widths(geo))
+        elif export_type == 1:
+            counts, ids = h2a.get_polygon_indices(geo)
+            self.attributes['prim'][h2a.vertex_count_attribute_name] = \
+                (1, counts.tostring())
+            self.attributes['vertex'][h2a.vertex_point_attribute_name] = \
+                (1, ids.tostring())
+
+    def intrinsicValueDict(self):
+        return dict(self.intrinsic_values)
+
+    def intrinsicValue(self, name):
+        return self.intrinsic_values[name]
+
+    def attribValue(self, name):
+        return self.detail_values[name]
+
+    def _find_attrib(self, attribute_class, name):
+        attribute = self.attributes[attribute_class].get(name)
+        if attribute is not None:
+            return SnapshotAttrib(name, attribute[0])
+
+    def _values(self, attribute_class, name):
+        try:
+            return self.attributes[attribute_class][name][1]
+        except KeyError:
+            raise h2a.hou.OperationFailed('Invalid attribute name: %s' % name)
+
+    def findPointAttrib(self, name):
+        return self._find_attrib('point', name)
+
+    def findPrimAttrib(self, name):
+        return self._find_attrib('prim', name)
+
+    def findVertexAttrib(self, name):
+        return self._find_attrib('vertex', name)
+
+    def pointFloatAttribValuesAsString(self, name):
+        return self._values('point', name)
+
+    def primFloatAttribValuesAsString(self, name):
+        return self._values('prim', name)
+
+    def vertexFloatAttribValuesAsString(self, name):
+        return self._values('vertex', name)
+
+    def primIntAttribValuesAsString(self, name):
+        return self._values('prim', name)
+
+    def vertexIntAttribValuesAsString(self, name):
+        return self._values('vertex', name)
+
+
+class FrozenNode(object):
+    """Holds the geometry of a node for a frame, so it can be exported while
+    the scene is moving to the next frame.
+
+    :param str path: The node path
+    :param geometry: A :class:`.GeometrySnapshot` instance
+    """
+
+    def __init__(self, path, geometry):
+        self._path = path
+        self._geometry = geometry
+
+    def path(self):
+        return self._path
+
+    def geometry(self):
+        return self._geometry
+
+
+def houdini_geometry_provider(node_path, export_type=1):
+    """Returns a geometry provider which cooks the node with the given path in
+    the given frame and returns a snapshot of its geometry.
+
+    :param str node_path: The path of a SOP node
+    :param int export_type: The export type, 0: curves, 1: polygons, 2:
+      particles
+    :return: function
+    """
+    def provider(frame):
+        hou.setFrame(frame)
+        node = hou.node(node_path)
+        return FrozenNode(
+            node.path(), GeometrySnapshot(node.geometry(), export_type)
+        )
+    return provider
+
+
+def get_frame_path(path_template, frame):
+    """Returns the path of the given frame, the "#" characters in the template
+    are replaced with the zero padded frame number.
+
+    :param str path_template: A path like "/path/name.####.ass.gz"
+    :param int frame: The frame number
+    :return: str
+    """
+    return re.sub(
+        '#+',
+        lambda match: '%0*d' % (len(match.group()), frame),
+        path_template
+    )
+
+
+class BatchExporter(object):
+    """Exports a frame range to .ass files by using a pool of worker threads.
+
+    :param geometry_provider: A callable that takes the frame number and
+      returns an object with ``geometry()`` and ``path()`` methods. It is
+      called in the calling thread, but the returned geometry is exported in
+      the worker threads, so it should not use HOM (see
+      :func:`.houdini_geometry_provider`).
+    :param str path_template: The output path, the "#" characters are
+      replaced with the frame number (ex. "/path/name.####.ass.gz").
+    :param str name: The name of the exported node
+    :param int workers: The number of frames exported at the same time,
+      defaults to the CPU count.
+    :param kwargs: The export options passed to :func:`.h2a.node2ass`
+      (min_pixel_width, mode, export_type, export_motion, export_color,
+      render_type, double_sided, invert_normals, compression_level etc.)
+    """
+
+    def __init__(self, geometry_provider, path_template, name, workers=None,
+                 **kwargs):
+        if workers is None:
+            try:
+                workers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                workers = 1
+
+        self.geometry_provider = geometry_provider
+        self.path_template = path_template
+        self.name = name
+        self.workers = max(1, workers)
+
+        self.export_options = {
+            'min_pixel_width': 0.5,
+            'mode': 'ribbon',
+            'export_type': 1,
+            'export_motion': False,
+            'export_color': False,
+            'render_type': 0,
+        }
+        self.export_options.update(kwargs)
+
+        # frame -> stage durations
+        self.timings = {}
+        self.duration = 0
+
+    def export_frame(self, frame, node):
+        """Exports the given node for the given frame
+
+        :param int frame: The frame number
+        :param node: The node returned by the geometry provider
+        :return: dict The stage durations
+        """
+        return h2a.node2ass(
+            node, get_frame_path(self.path_template, frame), self.name,
+            **self.export_options
+        )
+
+    def export(self, start_frame, end_frame, step=1):
+        """Exports the given frame range, the end frame is included.
+
+        :param int start_frame: The first frame
+        :param int end_frame: The last frame
+        :param int step: The frame step
+        :return: list The paths of the exported files
+        """
+        start_time = time.time()
+        frames = range(start_frame, end_frame + 1, step)
+        self.timings = {}
+
+        pool = None
+        if self.workers > 1:
+            pool = ThreadPool(self.workers)
+
+        pending = deque()
+        try:
+            for frame in frames:
+                fetch_start = time.time()
+                node = self.geometry_provider(frame)
+                fetch_end = time.time()
+                self.timings[frame] = {'fetch': fetch_end - fetch_start}
+
+                if pool is None:
+                    self.timings[frame].update(self.export_frame(frame, node))
+                    continue
+
+                pending.append(
+                    (frame, pool.apply_async(self.export_frame, (frame, node)))
+                )
+                # do not fetch more frames than the workers can handle
+                while len(pending) > self.workers:
+                    frame, result = pending.popleft()
+                    self.timings[frame].update(result.get())
+
+            while pending:
+                frame, result = pending.popleft()
+                self.timings[frame].update(result.get())
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.duration = time.time() - start_time
+        return [get_frame_path(self.path_template, frame) for frame in frames]
+
+    def stage_totals(self):
+        """Returns the total duration of every stage for all the frames
+
+        :return: dict
+        """
+        totals = dict((stage, 0.0) for stage in STAGES)
+        for timings in self.timings.values():
+            for stage in STAGES:
+                totals[stage] += timings.get(stage, 0)
+        return totals
+
+    def report(self):
+        """Returns the per stage timings as a printable string
+
+        :return: str
+        """
+        totals = self.stage_totals()
+        frame_count = len(self.timings) or 1
+        lines = [
+            'Frames                       : %s' % len(self.timings),
+            'Workers                      : %s' % self.workers,
+        ]
+        for stage in STAGES:
+            lines.append(
+                '%s: %3.3f sec (%3.3f sec per frame)' % (
+                    ('Total %s' % stage).ljust(29), totals[stage],
+                    totals[stage] / frame_count
+                )
+            )
+        lines.append(
+            'Wall clock                   : %3.3f sec' % self.duration
+        )
+        return '\n'.join(lines)
@@ -5,12 +5,13 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
 import os
+import sys
 import gzip
-import struct
+import array
 import time
 
 
-from anima.render.arnold import base85
+from anima.render.arnold import base85, asstoc, pgzip
 reload(base85)
 
 try:
@@ -18,9 +19,52 @@ try:
 except ImportError:
     hou = None
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from cStringIO import StringIO
 
 
+# encode the big sections in multiple processes with the shared base85 encoder
+# pool, the data is given to the pool in big chunks to keep all the workers
+# busy. It is disabled by default, because the workers are spawned with the
+# host application executable on Windows, set
+# base85.encoder_pool_executable to a Python interpreter before enabling it
+use_encoder_pool = False
+encoder_pool_chunk_size = 32 << 20
+
+# integer primitive and vertex attributes holding the vertex count of each
+# primitive and the point number of each vertex, if the geometry has them the
+# polygon indices are read in bulk instead of iterating over every vertex
+vertex_count_attribute_name = 'vertex_count'
+vertex_point_attribute_name = 'vertex_point'
+
+# compress the .ass.gz files in parallel as multi-member gzip files, the
+# compression level can be overridden with the ``compression_level`` keyword
+# argument of geometry2ass
+use_parallel_gzip = True
+gzip_compression_level = 9
+
+
+def b85_writer(ass_file, line_width=500):
+    """Returns a :class:`.B85Writer` that writes to the given file.
+
+    :param ass_file: A file like object
+    :param int line_width: The number of characters per line
+    :return: :class:`.B85Writer`
+    """
+    if use_encoder_pool:
+        return base85.B85Writer(
+            ass_file,
+            encode=base85.arnold_b85_encode_multithreaded,
+            line_width=line_width,
+            chunk_size=encoder_pool_chunk_size
+        )
+    return base85.B85Writer(ass_file, line_width=line_width)
+
+
 class Buffer(object):
     """Buffer class for efficient string concatenation.
 
@@ -62,31 +106,156 @@ class Buffer(object):
         return self.file_str.getvalue()
 
 
+class TimedFile(object):
+    """A file wrapper which measures the time spent in writing (and
+    compressing) the data.
+
+    :param file_handler: A file like object
+    """
+
+    def __init__(self, file_handler):
+        self.file_handler = file_handler
+        self.duration = 0
+
+    def write(self, data):
+        start = time.time()
+        self.file_handler.write(data)
+        self.duration += time.time() - start
+
+    def writelines(self, iterable):
+        for data in iterable:
+            self.write(data)
+
+    def tell(self):
+        return self.file_handler.tell()
+
+    def close(self):
+        start = time.time()
+        self.file_handler.close()
+        self.duration += time.time() - start
+
+
+class TimedGeometry(object):
+    """A ``hou.Geometry`` wrapper which measures the time spent in reading the
+    geometry, so it is not reported as encoding time.
+
+    :param geometry: A ``hou.Geometry`` instance
+    :param list timer: A list holding the duration, the geometries created by
+      :meth:`.call` share the timer of their parent
+    """
+
+    def __init__(self, geometry, timer=None):
+        self.wrapped_geometry = geometry
+        if timer is None:
+            timer = [0]
+        self.timer = timer
+
+    @property
+    def duration(self):
+        """the time spent in reading the geometry in seconds
+        """
+        return self.timer[0]
+
+    def call(self, function, *args):
+        """Calls the given function with the wrapped geometry and the given
+        arguments and measures the duration. The returned geometry is also
+        wrapped.
+
+        :param function: A function that takes a ``hou.Geometry`` as the
+          first argument
+        """
+        start = time.time()
+        result = function(self.wrapped_geometry, *args)
+        self.timer[0] += time.time() - start
+        if result is not None:
+            result = TimedGeometry(result, timer=self.timer)
+        return result
+
+    def __getattr__(self, name):
+        attribute = getattr(self.wrapped_geometry, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed_call(*args, **kwargs):
+            start = time.time()
+            result = attribute(*args, **kwargs)
+            if name in ('iterPrims', 'prims'):
+                # the primitives are read while iterating
+                result = list(result)
+            self.timer[0] += time.time() - start
+            return result
+        return timed_call
+
+
+class TimedNode(object):
+    """A node wrapper which returns the geometry of the node wrapped in a
+    :class:`.TimedGeometry`.
+
+    :param node: A ``hou.SopNode`` or any object that has the ``geometry()``
+      and ``path()`` methods
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self._geometry = None
+
+    def path(self):
+        return self.node.path()
+
+    def geometry(self):
+        if self._geometry is None:
+            self._geometry = TimedGeometry(self.node.geometry())
+        return self._geometry
+
+
 def geometry2ass(
         path, name, min_pixel_width, mode, export_type, export_motion,
         export_color, render_type, double_sided=True, invert_normals=False, **kwargs
 ):
     """exports geometry to ass format
+
+    Also writes an .asstoc file next to the .ass file, which holds the bounds
+    of the geometry and the byte offset and length of the exported node in the
+    uncompressed data (see :mod:`anima.render.arnold.asstoc`).
+    """
+    return node2ass(
+        hou.pwd(), path, name, min_pixel_width, mode, export_type,
+        export_motion, export_color, render_type, double_sided,
+        invert_normals, **kwargs
+    )
+
+
+def node2ass(
+        node, path, name, min_pixel_width, mode, export_type, export_motion,
+        export_color, render_type, double_sided=True, invert_normals=False,
+        **kwargs
+):
+    """exports the geometry of the given node to ass format, see
+    :func:`.geometry2ass` for details.
+
+    :param node: A ``hou.SopNode`` or any object that has the ``geometry()``
+      and ``path()`` methods
+    :returns: dict The durations of the "read" (reading the geometry),
+      "encode", "write" (including the compression) and "asstoc" stages and
+      the "total" duration in seconds
     """
     ass_path = path
     start_time = time.time()
 
-    parts = os.path.splitext(ass_path)
-    extension = parts[1]
-    use_gzip = False
-    if extension == '.gz':
-        use_gzip = True
-        basename = os.path.splitext(parts[0])[0]
-    else:
-        basename = parts[0]
+    extension = os.path.splitext(ass_path)[1]
+    use_gzip = extension == '.gz'
 
-    asstoc_path = '%s.asstoc' % basename
+    asstoc_path = asstoc.get_asstoc_path(ass_path)
 
-    node = hou.pwd()
+    compression_level = \
+        kwargs.get('compression_level', gzip_compression_level)
 
     file_handler = open
     if use_gzip:
-        file_handler = gzip.open
+        if use_parallel_gzip:
+            file_handler = pgzip.open_file
+        else:
+            file_handler = gzip.open
 
     # normalize path
     ass_path = os.path.normpath(ass_path)
@@ -95,53 +264,117 @@ def geometry2ass(
     except OSError:  # path exists
         pass
 
-    data = ''
-    if export_type == 0:
-        data = curves2ass(node, name, min_pixel_width, mode, export_motion)
-    elif export_type == 1:
-        data = polygon2ass(
-            node,
-            name,
-            export_motion,
-            export_color,
-            double_sided,
-            invert_normals,
-        )
-    elif export_type == 2:
-        data = particle2ass(node, name, export_motion, export_color, render_type)
+    node_types = {
+        0: 'curves',
+        1: 'polymesh',
+        2: 'points',
+    }
+
+    node = TimedNode(node)
 
     write_start = time.time()
-    ass_file = file_handler(ass_path, 'w')
-    ass_file.write(data)
-    ass_file.close()
+    if use_gzip:
+        ass_file = file_handler(ass_path, 'w', compression_level)
+    else:
+        ass_file = file_handler(ass_path, 'w')
+    ass_file = TimedFile(ass_file)
+    try:
+        # the offsets are in uncompressed bytes for gzip files too
+        node_offset = ass_file.tell()
+        if export_type == 0:
+            curves2ass(
+                node, name, min_pixel_width, mode, export_motion,
+                ass_file=ass_file
+            )
+        elif export_type == 1:
+            polygon2ass(
+                node,
+                name,
+                export_motion,
+                export_color,
+                double_sided,
+                invert_normals,
+                export_uvs=kwargs.get('export_uvs', True),
+                export_normals=kwargs.get('export_normals', True),
+                ass_file=ass_file
+            )
+        elif export_type == 2:
+            particle2ass(
+                node, name, export_motion, export_color, render_type,
+                ass_file=ass_file
+            )
+        node_length = ass_file.tell() - node_offset
+    finally:
+        ass_file.close()
     write_end = time.time()
+    read_duration = node.geometry().duration
 
-    print('Writing to file              : %3.3f' % (write_end - write_start))
+    print('Encoding and writing to file : %3.3f' % (write_end - write_start))
 
-    bounding_min = node.geometry().attribValue("bound_min")
-    bounding_max = node.geometry().attribValue("bound_max")
+    asstoc_start = time.time()
+    # the name that is written in to the .ass file
+    node_name = name
+    if export_type == 0:
+        node_name = get_curves_node_name(node)
 
-    bounding_box_info = 'bounds %s %s %s %s %s %s' % (
-        bounding_min[0], bounding_min[1], bounding_min[2],
-        bounding_max[0], bounding_max[1], bounding_max[2]
-    )
+    geo = node.geometry()
+    bounding_min = geo.attribValue("bound_min")
+    bounding_max = geo.attribValue("bound_max")
+    bounds = tuple(bounding_min[:3]) + tuple(bounding_max[:3])
 
-    with open(asstoc_path, 'w') as asstoc_file:
-        asstoc_file.write(bounding_box_info)
+    intrinsic_values = geo.intrinsicValueDict()
+    toc = asstoc.AssToc(bounds=bounds)
+    toc.nodes.append(
+        asstoc.AssTocNode(
+            name=node_name,
+            type=node_types.get(export_type, 'unknown'),
+            point_count=intrinsic_values['pointcount'],
+            primitive_count=intrinsic_values['primitivecount'],
+            bounds=bounds,
+            offset=node_offset,
+            length=node_length
+        )
+    )
+    toc.write(asstoc_path)
+    asstoc_end = time.time()
 
     end_time = time.time()
     print('All Conversion took          : %3.3f sec' % (end_time - start_time))
     print('******************************************************************')
 
+    return {
+        'read': read_duration,
+        'encode':
+            write_end - write_start - ass_file.duration - read_duration,
+        'write': ass_file.duration,
+        'asstoc': asstoc_end - asstoc_start,
+        'total': end_time - start_time,
+    }
+
 
 def polygon2ass(
         node, name, export_motion=False, export_color=False, double_sided=True,
-        invert_normals=False
+        invert_normals=False, export_uvs=True, export_normals=True,
+        ass_file=None
 ):
     """exports polygon geometry to ass format
+
+    The sections are encoded and written directly to the given ``ass_file``,
+    so the encoded data never lives in memory as a whole.
+
+    :param bool export_uvs: Exports the "uv" attribute as ``uvlist`` and
+      ``uvidxs`` if the geometry has it.
+    :param bool export_normals: Exports the "N" attribute as ``nlist`` and
+      ``nidxs`` if the geometry has it.
+    :param ass_file: A file like object to write the data to. If skipped the
+      data is returned as a string.
     """
     sample_count = 2 if export_motion else 1
 
+    return_data = ass_file is None
+    if return_data:
+        ass_file = StringIO()
+
     # visibility flags
     # a binary value of
     # 00000000
@@ -156,17 +389,17 @@ def polygon2ass(
     # +--------> (unknown)
 
     geo = node.geometry()
-    base_template = """
+    header_template = """
 polymesh
 {
  name %(name)s
- nsides %(primitive_count)i 1 UINT
-%(number_of_points_per_primitive)s
- vidxs %(vertex_count)s 1 UINT
-%(vertex_ids)s
- vlist %(point_count)s %(sample_count)s b85POINT
-%(point_positions)s
- smoothing on
+ nsides %(primitive_count)i 1 b85UINT
+"""
+    vertex_ids_template = """ vidxs %(vertex_count)s 1 b85UINT
+"""
+    point_positions_template = """ vlist %(point_count)s %(sample_count)s b85POINT
+"""
+    footer_template = """ smoothing on
  visibility 255
  sidedness %(sidedness)s
  invert_normals %(invert_normals)s
@@ -176,15 +409,16 @@ polymesh
  matrix
 %(matrix)s
  id 683108022
-%(color_template)s
-}"""
-    #  uvidxs %(vertex_count)s 1 UINT
-    #%(uv_ids)s
-    # uvlist %(vertex_count)s 1 b85POINT2
-    #%(vertex_uvs)s
+"""
+    uvs_template = """ uvlist %(uv_count)s 1 b85POINT2
+"""
+    uv_ids_template = """ uvidxs %(vertex_count)s 1 b85UINT
+"""
+    normals_template = """ nlist %(normal_count)s %(sample_count)s b85VECTOR
+"""
+    normal_ids_template = """ nidxs %(vertex_count)s 1 b85UINT
+"""
 
-    skip_normals = False
-    skip_uvs = False
     skip_colors = False
 
     intrinsic_values = geo.intrinsicValueDict()
@@ -193,207 +427,93 @@ polymesh
     point_count = intrinsic_values['pointcount']
     vertex_count = intrinsic_values['vertexcount']
 
-    number_of_points_per_primitive = []
-    vertex_ids = []
-    # vertex_normals = []
-    # vertex_uvs = []
-    # uv_ids = []
-    # combined_uv_ids = []
-    ## uv_ids = split_data(' '.join(map(str, range(vertex_count))), 500)
-    # j = 0
-    # for i in range(vertex_count):
-    #     uv_ids.append(str(i))
-    #     j += 1
-    #     if j > 500:
-    #         j = 0
-    #         combined_uv_ids.append(' '.join(uv_ids))
-    #         uv_ids = []
-    vertex_colors = []
-
-    ## join for a last time
-    # if uv_ids:
-    #     combined_uv_ids.append(' '.join(uv_ids))
-    #
-    # uv_ids = combined_uv_ids
-
-    # just for the first vertex try to read the uv to determine if we should
-    # skip the uvs or not
-    # skip_uvs = True
-
-    i = 0
-    j = 0
-    combined_vertex_ids = []
-    # combined_vertex_normals = []
-    combined_number_of_points_per_primitive = []
-
-    for prim in geo.iterPrims():
-        number_of_points_per_primitive.append(`prim.numVertices()`)
-        i += 1
-        if i > 500:
-            i = 0
-            combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-            number_of_points_per_primitive = []
-        for vertex in prim.vertices():
-            point = vertex.point()
-            point_id = point.number()
-            vertex_ids.append(`point_id`)
-            # vertex_normals.extend(point.floatListAttribValue('N'))
-            # vertex_uv = vertex.floatListAttribValue('uv')
-            # vertex_uvs.append(vertex_uv[0])
-            # vertex_uvs.append(vertex_uv[1])
-            j += 1
-            if j > 500:
-                j = 0
-                combined_vertex_ids.append(' '.join(vertex_ids))
-                vertex_ids = []
-                # combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-                # vertex_normals = []
-                vertex_colors = []
-
-    # join for a last time
-    if number_of_points_per_primitive:
-        combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-
-    if vertex_ids:
-        combined_vertex_ids.append(' '.join(vertex_ids))
-
-    # if vertex_normals:
-    #     combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-
-    ## encode uvs
-    # encoded_vertex_uvs = '%s' % base85.arnold_b85_encode(
-    #     struct.pack(
-    #         '<%sd' % len(vertex_uvs),
-    #         *vertex_uvs
-    #     )
-    # )
-    # splitted_vertex_uvs = split_data(encoded_vertex_uvs, 500)
-
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
+    template_vars = {
+        'name': name,
+        'point_count': point_count,
+        'vertex_count': vertex_count,
+        'primitive_count': primitive_count,
+        'sample_count': sample_count,
+    }
 
-    try:
-        point_colors = geo.pointFloatAttribValuesAsString('color')
-    except hou.OperationFailed:
-       # no color attribute skip it
-        skip_colors = True
-        point_colors = ''
-
-    # try:
-    #    point_normals = geo.pointFloatAttribValuesAsString('N')
-    #    # point_normals = geo.pointFloatAttribValues('N')
-    # except hou.OperationFailed:
-    #    # no normal attribute skip it
-    #    skip_normals = True
-    #    point_normals = ''
+    getting_indices_start = time.time()
+    number_of_points_per_primitive, vertex_ids = get_polygon_indices(geo)
+    getting_indices_end = time.time()
+    print('Getting Indices            : %3.3f' %
+          (getting_indices_end - getting_indices_start))
 
     #
     # Number Of Points Per Primitive
     #
     encode_start = time.time()
-    #encoded_number_of_points_per_primitive = 'B%s' % base85.arnold_b85_encode(
-    #    struct.pack(
-    #        '>%sB' % len(number_of_points_per_primitive),
-    #        *number_of_points_per_primitive
-    #    )
-    #)
-    encoded_number_of_points_per_primitive = '\n'.join(combined_number_of_points_per_primitive)
+    ass_file.write(header_template % template_vars)
+    write_uint_array(ass_file, number_of_points_per_primitive)
+    del number_of_points_per_primitive
     encode_end = time.time()
     print('Encoding Number of Points  : %3.3f' % (encode_end - encode_start))
 
-    split_start = time.time()
-    #splitted_number_of_points_per_primitive = \
-    #    re.sub(
-    #        "(.{500})", "\\1\n",
-    #        #' '.join(number_of_points_per_primitive),
-    #        encoded_number_of_points_per_primitive,
-    #        0
-    #    )
-    #splitted_number_of_points_per_primitive = ' '.join(encoded_number_of_points_per_primitive)
-    splitted_number_of_points_per_primitive = encoded_number_of_points_per_primitive
-    split_end = time.time()
-    print('Splitting Number of Points : %3.3f' % (split_end - split_start))
-
     #
-    # Point Positions
+    # Vertex Ids
     #
     encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
+    ass_file.write(vertex_ids_template % template_vars)
+    write_uint_array(ass_file, vertex_ids)
     encode_end = time.time()
-    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
+    print('Encoding Vertex Ids        : %3.3f' % (encode_end - encode_start))
 
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Normals
-    # #
-    # encode_start = time.time()
-    # encoded_vertex_normals = '\n'.join(combined_vertex_normals)#base85.arnold_b85_encode(point_normals)
-    # encode_end = time.time()
-    # print('Encoding Point Normals     : %3.3f' % (encode_end - encode_start))
     #
-    # split_start = time.time()
-    # # splitted_vertex_normals = re.sub("(.{500})", "\\1\n", encoded_point_normals, 0)
-    # splitted_vertex_normals = encoded_vertex_normals
-    # # # split every n-th data
-    # # n = 100
-    # # splitted_point_normals = []
-    # # for i in range(len(point_normals) / n):
-    # #     start_index = n * i
-    # #     end_index = n * (i+1)
-    # #     splitted_point_normals.extend(point_normals[start_index:end_index])
-    # #     splitted_point_normals.append('\n')
-    # #
-    # # splitted_point_normals = ' '.join(map(str, splitted_point_normals))
-    # split_end = time.time()
-    # print('Splitting Vertex Normals    : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Colors
-    # #
+    # Vertex UVs
+    #
+    if export_uvs:
+        encode_start = time.time()
+        uvs, uv_ids = get_indexed_vertex_attribute(geo, 'uv', 2, vertex_ids)
+        if uvs is not None:
+            template_vars['uv_count'] = len(uvs) / 8
+            ass_file.write(uvs_template % template_vars)
+            writer = b85_writer(ass_file, line_width=500)
+            writer.write(uvs)
+            writer.close()
+            ass_file.write(uv_ids_template % template_vars)
+            write_uint_array(ass_file, uv_ids)
+        del uvs, uv_ids
+        encode_end = time.time()
+        print('Encoding Vertex UVs        : %3.3f' % (encode_end - encode_start))
 
-    encode_start = time.time()
-    encoded_point_colors = base85.arnold_b85_encode(point_colors)
-    encode_end = time.time()
-    print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
+    #
+    # Vertex Normals
+    #
+    if export_normals:
+        encode_start = time.time()
+        normals, normal_ids = \
+            get_indexed_vertex_attribute(geo, 'N', 3, vertex_ids)
+        if normals is not None:
+            template_vars['normal_count'] = len(normals) / 12
+            ass_file.write(normals_template % template_vars)
+            writer = b85_writer(ass_file, line_width=500)
+            # the normals are not deforming, repeat them for every key
+            for i in range(sample_count):
+                writer.write(normals)
+            writer.close()
+            ass_file.write(normal_ids_template % template_vars)
+            write_uint_array(ass_file, normal_ids)
+        del normals, normal_ids
+        encode_end = time.time()
+        print('Encoding Vertex Normals    : %3.3f' % (encode_end - encode_start))
+
+    del vertex_ids
 
-    split_start = time.time()
-    splitted_point_colors = split_data(encoded_point_colors, 100)
-    split_end = time.time()
-    print('Splitting Vertex Colors    : %3.3f' % (split_end - split_start))
+    ass_file.write(point_positions_template % template_vars)
 
     #
-    # Vertex Ids
+    # Point Positions
     #
     encode_start = time.time()
-    #encoded_vertex_ids = 'B%s' % base85.arnold_b85_encode(
-    #    struct.pack(
-    #        '>%sB' % len(vertex_ids),
-    #        *vertex_ids
-    #    )
-    #)
-    encoded_vertex_ids = '\n'.join(combined_vertex_ids)
+    writer = b85_writer(ass_file, line_width=500)
+    writer.write(geo.pointFloatAttribValuesAsString('P'))
+    if export_motion:
+        writer.write(geo.pointFloatAttribValuesAsString('pprime'))
+    writer.close()
     encode_end = time.time()
-    print('Encoding Vertex Ids        : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    #splitted_vertex_ids = re.sub(
-    #    "(.{500})", "\\1\n",
-    #    #' '.join(vertex_ids),
-    #    encoded_vertex_ids,
-    #    0
-    #)
-    #splitted_vertex_ids = ' '.join(encoded_vertex_ids)
-    splitted_vertex_ids = encoded_vertex_ids
-    split_end = time.time()
-    print('Splitting Vertex Ids       : %3.3f' % (split_end - split_start))
+    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
 
     matrix = """1 0 0 0
 0 1 0 0
@@ -403,56 +523,310 @@ polymesh
     if export_motion:
         matrix += matrix
 
-    color_template = ''
+    ass_file.write(
+        footer_template % {
+            'matrix': matrix,
+            'sidedness': 255 if double_sided else 0,
+            'invert_normals': 'on' if invert_normals else 'off',
+        }
+    )
+
+    #
+    # Vertex Colors
+    #
     if export_color:
-        color_template = """
+        try:
+            point_colors = geo.pointFloatAttribValuesAsString('color')
+        except hou.OperationFailed:
+            # no color attribute skip it
+            skip_colors = True
+            point_colors = ''
+
+        ass_file.write("""
             declare colorSet1 varying RGBA
             colorSet1 %(point_count)s 1 b85RGBA
-            %(splitted_point_colors)s
-        """
+            """ % {'point_count': point_count})
 
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors':splitted_point_colors
-        }
+        encode_start = time.time()
+        writer = b85_writer(ass_file, line_width=100)
+        writer.write(point_colors)
+        writer.close()
+        encode_end = time.time()
+        print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
+        del point_colors
 
-    data = base_template % {
-        'name': name,
-        'point_count': point_count,
-        'vertex_count': vertex_count,
-        'primitive_count': primitive_count,
-        'sample_count': sample_count,
-        'number_of_points_per_primitive': splitted_number_of_points_per_primitive,
-        'vertex_ids': splitted_vertex_ids,
-        'point_positions': splitted_point_positions,
-        'matrix': matrix,
-        'color_template': color_template,
-        'sidedness': 255 if double_sided else 0,
-        'invert_normals': 'on' if invert_normals else 'off',
-        # 'uv_ids': uv_ids,
-        # 'vertex_uvs': splitted_vertex_uvs,
-        # 'normal_count': vertex_count,
-        # 'vertex_normals': splitted_vertex_normals,
-    }
+        ass_file.write('        ')
+
+    ass_file.write('\n}')
+
+    if return_data:
+        return ass_file.getvalue()
+
+
+# the VEX snippets and the attribute classes of the attribwrangle verbs that
+# compute the polygon index attributes
+polygon_index_wrangles = [
+    (1, 'i@%s = primvertexcount(0, @primnum);' % vertex_count_attribute_name),
+    (3, 'i@%s = @ptnum;' % vertex_point_attribute_name),
+]
+
+
+def read_polygon_indices(geo, intrinsic_values):
+    """Reads the polygon indices in bulk from the integer primitive and vertex
+    attributes with the names given in :data:`vertex_count_attribute_name` and
+    :data:`vertex_point_attribute_name`.
+
+    The attributes are validated against the primitive, vertex and point
+    counts of the geometry, so stale attributes (ex. the topology has changed
+    after they are created) are not used.
+
+    :param geo: A ``hou.Geometry`` instance
+    :param dict intrinsic_values: The intrinsic values of the geometry
+    :returns: (array.array, array.array) or None if the geometry has no valid
+      index attributes
+    """
+    if geo.findPrimAttrib(vertex_count_attribute_name) is None \
+       or geo.findVertexAttrib(vertex_point_attribute_name) is None:
+        return None
+
+    number_of_points_per_primitive = array.array('I')
+    number_of_points_per_primitive.fromstring(
+        geo.primIntAttribValuesAsString(vertex_count_attribute_name)
+    )
+    vertex_ids = array.array('I')
+    vertex_ids.fromstring(
+        geo.vertexIntAttribValuesAsString(vertex_point_attribute_name)
+    )
+
+    vertex_count = intrinsic_values['vertexcount']
+    if len(number_of_points_per_primitive) != \
+       intrinsic_values['primitivecount'] \
+       or len(vertex_ids) != vertex_count \
+       or sum(number_of_points_per_primitive) != vertex_count \
+       or (vertex_ids and
+           max(vertex_ids) >= intrinsic_values['pointcount']):
+        return None
+
+    return number_of_points_per_primitive, vertex_ids
+
+
+def compute_polygon_index_attributes(geo):
+    """Returns a copy of the given geometry with the polygon index attributes
+    computed by attribwrangle SOP verbs, so the values are computed in VEX
+    instead of iterating over every vertex in Python.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: ``hou.Geometry`` or None if SOP verbs are not available
+    """
+    if isinstance(geo, TimedGeometry):
+        # the verbs read the geometry
+        return geo.call(compute_polygon_index_attributes)
+
+    if hou is None:
+        return None
+
+    try:
+        verb = hou.sopNodeTypeCategory().nodeVerb('attribwrangle')
+    except (AttributeError, hou.OperationFailed):
+        # no SOP verbs in this Houdini version
+        return None
+    if verb is None:
+        return None
+
+    indexed_geo = geo
+    for attribute_class, snippet in polygon_index_wrangles:
+        verb.setParms({'class': attribute_class, 'snippet': snippet})
+        output_geo = hou.Geometry()
+        try:
+            verb.execute(output_geo, [indexed_geo])
+        except hou.OperationFailed:
+            return None
+        indexed_geo = output_geo
+
+    return indexed_geo
+
+
+def get_polygon_indices(geo):
+    """Returns the number of vertices of each primitive and the point number of
+    each vertex of the given geometry.
+
+    The values are read in bulk from the integer primitive and vertex
+    attributes with the names given in :data:`vertex_count_attribute_name` and
+    :data:`vertex_point_attribute_name` if the geometry has valid ones, which
+    can be created in a wrangle with::
+
+      i@vertex_count = primvertexcount(0, @primnum);  // primitive wrangle
+      i@vertex_point = @ptnum;  // vertex wrangle
+
+    otherwise the attributes are computed on a copy of the geometry with the
+    same wrangles as SOP verbs. Only if SOP verbs are not available the
+    primitives are iterated and the values are collected in to typed arrays.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: (array.array, array.array)
+    """
+    intrinsic_values = geo.intrinsicValueDict()
+
+    indices = read_polygon_indices(geo, intrinsic_values)
+    if indices is None:
+        indexed_geo = compute_polygon_index_attributes(geo)
+        if indexed_geo is not None:
+            indices = read_polygon_indices(indexed_geo, intrinsic_values)
+            del indexed_geo
+    if indices is not None:
+        return indices
+
+    number_of_points_per_primitive = array.array('I')
+    counts_append = number_of_points_per_primitive.append
+    vertex_ids = array.array('I')
+    ids_extend = vertex_ids.extend
+    for prim in geo.iterPrims():
+        counts_append(prim.numVertices())
+        ids_extend([vertex.point().number() for vertex in prim.vertices()])
+
+    return number_of_points_per_primitive, vertex_ids
 
-    return data
 
+def get_indexed_vertex_attribute(geo, name, size, vertex_ids):
+    """Returns the unique values of the given float attribute and the index
+    of the value of each vertex in to them.
 
-def particle2ass(node, name, export_motion=False, export_color=False, render_type=0):
+    The attribute can either be a vertex or a point attribute, the values of
+    a point attribute are indexed through the given ``vertex_ids``. Only the
+    first ``size`` components of each value are used (ex. the "uv" attribute
+    has 3 components but only 2 of them are exported).
+
+    :param geo: A ``hou.Geometry`` instance
+    :param str name: The attribute name
+    :param int size: The number of components to export
+    :param vertex_ids: The point number of each vertex, as returned by
+      :func:`.get_polygon_indices`
+    :returns: (str, array.array) The packed unique float values and the index
+      of each vertex. (None, None) if the geometry has no such attribute.
+    """
+    attribute = geo.findVertexAttrib(name)
+    if attribute is not None:
+        data = geo.vertexFloatAttribValuesAsString(name)
+        return index_values(data, attribute.size(), size)
+
+    attribute = geo.findPointAttrib(name)
+    if attribute is not None:
+        data = geo.pointFloatAttribValuesAsString(name)
+        values, point_value_ids = index_values(data, attribute.size(), size)
+        if numpy is not None:
+            value_ids = numpy.frombuffer(point_value_ids, dtype=numpy.uint32)
+            value_ids = value_ids.take(
+                numpy.frombuffer(vertex_ids, dtype=numpy.uint32)
+            )
+            indices = array.array('I')
+            indices.fromstring(value_ids.tostring())
+        else:
+            indices = array.array(
+                'I', [point_value_ids[i] for i in vertex_ids]
+            )
+        return values, indices
+
+    return None, None
+
+
+def index_values(data, stride, size):
+    """Deduplicates the values in the given packed float data.
+
+    Identical values are stored only once, which keeps the ``uvlist`` and
+    ``nlist`` arrays of the meshes small as most of the vertices are sharing
+    their values with their neighbours.
+
+    :param str data: Packed 32-bit float values
+    :param int stride: The number of components per value in the data
+    :param int size: The number of leading components to use from each value
+    :returns: (str, array.array) The packed unique values in the order they
+      first appear and the index of each value in to them.
+    """
+    item_size = 4  # float
+    value_count = len(data) / (stride * item_size)
+
+    if numpy is not None and value_count:
+        values = numpy.frombuffer(data, dtype=numpy.float32)
+        values = numpy.ascontiguousarray(
+            values.reshape(value_count, stride)[:, :size]
+        )
+        # compare the values by their bytes
+        keys = values.view(
+            numpy.dtype((numpy.void, size * item_size))
+        ).ravel()
+        unused, first_ids, inverse = numpy.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        # keep the values in the order they first appear
+        order = numpy.argsort(first_ids)
+        rank = numpy.empty(len(order), dtype=numpy.uint32)
+        rank[order] = numpy.arange(len(order), dtype=numpy.uint32)
+        indices = array.array('I')
+        indices.fromstring(rank.take(inverse).tostring())
+        return values[first_ids[order]].tostring(), indices
+
+    lut = {}
+    unique_values = []
+    indices = array.array('I')
+    indices_append = indices.append
+    value_stride = stride * item_size
+    value_size = size * item_size
+    for i in xrange(0, value_count * value_stride, value_stride):
+        value = data[i:i + value_size]
+        index = lut.get(value)
+        if index is None:
+            index = lut[value] = len(unique_values)
+            unique_values.append(value)
+        indices_append(index)
+
+    return ''.join(unique_values), indices
+
+
+def write_uint_array(ass_file, values, line_width=500):
+    """Writes the given unsigned integers as a Base85 encoded array.
+
+    If all the values fit in to a byte, the values are packed as bytes and the
+    data is prefixed with "B", otherwise they are packed as 32-bit integers.
+
+    :param ass_file: A file like object
+    :param values: An ``array.array('I')`` instance
+    :param int line_width: The number of characters per line
+    """
+    writer = b85_writer(ass_file, line_width=line_width)
+    if len(values) and max(values) < 256:
+        writer.write_encoded('B')
+        writer.write(array.array('B', values).tostring())
+    else:
+        if sys.byteorder == 'big':
+            values = array.array('I', values)
+            values.byteswap()
+        writer.write(values.tostring())
+    writer.close()
+
+
+def particle2ass(node, name, export_motion=False, export_color=False,
+                 render_type=0, ass_file=None):
     """exports polygon geometry to ass format
+
+    :param ass_file: A file like object to write the data to. If skipped the
+      data is returned as a string.
     """
     sample_count = 2 if export_motion else 1
 
+    return_data = ass_file is None
+    if return_data:
+        ass_file = StringIO()
+
     geo = node.geometry()
-    base_template = """
+    points_template = """
 points
 {
  name %(name)s
  points %(point_count)s %(sample_count)s b85POINT
-%(point_positions)s
- radius %(point_count)s 1 b85FLOAT
-%(point_radius)s
- mode %(render_as)s
+"""
+    radius_template = """ radius %(point_count)s 1 b85FLOAT
+"""
+    footer_template = """ mode %(render_as)s
  min_pixel_width 0
  step_size 0
  visibility 243
@@ -462,8 +836,7 @@ points
  opaque on
  matte off
  id -838484804
-%(color_template)s
-}"""
+"""
     #  uvidxs %(vertex_count)s 1 UINT
     #%(uv_ids)s
     # uvlist %(vertex_count)s 1 b85POINT2
@@ -478,33 +851,25 @@ points
 
     point_count = intrinsic_values['pointcount']
 
-    # i = 0
-    # j = 0
-    # combined_vertex_ids = []
-    # # combined_vertex_normals = []
-    # combined_number_of_points_per_primitive = []
+    ass_file.write(
+        points_template % {
+            'name': name,
+            'point_count': point_count,
+            'sample_count': sample_count,
+        }
+    )
 
     #
     # Point Positions
     #
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-        del point_prime_positions
-
     encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
+    writer = b85_writer(ass_file, line_width=500)
+    writer.write(geo.pointFloatAttribValuesAsString('P'))
+    if export_motion:
+        writer.write(geo.pointFloatAttribValuesAsString('pprime'))
+    writer.close()
     encode_end = time.time()
     print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
-    del point_positions
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-    del encoded_point_positions
 
     #
     # Point Radius
@@ -512,22 +877,20 @@ points
     try:
         point_radius = geo.pointFloatAttribValuesAsString('pscale')
     except hou.OperationFailed:
-       # no radius attribute skip it
+        # no radius attribute skip it
         skip_radius = True
         point_radius = ''
 
+    ass_file.write(radius_template % {'point_count': point_count})
+
     encode_start = time.time()
-    encoded_point_radius = base85.arnold_b85_encode(point_radius)
+    writer = b85_writer(ass_file, line_width=500)
+    writer.write(point_radius)
+    writer.close()
     encode_end = time.time()
     print('Encoding Point Radius    : %3.3f' % (encode_end - encode_start))
     del point_radius
 
-    split_start = time.time()
-    splitted_point_radius = split_data(encoded_point_radius, 500)
-    split_end = time.time()
-    print('Splitting Point Radius : %3.3f' % (split_end - split_start))
-    del encoded_point_radius
-
     render_type = render_type
     render_as = "disk"
 
@@ -536,75 +899,76 @@ points
     elif render_type == 2:
         render_as = "quad"
 
-    # #
-    # # Vertex Colors
-    # #
-    color_template = ''
+    ass_file.write(footer_template % {'render_as': render_as})
+
+    #
+    # Vertex Colors
+    #
     if export_color:
         try:
             point_colors = geo.pointFloatAttribValuesAsString('particle_color')
         except hou.OperationFailed:
-           # no color attribute skip it
+            # no color attribute skip it
             skip_colors = True
             point_colors = ''
 
+        ass_file.write("""
+            declare rgbPP uniform RGB
+            rgbPP %(point_count)s 1 b85RGB
+            """ % {'point_count': point_count})
+
         encode_start = time.time()
-        encoded_point_colors = base85.arnold_b85_encode(point_colors)
+        writer = b85_writer(ass_file, line_width=100)
+        writer.write(point_colors)
+        writer.close()
         encode_end = time.time()
         print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
         del point_colors
 
-        split_start = time.time()
-        splitted_point_colors = split_data(encoded_point_colors, 100)
-        split_end = time.time()
-        print('Splitting Point Colors : %3.3f' % (split_end - split_start))
-        del encoded_point_colors
+        ass_file.write('        ')
 
-        color_template = """
-            declare rgbPP uniform RGB
-            rgbPP %(point_count)s 1 b85RGB
-            %(splitted_point_colors)s
-        """
+    ass_file.write('\n}')
 
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors': splitted_point_colors
-        }
+    if return_data:
+        return ass_file.getvalue()
 
-    data = base_template % {
-        'name': name,
-        'point_count': point_count,
-        'sample_count': sample_count,
-        'render_as': render_as,
-        'point_radius': splitted_point_radius,
-        'point_positions': splitted_point_positions,
-        'color_template': color_template,
-    }
-    del splitted_point_radius
-    del splitted_point_positions
-    return data
+
+def get_curves_node_name(node):
+    """Returns the name of the curves node that :func:`.curves2ass` writes for
+    the given node, which is derived from the node path.
+
+    :param node: A ``hou.SopNode``
+    :return: str
+    """
+    return node.path().replace('/', '_')
 
 
 def curves2ass(node, hair_name, min_pixel_width=0.5, mode='ribbon',
-               export_motion=False):
+               export_motion=False, ass_file=None):
     """exports the node content to ass file
+
+    :param ass_file: A file like object to write the data to. If skipped the
+      data is returned as a string.
     """
     sample_count = 2 if export_motion else 1
-    template_vars = dict()
     geo = node.geometry()
 
-    base_template = """
+    return_data = ass_file is None
+    if return_data:
+        ass_file = StringIO()
+
+    points_template = """
 curves
 {
  name %(name)s
- num_points %(curve_count)i %(sample_count)s UINT
-  %(number_of_points_per_curve)s
- points %(point_count)s %(sample_count)s b85POINT
- %(point_positions)s
-
+ num_points %(curve_count)i %(sample_count)s b85UINT
+"""
+    point_positions_template = """ points %(point_count)s %(sample_count)s b85POINT
+ """
+    radius_template = """
  radius %(radius_count)s 1 b85FLOAT
- %(radius)s
- basis "catmull-rom"
+ """
+    uparamcoord_template = """ basis "catmull-rom"
  mode "%(mode)s"
  min_pixel_width %(min_pixel_width)s
  visibility 65535
@@ -615,11 +979,11 @@ curves
  opaque on
  declare uparamcoord uniform FLOAT
  uparamcoord %(curve_count)i %(sample_count)s b85FLOAT
- %(uparamcoord)s
- declare vparamcoord uniform FLOAT
+ """
+    vparamcoord_template = """ declare vparamcoord uniform FLOAT
  vparamcoord %(curve_count)i %(sample_count)s b85FLOAT
- %(vparamcoord)s
- declare curve_id uniform UINT
+ """
+    footer_template = """ declare curve_id uniform UINT
  curve_id %(curve_count)i %(sample_count)s UINT
   %(curve_ids)s
 }
@@ -635,175 +999,242 @@ curves
     # write down the radius for the tip twice
     radius_count = real_point_count
 
-    real_number_of_points_in_one_curve = real_point_count / number_of_curves
-    number_of_points_in_one_curve = real_number_of_points_in_one_curve + 2
-    number_of_points_per_curve = [`number_of_points_in_one_curve`] * number_of_curves
+    getting_point_counts_start = time.time()
+    real_number_of_points_per_curve = get_curve_point_counts(geo)
+    getting_point_counts_end = time.time()
+    print('Getting Point Counts         : %3.3f' %
+          (getting_point_counts_end - getting_point_counts_start))
+
+    number_of_points_per_curve = array.array(
+        'I', [count + 2 for count in real_number_of_points_per_curve]
+    )
 
     curve_ids = ' '.join(`id_` for id_ in xrange(number_of_curves))
 
-    radius = None
+    # extend for motion blur
+    matrix = """1 0 0 0
+  0 1 0 0
+  0 0 1 0
+  0 0 0 1
+"""
+    if export_motion:
+        number_of_points_per_curve.extend(number_of_points_per_curve)
+        matrix += matrix
+
+    template_vars = {
+        'name': get_curves_node_name(node),
+        'curve_count': number_of_curves,
+        'real_point_count': real_point_count,
+        'point_count': point_count,
+        'radius_count': radius_count,
+        'curve_ids': curve_ids,
+        'min_pixel_width': min_pixel_width,
+        'mode': mode,
+        'sample_count': sample_count,
+        'matrix': matrix
+    }
 
-    pack = struct.pack
+    ass_file.write(points_template % template_vars)
+    write_uint_array(ass_file, number_of_points_per_curve)
+    del number_of_points_per_curve
 
-    # try to find the width as a point attribute to speed things up
-    getting_radius_start = time.time()
-    radius_attribute = geo.findPointAttrib('width')
-    if radius_attribute:
-        # this one works 100 times faster then iterating over each vertex
-        radius = geo.pointFloatAttribValuesAsString('width')
-    else:
-        # no radius in points, so iterate over each vertex
-        radius_i = 0
-        radius_str_buffer = []
-        radius_file_str = StringIO()
-        radius_file_str_write = radius_file_str.write
-        radius_str_buffer_append = radius_str_buffer.append
-        for prim in geo.prims():
-            prim_vertices = prim.vertices()
-
-            # radius
-            radius_i += real_number_of_points_in_one_curve
-            if radius_i >= 1000:
-                radius_file_str_write(''.join(radius_str_buffer))
-                radius_str_buffer = []
-                radius_str_buffer_append = radius_str_buffer.append
-                radius_i = 0
-
-            for vertex in prim_vertices:
-                radius_str_buffer_append(pack('f', vertex.attribValue('width')))
-
-        # do flushes again before getting the values
-        radius_file_str_write(''.join(radius_str_buffer))
-        radius = radius_file_str.getvalue()
-    getting_radius_end = time.time()
-    print('Getting Radius Info          : %3.3f' %
-          (getting_radius_end - getting_radius_start))
+    ass_file.write(point_positions_template % template_vars)
 
     # point positions
     encode_start = time.time()
+    writer = b85_writer(ass_file, line_width=500)
 
     # for motion blur use pprime
-    getting_point_positions_start = time.time()
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-
+    attribute_names = ['P']
     if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-
-    getting_point_positions_end = time.time()
-    print('Getting Point Position       : %3.3f' %
-          (getting_point_positions_end - getting_point_positions_start))
-
-    # repeat every first and last point coordinates
-    # (3 value each 3 * 4 = 12 characters) of every curve
-    zip_start = time.time()
-    point_positions = ''.join(
-        map(
-            lambda x: '%s%s%s' % (x[:12], x, x[-12:]),
-            map(
-                ''.join,
-                zip(*[iter(point_positions)] * (real_number_of_points_in_one_curve*4*3)))
-        )
-    )
-    zip_end = time.time()
-    print('Zipping Point Position       : %3.3f' % (zip_end - zip_start))
-
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
+        attribute_names.append('pprime')
+
+    for attribute_name in attribute_names:
+        getting_point_positions_start = time.time()
+        point_positions = geo.pointFloatAttribValuesAsString(attribute_name)
+        getting_point_positions_end = time.time()
+        print('Getting Point Position       : %3.3f' %
+              (getting_point_positions_end - getting_point_positions_start))
+
+        # repeat every first and last point coordinates of every curve
+        pad_start = time.time()
+        point_positions = \
+            pad_curve_points(point_positions, real_number_of_points_per_curve)
+        pad_end = time.time()
+        print('Padding Point Position       : %3.3f' % (pad_end - pad_start))
+
+        writer.write(point_positions)
+        del point_positions
+
+    writer.close()
     encode_end = time.time()
     print('Encoding Point Position      : %3.3f' % (encode_end - encode_start))
 
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions    : %3.3f' % (split_end - split_start))
-
     # radius
+    ass_file.write(radius_template % template_vars)
+
     encode_start = time.time()
-    encoded_radius = base85.arnold_b85_encode(radius)
-    encode_end = time.time()
-    print('Radius encode                : %3.3f' % (encode_end - encode_start))
+    writer = b85_writer(ass_file, line_width=500)
 
-    split_start = time.time()
-    splitted_radius = split_data(encoded_radius, 500)
-    # extend for motion blur
-    # if export_motion:
-    #     splitted_radius = '%(data)s%(data)s' % {'data': splitted_radius}
-    split_end = time.time()
-    print('Splitting Radius             : %3.3f' % (split_end - split_start))
+    # try to find the width as a point attribute to speed things up
+    radius_attribute = geo.findPointAttrib('width')
+    if radius_attribute:
+        # this one works 100 times faster then iterating over each vertex
+        writer.write(geo.pointFloatAttribValuesAsString('width'))
+    elif geo.findVertexAttrib('width') is not None:
+        # the vertex values are in primitive order, read them in bulk
+        writer.write(geo.vertexFloatAttribValuesAsString('width'))
+    else:
+        # no radius in points, so iterate over each vertex
+        writer.write(get_curve_vertex_widths(geo))
+    writer.close()
+    encode_end = time.time()
+    print('Encoding Radius              : %3.3f' % (encode_end - encode_start))
 
     # uv
-    getting_uv_start = time.time()
-    u = geo.primFloatAttribValuesAsString('uv_u')
-    v = geo.primFloatAttribValuesAsString('uv_v')
-    getting_uv_end = time.time()
-    print('Getting uv                   : %3.3f' %
-          (getting_uv_end - getting_uv_start))
+    ass_file.write(uparamcoord_template % template_vars)
 
     encode_start = time.time()
-    encoded_u = base85.arnold_b85_encode(u)
+    u = geo.primFloatAttribValuesAsString('uv_u')
+    writer = b85_writer(ass_file, line_width=500)
+    writer.write(u)
+    if export_motion:
+        writer.write(u)
+    writer.close()
+    del u
     encode_end = time.time()
     print('Encoding UParamcoord         : %3.3f' % (encode_end - encode_start))
 
-    split_start = time.time()
-    splitted_u = split_data(encoded_u, 500)
-    if export_motion:
-        splitted_u = '%(data)s%(data)s' % {'data': splitted_u}
-    split_end = time.time()
-    print('Splitting UParamCoord        : %3.3f' % (split_end - split_start))
+    ass_file.write(vparamcoord_template % template_vars)
 
     encode_start = time.time()
-    encoded_v = base85.arnold_b85_encode(v)
+    v = geo.primFloatAttribValuesAsString('uv_v')
+    writer = b85_writer(ass_file, line_width=500)
+    writer.write(v)
+    if export_motion:
+        writer.write(v)
+    writer.close()
+    del v
     encode_end = time.time()
     print('Encoding VParamcoord         : %3.3f' % (encode_end - encode_start))
 
-    split_start = time.time()
-    splitted_v = split_data(encoded_v, 500)
-    if export_motion:
-        splitted_v = '%(data)s%(data)s' % {'data': splitted_v}
-    split_end = time.time()
-    print('Splitting VParamCoord        : %3.3f' % (split_end - split_start))
+    ass_file.write(footer_template % template_vars)
 
-    print('len(encoded_point_positions) : %s' % len(encoded_point_positions))
-    print('(p + 2 * c) * 5 * 3          : %s' % (point_count * 5 * 3))
-    print('len(encoded_radius)          : %s' % len(encoded_radius))
-    print('len(uv)                      : %s' % len(u))
-    print('len(encoded_u)               : %s' % len(encoded_u))
-    print('len(encoded_v)               : %s' % len(encoded_v))
+    del geo
 
-    # extend for motion blur
-    matrix = """1 0 0 0
-  0 1 0 0
-  0 0 1 0
-  0 0 0 1
-"""
-    if export_motion:
-        number_of_points_per_curve.extend(number_of_points_per_curve)
-        matrix += matrix
+    if return_data:
+        return ass_file.getvalue()
 
-    template_vars.update({
-        'name': node.path().replace('/', '_'),
-        'curve_count': number_of_curves,
-        'real_point_count': real_point_count,
-        'number_of_points_per_curve': ' '.join(number_of_points_per_curve),
-        'point_count': point_count,
-        'point_positions': splitted_point_positions,
-        'radius': splitted_radius,
-        'radius_count': radius_count,
-        'curve_ids': curve_ids,
-        'uparamcoord': splitted_u,
-        'vparamcoord': splitted_v,
-        'min_pixel_width': min_pixel_width,
-        'mode': mode,
-        'sample_count': sample_count,
-        'matrix': matrix
-    })
 
-    rendered_curve_data = base_template % template_vars
+def get_curve_point_counts(geo):
+    """Returns the number of points of each curve of the given geometry.
 
-    del geo
+    The values are read in bulk from the integer primitive attribute with the
+    name given in :data:`vertex_count_attribute_name` if the geometry has a
+    valid one, otherwise the primitives are iterated once.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: array.array
+    """
+    if geo.findPrimAttrib(vertex_count_attribute_name) is not None:
+        point_counts = array.array('I')
+        point_counts.fromstring(
+            geo.primIntAttribValuesAsString(vertex_count_attribute_name)
+        )
+        intrinsic_values = geo.intrinsicValueDict()
+        if len(point_counts) == intrinsic_values['primitivecount'] \
+           and sum(point_counts) == intrinsic_values['vertexcount']:
+            return point_counts
+
+    point_counts = array.array('I')
+    point_counts.extend(
+        [prim.numVertices() for prim in geo.iterPrims()]
+    )
+    return point_counts
 
-    return rendered_curve_data
+
+def get_curve_vertex_widths(geo):
+    """Returns the packed width values of all the vertices of the curves in
+    the given geometry by iterating over the vertices, for a geometry without
+    a point or vertex "width" attribute. ``hou.Vertex.attribValue()`` reads
+    the primitive or detail "width" attribute in that case.
+
+    :param geo: A ``hou.Geometry`` instance
+    :return: str
+    """
+    widths = array.array('f')
+    for prim in geo.prims():
+        widths.extend(
+            [vertex.attribValue('width') for vertex in prim.vertices()]
+        )
+    return widths.tostring()
+
+
+def pad_curve_points(point_positions, point_counts):
+    """Repeats the first and the last point of every curve in the given point
+    positions, so Arnold can use them for the start and end tangents.
+
+    The curves can have different number of points, but the points of every
+    curve should be following each other in the point order. A ValueError is
+    raised for curves without any points, as they have no point to repeat.
+
+    :param str point_positions: The packed point positions (3 floats per
+      point) of all the curves
+    :param point_counts: An ``array.array`` holding the number of points of
+      each curve
+    :return: str
+    """
+    item_size = 12  # 3 floats
+    curve_count = len(point_counts)
+    point_count = len(point_positions) / item_size
+
+    if not curve_count:
+        return point_positions
+
+    if min(point_counts) == 0:
+        raise ValueError(
+            'curve %s has no points, the curves without points can not be '
+            'exported' % list(point_counts).index(0)
+        )
+
+    if numpy is not None:
+        points = numpy.frombuffer(point_positions, dtype=numpy.float32)
+        points = points.reshape(point_count, 3)
+        counts = numpy.frombuffer(point_counts, dtype=numpy.uint32)
+        counts = counts.astype(numpy.int64)
+
+        ends = numpy.cumsum(counts)
+        starts = ends - counts
+        shifts = numpy.arange(curve_count) * 2
+
+        # every point is shifted by the two extra points of the previous
+        # curves plus the extra root point of its own curve
+        padded_points = numpy.empty(
+            (point_count + 2 * curve_count, 3), dtype=numpy.float32
+        )
+        padded_points[
+            numpy.arange(point_count) + numpy.repeat(shifts + 1, counts)
+        ] = points
+        padded_points[starts + shifts] = points[starts]
+        padded_points[ends + shifts + 1] = points[ends - 1]
+        return padded_points.tostring()
+
+    padded_points = bytearray(
+        len(point_positions) + 2 * curve_count * item_size
+    )
+    i = 0
+    j = 0
+    for count in point_counts:
+        length = count * item_size
+        curve = point_positions[i:i + length]
+        padded_points[j:j + item_size] = curve[:item_size]
+        j += item_size
+        padded_points[j:j + length] = curve
+        j += length
+        padded_points[j:j + item_size] = curve[-item_size:]
+        j += item_size
+        i += length
+    return str(padded_points)
 
 
 def split_data(data, chunk_size):
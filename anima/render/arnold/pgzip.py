@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Parallel gzip writer.
+
+The data is split in to fixed size blocks and every block is compressed as a
+separate gzip member in a thread pool (zlib releases the GIL while
+compressing). The members are written in order, and the resulting multi-member
+gzip file can be read with gunzip, the Python gzip module and Arnold.
+
+The files share one compression thread pool by default, so writing many files
+at the same time (ex. batch exports) does not start a pool per file.
+"""
+
+import multiprocessing
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+def compress_member(data, compresslevel=9, mtime=0):
+    """Compresses the given data as a complete gzip member.
+
+    :param str data: The data to be compressed
+    :param int compresslevel: The zlib compression level (0-9)
+    :param int mtime: The modification time stored in the member header
+    :return: str
+    """
+    if compresslevel == 9:
+        extra_flags = 2  # maximum compression
+    elif compresslevel == 1:
+        extra_flags = 4  # fastest compression
+    else:
+        extra_flags = 0
+
+    header = struct.pack(
+        '<BBBBIBB', 0x1f, 0x8b, zlib.DEFLATED, 0, mtime & 0xffffffff,
+        extra_flags, 255
+    )
+    compressor = zlib.compressobj(
+        compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0
+    )
+    trailer = struct.pack(
+        '<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff
+    )
+    return ''.join(
+        [header, compressor.compress(data), compressor.flush(), trailer]
+    )
+
+
+__compression_pool = []
+__compression_pool_lock = threading.Lock()
+
+
+def get_cpu_count():
+    """Returns the number of CPUs or 1 if it can not be determined
+
+    :return: int
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def get_compression_pool():
+    """Returns the shared compression thread pool, creates it in the first
+    call.
+
+    :returns: :class:`multiprocessing.pool.ThreadPool`
+    """
+    with __compression_pool_lock:
+        if not __compression_pool:
+            import atexit
+            pool = ThreadPool(get_cpu_count())
+            atexit.register(pool.close)
+            __compression_pool.append(pool)
+    return __compression_pool[0]
+
+
+class ParallelGzipFile(object):
+    """A write only file object which compresses the data in parallel.
+
+    :param str filename: The output file path
+    :param str mode: The file mode, only "w" and "wb" are supported
+    :param int compresslevel: The zlib compression level (0-9), the default
+      is 9 as in :func:`gzip.open`
+    :param int threads: The number of compression threads. The shared
+      compression pool (see :func:`.get_compression_pool`) is used if
+      skipped, otherwise the file starts its own pool.
+    :param int block_size: The uncompressed size of the blocks
+    :param fileobj: A file like object to write to instead of opening the
+      ``filename``
+    """
+
+    def __init__(self, filename=None, mode='wb', compresslevel=9,
+                 threads=None, block_size=1 << 22, fileobj=None):
+        if mode not in ('w', 'wb'):
+            raise ValueError('ParallelGzipFile only supports writing')
+
+        if not 0 <= compresslevel <= 9:
+            raise ValueError(
+                'compresslevel should be between 0 and 9, not %s' %
+                compresslevel
+            )
+
+        if fileobj is None:
+            fileobj = open(filename, 'wb')
+            self.close_fileobj = True
+        else:
+            self.close_fileobj = False
+
+        self.name = filename
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.mtime = int(time.time())
+
+        self.pool = None
+        self.close_pool = False
+        if threads is None:
+            self.threads = get_cpu_count()
+            if self.threads > 1:
+                self.pool = get_compression_pool()
+        else:
+            self.threads = max(1, threads)
+            if self.threads > 1:
+                self.pool = ThreadPool(self.threads)
+                self.close_pool = True
+        self.pending = deque()
+
+        self.buffer = []
+        self.buffer_size = 0
+        self.offset = 0
+        self.member_count = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def tell(self):
+        """Returns the number of uncompressed bytes written so far
+        """
+        return self.offset
+
+    def write(self, data):
+        """Writes the given data
+
+        :param str data: The data to be written
+        """
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+
+        if not data:
+            return
+
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        self.offset += len(data)
+
+        if self.buffer_size >= self.block_size:
+            data = ''.join(self.buffer)
+            block_size = self.block_size
+            full_length = len(data) - len(data) % block_size
+            for i in range(0, full_length, block_size):
+                self._compress_block(data[i:i + block_size])
+            remainder = data[full_length:]
+            self.buffer = [remainder] if remainder else []
+            self.buffer_size = len(remainder)
+
+    def writelines(self, iterable):
+        """Writes the given strings
+
+        :param iterable: An iterable of strings
+        """
+        for data in iterable:
+            self.write(data)
+
+    def _compress_block(self, block):
+        """Compresses the given block in the pool and writes the finished
+        members in order
+        """
+        self.member_count += 1
+        if self.pool is None:
+            self.fileobj.write(
+                compress_member(block, self.compresslevel, self.mtime)
+            )
+            return
+
+        self.pending.append(
+            self.pool.apply_async(
+                compress_member, (block, self.compresslevel, self.mtime)
+            )
+        )
+        # do not let the compressed data to pile up in memory
+        while len(self.pending) > 2 * self.threads:
+            self.fileobj.write(self.pending.popleft().get())
+
+    def flush(self):
+        """Compresses the buffered data and writes all the pending members
+        """
+        if self.buffer_size:
+            self._compress_block(''.join(self.buffer))
+            self.buffer = []
+            self.buffer_size = 0
+
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().get())
+        self.fileobj.flush()
+
+    def close(self):
+        """Writes the remaining data and closes the file
+        """
+        if self.closed:
+            return
+
+        try:
+            self.flush()
+            if not self.member_count:
+                # an empty gzip file still needs one member
+                self.fileobj.write(
+                    compress_member('', self.compresslevel, self.mtime)
+                )
+        finally:
+            self.closed = True
+            if self.close_pool:
+                self.pool.close()
+                self.pool.join()
+            self.pool = None
+            if self.close_fileobj:
+                self.fileobj.close()
+
+
+def open_file(filename, mode='wb', compresslevel=9, threads=None,
+              block_size=1 << 22):
+    """Opens a :class:`.ParallelGzipFile` for writing, the interface is
+    similar to :func:`gzip.open`.
+
+    :return: :class:`.ParallelGzipFile`
+    """
+    return ParallelGzipFile(
+        filename, mode, compresslevel=compresslevel, threads=threads,
+        block_size=block_size
+    )
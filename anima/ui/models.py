@@ -4,9 +4,12 @@
 # This module is part of anima-tools and is released under the BSD 2
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
+import threading
+from collections import namedtuple
+
 from stalker import (db, defaults, SimpleEntity, Task, Project, ProjectUser,
                      Version)
-from anima import logger, status_colors_by_id
+from anima import logger, status_colors_by_id, user_names_lut
 from anima.ui.lib import QtGui, QtCore, QtWidgets
 
 
@@ -20,6 +23,105 @@ def set_item_color(item, color):
     item.setForeground(foreground)
 
 
+def append_rows(parent, rows):
+    """appends the given rows to the given parent item with one row
+    insertion instead of one per row
+
+    :param parent: A QStandardItem, use the invisibleRootItem() of the model
+      to append top level rows.
+    :param rows: A list of lists of QStandardItems.
+    """
+    if not rows:
+        return
+
+    first_row = parent.rowCount()
+    column_count = max(len(row) for row in rows)
+    if parent.columnCount() < column_count:
+        parent.setColumnCount(column_count)
+
+    parent.appendRows([row[0] for row in rows])
+    for i, row in enumerate(rows):
+        for column, item in enumerate(row[1:], 1):
+            parent.setChild(first_row + i, column, item)
+
+
+VersionRowData = namedtuple(
+    # the data of a row in the VersionTreeModel
+    'VersionRowData',
+    [
+        'latest_published_version_number',
+        'latest_published_updated_by_id',
+        'latest_published_description',
+        'has_inputs',
+    ]
+)
+
+
+def query_version_row_data(versions):
+    """returns the latest published version data and the has inputs flag of
+    the given Versions with one query
+
+    :param versions: A list of :class:`~stalker.models.version.Version`
+      instances.
+    :returns: A dictionary of Version ids and VersionRowData instances.
+    """
+    from sqlalchemy import and_, exists, func
+    from sqlalchemy.orm import aliased
+    from stalker.models.version import Version_Inputs
+
+    if not versions:
+        return {}
+
+    version_ids = list(set(v.id for v in versions))
+    task_ids = list(set(v.task_id for v in versions))
+
+    latest_numbers = db.DBSession\
+        .query(
+            Version.task_id,
+            Version.take_name,
+            func.max(Version.version_number).label('version_number')
+        )\
+        .filter(Version.task_id.in_(task_ids))\
+        .filter(Version.is_published == True)\
+        .group_by(Version.task_id, Version.take_name)\
+        .subquery()
+
+    latest_version = aliased(Version, flat=True)
+    has_inputs = exists().where(Version_Inputs.c.version_id == Version.id)
+
+    result = db.DBSession\
+        .query(
+            Version.id,
+            latest_version.version_number,
+            latest_version.updated_by_id,
+            latest_version.description,
+            has_inputs
+        )\
+        .outerjoin(
+            latest_numbers,
+            and_(
+                Version.task_id == latest_numbers.c.task_id,
+                Version.take_name == latest_numbers.c.take_name
+            )
+        )\
+        .outerjoin(
+            latest_version,
+            and_(
+                latest_version.task_id == latest_numbers.c.task_id,
+                latest_version.take_name == latest_numbers.c.take_name,
+                latest_version.version_number ==
+                latest_numbers.c.version_number
+            )
+        )\
+        .filter(Version.id.in_(version_ids))\
+        .all()
+
+    return dict(
+        (r[0], VersionRowData(r[1], r[2], r[3], bool(r[4])))
+        for r in result
+    )
+
+
 class VersionItem(QtGui.QStandardItem):
     """Implements the Version as a QStandardItem
     """
@@ -52,17 +154,31 @@ class VersionItem(QtGui.QStandardItem):
         logger.debug(
             'VersionItem.canFetchMore() is started for item: %s' % self.text())
         if self.version and not self.fetched_all:
-            return_value = bool(self.version.inputs)
+            return_value = self.has_inputs()
         else:
             return_value = False
         logger.debug(
             'VersionItem.canFetchMore() is finished for item: %s' % self.text())
         return return_value
 
+    def has_inputs(self):
+        """returns True if the Version has inputs, uses the row data of the
+        model if it is loaded
+        """
+        if self.pseudo_model is not None:
+            row_data = self.pseudo_model.get_row_data(self.version)
+            if row_data is not None:
+                return row_data.has_inputs
+        return bool(self.version.inputs)
+
     @classmethod
     def generate_version_row(cls, parent, pseudo_model, version):
         """Generates a new version row
 
+        The row data of the version is loaded by the model, call
+        :meth:`.VersionTreeModel.load_row_data` with all the versions of the
+        level before generating the rows to load them with one query.
+
         :return:
         """
         # column 0
@@ -72,35 +188,34 @@ class VersionItem(QtGui.QStandardItem):
 
         version_item.version = version
         version_item.setEditable(False)
-        reference_resolution = pseudo_model.reference_resolution
+        resolution_ids = pseudo_model.resolution_ids
 
-        if version in reference_resolution['update']:
+        if version.id in resolution_ids['update']:
             action = 'update'
-            font_color = QtGui.QColor(192, 128, 0)
-            if version in reference_resolution['root']:
+            if version.id in resolution_ids['root']:
                 version_item.setCheckable(True)
                 version_item.setCheckState(QtCore.Qt.Checked)
-        elif version in reference_resolution['create']:
+        elif version.id in resolution_ids['create']:
             action = 'create'
-            font_color = QtGui.QColor(192, 0, 0)
-            if version in reference_resolution['root']:
+            if version.id in resolution_ids['root']:
                 version_item.setCheckable(True)
                 version_item.setCheckState(QtCore.Qt.Checked)
         else:
-            font_color = QtGui.QColor(0, 192, 0)
             action = ''
 
         version_item.action = action
 
-        set_item_color(version_item, font_color)
+        # one brush for all the items of the same action
+        foreground = pseudo_model.get_action_brush(action)
+
+        row_data = pseudo_model.get_row_data(version)
+        if row_data is None:
+            pseudo_model.load_row_data([version])
+            row_data = pseudo_model.get_row_data(version)
 
         # thumbnail
         thumbnail_item = QtGui.QStandardItem()
-        thumbnail_item.setEditable(False)
         # thumbnail_item.setText('no thumbnail')
-        thumbnail_item.version = version
-        thumbnail_item.action = action
-        set_item_color(thumbnail_item, font_color)
 
         # Nice Name
         nice_name_item = QtGui.QStandardItem()
@@ -111,71 +226,43 @@ class VersionItem(QtGui.QStandardItem):
                 ('%s' % version.version_number).zfill(3)
             )
         )
-        nice_name_item.setEditable(False)
-        nice_name_item.version = version
-        nice_name_item.action = action
-        set_item_color(nice_name_item, font_color)
 
         # Take
         take_item = QtGui.QStandardItem()
-        take_item.setEditable(False)
         take_item.setText(version.take_name)
-        take_item.version = version
-        take_item.action = action
-        set_item_color(take_item, font_color)
 
         # Current
         current_version_item = QtGui.QStandardItem()
         current_version_item.setText('%s' % version.version_number)
-        current_version_item.setEditable(False)
-        current_version_item.version = version
-        current_version_item.action = action
-        set_item_color(current_version_item, font_color)
 
         # Latest
-        latest_published_version = version.latest_published_version
-
         latest_published_version_item = QtGui.QStandardItem()
-        latest_published_version_item.version = version
-        latest_published_version_item.action = action
-        latest_published_version_item.setEditable(False)
 
         latest_published_version_text = 'No Published Version'
-        if latest_published_version:
+        if row_data.latest_published_version_number is not None:
             latest_published_version_text = '%s' % \
-                latest_published_version.version_number
+                row_data.latest_published_version_number
         latest_published_version_item.setText(
             latest_published_version_text
         )
-        set_item_color(latest_published_version_item, font_color)
 
         # Action
         action_item = QtGui.QStandardItem()
-        action_item.setEditable(False)
         action_item.setText(action)
-        action_item.version = version
-        action_item.action = action
-        set_item_color(action_item, font_color)
 
         # Updated By
         updated_by_item = QtGui.QStandardItem()
-        updated_by_item.setEditable(False)
         updated_by_text = ''
-        if latest_published_version.updated_by:
-            updated_by_text = latest_published_version.updated_by.name
+        if row_data.latest_published_updated_by_id:
+            updated_by_text = user_names_lut.get(
+                row_data.latest_published_updated_by_id, ''
+            )
         updated_by_item.setText(updated_by_text)
-        updated_by_item.version = version
-        updated_by_item.action = action
-        set_item_color(updated_by_item, font_color)
 
         # Description
         description_item = QtGui.QStandardItem()
-        if latest_published_version:
-            description_item.setText(latest_published_version.description)
-        description_item.setEditable(False)
-        description_item.version = version
-        description_item.action = action
-        set_item_color(description_item, font_color)
+        if row_data.latest_published_description:
+            description_item.setText(row_data.latest_published_description)
 
         # # Path
         # path_item = QtGui.QStandardItem()
@@ -184,9 +271,17 @@ class VersionItem(QtGui.QStandardItem):
         # path_item.setEditable(True)
         # set_item_color(path_item, font_color)
 
-        return [version_item, thumbnail_item, nice_name_item, take_item,
-                current_version_item, latest_published_version_item,
-                action_item, updated_by_item, description_item]
+        row = [version_item, thumbnail_item, nice_name_item, take_item,
+               current_version_item, latest_published_version_item,
+               action_item, updated_by_item, description_item]
+
+        for item in row:
+            item.setEditable(False)
+            item.setForeground(foreground)
+            item.version = version
+            item.action = action
+
+        return row
 
     def fetchMore(self):
         logger.debug(
@@ -195,11 +290,13 @@ class VersionItem(QtGui.QStandardItem):
         if self.canFetchMore():
             # model = self.model() # This will cause a SEGFAULT
             versions = sorted(self.version.inputs, key=lambda x: x.full_path)
+            self.pseudo_model.load_row_data(versions)
 
-            for version in versions:
-                self.appendRow(
-                    self.generate_version_row(self, self.pseudo_model, version)
-                )
+            append_rows(
+                self,
+                [self.generate_version_row(self, self.pseudo_model, version)
+                 for version in versions]
+            )
 
             self.fetched_all = True
         logger.debug(
@@ -209,7 +306,7 @@ class VersionItem(QtGui.QStandardItem):
         logger.debug(
             'VersionItem.hasChildren() is started for item: %s' % self.text())
         if self.version:
-            return_value = bool(self.version.inputs)
+            return_value = self.has_inputs()
         else:
             return_value = False
         logger.debug(
@@ -226,15 +323,81 @@ class VersionTreeModel(QtGui.QStandardItemModel):
     """Implements the model view for the version hierarchy
     """
 
+    action_colors = {
+        'update': (192, 128, 0),
+        'create': (192, 0, 0),
+        '': (0, 192, 0),
+    }
+
+    # the maximum number of Versions whose row data is loaded in one query
+    max_query_versions = 500
+
     def __init__(self, flat_view=False, *args, **kwargs):
         QtGui.QStandardItemModel.__init__(self, *args, **kwargs)
         logger.debug('VersionTreeModel.__init__() is started')
         self.root = None
         self.root_versions = []
+        self._reference_resolution = None
+        self.resolution_ids = None
+        self.row_data = {}
+        self.action_brushes = {}
         self.reference_resolution = None
         self.flat_view = flat_view
         logger.debug('VersionTreeModel.__init__() is finished')
 
+    @property
+    def reference_resolution(self):
+        """the reference resolution dictionary
+        """
+        return self._reference_resolution
+
+    @reference_resolution.setter
+    def reference_resolution(self, reference_resolution):
+        """sets the reference resolution and the sets of the Version ids in
+        it for fast look up
+        """
+        self._reference_resolution = reference_resolution
+        self.resolution_ids = dict(
+            (key, set(v.id for v in (reference_resolution or {}).get(key, [])))
+            for key in ['root', 'leave', 'update', 'create']
+        )
+
+    def get_action_brush(self, action):
+        """returns the foreground brush for the given action
+        """
+        brush = self.action_brushes.get(action)
+        if brush is None:
+            brush = QtGui.QBrush(QtGui.QColor(*self.action_colors[action]))
+            self.action_brushes[action] = brush
+        return brush
+
+    def get_row_data(self, version):
+        """returns the loaded VersionRowData of the given Version or None
+        """
+        return self.row_data.get(version.id)
+
+    def load_row_data(self, versions):
+        """loads the row data of the given Versions with one query per
+        max_query_versions Versions, and their Tasks and the user names in to
+        the caches, so the rows of a whole level are generated without any
+        other query
+        """
+        versions = [v for v in versions if v.id not in self.row_data]
+        size = self.max_query_versions
+        for chunk in [versions[i:i + size]
+                      for i in range(0, len(versions), size)]:
+            # load the tasks to the session for the nice names
+            task_ids = list(set(v.task_id for v in chunk))
+            Task.query.filter(Task.id.in_(task_ids)).all()
+
+            row_data = query_version_row_data(chunk)
+            self.row_data.update(row_data)
+
+            user_names_lut.warm_up(
+                [data.latest_published_updated_by_id
+                 for data in row_data.values()]
+            )
+
     def populateTree(self, versions):
         """populates tree with root versions
         """
@@ -246,10 +409,12 @@ class VersionTreeModel(QtGui.QStandardItemModel):
         )
 
         self.root_versions = versions
-        for version in versions:
-            self.appendRow(
-                VersionItem.generate_version_row(None, self, version)
-            )
+        self.load_row_data(versions)
+        append_rows(
+            self.invisibleRootItem(),
+            [VersionItem.generate_version_row(None, self, version)
+             for version in versions]
+        )
 
         logger.debug('VersionTreeModel.populateTree() is finished')
 
@@ -319,6 +484,101 @@ class TaskTreeView(QtWidgets.QTreeView):
         super(TaskTreeView, self).__init__(*args, **kwargs)
 
 
+def query_task_children(task_ids=None, project_ids=None):
+    """returns the data of the children of the given Tasks and the root Tasks
+    of the given Projects with one query
+
+    :param task_ids: A list of Task ids.
+    :param project_ids: A list of Project ids.
+    :returns: A dictionary of parent ids and the list of the
+      (id, name, entity_type, status_id, has_children) tuples of their
+      children ordered by name.
+    """
+    from sqlalchemy import and_, or_, exists
+
+    conditions = []
+    if task_ids:
+        conditions.append(Task.parent_id.in_(task_ids))
+    if project_ids:
+        conditions.append(
+            and_(Task.parent_id == None, Task.project_id.in_(project_ids))
+        )
+
+    children_data = dict(
+        (parent_id, []) for parent_id in (task_ids or []) + (project_ids or [])
+    )
+    if not conditions:
+        return children_data
+
+    # has children flag of every child in the same query
+    child_tasks = Task.__table__.alias('child_tasks')
+    has_children = exists().where(child_tasks.c.parent_id == Task.id)
+
+    result = db.DBSession\
+        .query(Task.parent_id, Task.project_id, Task.id, Task.name,
+               Task.entity_type, Task.status_id, has_children)\
+        .filter(or_(*conditions))\
+        .order_by(Task.name)\
+        .all()
+
+    for r in result:
+        parent_id = r[0] if r[0] is not None else r[1]
+        children_data[parent_id].append(
+            (r[2], r[3], r[4], r[5], bool(r[6]))
+        )
+
+    return children_data
+
+
+class TaskChildrenPrefetcher(object):
+    """Queries the children of the Tasks in a background thread, so they are
+    ready when the Tasks are expanded.
+    """
+
+    def __init__(self):
+        self.children_data = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, task_ids):
+        """starts querying the children of the given Tasks in the background
+
+        :param task_ids: A list of Task ids.
+        :returns: The started thread.
+        """
+        thread = threading.Thread(
+            target=self.fetch_in_background,
+            args=(task_ids, )
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def fetch_in_background(self, task_ids):
+        """queries the children of the given Tasks with the session of the
+        background thread
+        """
+        try:
+            self.fetch(task_ids)
+        except Exception as e:
+            logger.debug('could not prefetch the Task children: %s' % e)
+        finally:
+            db.DBSession.remove()
+
+    def fetch(self, task_ids):
+        """queries the children of the given Tasks
+        """
+        children_data = query_task_children(task_ids=task_ids)
+        with self.lock:
+            self.children_data.update(children_data)
+
+    def pop(self, task_id):
+        """returns the prefetched children data of the given Task and removes
+        it from the cache, returns None if it is not prefetched yet
+        """
+        with self.lock:
+            return self.children_data.pop(task_id, None)
+
+
 class TaskItem(QtGui.QStandardItem):
     """Implements the Task as a QStandardItem
     """
@@ -344,6 +604,7 @@ class TaskItem(QtGui.QStandardItem):
         self.user_id = None
         self.user_name = None
         self.user_tasks_only = False
+        self.children_prefetcher = None
         logger.debug(
             'TaskItem.__init__() is finished for item: %s' % self.text()
         )
@@ -356,41 +617,46 @@ class TaskItem(QtGui.QStandardItem):
         new_item.task_id = self.task_id
         new_item.parent = self.parent
         new_item.fetched_all = self.fetched_all
+        new_item.children_prefetcher = self.children_prefetcher
         logger.debug('TaskItem.clone() is finished for item: %s' % self.text())
         return new_item
 
+    def load_children_data(self):
+        """loads the data of the children of this item together with their
+        has children flags with one query
+        """
+        if self.task_children_data is not None:
+            return
+
+        if self.task_name is None:
+            self.task_name, self.task_entity_type = \
+                db.DBSession \
+                .query(SimpleEntity.name, SimpleEntity.entity_type) \
+                .filter(SimpleEntity.id == self.task_id) \
+                .first()
+
+        if self.task_entity_type in self.task_entity_types:
+            if self.children_prefetcher:
+                self.task_children_data = \
+                    self.children_prefetcher.pop(self.task_id)
+            if self.task_children_data is None:
+                self.task_children_data = \
+                    query_task_children(task_ids=[self.task_id])[self.task_id]
+        elif self.task_entity_type == 'Project':
+            self.task_children_data = \
+                query_task_children(project_ids=[self.task_id])[self.task_id]
+        else:
+            self.task_children_data = []
+
+        self.task_has_children = len(self.task_children_data) > 0
+
     def canFetchMore(self):
         logger.debug(
             'TaskItem.canFetchMore() is started for item: %s' % self.text()
         )
         return_value = False
         if self.task_id and not self.fetched_all:
-            if self.task_name is None:
-                self.task_name, self.task_entity_type = \
-                    db.DBSession.query(
-                        SimpleEntity.name,
-                        SimpleEntity.entity_type
-                    )\
-                    .filter(SimpleEntity.id == self.task_id)\
-                    .first()
-
-            if self.task_entity_type in self.task_entity_types:
-                if self.task_has_children is None:
-                    self.task_has_children = \
-                        Task.query\
-                            .filter(Task.parent_id == self.task_id)\
-                            .count() > 0
-                return_value = self.task_has_children
-            elif self.task_entity_type == 'Project':
-                if self.task_has_children is None:
-                    self.task_has_children = \
-                        Task.query\
-                            .filter(Task.project_id == self.task_id)\
-                            .filter(Task.parent_id == None)\
-                            .count() > 0
-                return_value = self.task_has_children
-        else:
-            return_value = False
+            return_value = self.hasChildren()
         logger.debug(
             'TaskItem.canFetchMore() is finished for item: %s' % self.text()
         )
@@ -402,32 +668,8 @@ class TaskItem(QtGui.QStandardItem):
         )
 
         if self.canFetchMore():
-            tasks = []
-
-            if self.task_name is None:
-                self.task_name, self.task_entity_type = \
-                    db.DBSession \
-                        .query(SimpleEntity.name, SimpleEntity.entity_type) \
-                    .filter(SimpleEntity.id == self.task_id) \
-                    .first()
-
-            if self.task_children_data is None:
-                if self.task_entity_type in self.task_entity_types:
-                    self.task_children_data = db.DBSession \
-                        .query(Task.id, Task.name, Task.entity_type, Task.status_id) \
-                        .filter(Task.parent_id == self.task_id) \
-                        .order_by(Task.name) \
-                        .all()
-
-                elif self.task_entity_type == 'Project':
-                    self.task_children_data = db.DBSession\
-                        .query(Task.id, Task.name, Task.entity_type, Task.status_id) \
-                        .filter(Task.parent_id == None) \
-                        .filter(Task.project_id == self.task_id) \
-                        .order_by(Task.name) \
-                        .all()
-
-                tasks = self.task_children_data
+            self.load_children_data()
+            tasks = self.task_children_data
 
             # # model = self.model() # This will cause a SEGFAULT
             # # TODO: update it later on
@@ -451,8 +693,12 @@ class TaskItem(QtGui.QStandardItem):
                 task_item = TaskItem(0, 3)
                 task_item.parent = self
                 task_item.task_id = task[0]
+                task_item.task_name = task[1]
+                task_item.task_entity_type = task[2]
+                task_item.task_has_children = task[4]
                 task_item.user_id = self.user_id
                 task_item.user_tasks_only = self.user_tasks_only
+                task_item.children_prefetcher = self.children_prefetcher
 
                 # set the font
                 # name_item = QtGui.QStandardItem(task.name)
@@ -461,24 +707,6 @@ class TaskItem(QtGui.QStandardItem):
                 # task_item.setItem(0, 1, entity_type_item)
                 task_item.setText(task[1])
 
-                # make_bold = False
-                # if task_item.canFetchMore():
-                #     make_bold = True
-                # if task[2] in self.task_entity_types:
-                #     children_count = \
-                #         db.DBSession.query(Task.id)\
-                #             .filter(Task.parent_id == task[0])\
-                #             .count()
-                #     if children_count:
-                #         make_bold = True
-                # elif task[2] == 'Project':
-                #     make_bold = True
-
-                # if make_bold:
-                #     my_font = task_item.font()
-                #     my_font.setBold(True)
-                #     task_item.setFont(my_font)
-
                 # color with task status
                 task_item.setData(
                     QtGui.QColor(
@@ -497,6 +725,12 @@ class TaskItem(QtGui.QStandardItem):
             if task_items:
                 self.appendRows(task_items)
 
+            # get the next level ready
+            if self.children_prefetcher:
+                task_ids = [task[0] for task in tasks if task[4]]
+                if task_ids:
+                    self.children_prefetcher.prefetch(task_ids)
+
             self.fetched_all = True
 
         logger.debug(
@@ -508,32 +742,11 @@ class TaskItem(QtGui.QStandardItem):
             'TaskItem.hasChildren() is started for item: %s' % self.text()
         )
 
+        return_value = False
         if self.task_id:
-            if self.task_name is None:
-                self.task_name, self.task_entity_type = \
-                    db.DBSession \
-                    .query(SimpleEntity.name, SimpleEntity.entity_type) \
-                    .filter(SimpleEntity.id == self.task_id) \
-                    .first()
-            if self.task_entity_type in self.task_entity_types:
-                if self.task_has_children is None:
-                    self.task_has_children = db.DBSession.query(Task.id)\
-                        .filter(Task.parent_id == self.task_id)\
-                        .count() > 0
-                return_value = self.task_has_children
-            elif self.task_entity_type == 'Project':
-                if self.task_has_children is None:
-                    self.task_has_children = \
-                        db.DBSession.query(Task.id)\
-                            .filter(Task.project_id == self.task_id)\
-                            .filter(Task.parent_id == None)\
-                            .count() > 0
-                return_value = self.task_has_children
-
-            else:
-                return_value = False
-        else:
-            return_value = False
+            if self.task_has_children is None:
+                self.load_children_data()
+            return_value = self.task_has_children
 
         # print('TaskItem.hasChildren | self.task_name: %s' % self.task_name)
 
@@ -558,6 +771,8 @@ class TaskTreeModel(QtGui.QStandardItemModel):
         self.user_id = None
         self.root = None
         self.user_tasks_only = False
+        self.prefetch_children = False
+        self.children_prefetcher = TaskChildrenPrefetcher()
         logger.debug('TaskTreeModel.__init__() is finished')
 
     def populateTree(self, projects):
@@ -581,8 +796,12 @@ class TaskTreeModel(QtGui.QStandardItemModel):
             project_item.setColumnCount(3)
             project_item.setText(project.name)
             project_item.task_id = project.id
+            project_item.task_name = project.name
+            project_item.task_entity_type = 'Project'
             project_item.user_id = self.user.id
             project_item.user_tasks_only = self.user_tasks_only
+            if self.prefetch_children:
+                project_item.children_prefetcher = self.children_prefetcher
 
             # set the font
             # project_item.setText(0, entity.name)
@@ -295,10 +295,11 @@ class MainDialog(QtWidgets.QDialog, time_log_dialog_UI.Ui_Dialog, AnimaDialogBas
             self.logged_in_user = self.get_logged_in_user()
 
         # fill the tasks comboBox
-        from stalker import Status, Task
-        status_wfd = Status.query.filter(Status.code == 'WFD').first()
-        status_cmpl = Status.query.filter(Status.code == 'CMPL').first()
-        status_prev = Status.query.filter(Status.code == 'PREV').first()
+        from stalker import Task
+        from anima import status_ids_by_code
+        status_wfd_id = status_ids_by_code.get('WFD')
+        status_cmpl_id = status_ids_by_code.get('CMPL')
+        status_prev_id = status_ids_by_code.get('PREV')
 
         if not self.timelog:
             # dialog is in create TimeLog mode
@@ -310,9 +311,9 @@ class MainDialog(QtWidgets.QDialog, time_log_dialog_UI.Ui_Dialog, AnimaDialogBas
                 # show all the suitable tasks of the logged_in_user
                 all_tasks = Task.query \
                     .filter(Task.resources.contains(self.logged_in_user)) \
-                    .filter(Task.status != status_wfd) \
-                    .filter(Task.status != status_cmpl) \
-                    .filter(Task.status != status_prev) \
+                    .filter(Task.status_id != status_wfd_id) \
+                    .filter(Task.status_id != status_cmpl_id) \
+                    .filter(Task.status_id != status_prev_id) \
                     .all()
                 # sort the task labels
                 all_tasks = sorted(
@@ -516,18 +517,18 @@ order by cast("TimeLogs".start as date)
     def get_current_resource(self):
         """returns the current resource
         """
-        resource_name = self.resource_comboBox.currentText()
+        resource_id = self.get_current_resource_id()
+        if resource_id is None:
+            return None
         from stalker import User
-        return User.query.filter(User.name == resource_name).first()
+        return User.query.get(resource_id)
 
     def get_current_resource_id(self):
         """returns the current resource
         """
         resource_name = self.resource_comboBox.currentText()
-        from stalker import db, User
-        return db.DBSession\
-            .query(User.id).filter(User.name == resource_name)\
-            .first()
+        from anima import user_ids_by_name
+        return user_ids_by_name.get(resource_name)
 
     def start_time_changed(self, q_time):
         """validates the start time
@@ -810,7 +811,8 @@ order by cast("TimeLogs".start as date)
         if is_complete:
             # set the status to complete
             from stalker import Type, Status
-            status_cmpl = Status.query.filter(Status.code == 'CMPL').first()
+            from anima import status_ids_by_code
+            status_cmpl = Status.query.get(status_ids_by_code['CMPL'])
 
             forced_status_type = \
                 Type.query.filter(Type.name == 'Forced Status').first()
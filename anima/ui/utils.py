@@ -7,6 +7,8 @@
 """
 import os
 import shutil
+import threading
+import Queue
 
 from anima import logger
 from anima.ui.lib import QtCore, QtGui, QtWidgets
@@ -39,6 +41,72 @@ def clear_thumbnail(gview):
     scene.clear()
 
 
+def get_thumbnail_full_path(link):
+    """Returns the local path of the given thumbnail Link.
+
+    The thumbnail is read as a normal file if it is reachable, otherwise it is
+    downloaded from the Stalker server through the
+    :class:`~anima.utils.StalkerThumbnailCache`.
+
+    :param link: A :class:`~stalker.models.link.Link` instance
+    :return str: The thumbnail path or None if it is not found
+    """
+    # try to get it as a normal file
+    full_path = os.path.expandvars(link.full_path)
+    if os.path.exists(full_path):
+        return full_path
+
+    import anima
+    if anima.stalker_server_internal_address:
+        # use the cache system to get the thumbnail
+        from anima.utils import StalkerThumbnailCache
+        try:
+            full_path = StalkerThumbnailCache.default().get(link.full_path)
+        except Exception as e:  # the server is not reachable
+            logger.debug('could not get thumbnail: %s' % e)
+            return None
+        if os.path.exists(full_path):
+            return full_path
+
+
+def get_task_thumbnail_full_path(task):
+    """Returns the local path of the thumbnail of the given Task, or of its
+    closest parent with a thumbnail.
+
+    The thumbnail may be downloaded from the Stalker server (see
+    :func:`.get_thumbnail_full_path`), so in UIs it should be called in a
+    worker thread, use :func:`.query_task_thumbnail_full_path` with a
+    :class:`.BackgroundLoader`.
+
+    :param task: A :class:`~stalker.models.task.Task` instance
+    :return str: The thumbnail path or None if it is not found
+    """
+    if task.thumbnail:
+        return get_thumbnail_full_path(task.thumbnail)
+
+    logger.debug('there is no thumbnail')
+    # try to get the thumbnail from parents
+    for parent in reversed(task.parents):
+        if parent.thumbnail:
+            full_path = get_thumbnail_full_path(parent.thumbnail)
+            logger.debug('found parent thumbnail at: %s' % full_path)
+            return full_path
+
+
+def query_task_thumbnail_full_path(task_id):
+    """Returns the local path of the thumbnail of the Task with the given id
+    like :func:`.get_task_thumbnail_full_path`. It returns plain data, so it
+    can be used as a :class:`.BackgroundLoader` query.
+
+    :param int task_id: The Task id.
+    :return str: The thumbnail path or None if it is not found
+    """
+    from stalker import Task
+    task = Task.query.get(task_id)
+    if task is not None:
+        return get_task_thumbnail_full_path(task)
+
+
 def update_gview_with_task_thumbnail(task, gview):
     """Updates the given QGraphicsView with the given Task thumbnail
 
@@ -56,29 +124,7 @@ def update_gview_with_task_thumbnail(task, gview):
         return
 
     # get the thumbnail full path
-    full_path = None
-    if task.thumbnail:
-        # use the cache system to get the thumbnail
-        # try to get it as a normal file
-        full_path = os.path.expandvars(
-            task.thumbnail.full_path
-        )
-        if not os.path.exists(full_path):
-            full_path = None
-    else:
-        logger.debug('there is no thumbnail')
-        # try to get the thumbnail from parents
-        for parent in reversed(task.parents):
-            if parent.thumbnail:
-                # try to get it as a normal file
-                full_path = os.path.expandvars(
-                    parent.thumbnail.full_path
-                )
-                if not os.path.exists(full_path):
-                    full_path = None
-                logger.debug('found parent thumbnail at: %s' % full_path)
-                break
-
+    full_path = get_task_thumbnail_full_path(task)
     if full_path:
         update_gview_with_image_file(
             full_path,
@@ -218,3 +264,171 @@ def render_image_from_gview(gview, image_full_path):
         pixmap.save(
             image_full_path
         )
+
+
+class BackgroundLoader(QtCore.QObject):
+    """Runs database queries in worker threads and applies their results on
+    the UI thread.
+
+    Every job has a name, like the name of the widget it fills. Loading a new
+    job with the same name makes the previous one stale and the result of the
+    stale job is dropped. The queries run with the session of their own
+    thread, so they should return plain data instead of Stalker instances.
+    The results are applied on the UI thread by polling them with a QTimer.
+
+    For an in memory SQLite database, which can not be reached from another
+    thread, the jobs run synchronously.
+
+    If a job fails, the :attr:`.error_callback` is called with the name of
+    the job and the error on the UI thread, and the callbacks waiting the job
+    (see :meth:`.call_after`) are still called.
+    """
+
+    poll_interval = 20  # in milliseconds
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.synchronous = None
+        self.generations = {}
+        self.after_callbacks = {}
+        self.results = Queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.error_callback = None
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.poll_interval)
+        QtCore.QObject.connect(
+            self.timer,
+            QtCore.SIGNAL('timeout()'),
+            self.apply_results
+        )
+
+    def is_synchronous(self):
+        """returns True if the jobs should run on the calling thread
+        """
+        if self.synchronous is not None:
+            return self.synchronous
+
+        from stalker import db
+        bind = db.DBSession.bind
+        if bind is None:
+            return True
+        return bind.url.drivername.startswith('sqlite') \
+            and bind.url.database in (None, '', ':memory:')
+
+    def load(self, name, query, callback, *args):
+        """runs the given query with the given args in a worker thread and
+        calls the callback with the result on the UI thread
+
+        :param str name: The name of the job.
+        :param query: A callable returning the data.
+        :param callback: A callable which is called with the returned data.
+        """
+        with self.lock:
+            generation = abs(self.generations.get(name, 0)) + 1
+            self.generations[name] = generation
+
+        if self.is_synchronous():
+            result = None
+            error = None
+            try:
+                result = query(*args)
+            except Exception as e:
+                error = e
+            self.apply_result(name, generation, callback, result, error)
+            return
+
+        thread = threading.Thread(
+            target=self.run,
+            args=(name, generation, query, callback, args)
+        )
+        thread.daemon = True
+        self.threads.append(thread)
+        thread.start()
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def run(self, name, generation, query, callback, args):
+        """runs the query in the worker thread
+        """
+        from stalker import db
+        result = None
+        error = None
+        try:
+            result = query(*args)
+        except Exception as e:
+            error = e
+        finally:
+            db.DBSession.remove()
+        self.results.put((name, generation, callback, result, error))
+
+    def is_loading(self, name):
+        """returns True if the job with the given name is not finished yet
+        """
+        with self.lock:
+            return self.generations.get(name, 0) > 0
+
+    def cancel(self, name):
+        """drops the result of the job with the given name
+        """
+        with self.lock:
+            if name in self.generations:
+                self.generations[name] = -abs(self.generations[name])
+            self.after_callbacks.pop(name, None)
+
+    def call_after(self, name, callback, *args):
+        """calls the given callback after the job with the given name is
+        applied, or now if it is not loading
+        """
+        if not self.is_loading(name):
+            callback(*args)
+            return
+        with self.lock:
+            self.after_callbacks.setdefault(name, []).append((callback, args))
+
+    def apply_result(self, name, generation, callback, result, error):
+        """calls the callback of the job if it is not stale, or the
+        :attr:`.error_callback` if the job is failed. The callbacks waiting
+        the job are called in both cases.
+        """
+        with self.lock:
+            if self.generations.get(name) != generation:
+                logger.debug('dropping the stale result of %s' % name)
+                return
+            # mark as finished
+            self.generations[name] = -generation
+            after_callbacks = self.after_callbacks.pop(name, [])
+
+        if error is not None:
+            logger.error('could not load %s: %s' % (name, error))
+            if self.error_callback:
+                self.error_callback(name, error)
+        else:
+            callback(result)
+
+        for after_callback, args in after_callbacks:
+            after_callback(*args)
+
+    def apply_results(self):
+        """applies the results of the finished jobs, it is called by the
+        timer on the UI thread
+        """
+        while True:
+            try:
+                job = self.results.get_nowait()
+            except Queue.Empty:
+                break
+            self.apply_result(*job)
+
+        self.threads = [t for t in self.threads if t.is_alive()]
+        if not self.threads and self.results.empty():
+            self.timer.stop()
+
+    def wait(self):
+        """waits all the jobs and applies their results
+        """
+        for thread in self.threads:
+            thread.join()
+        self.apply_results()
@@ -49,6 +49,120 @@ VersionNT = namedtuple(
 )
 
 
+def query_projects():
+    """returns the ids and names of the Projects ordered by name
+    """
+    from stalker import db, Project
+    return db.DBSession.query(Project.id, Project.name)\
+        .order_by(Project.name)\
+        .all()
+
+
+def query_take_names(task_id, repr_as_separate_takes=False):
+    """returns the sorted take names of the Versions of the given Task, or
+    an empty list for a Project or a container Task
+
+    :param int task_id: The Task id.
+    :param bool repr_as_separate_takes: Include the take names of the
+      representations.
+    """
+    from stalker import db, SimpleEntity, Task
+    entity_type = db.DBSession\
+        .query(SimpleEntity.entity_type)\
+        .filter(SimpleEntity.id == task_id)\
+        .scalar()
+
+    if entity_type == "Project":
+        return []
+
+    children_count = db.DBSession.query(Task.id)\
+        .filter(Task.parent_id == task_id)\
+        .count()
+
+    if children_count:
+        return []
+
+    from sqlalchemy import text
+    sql = """SELECT
+        DISTINCT "Versions".take_name
+    FROM "Versions"
+    WHERE "Versions".task_id = :task_id
+    """
+    result = db.DBSession\
+        .connection()\
+        .execute(text(sql), task_id=task_id)\
+        .fetchall()
+
+    takes = map(lambda x: x[0], result)
+
+    if not repr_as_separate_takes:
+        # filter representations
+        from anima.repr import Representation
+        takes = [take for take in takes
+                 if Representation.repr_separator not in take]
+    return sorted(takes, key=lambda x: x.lower())
+
+
+def query_previous_versions(task_id, take_name, published_only, count):
+    """returns the data of the last Versions of the given Task and take as
+    VersionNT instances ordered by version number, or an empty list for a
+    container Task
+
+    :param int task_id: The Task id.
+    :param str take_name: The take name.
+    :param bool published_only: Return only the published Versions.
+    :param int count: The maximum number of Versions.
+    """
+    from stalker import db, Task, Version
+
+    # do not display any version for a container task
+    children_count = db.DBSession\
+        .query(Task.id)\
+        .filter(Task.parent_id == task_id)\
+        .count()
+    if children_count > 0:
+        return []
+
+    # query the Versions of this type and take
+    query = db.DBSession.query(
+        # use only the necessary fields
+        Version.id, Version.version_number,
+        Version.is_published, Version.created_with,
+        Version.created_by_id, Version.updated_by_id,
+        Version.full_path,  # convert to absolute full path
+        Version.description,
+    )\
+        .filter(Version.task_id == task_id) \
+        .filter(Version.take_name == take_name)
+
+    # get the published only
+    if published_only:
+        query = query.filter(Version.is_published == True)
+
+    data_from_db = \
+        query.order_by(Version.version_number.desc()).limit(count).all()
+    versions = map(lambda x: VersionNT(*x), data_from_db)
+    versions.reverse()
+
+    # get the names of all the users with one query
+    user_names_lut.warm_up(
+        [version.created_by_id for version in versions] +
+        [version.updated_by_id for version in versions]
+    )
+    return versions
+
+
+def read_recent_files(environment_name):
+    """returns the recent files of the given environment
+    """
+    from anima.recent import RecentFileManager
+    rfm = RecentFileManager()
+    try:
+        return rfm[environment_name]
+    except KeyError:
+        return None
+
+
 class RecentFilesComboBox(QtWidgets.QComboBox):
     """A Fixed with popup box comboBox alternative
     """
@@ -429,6 +543,11 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         # create the project attribute in projects_comboBox
         self.current_dialog = None
 
+        # runs the queries in the background
+        from anima.ui.utils import BackgroundLoader
+        self.background_loader = BackgroundLoader(self)
+        self.background_loader.error_callback = self.background_loader_failed
+
         # remove recent files comboBox and create a new one
         layout = self.horizontalLayout_8
         self.recent_files_comboBox.deleteLater()
@@ -909,12 +1028,11 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         menu.addAction('Copy ID to clipboard')
 
         logged_in_user = self.get_logged_in_user()
-        from stalker import Status
-        status_wfd = Status.query.filter(Status.code == 'WFD').first()
-        status_prev = Status.query.filter(Status.code == 'PREV').first()
-        status_cmpl = Status.query.filter(Status.code == 'CMPL').first()
+        from anima import status_ids_by_code
+        status_ids = [status_ids_by_code.get(code)
+                      for code in ['WFD', 'PREV', 'CMPL']]
         if logged_in_user in task.resources \
-           and task.status not in [status_wfd, status_prev, status_cmpl]:
+           and task.status_id not in status_ids:
             menu.addAction('Create TimeLog...')
 
         menu.addSeparator()
@@ -1026,6 +1144,15 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
             rfm[self.environment.name] = []
             rfm.save()
 
+    def background_loader_failed(self, name, error):
+        """shows the error of a failed background job
+        """
+        QtWidgets.QMessageBox.critical(
+            self,
+            "Error",
+            "Could not load %s:\n\n%s" % (name, error)
+        )
+
     def clear_recent_file_push_button_clicked(self):
         """clear the recent files
         """
@@ -1043,56 +1170,75 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         self.recent_files_comboBox.clear()
         # update recent files list
         if self.environment:
-            from anima.recent import RecentFileManager
-            rfm = RecentFileManager()
-            try:
-                recent_files = rfm[self.environment.name]
-                recent_files.insert(0, '')
-                # append them to the comboBox
-
-                for i, full_path in enumerate(recent_files[:50]):
-                    parts = os.path.split(full_path)
-                    filename = parts[-1]
-                    self.recent_files_comboBox.addItem(
-                        filename,
-                        full_path,
-                    )
+            self.background_loader.load(
+                'recent_files_comboBox',
+                read_recent_files,
+                self.fill_recent_files_combo_box,
+                self.environment.name
+            )
 
-                    self.recent_files_comboBox.setItemData(
-                        i,
-                        full_path,
-                        QtCore.Qt.ToolTipRole
-                    )
+    def fill_recent_files_combo_box(self, recent_files):
+        """fills the recent_files_comboBox with the given file paths
+        """
+        if recent_files is None:
+            return
 
-                # try:
-                #     self.recent_files_comboBox.setStyleSheet(
-                #         "qproperty-textElideMode: ElideNone"
-                #     )
-                # except:
-                #     pass
+        recent_files.insert(0, '')
+        # append them to the comboBox
 
-                self.recent_files_comboBox.setSizePolicy(
-                    QtWidgets.QSizePolicy.MinimumExpanding,
-                    QtWidgets.QSizePolicy.Minimum
-                )
-            except KeyError:
-                pass
+        for i, full_path in enumerate(recent_files[:50]):
+            parts = os.path.split(full_path)
+            filename = parts[-1]
+            self.recent_files_comboBox.addItem(
+                filename,
+                full_path,
+            )
+
+            self.recent_files_comboBox.setItemData(
+                i,
+                full_path,
+                QtCore.Qt.ToolTipRole
+            )
+
+        # try:
+        #     self.recent_files_comboBox.setStyleSheet(
+        #         "qproperty-textElideMode: ElideNone"
+        #     )
+        # except:
+        #     pass
+
+        self.recent_files_comboBox.setSizePolicy(
+            QtWidgets.QSizePolicy.MinimumExpanding,
+            QtWidgets.QSizePolicy.Minimum
+        )
 
     def fill_tasks_treeView(self):
-        """sets up the tasks_treeView
+        """sets up the tasks_treeView, the projects are queried in the
+        background
         """
         logger.debug('start filling tasks_treeView')
+        self.background_loader.load(
+            'tasks_treeView',
+            query_projects,
+            self.populate_tasks_treeView
+        )
+
+    def populate_tasks_treeView(self, projects):
+        """fills the tasks_treeView with the given projects
+
+        :param projects: A list of objects with the id and name of the
+          Projects.
+        """
         logged_in_user = self.get_logged_in_user()
 
         logger.debug('creating a new model')
-        from stalker import Project
-        projects = Project.query.order_by(Project.name).all()
         logger.debug('projects: %s' % projects)
 
         task_tree_model = TaskTreeModel()
         task_tree_model.user = logged_in_user
         task_tree_model.user_tasks_only = \
             self.my_tasks_only_checkBox.isChecked()
+        task_tree_model.prefetch_children = True
         task_tree_model.populateTree(projects)
 
         self.tasks_treeView.setModel(task_tree_model)
@@ -1109,6 +1255,25 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         self.tasks_treeView.is_updating = False
         logger.debug('finished filling tasks_treeView')
 
+        # download the thumbnails of the user tasks in the background
+        if anima.stalker_server_internal_address and logged_in_user:
+            from anima.utils import StalkerThumbnailCache
+            self.background_loader.load(
+                'thumbnail_cache',
+                StalkerThumbnailCache.query_user_thumbnail_paths,
+                self.prefetch_thumbnails,
+                logged_in_user.id
+            )
+
+    def prefetch_thumbnails(self, thumbnail_full_paths):
+        """downloads the given thumbnails to the thumbnail cache in the
+        background
+        """
+        from anima.utils import StalkerThumbnailCache
+        StalkerThumbnailCache.default().prefetch(
+            thumbnail_full_paths, wait=False
+        )
+
     def tasks_treeView_auto_fit_column(self):
         """fits columns to content
         """
@@ -1126,57 +1291,29 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         logger.debug('task_id : %s' % task_id)
 
         # update the thumbnail
-        # TODO: do it in another thread
         self.clear_thumbnail()
         self.update_thumbnail()
 
-        # get the versions of the entity
-        takes = []
-
         if task_id:
             # clear the takes_listWidget and fill with new data
             logger.debug('clear takes widget')
             self.takes_listWidget.clear()
 
-            from stalker import db, SimpleEntity
-            entity_type = db.DBSession\
-                .query(SimpleEntity.entity_type)\
-                .filter(SimpleEntity.id == task_id)\
-                .first()
-
-            if entity_type == "Project":
-                return
-
-            from stalker import db, Task
-            children_count = db.DBSession.query(Task.id)\
-                .filter(Task.parent_id == task_id)\
-                .count()
-
-            if children_count == 0:
-                from sqlalchemy import text
-                sql = """SELECT
-                    DISTINCT "Versions".take_name
-                FROM "Versions"
-                WHERE "Versions".task_id = :task_id
-                """
-                result = db.DBSession\
-                    .connection()\
-                    .execute(text(sql), task_id=task_id)\
-                    .fetchall()
-
-                takes = map(lambda x: x[0], result)
-
-                if not self.repr_as_separate_takes_checkBox.isChecked():
-                    # filter representations
-                    from anima.repr import Representation
-                    takes = [take for take in takes
-                             if Representation.repr_separator not in take]
-                takes = sorted(takes, key=lambda x: x.lower())
+            self.background_loader.load(
+                'takes_listWidget',
+                query_take_names,
+                self.fill_takes_listWidget,
+                task_id,
+                self.repr_as_separate_takes_checkBox.isChecked()
+            )
 
-            logger.debug("len(takes) from db: %s" % len(takes))
+    def fill_takes_listWidget(self, takes):
+        """fills the takes_listWidget with the given take names
+        """
+        logger.debug("len(takes) from db: %s" % len(takes))
 
-            logger.debug("adding the takes from db")
-            self.takes_listWidget.take_names = takes
+        logger.debug("adding the takes from db")
+        self.takes_listWidget.take_names = takes
 
     def _set_defaults(self):
         """sets up the defaults for the interface
@@ -1377,6 +1514,13 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         if version is None or not version.task.project.active:
             return
 
+        # wait the projects
+        if self.background_loader.is_loading('tasks_treeView'):
+            self.background_loader.call_after(
+                'tasks_treeView', self.restore_ui, version
+            )
+            return
+
         # set the task
         task = version.task
 
@@ -1384,12 +1528,10 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
                 task, self.tasks_treeView):
             return
 
-        # take_name
-        take_name = version.take_name
-        self.takes_listWidget.current_take_name = take_name
-
-        # select the version in the previous version list
-        self.previous_versions_tableWidget.select_version(version)
+        # take_name, after the takes of the task are loaded
+        self.background_loader.call_after(
+            'takes_listWidget', self.restore_take_and_version, version
+        )
 
         if not self.environment:
             # set the environment_comboBox
@@ -1406,6 +1548,23 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
                 if index:
                     self.environment_comboBox.setCurrentIndex(index)
 
+    def restore_take_and_version(self, version):
+        """selects the take and the given version in the previous versions
+        list
+
+        :param version: :class:`~stalker.models.version.Version` instance
+        """
+        # take_name
+        take_name = version.take_name
+        self.takes_listWidget.current_take_name = take_name
+
+        # select the version in the previous version list
+        self.background_loader.call_after(
+            'previous_versions_tableWidget',
+            self.previous_versions_tableWidget.select_version,
+            version
+        )
+
     def load_task_item_hierarchy(self, task, treeView):
         """loads the TaskItem related to the given task in the given treeView
 
@@ -1479,61 +1638,31 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         logger.debug('takes_listWidget_changed finished')
 
     def update_previous_versions_tableWidget(self):
-        """updates the previous_versions_tableWidget
+        """updates the previous_versions_tableWidget, the versions are
+        queried in the background
         """
         logger.debug('update_previous_versions_tableWidget is started')
         self.previous_versions_tableWidget.clear()
 
-        from stalker import Task
         task_id = self.get_task_id()
-        if not task_id:  # or not isinstance(task, Task):
-            return
-
-        # do not display any version for a container task
-        from stalker import db
-        children_count = db.DBSession\
-            .query(Task.id)\
-            .filter(Task.parent_id == task_id)\
-            .count()
-        if children_count > 0:
-            # clear the versions list
-            self.previous_versions_tableWidget.clear()
-            return
-
         # take name
         take_name = self.takes_listWidget.current_take_name
-
-        if take_name != '':
-            logger.debug("take_name: %s" % take_name)
-        else:
+        if not task_id or take_name == '':
+            # drop the result of the previous selection
+            self.background_loader.cancel('previous_versions_tableWidget')
             return
 
-        # query the Versions of this type and take
-        from stalker import db, Version
-        query = db.DBSession.query(
-            # use only the necessary fields
-            Version.id, Version.version_number,
-            Version.is_published, Version.created_with,
-            Version.created_by_id, Version.updated_by_id,
-            Version.full_path,  # convert to absolute full path
-            Version.description,
-        )\
-            .filter(Version.task_id == task_id) \
-            .filter(Version.take_name == take_name)
-
-        # get the published only
-        if self.show_published_only_checkBox.isChecked():
-            query = query.filter(Version.is_published == True)
-
-        # show how many
-        count = self.version_count_spinBox.value()
-
-        data_from_db = \
-            query.order_by(Version.version_number.desc()).limit(count).all()
-        versions = map(lambda x: VersionNT(*x), data_from_db)
-        versions.reverse()
-
-        self.previous_versions_tableWidget.update_content(versions)
+        logger.debug("take_name: %s" % take_name)
+
+        self.background_loader.load(
+            'previous_versions_tableWidget',
+            query_previous_versions,
+            self.previous_versions_tableWidget.update_content,
+            task_id,
+            take_name,
+            self.show_published_only_checkBox.isChecked(),
+            self.version_count_spinBox.value()
+        )
         logger.debug('update_previous_versions_tableWidget is finished')
 
     def get_task_id(self):
@@ -2027,17 +2156,31 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
         ui_utils.clear_thumbnail(self.thumbnail_graphicsView)
 
     def update_thumbnail(self):
-        """updates the thumbnail for the selected task
+        """updates the thumbnail for the selected task, the thumbnail is
+        queried and downloaded in the background
         """
         # get the current task
         task_id = self.get_task_id()
-        if task_id:
+        if not task_id:
+            # drop the thumbnail of the previous selection
+            self.background_loader.cancel('thumbnail_graphicsView')
+            return
+
+        from anima.ui import utils as ui_utils
+        self.background_loader.load(
+            'thumbnail_graphicsView',
+            ui_utils.query_task_thumbnail_full_path,
+            self.show_thumbnail,
+            task_id
+        )
+
+    def show_thumbnail(self, thumbnail_full_path):
+        """shows the given thumbnail in the thumbnail_graphicsView
+        """
+        if thumbnail_full_path:
             from anima.ui import utils as ui_utils
-            # TODO: Update this too
-            from stalker import Task
-            task = Task.query.get(task_id)
-            ui_utils.update_gview_with_task_thumbnail(
-                task,
+            ui_utils.update_gview_with_image_file(
+                thumbnail_full_path,
                 self.thumbnail_graphicsView
             )
 
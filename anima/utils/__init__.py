@@ -12,6 +12,8 @@ import calendar
 import datetime
 import shutil
 import tempfile
+import threading
+import time
 import uuid
 import copy
 import subprocess
@@ -113,69 +115,631 @@ def md5_checksum(path):
     import hashlib
 
     m = hashlib.md5()
-    with open(path) as f:
-        chunk = f.read(8192)
+    with open(path, 'rb') as f:
+        chunk = f.read(1 << 20)
         while chunk:
             m.update(chunk)
-            chunk = f.read(8192)
+            chunk = f.read(1 << 20)
     return m.digest()
 
 
+def copy_file_object(source, destination, hash_name=None,
+                     buffer_size=1 << 20):
+    """Copies the data of the given source file like object to the given
+    destination file from the current position of the source.
+
+    If a ``hash_name`` is given the data is hashed while it is copied, so the
+    data is read only once. The data is read in to one reusable buffer if the
+    source supports ``readinto()``.
+
+    If no hash is requested, the source is a regular file and
+    ``os.sendfile`` is available the data is copied by the kernel without
+    passing through Python.
+
+    :param source: A file like object to read the data from
+    :param destination: A file object opened in binary write mode
+    :param str hash_name: The name of a :mod:`hashlib` algorithm (ex. "sha1",
+      "md5"), no hash is calculated if it is skipped.
+    :param int buffer_size: The size of the reads in bytes
+    :return: The hex digest of the data if a ``hash_name`` is given, None
+      otherwise.
+    """
+    hasher = None
+    if hash_name:
+        import hashlib
+        hasher = hashlib.new(hash_name)
+
+    sendfile = getattr(os, 'sendfile', None)
+    if hasher is None and sendfile is not None:
+        import stat
+        try:
+            source_fd = source.fileno()
+            destination_fd = destination.fileno()
+        except (AttributeError, IOError, ValueError):
+            source_fd = None
+
+        if source_fd is not None \
+           and stat.S_ISREG(os.fstat(source_fd).st_mode):
+            offset = source.tell()
+            destination.flush()
+            while True:
+                sent = sendfile(destination_fd, source_fd, offset, buffer_size)
+                if not sent:
+                    break
+                offset += sent
+            source.seek(offset)
+            return
+
+    if hasattr(source, 'readinto'):
+        buffer_ = bytearray(buffer_size)
+        view = memoryview(buffer_)
+        while True:
+            size = source.readinto(buffer_)
+            if not size:
+                break
+            chunk = view[:size]
+            if hasher:
+                hasher.update(chunk)
+            destination.write(chunk)
+    else:
+        while True:
+            chunk = source.read(buffer_size)
+            if not chunk:
+                break
+            if hasher:
+                hasher.update(chunk)
+            destination.write(chunk)
+
+    if hasher:
+        return hasher.hexdigest()
+
+
+def write_zip_entry(zip_file, arcname, source, copies=(),
+                    buffer_size=1 << 20):
+    """Writes the data of the given source file like object to the given zip
+    file as one stored (uncompressed) entry from the current position of the
+    source.
+
+    It works like ``ZipFile.write()`` but reads a file like object instead of
+    a file on the disk, so the data does not need to be written to a file
+    first. The data is read only once, it is also written to the given
+    ``copies`` while it is written to the zip file.
+
+    :param zip_file: A ``zipfile.ZipFile`` instance opened in write mode
+    :param str arcname: The name of the entry in the zip file
+    :param source: A seekable file like object to read the data from
+    :param copies: A list of file objects opened in binary write mode that
+      the data is also written to.
+    :param int buffer_size: The size of the reads in bytes
+    """
+    import zipfile
+    import zlib
+
+    if not zip_file.fp:
+        raise RuntimeError(
+            'Attempt to write to ZIP archive that was already closed'
+        )
+
+    start = source.tell()
+    source.seek(0, 2)
+    file_size = source.tell() - start
+    source.seek(start)
+
+    zinfo = zipfile.ZipInfo(arcname, time.localtime()[0:6])
+    zinfo.external_attr = 0o644 << 16  # Unix attributes
+    zinfo.compress_type = zipfile.ZIP_STORED
+    zinfo.file_size = file_size
+    zinfo.flag_bits = 0x00
+    zinfo.header_offset = zip_file.fp.tell()
+
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+
+    # the CRC is written after the data, the sizes are known beforehand
+    zinfo.CRC = crc = 0
+    zinfo.compress_size = file_size
+    zip64 = zip_file._allowZip64 and file_size * 1.05 > zipfile.ZIP64_LIMIT
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+
+    size = 0
+    while True:
+        chunk = source.read(buffer_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        crc = zlib.crc32(chunk, crc) & 0xffffffff
+        zip_file.fp.write(chunk)
+        for copy_ in copies:
+            copy_.write(chunk)
+
+    if size != file_size:
+        raise RuntimeError(
+            'The size of %s has changed while it is zipped' % arcname
+        )
+
+    zinfo.CRC = crc
+    position = zip_file.fp.tell()
+    zip_file.fp.seek(zinfo.header_offset)
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    zip_file.fp.seek(position)
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+
+
 class StalkerThumbnailCache(object):
-    """A simple file cache system
+    """A persistent file cache for the thumbnails in Stalker server.
+
+    The cache logs in to the server once and keeps the session cookie and
+    one keep-alive connection per thread, so the thumbnails are downloaded
+    without a new login or a new connection for each file.
+
+    The cached files are kept under a size budget by removing the least
+    recently used files first. The cached files that are checked more than
+    :attr:`.max_age` seconds ago are revalidated with a conditional request
+    (``If-None-Match`` / ``If-Modified-Since``), and downloaded again only if
+    they are changed on the server.
+
+    The thumbnails can be downloaded concurrently with :meth:`.prefetch`,
+    the thumbnails of the tasks of a user are queried with
+    :meth:`.query_user_thumbnail_paths`.
+
+    :param str server_address: The address of the Stalker server, defaults
+      to ``anima.stalker_server_internal_address``.
+    :param str cache_path: The cache folder, defaults to the
+      ``anima.thumbnail_cache_folder_name`` folder under
+      ``anima.local_cache_folder``.
+    :param str login: The login of the user to download the thumbnails with.
+    :param str password: The password of the user.
+    :param int max_size: The size budget of the cache in bytes, defaults to
+      ``anima.thumbnail_cache_max_size``.
+    :param int max_age: The time in seconds a cached file is used without
+      being revalidated, defaults to ``anima.thumbnail_cache_max_age``.
+    :param float timeout: The timeout of the connections in seconds.
     """
 
+    index_file_name = 'index.json'
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, server_address=None, cache_path=None, login=None,
+                 password=None, max_size=None, max_age=None, timeout=30):
+        import anima
+        if server_address is None:
+            server_address = anima.stalker_server_internal_address
+        if cache_path is None:
+            cache_path = os.path.join(
+                os.path.expanduser(anima.local_cache_folder),
+                anima.thumbnail_cache_folder_name
+            )
+        if max_size is None:
+            max_size = anima.thumbnail_cache_max_size
+        if max_age is None:
+            max_age = anima.thumbnail_cache_max_age
+
+        self.server_address = server_address.rstrip('/')
+        self.cache_path = cache_path
+        self.login = login
+        self.password = password
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timeout = timeout
+
+        import cookielib
+        self.cookie_jar = cookielib.CookieJar()
+        self.logged_in = False
+
+        self.lock = threading.RLock()
+        self.connections = threading.local()
+        self.index = None
+
     @classmethod
-    def get(cls, thumbnail_full_path, login=None, password=None):
-        """returns the file either from cache or from stalker server
+    def default(cls):
+        """Returns the StalkerThumbnailCache shared in this session, which
+        logs in with the ``anima.stalker_dummy_user_login`` user.
+
+        :return: :class:`.StalkerThumbnailCache`
         """
-        import anima
+        with cls._default_lock:
+            if cls._default is None:
+                import anima
+                cls._default = cls(
+                    login=anima.stalker_dummy_user_login,
+                    password=anima.stalker_dummy_user_pass
+                )
+        return cls._default
 
-        # look up in the cache first
-        filename = os.path.basename(thumbnail_full_path)
-        logger.debug('filename : %s' % filename)
+    @property
+    def index_file_full_path(self):
+        """the path of the file that keeps the cache entries
+        """
+        return os.path.join(self.cache_path, self.index_file_name)
+
+    def cached_file_full_path(self, thumbnail_full_path):
+        """Returns the cache path of the given thumbnail.
 
-        cache_path = os.path.expanduser(anima.local_cache_folder)
-        cached_file_full_path = os.path.join(cache_path, filename)
+        The thumbnails of different tasks generally have the same file name,
+        so the file name is generated from the hash of the whole path.
 
-        url = '%s/%s' % (
-            anima.stalker_server_internal_address,
-            thumbnail_full_path
+        :param str thumbnail_full_path: The path of the thumbnail in the server
+        :return str:
+        """
+        import hashlib
+        extension = os.path.splitext(thumbnail_full_path)[-1]
+        if isinstance(thumbnail_full_path, unicode):
+            thumbnail_full_path = thumbnail_full_path.encode('utf-8')
+        return os.path.join(
+            self.cache_path,
+            '%s%s' % (hashlib.md5(thumbnail_full_path).hexdigest(), extension)
         )
-        login_url = '%s/login' % anima.stalker_server_internal_address
 
-        logger.debug('cache_path            : %s' % cache_path)
-        logger.debug('cached_file_full_path : %s' % cached_file_full_path)
-        logger.debug('url                   : %s' % url)
+    def load_index(self):
+        """Reads the cache entries from the index file, the entries of the
+        missing files are skipped.
+        """
+        import json
+        with self.lock:
+            if self.index is not None:
+                return
+            index = {}
+            try:
+                with open(self.index_file_full_path) as f:
+                    index = json.load(f)
+            except (IOError, OSError, ValueError):
+                pass
+
+            self.index = dict(
+                (filename, entry) for filename, entry in index.items()
+                if os.path.exists(os.path.join(self.cache_path, filename))
+            )
+
+    def save_index(self):
+        """Writes the cache entries to the index file
+        """
+        import json
+        with self.lock:
+            if self.index is None:
+                return
+            if not os.path.exists(self.cache_path):
+                os.makedirs(self.cache_path)
+            temp_path = '%s.%s' % (self.index_file_full_path, uuid.uuid4().hex)
+            with open(temp_path, 'w') as f:
+                json.dump(self.index, f)
+            if os.path.exists(self.index_file_full_path) \
+               and platform.system() == 'Windows':
+                os.remove(self.index_file_full_path)
+            os.rename(temp_path, self.index_file_full_path)
+
+    @property
+    def size(self):
+        """the total size of the cached files in bytes
+        """
+        self.load_index()
+        with self.lock:
+            return sum(entry['size'] for entry in self.index.values())
+
+    def evict(self):
+        """Removes the least recently used files until the cache fits in to
+        the size budget.
+        """
+        self.load_index()
+        with self.lock:
+            total_size = sum(entry['size'] for entry in self.index.values())
+            entries = sorted(
+                self.index.items(), key=lambda item: item[1]['accessed']
+            )
+            for filename, entry in entries:
+                if total_size <= self.max_size:
+                    break
+                logger.debug('removing from thumbnail cache: %s' % filename)
+                try:
+                    os.remove(os.path.join(self.cache_path, filename))
+                except OSError:
+                    pass
+                del self.index[filename]
+                total_size -= entry['size']
+
+    def get_connection(self):
+        """Returns the connection of the current thread, a new connection is
+        created if there is none.
+        """
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None:
+            import httplib
+            import urlparse
+            url = urlparse.urlparse(self.server_address)
+            if url.scheme == 'https':
+                connection_class = httplib.HTTPSConnection
+            else:
+                connection_class = httplib.HTTPConnection
+            connection = connection_class(url.netloc, timeout=self.timeout)
+            self.connections.connection = connection
+        return connection
+
+    def close_connection(self):
+        """Closes the connection of the current thread
+        """
+        connection = getattr(self.connections, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.connections.connection = None
+
+    def request(self, method, url, body=None, headers=None):
+        """Sends a request through the connection of the current thread with
+        the session cookies.
+
+        The connection is opened again and the request is sent once more if
+        the server has closed the keep-alive connection.
+
+        :param str method: The HTTP method
+        :param str url: The full url
+        :param str body: The request body
+        :param dict headers: The request headers
+        :return: (int, dict, str) The status, the headers and the body of the
+          response.
+        """
+        import httplib
+        import socket
+        import urllib2
+        import urlparse
+
+        request = urllib2.Request(url, body, headers or {})
+        self.cookie_jar.add_cookie_header(request)
+        request_headers = dict(request.header_items())
+        if body is not None:
+            request_headers.setdefault(
+                'Content-Type', 'application/x-www-form-urlencoded'
+            )
+
+        parsed_url = urlparse.urlparse(url)
+        path = parsed_url.path or '/'
+        if parsed_url.query:
+            path = '%s?%s' % (path, parsed_url.query)
+
+        for i in range(2):
+            connection = self.get_connection()
+            try:
+                connection.request(method, path, body, request_headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (httplib.HTTPException, socket.error):
+                self.close_connection()
+                if i:
+                    raise
+
+        class CookieResponse(object):
+            """adapts the httplib response to cookielib
+            """
+            def info(self):
+                return response.msg
+
+        self.cookie_jar.extract_cookies(CookieResponse(), request)
+
+        if response.getheader('connection', '').lower() == 'close':
+            self.close_connection()
+
+        response_headers = dict(
+            (key.lower(), value) for key, value in response.getheaders()
+        )
+        return response.status, response_headers, data
 
-        if not os.path.exists(cached_file_full_path) and login and password:
-            # download the file and put it on to the cache
-            import urllib
-            import urllib2
-            import cookielib
+    def log_in(self):
+        """Logs in to the server, the session cookie is used by all the
+        following requests.
 
-            cj = cookielib.CookieJar()
-            opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cj))
+        A RuntimeError is raised if the login is failed, that is the server
+        returns an error status or does not set a session cookie (ex. it
+        returns the login page again).
+        """
+        import urllib
+        with self.lock:
+            if self.logged_in:
+                return
             login_data = urllib.urlencode({
-                'login': login,
-                'password': password,
+                'login': self.login,
+                'password': self.password,
                 'submit': True
             })
-            opener.open(login_url, login_data)
+            # drop the cookies of the previous session
+            self.cookie_jar.clear()
+            status, headers, data = self.request(
+                'POST', '%s/login' % self.server_address, login_data
+            )
+            if status >= 400 or not len(self.cookie_jar):
+                raise RuntimeError(
+                    'could not log in to %s as %s (status: %s)' %
+                    (self.server_address, self.login, status)
+                )
+            self.logged_in = True
 
-            resp = opener.open(url)
-            data = resp.read()
+    def download(self, thumbnail_full_path, entry=None):
+        """Downloads the given thumbnail, the download is skipped if the given
+        cache entry is still valid.
+
+        :param str thumbnail_full_path: The path of the thumbnail in the server
+        :param dict entry: The cache entry of the thumbnail
+        :return: (int, dict, str) The status, the headers and the body of the
+          response.
+        """
+        url = '%s/%s' % (self.server_address, thumbnail_full_path)
+        logger.debug('url : %s' % url)
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        self.log_in()
+        status, response_headers, data = \
+            self.request('GET', url, headers=headers)
+
+        if status in (401, 403):
+            # the session is expired, log in again
+            with self.lock:
+                self.logged_in = False
+            self.log_in()
+            status, response_headers, data = \
+                self.request('GET', url, headers=headers)
+
+        return status, response_headers, data
+
+    def fetch(self, thumbnail_full_path):
+        """Returns the cached file path of the given thumbnail, downloads or
+        revalidates the file if needed, without saving the index file.
+
+        :param str thumbnail_full_path: The path of the thumbnail in the server
+        :return str:
+        """
+        self.load_index()
 
-            # put it in to a file
-            # TODO: from header decide ascii or binary mode
-            if not os.path.exists(cache_path):
-                os.makedirs(cache_path)
+        cached_file_full_path = \
+            self.cached_file_full_path(thumbnail_full_path)
+        filename = os.path.basename(cached_file_full_path)
+        logger.debug('cached_file_full_path : %s' % cached_file_full_path)
 
-            with open(cached_file_full_path, 'wb') as f:
+        now = time.time()
+        with self.lock:
+            entry = self.index.get(filename)
+            if entry:
+                entry['accessed'] = now
+
+        can_download = \
+            self.server_address and self.login and self.password
+        if not can_download \
+           or (entry and now - entry['checked'] < self.max_age):
+            return cached_file_full_path
+
+        status, headers, data = self.download(thumbnail_full_path, entry)
+        if status == 304 and entry:
+            with self.lock:
+                entry['checked'] = now
+        elif status == 200:
+            if not os.path.exists(self.cache_path):
+                try:
+                    os.makedirs(self.cache_path)
+                except OSError:  # created by another thread
+                    pass
+            temp_path = '%s.%s' % (cached_file_full_path, uuid.uuid4().hex)
+            with open(temp_path, 'wb') as f:
                 f.write(data)
+            if platform.system() == 'Windows' \
+               and os.path.exists(cached_file_full_path):
+                os.remove(cached_file_full_path)
+            os.rename(temp_path, cached_file_full_path)
+
+            with self.lock:
+                self.index[filename] = {
+                    'path': thumbnail_full_path,
+                    'size': len(data),
+                    'etag': headers.get('etag'),
+                    'last_modified': headers.get('last-modified'),
+                    'checked': now,
+                    'accessed': now,
+                }
+        else:
+            logger.debug(
+                'could not download %s: %s' % (thumbnail_full_path, status)
+            )
+
+        return cached_file_full_path
+
+    def get(self, thumbnail_full_path, login=None, password=None):
+        """returns the file either from cache or from stalker server
 
+        :param str thumbnail_full_path: The path of the thumbnail in the server
+        :param str login: The login of the user, it is used for the following
+          calls too.
+        :param str password: The password of the user
+        :return str: The path of the cached file
+        """
+        if login and password:
+            with self.lock:
+                if (login, password) != (self.login, self.password):
+                    self.logged_in = False
+                self.login = login
+                self.password = password
+
+        cached_file_full_path = self.fetch(thumbnail_full_path)
+        self.evict()
+        self.save_index()
         return cached_file_full_path
 
+    def prefetch(self, thumbnail_full_paths, max_workers=4, wait=True):
+        """Downloads the given thumbnails concurrently.
+
+        :param thumbnail_full_paths: A list of thumbnail paths in the server
+        :param int max_workers: The number of concurrent downloads
+        :param bool wait: Waits for the downloads to finish if True,
+          otherwise the downloads are done in the background.
+        :return: The list of the cached file paths in the order of the given
+          thumbnails (None for the failed downloads), or an
+          :class:`multiprocessing.pool.AsyncResult` returning the same list if
+          wait is False.
+        """
+        from multiprocessing.pool import ThreadPool
+
+        def fetch(thumbnail_full_path):
+            try:
+                return self.fetch(thumbnail_full_path)
+            except Exception as e:
+                logger.debug(
+                    'could not prefetch %s: %s' % (thumbnail_full_path, e)
+                )
+
+        def finish(cached_file_full_paths):
+            self.evict()
+            self.save_index()
+
+        thumbnail_full_paths = list(thumbnail_full_paths)
+        pool = ThreadPool(max(1, min(max_workers, len(thumbnail_full_paths))))
+        result = pool.map_async(
+            fetch, thumbnail_full_paths, chunksize=1, callback=finish
+        )
+        pool.close()
+        if wait:
+            cached_file_full_paths = result.get()
+            pool.join()
+            return cached_file_full_paths
+        return result
+
+    @classmethod
+    def query_user_thumbnail_paths(cls, user_id):
+        """Returns the paths of the thumbnails of the Tasks of the given User
+        and the parents of these Tasks, with one query. The paths can be
+        downloaded with :meth:`.prefetch`.
+
+        The query returns plain data, so it can run in a worker thread.
+
+        :param int user_id: The id of the User
+        :return: A sorted list of the thumbnail paths in the server
+        """
+        from sqlalchemy import text
+        from stalker import db
+        sql = """WITH RECURSIVE task_hierarchy(id, parent_id) AS (
+            SELECT "Tasks".id, "Tasks".parent_id
+            FROM "Tasks"
+            JOIN "Task_Resources" ON "Task_Resources".task_id = "Tasks".id
+            WHERE "Task_Resources".resource_id = :user_id
+        UNION
+            SELECT "Tasks".id, "Tasks".parent_id
+            FROM "Tasks"
+            JOIN task_hierarchy ON task_hierarchy.parent_id = "Tasks".id
+        )
+        SELECT "Links".full_path
+        FROM task_hierarchy
+        JOIN "SimpleEntities" ON "SimpleEntities".id = task_hierarchy.id
+        JOIN "Links" ON "Links".id = "SimpleEntities".thumbnail_id
+        """
+        result = db.DBSession\
+            .connection()\
+            .execute(text(sql), user_id=user_id)\
+            .fetchall()
+
+        return sorted(set(full_path for (full_path, ) in result))
+
 
 def multiple_replace(text, adict):
     rx = re.compile('|'.join(map(re.escape, adict)))
@@ -279,6 +843,551 @@ def local_to_utc(local_dt):
     return local_dt - (utc_to_local(local_dt) - local_dt)
 
 
+class ImageSequence(object):
+    """An image sequence on disk.
+
+    The frame files should be named as ``<prefix><frame number><extension>``
+    (ex. "plate.0001.exr", "plate_0001.exr"), use :meth:`.find` to group a
+    list of files or the content of a directory in to image sequences.
+
+    :param str path: The directory of the sequence
+    :param str prefix: The file name part before the frame number
+    :param int padding: The number of digits of the frame numbers
+    :param str extension: The file extension with the dot
+    :param frames: A list of frame numbers
+    """
+
+    frame_number_re = re.compile(r'^(.*?)(\d+)(\.[^.\d][^.]*)$')
+
+    def __init__(self, path, prefix, padding, extension, frames=None):
+        self.path = path
+        self.prefix = prefix
+        self.padding = padding
+        self.extension = extension
+        self.frames = sorted(frames or [])
+
+    def __repr__(self):
+        return '<ImageSequence %s [%s-%s]>' % (
+            self.hash_pattern, self.start_frame, self.end_frame
+        )
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def name(self):
+        """the name of the sequence without the frame number and separators
+        """
+        return self.prefix.rstrip('._-') or 'image_sequence'
+
+    @property
+    def start_frame(self):
+        return self.frames[0] if self.frames else None
+
+    @property
+    def end_frame(self):
+        return self.frames[-1] if self.frames else None
+
+    @property
+    def pattern(self):
+        """the printf style path pattern that ffmpeg image2 demuxer accepts
+        (ex. /path/plate.%04d.exr)
+        """
+        return os.path.join(
+            self.path,
+            '%s%%0%sd%s' % (self.prefix, self.padding, self.extension)
+        )
+
+    @property
+    def hash_pattern(self):
+        """the path pattern with hash characters (ex. /path/plate.####.exr)
+        """
+        return os.path.join(
+            self.path,
+            '%s%s%s' % (self.prefix, '#' * self.padding, self.extension)
+        )
+
+    def frame_full_path(self, frame):
+        """returns the full path of the given frame
+
+        :param int frame: The frame number
+        :return str:
+        """
+        return self.pattern % frame
+
+    @property
+    def files(self):
+        """the full paths of all the frames
+        """
+        return [self.frame_full_path(frame) for frame in self.frames]
+
+    @classmethod
+    def find(cls, paths, min_length=2):
+        """Groups the given file paths in to image sequences.
+
+        A sequence holds consecutive frames only, the files with the same
+        name pattern are split in to separate sequences at the missing
+        frames. So unrelated files like "IMG_0001.jpg" and "IMG_0120.jpg" are
+        not grouped together.
+
+        :param paths: A list of file paths or a directory path
+        :param int min_length: The minimum number of frames of a sequence,
+          the files of shorter sequences are returned as single files.
+        :return: (list, list) The :class:`.ImageSequence` instances and the
+          paths of the files that are not part of a sequence
+        """
+        if isinstance(paths, basestring):
+            directory = paths
+            paths = [
+                os.path.join(directory, filename)
+                for filename in sorted(os.listdir(directory))
+                if os.path.isfile(os.path.join(directory, filename))
+            ]
+
+        sequences = {}
+        order = []
+        singles = []
+        for path in paths:
+            directory, filename = os.path.split(path)
+            match = cls.frame_number_re.match(filename)
+            if not match:
+                singles.append(path)
+                continue
+            prefix, frame, extension = match.groups()
+            key = (directory, prefix, len(frame), extension)
+            if key not in sequences:
+                sequences[key] = []
+                order.append(key)
+            sequences[key].append((int(frame), path))
+
+        image_sequences = []
+        for key in order:
+            directory, prefix, padding, extension = key
+            # split in to runs of consecutive frames
+            runs = []
+            for frame, path in sorted(sequences[key]):
+                if runs and frame == runs[-1][-1][0] + 1:
+                    runs[-1].append((frame, path))
+                else:
+                    runs.append([(frame, path)])
+
+            for frames in runs:
+                if len(frames) < min_length:
+                    singles.extend([path for frame, path in frames])
+                    continue
+                image_sequences.append(
+                    cls(directory, prefix, padding, extension,
+                        [frame for frame, path in frames])
+                )
+
+        return image_sequences, singles
+
+
+class MediaJob(object):
+    """A media conversion job, which runs the given function with the given
+    arguments in a :class:`.MediaJobQueue`.
+
+    The status of the job can be polled with the :attr:`.status` attribute
+    and the result can be waited with :meth:`.wait`.
+
+    :param function: The function to run
+    :param args: The positional arguments of the function
+    :param kwargs: The keyword arguments of the function
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, function, args=None, kwargs=None):
+        import threading
+        self.function = function
+        self.args = args or ()
+        self.kwargs = kwargs or {}
+        self.status = self.PENDING
+        self.result = None
+        self.error = None
+        self.link = None
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def __repr__(self):
+        return '<MediaJob %s (%s)>' % (
+            getattr(self.function, '__name__', self.function), self.status
+        )
+
+    @property
+    def finished(self):
+        """returns True if the job is done or failed
+        """
+        return self._finished.is_set()
+
+    def run(self):
+        """Runs the job in the current thread
+        """
+        self.status = self.RUNNING
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+            self.status = self.DONE
+        except Exception as e:
+            logger.debug('media job failed: %s' % e)
+            self.error = e
+            self.status = self.FAILED
+        finally:
+            with self._lock:
+                self._finished.set()
+                callbacks = self._callbacks
+                self._callbacks = []
+            for callback in callbacks:
+                self._call(callback)
+
+    def _call(self, callback):
+        """calls the given done callback with this job, the errors are only
+        logged
+        """
+        try:
+            callback(self)
+        except Exception as e:
+            logger.debug('media job callback failed: %s' % e)
+
+    def add_done_callback(self, callback):
+        """Adds a function which is called with this job when the job is
+        finished, in the thread that runs the job. It is called immediately
+        if the job is already finished.
+
+        :param callback: A function that accepts the job
+        """
+        with self._lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def wait(self, timeout=None):
+        """Waits for the job to finish and returns the result, raises the
+        error of the job if it is failed.
+
+        :param float timeout: The maximum time to wait in seconds, a
+          RuntimeError is raised if the job is not finished in time.
+        :return: The result of the job function
+        """
+        # Event.wait() without a timeout can not be interrupted
+        if timeout is None:
+            while not self._finished.wait(1):
+                pass
+        elif not self._finished.wait(timeout):
+            raise RuntimeError('%r is not finished in %s seconds' %
+                               (self, timeout))
+
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class MediaJobQueue(object):
+    """Runs media conversion jobs in a bounded pool of worker threads.
+
+    The conversions are mostly done by external processes (ffmpeg) or by
+    libraries that release the GIL, so threads are enough to run them
+    concurrently.
+
+    :param int max_workers: The maximum number of jobs running at the same
+      time, defaults to the CPU count.
+    """
+
+    def __init__(self, max_workers=None):
+        import Queue
+        import threading
+        if max_workers is None:
+            import multiprocessing
+            max_workers = multiprocessing.cpu_count()
+        self.max_workers = max(1, max_workers)
+        self.queue = Queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def _work(self):
+        """the worker thread loop
+        """
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:  # stop
+                    break
+                job.run()
+            finally:
+                self.queue.task_done()
+
+    def submit(self, function, *args, **kwargs):
+        """Submits a new job to the queue
+
+        :param function: The function to run
+        :param args: The positional arguments of the function
+        :param kwargs: The keyword arguments of the function
+        :return: :class:`.MediaJob`
+        """
+        import threading
+        job = MediaJob(function, args, kwargs)
+        with self.lock:
+            # start the workers with the first job
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+            self.queue.put(job)
+        return job
+
+    @classmethod
+    def wait(cls, jobs, timeout=None):
+        """Waits for all the given jobs to finish.
+
+        :param jobs: A list of :class:`.MediaJob` instances
+        :param float timeout: The maximum time to wait in seconds for each job
+        :return: list The results of the jobs
+        """
+        return [job.wait(timeout) for job in jobs]
+
+    def shutdown(self, wait=True):
+        """Stops the workers after the submitted jobs are finished
+
+        :param bool wait: Waits for the workers to stop if True.
+        """
+        with self.lock:
+            workers = self.workers
+            self.workers = []
+            for i in range(len(workers)):
+                self.queue.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+class ContentStore(object):
+    """A content addressed file store.
+
+    The files are stored once under ``objects`` folder with their hash as
+    the file name, and the files with the same content are replaced with hard
+    links (or symbolic links) to the stored file. The files generated from a
+    stored file (web versions, thumbnails etc.) are stored under
+    ``derivatives`` folder with the hash of the source file and a kind name,
+    so they can be reused instead of being generated again.
+
+    The paths linked to every stored file are recorded under ``refs`` folder
+    and used in :meth:`.statistics` to calculate the space saved.
+
+    :param str path: The root folder of the store. It should be on the same
+      file system with the linked files for hard links.
+    :param str link_type: "hardlink" or "symlink". The hard links fall back to
+      symbolic links if they are not possible (ex. the files are on another
+      device) and the symbolic links fall back to copies.
+    :param str hash_name: The :mod:`hashlib` algorithm name of the hashes.
+    """
+
+    link_types = ['hardlink', 'symlink']
+
+    def __init__(self, path, link_type='hardlink', hash_name='sha1'):
+        if link_type not in self.link_types:
+            raise ValueError(
+                'link_type should be one of %s, not %s' %
+                (self.link_types, link_type)
+            )
+
+        import threading
+        self.path = path
+        self.link_type = link_type
+        self.hash_name = hash_name
+        self.lock = threading.RLock()
+
+    def object_path(self, digest):
+        """returns the path of the stored file with the given hash
+
+        :param str digest: The hex digest of the file content
+        :return str:
+        """
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def derivative_path(self, digest, kind, extension=''):
+        """returns the path of the derivative of the given kind of the stored
+        file with the given hash
+
+        :param str digest: The hex digest of the source file content
+        :param str kind: The kind of the derivative (ex. "ForWeb",
+          "Thumbnail")
+        :param str extension: The file extension of the derivative
+        :return str:
+        """
+        return os.path.join(
+            self.path, 'derivatives', digest[:2],
+            '%s.%s%s' % (digest, kind, extension)
+        )
+
+    def find_derivative(self, digest, kind):
+        """returns the path of the derivative of the given kind of the stored
+        file with the given hash or None if there is no such derivative.
+
+        :param str digest: The hex digest of the source file content
+        :param str kind: The kind of the derivative
+        :return str:
+        """
+        import glob
+        paths = glob.glob('%s.*' % self.derivative_path(digest, kind))
+        if paths:
+            return paths[0]
+
+    def link(self, stored_path, file_full_path):
+        """Links the given stored file to the given path and records the link
+
+        :param str stored_path: The path of a stored file
+        :param str file_full_path: The path to create the link at
+        """
+        try:
+            os.makedirs(os.path.dirname(file_full_path))
+        except OSError:  # path exists
+            pass
+
+        linked = False
+        if self.link_type == 'hardlink' and hasattr(os, 'link'):
+            try:
+                os.link(stored_path, file_full_path)
+                linked = True
+            except OSError:
+                # another device or file system without hard links
+                pass
+
+        if not linked:
+            if hasattr(os, 'symlink'):
+                os.symlink(os.path.abspath(stored_path), file_full_path)
+            else:
+                shutil.copy2(stored_path, file_full_path)
+
+        refs_path = os.path.join(
+            self.path, 'refs', os.path.relpath(stored_path, self.path)
+        )
+        with self.lock:
+            try:
+                os.makedirs(os.path.dirname(refs_path))
+            except OSError:  # path exists
+                pass
+            with open(refs_path, 'a') as f:
+                f.write('%s\n' % os.path.abspath(file_full_path))
+
+    def store(self, stored_path, file_full_path):
+        """Stores the given file under the given store path. If there is
+        already a file in the store path the given file is removed. The file
+        path is replaced with a link to the stored file in both cases.
+
+        :param str stored_path: The path in the store
+        :param str file_full_path: The path of the file to be stored
+        :return bool: True if the file was already stored
+        """
+        with self.lock:
+            duplicate = os.path.exists(stored_path)
+            if duplicate:
+                os.remove(file_full_path)
+            else:
+                try:
+                    os.makedirs(os.path.dirname(stored_path))
+                except OSError:  # path exists
+                    pass
+                shutil.move(file_full_path, stored_path)
+            self.link(stored_path, file_full_path)
+
+        return duplicate
+
+    def add(self, file_full_path, digest):
+        """Adds the given file with the given hash to the store.
+
+        :param str file_full_path: The path of the file
+        :param str digest: The hex digest of the file content
+        :return bool: True if the file was already stored
+        """
+        return self.store(self.object_path(digest), file_full_path)
+
+    def add_derivative(self, digest, kind, file_full_path):
+        """Adds the given file as the derivative of the given kind of the
+        stored file with the given hash.
+
+        :param str digest: The hex digest of the source file content
+        :param str kind: The kind of the derivative
+        :param str file_full_path: The path of the derivative file
+        :return bool: True if there was already a derivative of this kind
+        """
+        with self.lock:
+            stored_path = self.find_derivative(digest, kind)
+            if stored_path is None:
+                stored_path = self.derivative_path(
+                    digest, kind, os.path.splitext(file_full_path)[-1]
+                )
+            return self.store(stored_path, file_full_path)
+
+    def link_derivative(self, digest, kind, file_full_path):
+        """Links the derivative of the given kind of the stored file with the
+        given hash to the given path. The extension of the path is replaced
+        with the extension of the stored derivative.
+
+        :param str digest: The hex digest of the source file content
+        :param str kind: The kind of the derivative
+        :param str file_full_path: The desired path of the derivative
+        :return str: The path of the link or None if there is no derivative
+        """
+        stored_path = self.find_derivative(digest, kind)
+        if stored_path is None:
+            return None
+
+        full_path = '%s%s' % (
+            os.path.splitext(file_full_path)[0],
+            os.path.splitext(stored_path)[-1]
+        )
+        self.link(stored_path, full_path)
+        return full_path
+
+    def statistics(self):
+        """returns the statistics of the store
+
+        :return dict: The number of the stored files, the number of the links
+          to them, the stored size and the size saved by linking in bytes.
+        """
+        stats = {
+            'files': 0,
+            'links': 0,
+            'stored_size': 0,
+            'saved_size': 0,
+        }
+        refs_root = os.path.join(self.path, 'refs')
+        for root, dirs, files in os.walk(refs_root):
+            for filename in files:
+                refs_path = os.path.join(root, filename)
+                stored_path = os.path.join(
+                    self.path, os.path.relpath(refs_path, refs_root)
+                )
+                if not os.path.exists(stored_path):
+                    continue
+                with open(refs_path) as f:
+                    link_count = len([line for line in f if line.strip()])
+                size = os.path.getsize(stored_path)
+                stats['files'] += 1
+                stats['links'] += link_count
+                stats['stored_size'] += size
+                stats['saved_size'] += size * max(0, link_count - 1)
+        return stats
+
+    def report(self):
+        """returns the statistics of the store as a printable string
+
+        :return str:
+        """
+        stats = self.statistics()
+        return '\n'.join([
+            'Stored files : %s' % stats['files'],
+            'Links        : %s' % stats['links'],
+            'Stored size  : %3.3f MB' % (stats['stored_size'] / 1048576.0),
+            'Saved size   : %3.3f MB' % (stats['saved_size'] / 1048576.0),
+        ])
+
+
 class MediaManager(object):
     """Manages media files.
 
@@ -299,6 +1408,14 @@ class MediaManager(object):
     It will generate a zip file to serve all the images in an image sequence.
     """
 
+    # the attributes passed to the worker processes of
+    # generate_images_thumbnail_and_web()
+    image_setting_names = [
+        'thumbnail_format', 'thumbnail_width', 'thumbnail_height',
+        'thumbnail_options', 'web_image_format', 'web_image_width',
+        'web_image_height',
+    ]
+
     def __init__(self):
         self.reference_path = 'References/Stalker_Pyramid/'
         self.version_output_path = 'Outputs/Stalker_Pyramid/'
@@ -337,81 +1454,190 @@ class MediaManager(object):
         self.web_video_height = 540
         self.web_video_bitrate = 4096  # in kBits/sec
 
+        # uploads
+        self.upload_buffer_size = 1 << 20
+        self.upload_hash_name = 'sha1'
+
+        # the frame rate of the web versions of image sequences
+        self.image_sequence_frame_rate = 25
+
+        # grab the three frames of the video thumbnails with one seeking
+        # ffmpeg call instead of decoding the video three times
+        self.single_pass_video_thumbnails = True
+
+        # cached get_video_info() results
+        self.video_info_cache = {}
+
+        # the web version and thumbnail conversions of the uploads are run in
+        # a MediaJobQueue with this many workers (defaults to the CPU count)
+        self.max_conversion_jobs = None
+        self.job_queue = None
+        self.conversion_jobs = []
+        self.conversion_jobs_lock = threading.Lock()
+        # the successful conversions are forgotten when they are finished,
+        # but the failed ones and the ones that should update the path of
+        # their Link are kept until they are waited, this many of them at most
+        self.max_finished_conversion_jobs = 100
+
+        # an optional ContentStore to deduplicate the version outputs, the
+        # web versions and thumbnails of the same files are also reused
+        self.content_store = None
+
         # commands
         import anima
         self.ffmpeg_command_path = anima.ffmpeg_command_path
         self.ffprobe_command_path = anima.ffprobe_command_path
 
     @classmethod
-    def reorient_image(cls, img):
-        """re-orients rotated images by looking at EXIF data
+    def get_image_orientation(cls, img):
+        """Returns the EXIF orientation of the given image.
+
+        The orientation is read from the EXIF data of the already opened
+        image, so the file is not opened again.
+
+        :param img: A PIL Image instance
+        :return int: The EXIF orientation (1-8), 1 if the image has no
+          orientation information.
         """
-        # get the image rotation from EXIF information
-        import exifread
+        exif = None
+        try:
+            if hasattr(img, 'getexif'):
+                exif = img.getexif()
+            elif hasattr(img, '_getexif'):
+                exif = img._getexif()
+        except Exception as e:  # broken EXIF data
+            logger.debug('could not read EXIF data: %s' % e)
+
+        if not exif:
+            return 1
+
+        try:
+            orientation = int(exif.get(0x0112, 1))  # Image Orientation
+        except (TypeError, ValueError):
+            return 1
 
-        file_full_path = img.filename
+        if not 1 <= orientation <= 8:
+            return 1
+        return orientation
 
-        with open(file_full_path) as f:
-            tags = exifread.process_file(f)
+    @classmethod
+    def reorient_image(cls, img, orientation=None):
+        """re-orients rotated images by looking at EXIF data
 
-        orientation_string = tags.get('Image Orientation')
+        :param img: A PIL Image instance
+        :param int orientation: The EXIF orientation of the image, it is read
+          from the image if skipped.
+        """
+        if orientation is None:
+            orientation = cls.get_image_orientation(img)
 
         from PIL import Image
-        if orientation_string:
-            orientation = orientation_string.values[0]
-            if orientation == 1:
-                # do nothing
-                pass
-            elif orientation == 2:  # flipped in X
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            elif orientation == 3:  # rotated 180 degree
-                img = img.transpose(Image.ROTATE_180)
-            elif orientation == 4:  # flipped in Y
-                img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            elif orientation == 5:  #
-                img = img.transpose(Image.ROTATE_270)
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            elif orientation == 6:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            elif orientation == 7:
-                img = img.transpose(Image.ROTATE_90)
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            elif orientation == 8:
-                img = img.transpose(Image.ROTATE_90)
+        if orientation == 1:
+            # do nothing
+            pass
+        elif orientation == 2:  # flipped in X
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        elif orientation == 3:  # rotated 180 degree
+            img = img.transpose(Image.ROTATE_180)
+        elif orientation == 4:  # flipped in Y
+            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+        elif orientation == 5:  #
+            img = img.transpose(Image.ROTATE_270)
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        elif orientation == 6:
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        elif orientation == 7:
+            img = img.transpose(Image.ROTATE_90)
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        elif orientation == 8:
+            img = img.transpose(Image.ROTATE_90)
 
         return img
 
-    def generate_image_thumbnail(self, file_full_path):
-        """Generates a thumbnail for the given image file
-
-        :param file_full_path: Generates a thumbnail for the given file in the
-          given path
-        :return str: returns the thumbnail path
+    @classmethod
+    def open_image(cls, file_full_path, width, height):
+        """Opens and re-orients the given image to be scaled down to fit in to
+        the given size.
+
+        JPEG images are decoded in a lower resolution (with
+        :meth:`PIL.Image.Image.draft`) that is still bigger than the given
+        size, which is a lot faster than decoding the full image.
+
+        :param str file_full_path: The image path
+        :param int width: The width of the scaled image
+        :param int height: The height of the scaled image
+        :return: (PIL.Image.Image, str) The image and the format of the image
+          file, the format of the re-oriented images are not kept by PIL.
         """
-        # generate thumbnail for the image and save it to a tmp folder
-        suffix = self.thumbnail_format
-
         from PIL import Image
         img = Image.open(file_full_path)
-        # do a double scale
-        img.thumbnail((2 * self.thumbnail_width, 2 * self.thumbnail_height))
-        img.thumbnail((self.thumbnail_width, self.thumbnail_height),
-                      Image.ANTIALIAS)
+        image_format = img.format
+        orientation = cls.get_image_orientation(img)
+
+        # the image is rotated after it is decoded
+        if orientation >= 5:
+            width, height = height, width
 
-        # re-orient images
-        img = self.reorient_image(img)
+        if image_format == 'JPEG' \
+           and (img.size[0] > width or img.size[1] > height):
+            img.draft('RGB', (width, height))
 
-        if img.format == 'GIF':
+        return cls.reorient_image(img, orientation), image_format
+
+    @classmethod
+    def resize_image(cls, img, width, height):
+        """Scales down the given image in place to fit in to the given size,
+        smaller images are not changed.
+
+        :param img: A PIL Image instance
+        :param int width: The maximum width
+        :param int height: The maximum height
+        """
+        if img.size[0] > width or img.size[1] > height:
+            from PIL import Image
+            img.thumbnail((width, height), Image.ANTIALIAS)
+
+    @classmethod
+    def save_image(cls, img, image_format, suffix, options=None):
+        """Saves the given image to a temp file.
+
+        GIF images are saved as GIF, and the other images are saved as RGB
+        images in the format of the given suffix.
+
+        :param img: A PIL Image instance
+        :param str image_format: The format of the source image file
+        :param str suffix: The suffix of the temp file
+        :param dict options: The options passed to
+          :meth:`PIL.Image.Image.save`
+        :return str: The path of the saved image
+        """
+        if image_format == 'GIF':
             suffix = '.gif'  # force save in gif format
         else:
             # check if the image is in RGB mode
             if img.mode != "RGB":
                 img = img.convert("RGB")
 
-        thumbnail_path = tempfile.mktemp(suffix=suffix)
+        image_path = tempfile.mktemp(suffix=suffix)
 
-        img.save(thumbnail_path, **self.thumbnail_options)
-        return thumbnail_path
+        img.save(image_path, **(options or {}))
+        return image_path
+
+    def generate_image_thumbnail(self, file_full_path):
+        """Generates a thumbnail for the given image file
+
+        :param file_full_path: Generates a thumbnail for the given file in the
+          given path
+        :return str: returns the thumbnail path
+        """
+        # generate thumbnail for the image and save it to a tmp folder
+        img, image_format = self.open_image(
+            file_full_path, self.thumbnail_width, self.thumbnail_height
+        )
+        self.resize_image(img, self.thumbnail_width, self.thumbnail_height)
+        return self.save_image(
+            img, image_format, self.thumbnail_format, self.thumbnail_options
+        )
 
     def generate_image_for_web(self, file_full_path):
         """Generates a version suitable to be viewed from a web browser.
@@ -420,73 +1646,173 @@ class MediaManager(object):
           given path.
         :return str: returns the thumbnail path
         """
-        # generate thumbnail for the image and save it to a tmp folder
-        suffix = self.thumbnail_format
+        img, image_format = self.open_image(
+            file_full_path, self.web_image_width, self.web_image_height
+        )
+        self.resize_image(img, self.web_image_width, self.web_image_height)
+        return self.save_image(img, image_format, self.web_image_format)
 
-        from PIL import Image
-        img = Image.open(file_full_path)
-        if img.size[0] > self.web_image_width \
-           or img.size[1] > self.web_image_height:
-            # do a double scale
-            img.thumbnail(
-                (2 * self.web_image_width, 2 * self.web_image_height)
-            )
-            img.thumbnail(
-                (self.web_image_width, self.web_image_height),
-                Image.ANTIALIAS
-            )
+    def generate_image_thumbnail_and_web(self, file_full_path):
+        """Generates both the thumbnail and the web version of the given image
+        by decoding the image only once.
 
-        # re-orient images
-        img = self.reorient_image(img)
+        :param str file_full_path: The image path
+        :return: (str, str) The thumbnail and the web version paths
+        """
+        img, image_format = self.open_image(
+            file_full_path, self.web_image_width, self.web_image_height
+        )
+        self.resize_image(img, self.web_image_width, self.web_image_height)
+        web_path = self.save_image(img, image_format, self.web_image_format)
 
-        if img.format == 'GIF':
-            suffix = '.gif'  # force save in gif format
-        else:
-            # check if the image is in RGB mode
-            if img.mode != "RGB":
-                img = img.convert("RGB")
+        # the thumbnail is always smaller than the web version
+        self.resize_image(img, self.thumbnail_width, self.thumbnail_height)
+        thumbnail_path = self.save_image(
+            img, image_format, self.thumbnail_format, self.thumbnail_options
+        )
+        return thumbnail_path, web_path
 
-        thumbnail_path = tempfile.mktemp(suffix=suffix)
+    def get_image_settings(self):
+        """Returns the attributes used in image conversions, to be able to
+        set up a MediaManager in the worker processes of
+        :meth:`.generate_images_thumbnail_and_web`.
 
-        img.save(thumbnail_path)
-        return thumbnail_path
+        :return dict:
+        """
+        return dict(
+            (attr_name, getattr(self, attr_name))
+            for attr_name in self.image_setting_names
+        )
+
+    def generate_images_thumbnail_and_web(self, file_full_paths,
+                                          processes=None):
+        """Generates the thumbnails and web versions of the given images in a
+        pool of worker processes.
+
+        :param file_full_paths: A list of image paths
+        :param int processes: The number of worker processes, defaults to the
+          CPU count. The images are converted in the current process if it is
+          1 or there is only one image.
+        :return: A list of (thumbnail path, web version path) tuples in the
+          order of the given images.
+        """
+        file_full_paths = list(file_full_paths)
+
+        import multiprocessing
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        processes = max(1, min(processes, len(file_full_paths)))
+
+        if processes == 1:
+            return [
+                self.generate_image_thumbnail_and_web(file_full_path)
+                for file_full_path in file_full_paths
+            ]
+
+        settings = self.get_image_settings()
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(
+                _generate_image_thumbnail_and_web,
+                [(file_full_path, settings)
+                 for file_full_path in file_full_paths],
+                chunksize=1
+            )
+        finally:
+            pool.close()
+            pool.join()
 
     def generate_video_thumbnail(self, file_full_path):
         """Generates a thumbnail for the given video link
 
+        The thumbnail is a composition of three frames from the start, middle
+        and end of the video. If :attr:`.single_pass_video_thumbnails` is True
+        the frames are grabbed and composited in one ffmpeg call (see
+        :meth:`.generate_video_thumbnail_single_pass`), and it falls back to
+        :meth:`.generate_video_thumbnail_multi_pass` if that fails.
+
         :param str file_full_path: A string showing the full path of the video
           file.
         """
-        # TODO: split this in to two different methods, one generating
-        #       thumbnails from the video and another one accepting three
-        #       images
+        if self.single_pass_video_thumbnails:
+            thumbnail_path = \
+                self.generate_video_thumbnail_single_pass(file_full_path)
+            if thumbnail_path is not None:
+                return thumbnail_path
+        return self.generate_video_thumbnail_multi_pass(file_full_path)
+
+    def generate_video_thumbnail_filter(self, stream_specifier='v:0'):
+        """Returns the ffmpeg filter graph that composites the three frames of
+        a video thumbnail.
+
+        :param str stream_specifier: The stream specifier of the frames in
+          each input.
+        :return str:
+        """
+        return \
+            '[0:%(s)s]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];' \
+            '[1:%(s)s]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];' \
+            '[2:%(s)s]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];' \
+            '[s][e]overlay=%(tw)s/4:%(th)s-h[x];' \
+            '[x][m]overlay=%(tw)s/8:%(th)s/2-h/2' % {
+                's': stream_specifier,
+                'tw': self.thumbnail_width,
+                'th': self.thumbnail_height
+            }
+
+    @classmethod
+    def parse_frame_rate(cls, frame_rate):
+        """Parses the given frame rate string, which can be in Number/Number
+        format.
+
+        :param str frame_rate: The frame rate string (ex. "25", "30000/1001")
+        :return: float or None if the frame rate is missing or not positive
+        """
+        if frame_rate is None or frame_rate == 'N/A':
+            return None
+
+        try:
+            if '/' in frame_rate:
+                nominator, denominator = frame_rate.split('/')
+                if not float(denominator):
+                    return None
+                frame_rate = float(nominator) / float(denominator)
+            frame_rate = float(frame_rate)
+        except ValueError:
+            return None
+
+        if frame_rate <= 0:
+            return None
+        return frame_rate
+
+    def get_video_frame_info(self, file_full_path):
+        """Returns the number of frames and the frame rate of the given video.
+
+        :param str file_full_path: A string showing the full path of the video
+          file.
+        :return: (int, float)
+        """
         media_info = self.get_video_info(file_full_path)
-        video_info = media_info['video_info']
+        video_info = media_info['video_info'] or {}
 
         # get the correct stream
-        video_stream = None
+        video_stream = {}
         for stream in media_info['stream_info']:
-            if stream['codec_type'] == 'video':
+            if stream.get('codec_type') == 'video':
                 video_stream = stream
 
+        # first try to use "r_frame_rate", it can be "0/0" for some streams
+        frame_rate = self.parse_frame_rate(video_stream.get('r_frame_rate'))
+        if frame_rate is None:  # still no frame rate
+            # try to use the video_info and get frame rate
+            frame_rate = self.parse_frame_rate(
+                video_info.get('TAG:framerate')
+            ) or 23.976
+
         nb_frames = video_stream.get('nb_frames')
         if nb_frames is None or nb_frames == 'N/A':
-            # no nb_frames
-            # first try to use "r_frame_rate" and "duration"
-            frame_rate = video_stream.get('r_frame_rate')
-
-            if frame_rate is None:  # still no frame rate
-                # try to use the video_info and duration
-                # and try to get frame rate
-                frame_rate = float(video_info.get('TAG:framerate', 23.976))
-            else:
-                # check if it is in Number/Number format
-                if '/' in frame_rate:
-                    nominator, denominator = frame_rate.split('/')
-                    frame_rate = float(nominator)/float(denominator)
-
-            # get duration
-            duration = video_stream.get('duration')
+            # no nb_frames, use "duration"
+            duration = video_stream.get('duration', 'N/A')
             if duration == 'N/A':  # no duration
                 duration = float(video_info.get('duration', 1))
             else:
@@ -500,6 +1826,58 @@ class MediaManager(object):
             nb_frames = int(duration * frame_rate)
         nb_frames = int(nb_frames)
 
+        return nb_frames, frame_rate
+
+    def generate_video_thumbnail_single_pass(self, file_full_path):
+        """Generates a thumbnail for the given video by seeking to the three
+        frames on the input side, so ffmpeg starts decoding from the closest
+        keyframes instead of the start of the video, and composites them in
+        the same ffmpeg call.
+
+        Together with the (cached) ffprobe call there are at most two
+        processes.
+
+        :param str file_full_path: A string showing the full path of the video
+          file.
+        :return str: The thumbnail path or None if ffmpeg fails to generate
+          the thumbnail.
+        """
+        nb_frames, frame_rate = self.get_video_frame_info(file_full_path)
+
+        # generate three thumbnails from the start, middle and end of the file
+        frames = [
+            int(nb_frames * 0.10),
+            int(nb_frames * 0.5),
+            max(0, int(nb_frames * 0.90) - 1),
+        ]
+
+        thumbnail_path = tempfile.mktemp(suffix=self.thumbnail_format)
+        self.ffmpeg(**{
+            'inputs': [
+                (file_full_path, {'ss': '%.3f' % (frame / frame_rate)})
+                for frame in frames
+            ],
+            'filter_complex': self.generate_video_thumbnail_filter(),
+            'frames:v': 1,
+            'o': thumbnail_path
+        })
+
+        if not os.path.exists(thumbnail_path):
+            return None
+        return thumbnail_path
+
+    def generate_video_thumbnail_multi_pass(self, file_full_path):
+        """Generates a thumbnail for the given video by decoding it once for
+        every frame and compositing the frames in another ffmpeg call.
+
+        :param str file_full_path: A string showing the full path of the video
+          file.
+        """
+        # TODO: split this in to two different methods, one generating
+        #       thumbnails from the video and another one accepting three
+        #       images
+        nb_frames, frame_rate = self.get_video_frame_info(file_full_path)
+
         start_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
         mid_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
         end_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
@@ -509,13 +1887,13 @@ class MediaManager(object):
         # generate three thumbnails from the start, middle and end of the file
         start_frame = int(nb_frames * 0.10)
         mid_frame = int(nb_frames * 0.5)
-        end_frame = int(nb_frames * 0.90) - 1
+        end_frame = max(0, int(nb_frames * 0.90) - 1)
 
         # start_frame
         self.ffmpeg(**{
             'i': file_full_path,
-            'vf': "select='eq(n,0)'",
-            'vframes': start_frame,
+            'vf': "select='eq(n,%s)'" % start_frame,
+            'vframes': 1,
             'o': start_thumb_path
         })
         # mid_frame
@@ -559,16 +1937,7 @@ class MediaManager(object):
         # now merge them
         self.ffmpeg(**{
             'i': [start_thumb_path, mid_thumb_path, end_thumb_path],
-            'filter_complex':
-                '[0:0]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];'
-                '[1:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];'
-                '[2:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];'
-                '[s][e]overlay=%(tw)s/4:%(th)s-h[x];'
-                '[x][m]overlay=%(tw)s/8:%(th)s/2-h/2' %
-                {
-                    'tw': self.thumbnail_width,
-                    'th': self.thumbnail_height
-                },
+            'filter_complex': self.generate_video_thumbnail_filter('0:0'),
             'o': thumbnail_path
         })
 
@@ -600,6 +1969,124 @@ class MediaManager(object):
         self.convert_to_webm(file_full_path, web_version_full_path)
         return web_version_full_path
 
+    def get_image_sequence(self, file_full_path):
+        """Returns the image sequence of the given :class:`.ImageSequence`
+        instance or directory path. Returns None for other paths.
+
+        :param file_full_path: An :class:`.ImageSequence` instance or a path
+        :return: :class:`.ImageSequence`
+        """
+        if isinstance(file_full_path, ImageSequence):
+            return file_full_path
+
+        if os.path.isdir(file_full_path):
+            sequences = ImageSequence.find(file_full_path)[0]
+            sequences = [
+                sequence for sequence in sequences
+                if sequence.extension.lower() in self.image_formats
+            ]
+            if not sequences:
+                raise RuntimeError('%s has no image sequence!' %
+                                   file_full_path)
+            # use the longest one
+            return max(sequences, key=len)
+
+    def generate_image_sequence_thumbnail(self, sequence):
+        """Generates a thumbnail for the given image sequence from three
+        frames in the start, middle and end of the sequence in one ffmpeg
+        call.
+
+        :param sequence: An :class:`.ImageSequence` instance
+        :return str: returns the thumbnail path
+        """
+        frames = sequence.frames
+        frame_count = len(frames)
+        sampled_frames = [
+            frames[int(frame_count * 0.10)],
+            frames[int(frame_count * 0.5)],
+            frames[max(0, int(frame_count * 0.90) - 1)],
+        ]
+
+        thumbnail_path = tempfile.mktemp(suffix=self.thumbnail_format)
+        self.ffmpeg(**{
+            'inputs': [
+                (sequence.frame_full_path(frame), {})
+                for frame in sampled_frames
+            ],
+            'filter_complex': self.generate_video_thumbnail_filter(),
+            'frames:v': 1,
+            'o': thumbnail_path
+        })
+        return thumbnail_path
+
+    def generate_image_sequence_for_web(self, sequence):
+        """Generates a web friendly video for the given image sequence with
+        one ffmpeg image2 run.
+
+        The image2 demuxer stops at the first missing frame, the sequences
+        found by :meth:`.ImageSequence.find` do not have gaps.
+
+        :param sequence: An :class:`.ImageSequence` instance
+        :return str: returns the video path
+        """
+        web_version_full_path = tempfile.mktemp(suffix=self.web_video_format)
+        self.ffmpeg(**{
+            'inputs': [
+                (sequence.pattern, {
+                    'f': 'image2',
+                    'framerate': self.image_sequence_frame_rate,
+                    'start_number': sequence.start_frame,
+                })
+            ],
+            'vcodec': 'libvpx',
+            'b:v': '%sk' % self.web_video_bitrate,
+            'o': web_version_full_path
+        })
+        return web_version_full_path
+
+    @classmethod
+    def generate_image_sequence_zip(cls, sequence, output_full_path=None,
+                                    file_objects=None):
+        """Zips the frames of the given image sequence.
+
+        The frames are streamed in to the zip file one by one, so the
+        sequence is never loaded in to memory as a whole. The frames are
+        stored without compression as the image formats are already
+        compressed.
+
+        :param sequence: An :class:`.ImageSequence` instance
+        :param str output_full_path: The zip file path, a temp path is used if
+          skipped.
+        :param dict file_objects: A dictionary of the frame paths and the file
+          like objects holding the data of the frames. If given, the frames
+          are zipped from these objects and written to the frame paths in the
+          same pass, so the data is read only once.
+        :return str: returns the zip file path
+        """
+        import zipfile
+        if output_full_path is None:
+            output_full_path = tempfile.mktemp(suffix='.zip')
+
+        zip_file = zipfile.ZipFile(
+            output_full_path, 'w', zipfile.ZIP_STORED, allowZip64=True
+        )
+        try:
+            for frame_full_path in sequence.files:
+                arcname = os.path.basename(frame_full_path)
+                if file_objects is None:
+                    zip_file.write(frame_full_path, arcname)
+                    continue
+
+                with open(frame_full_path, 'wb') as frame_file:
+                    write_zip_entry(
+                        zip_file, arcname, file_objects[frame_full_path],
+                        [frame_file]
+                    )
+        finally:
+            zip_file.close()
+
+        return output_full_path
+
     def generate_thumbnail(self, file_full_path):
         """Generates a thumbnail for the given link
 
@@ -607,6 +2094,10 @@ class MediaManager(object):
           given path
         :return str: returns the thumbnail path
         """
+        sequence = self.get_image_sequence(file_full_path)
+        if sequence is not None:
+            return self.generate_image_sequence_thumbnail(sequence)
+
         extension = os.path.splitext(file_full_path)[-1].lower()
         # check if it is an image or video or non of them
         if extension in self.image_formats:
@@ -629,6 +2120,10 @@ class MediaManager(object):
           file in the given path.
         :return str: returns the media file path.
         """
+        sequence = self.get_image_sequence(file_full_path)
+        if sequence is not None:
+            return self.generate_image_sequence_for_web(sequence)
+
         extension = os.path.splitext(file_full_path)[-1].lower()
         # check if it is an image or video or non of them
         if extension in self.image_formats:
@@ -670,68 +2165,175 @@ class MediaManager(object):
     def get_video_info(self, full_path):
         """Returns the video info like the duration  in seconds and fps.
 
-        Uses ffmpeg to extract information about the video file.
+        Uses one ``ffprobe`` call with JSON output to extract information about
+        the streams and the format of the video file.
+
+        The result is cached in memory and on disk (see
+        :meth:`.video_info_cache_file_full_path`), keyed by the path, size and
+        modification time of the file, so the same file is probed only once.
+        A cache entry with a different size or modification time is replaced.
 
         :param str full_path: The full path of the video file
-        :return: int
+        :return: dict A dictionary with "video_info" (the format info) and
+          "stream_info" (a list of stream info) keys, the tags are stored with
+          a "TAG:" prefix as in the default ffprobe output.
         """
-        output_buffer = self.ffprobe(**{
-            'show_streams': full_path,
-        })
+        stat = os.stat(full_path)
+        cache_key = (full_path, stat.st_size, stat.st_mtime)
+        media_info = self.video_info_cache.get(cache_key)
+        if media_info is not None:
+            return copy.deepcopy(media_info)
+
+        media_info = self.read_video_info_cache(
+            full_path, stat.st_size, stat.st_mtime
+        )
+        if media_info is None:
+            output_buffer = self.ffprobe(**{
+                'v': 'error',
+                'print_format': 'json',
+                'show_format': None,
+                'show_streams': None,
+                'i': full_path,
+            })
+            media_info = self.parse_video_info(''.join(output_buffer))
+            self.write_video_info_cache(
+                full_path, stat.st_size, stat.st_mtime, media_info
+            )
+
+        self.video_info_cache[cache_key] = copy.deepcopy(media_info)
+        return media_info
+
+    @classmethod
+    def parse_video_info(cls, data):
+        """Parses the JSON output of ffprobe.
 
-        media_info = {
-            'video_info': None,
-            'stream_info': []
+        :param str data: The output of ffprobe with ``-print_format json
+          -show_format -show_streams`` options.
+        :return: dict
+        """
+        import json
+        try:
+            probe_data = json.loads(data or '{}')
+        except ValueError:
+            probe_data = {}
+
+        def flatten(info):
+            """converts the values to strings and the nested sections to
+            prefixed keys like the default ffprobe output
+            """
+            flat_info = {}
+            for key, value in info.items():
+                if isinstance(value, dict):
+                    if key == 'tags':
+                        prefix = 'TAG'
+                    else:
+                        prefix = key.upper()
+                    for sub_key, sub_value in value.items():
+                        flat_info['%s:%s' % (prefix, sub_key)] = \
+                            '%s' % sub_value
+                else:
+                    flat_info[key] = '%s' % value
+            return flat_info
+
+        video_info = None
+        if 'format' in probe_data:
+            video_info = flatten(probe_data['format'])
+
+        return {
+            'video_info': video_info,
+            'stream_info': map(flatten, probe_data.get('streams', []))
         }
-        video_info = {}
-        stream_info = {}
-
-        # get STREAM info
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == '[STREAM]':
-                # pop until you find [/STREAM]
-                while line != '[/STREAM]':
-                    if '=' in line:
-                        flag, value = line.split('=')
-                        stream_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                copy_stream = copy.deepcopy(stream_info)
-                media_info['stream_info'].append(copy_stream)
-                stream_info = {}
-            try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
 
-        # also get FORMAT info
-        output_buffer = self.ffprobe(**{
-            'show_format': full_path,
-        })
+    @classmethod
+    def video_info_cache_file_full_path(cls, full_path):
+        """Returns the cache file path of the video info of the given file.
 
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == '[FORMAT]':
-                # pop until you find [/FORMAT]
-                while line != '[/FORMAT]':
-                    if '=' in line:
-                        flag, value = line.split('=')
-                        video_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                media_info['video_info'] = video_info
-            try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
+        :param str full_path: The full path of the video file
+        :return str:
+        """
+        import anima
+        import hashlib
+        if isinstance(full_path, unicode):
+            full_path = full_path.encode('utf-8')
+        return os.path.normpath(
+            os.path.expandvars(
+                os.path.expanduser(
+                    os.path.join(
+                        anima.local_cache_folder,
+                        anima.video_info_cache_folder_name,
+                        '%s.json' % hashlib.sha1(full_path).hexdigest()
+                    )
+                )
+            )
+        )
 
-        return media_info
+    @classmethod
+    def read_video_info_cache(cls, full_path, size, mtime):
+        """Returns the cached video info of the given file, if the cached size
+        and modification time matches the given values, otherwise returns
+        None.
+
+        :param str full_path: The full path of the video file
+        :param int size: The size of the file
+        :param float mtime: The modification time of the file
+        :return: dict
+        """
+        import json
+        cache_full_path = cls.video_info_cache_file_full_path(full_path)
+        try:
+            with open(cache_full_path) as f:
+                cache_data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if cache_data.get('path') != full_path \
+           or cache_data.get('size') != size \
+           or cache_data.get('mtime') != mtime:
+            # stale
+            return None
+
+        return cache_data.get('media_info')
+
+    @classmethod
+    def write_video_info_cache(cls, full_path, size, mtime, media_info):
+        """Caches the given video info of the given file on disk
+
+        :param str full_path: The full path of the video file
+        :param int size: The size of the file
+        :param float mtime: The modification time of the file
+        :param dict media_info: The video info
+        """
+        import json
+        cache_full_path = cls.video_info_cache_file_full_path(full_path)
+        cache_path = os.path.dirname(cache_full_path)
+        try:
+            os.makedirs(cache_path)
+        except OSError:  # path exists
+            pass
+
+        data = json.dumps({
+            'path': full_path,
+            'size': size,
+            'mtime': mtime,
+            'media_info': media_info,
+        })
+
+        # write to a temp file and rename it, so other processes never read
+        # a partially written file
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=cache_path)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.rename(temp_path, cache_full_path)
+        except (IOError, OSError) as e:
+            logger.debug('could not cache video info: %s' % e)
 
     def ffmpeg(self, **kwargs):
         """A simple python wrapper for ``ffmpeg`` command.
         """
-        # there is only one special keyword called 'o'
+        # there are two special keywords, 'o' for the output and 'inputs'
+        # for a list of (path, options dict) pairs of inputs that have their
+        # own options
 
         # this will raise KeyError if there is no 'o' key which is good to
         # prevent the rest to execute
@@ -743,6 +2345,17 @@ class MediaManager(object):
 
         # generate args
         args = [self.ffmpeg_command_path]
+
+        # the inputs with their own options (ex. input side seeking) should
+        # come before the other options
+        inputs = kwargs.pop('inputs', [])
+        for input_path, input_options in inputs:
+            for key in input_options:
+                args.append('-' + key)
+                args.append(str(input_options[key]))
+            args.append('-i')
+            args.append(input_path)
+
         for key in kwargs:
             flag = '-' + key
             value = kwargs[key]
@@ -779,16 +2392,9 @@ class MediaManager(object):
 
         process = subprocess.Popen(args, stderr=subprocess.PIPE)
 
-        # loop until process finishes and capture stderr output
-        stderr_buffer = []
-        while True:
-            stderr = process.stderr.readline()
-
-            if stderr == '' and process.poll() is not None:
-                break
-
-            if stderr != '':
-                stderr_buffer.append(stderr)
+        # wait for the process to finish and capture stderr output
+        stderr = process.communicate()[1]
+        stderr_buffer = stderr.splitlines(True)
 
         # if process.returncode:
         #     # there is an error
@@ -806,7 +2412,10 @@ class MediaManager(object):
         for key in kwargs:
             flag = '-' + key
             value = kwargs[key]
-            if not isinstance(value, list):
+            if value is None:
+                # a flag without a value
+                args.append(flag)
+            elif not isinstance(value, list):
                 # append the flag
                 args.append(flag)
                 # append the value
@@ -822,16 +2431,9 @@ class MediaManager(object):
 
         process = subprocess.Popen(args, stdout=subprocess.PIPE)
 
-        # loop until process finishes and capture stderr output
-        stdout_buffer = []
-        while True:
-            stdout = process.stdout.readline()
-
-            if stdout == '' and process.poll() is not None:
-                break
-
-            if stdout != '':
-                stdout_buffer.append(stdout)
+        # wait for the process to finish and capture stdout output
+        stdout = process.communicate()[0]
+        stdout_buffer = stdout.splitlines(True)
 
         # if process.returncode:
         #     # there is an error
@@ -989,6 +2591,241 @@ class MediaManager(object):
 
         return output_path
 
+    def get_media_extension(self, file_full_path, for_web=False):
+        """Returns the extension of the thumbnail or the web version of the
+        given file without generating it.
+
+        :param str file_full_path: The media file path
+        :param bool for_web: Returns the web version extension if True,
+          otherwise the thumbnail extension.
+        :return str:
+        """
+        if isinstance(file_full_path, ImageSequence):
+            if for_web:
+                return self.web_video_format
+            return self.thumbnail_format
+
+        extension = os.path.splitext(file_full_path)[-1].lower()
+        if extension in self.image_formats:
+            if extension == '.gif':
+                return '.gif'
+            return self.thumbnail_format
+        elif extension in self.video_formats:
+            if for_web:
+                return self.web_video_format
+            return self.thumbnail_format
+
+        raise RuntimeError('%s is not an image nor a video file!' %
+                           file_full_path)
+
+    def get_job_queue(self):
+        """Returns the :class:`.MediaJobQueue` of this MediaManager, creates
+        it in the first call.
+
+        :return: :class:`.MediaJobQueue`
+        """
+        if self.job_queue is None:
+            self.job_queue = MediaJobQueue(self.max_conversion_jobs)
+        return self.job_queue
+
+    def convert_and_move(self, generate, file_full_path, output_full_path,
+                         link=None, to_link_path=None):
+        """Generates a media with the given generator and moves it to the
+        given output path.
+
+        The extension of the output path is replaced with the extension of the
+        generated file. This runs in the job queue threads, so the Link of the
+        output is not updated here but in :meth:`.apply_conversion_results`
+        in the thread that owns the Link.
+
+        :param generate: A function that accepts the source path and returns
+          the path of the generated media (ex.
+          :meth:`.generate_media_for_web`)
+        :param str file_full_path: The source media file path
+        :param str output_full_path: The desired output path
+        :return str: The output path
+        """
+        temp_full_path = generate(file_full_path)
+        extension = os.path.splitext(temp_full_path)[-1]
+        full_path = '%s%s' % (os.path.splitext(output_full_path)[0], extension)
+
+        # move it to repository
+        try:
+            os.makedirs(os.path.dirname(full_path))
+        except OSError:  # path exists
+            pass
+        shutil.move(temp_full_path, full_path)
+
+        return full_path
+
+    def track_conversion(self, job, output_full_path, link=None,
+                         to_link_path=None):
+        """Adds the given conversion job to the :attr:`.conversion_jobs`. The
+        job is removed when it is finished successfully and its Link does not
+        need to be updated.
+
+        :param job: A :class:`.MediaJob` instance
+        :param str output_full_path: The desired output path of the job
+        :param link: The :class:`.Link` of the output
+        :param to_link_path: A function that converts the output path to the
+          Link path.
+        """
+        job.link = link
+        job.output_full_path = output_full_path
+        job.to_link_path = to_link_path
+        with self.conversion_jobs_lock:
+            self.conversion_jobs.append(job)
+        job.add_done_callback(self.conversion_finished)
+
+    @classmethod
+    def needs_link_update(cls, job):
+        """returns True if the given finished job has generated a file with
+        another extension and its Link path should be updated
+        """
+        return job.status == MediaJob.DONE and job.link is not None \
+            and job.result != job.output_full_path
+
+    def conversion_finished(self, job):
+        """Removes the given finished job from the :attr:`.conversion_jobs` if
+        it is successful and its Link is up to date, and limits the number of
+        the finished jobs that are kept.
+
+        :param job: A :class:`.MediaJob` instance
+        """
+        with self.conversion_jobs_lock:
+            if job.status == MediaJob.DONE \
+               and not self.needs_link_update(job):
+                self.conversion_jobs = [
+                    j for j in self.conversion_jobs if j is not job
+                ]
+                return
+
+            finished_jobs = [j for j in self.conversion_jobs if j.finished]
+            excess = len(finished_jobs) - self.max_finished_conversion_jobs
+            if excess > 0:
+                dropped_jobs = finished_jobs[:excess]
+                logger.debug(
+                    'dropping the finished conversion jobs that are not '
+                    'waited: %s' % dropped_jobs
+                )
+                self.conversion_jobs = [
+                    j for j in self.conversion_jobs
+                    if not any(j is d for d in dropped_jobs)
+                ]
+
+    def apply_conversion_results(self, jobs):
+        """Updates the Link paths of the given finished jobs, if their media
+        is generated with another extension. Call it in the thread that owns
+        the Links (ex. the request thread).
+
+        :param jobs: A list of :class:`.MediaJob` instances
+        """
+        for job in jobs:
+            if job.finished and self.needs_link_update(job):
+                job.link.full_path = job.to_link_path(job.result)
+
+    def submit_conversion(self, generate, file_full_path, output_full_path,
+                          link=None, to_link_path=None):
+        """Submits a :meth:`.convert_and_move` job to the job queue.
+
+        :return: :class:`.MediaJob`
+        """
+        job = self.get_job_queue().submit(
+            self.convert_and_move, generate, file_full_path, output_full_path
+        )
+        self.track_conversion(job, output_full_path, link, to_link_path)
+        return job
+
+    def convert_and_store(self, generate, kind, digest, file_full_path,
+                          output_full_path):
+        """Runs :meth:`.convert_and_move` and adds the generated media to the
+        :attr:`.content_store` as the derivative of the given kind of the
+        source file with the given hash.
+
+        :return str: The output path
+        """
+        full_path = self.convert_and_move(
+            generate, file_full_path, output_full_path
+        )
+        self.content_store.add_derivative(digest, kind, full_path)
+        return full_path
+
+    def submit_stored_conversion(self, generate, kind, digest,
+                                 file_full_path, output_full_path, link=None,
+                                 to_link_path=None):
+        """Links the derivative of the given kind from the
+        :attr:`.content_store` to the output path if it is already generated
+        for a file with the same content, or submits a
+        :meth:`.convert_and_store` job to generate it.
+
+        :return: :class:`.MediaJob` or None if the stored derivative is used
+        """
+        if self.content_store is None or digest is None:
+            return self.submit_conversion(
+                generate, file_full_path, output_full_path, link,
+                to_link_path
+            )
+
+        full_path = self.content_store.link_derivative(
+            digest, kind, output_full_path
+        )
+        if full_path is not None:
+            if link is not None and full_path != output_full_path:
+                link.full_path = to_link_path(full_path)
+            return None
+
+        job = self.get_job_queue().submit(
+            self.convert_and_store, generate, kind, digest, file_full_path,
+            output_full_path
+        )
+        self.track_conversion(job, output_full_path, link, to_link_path)
+        return job
+
+    def get_conversion_jobs(self, link=None):
+        """Returns the conversion jobs of the given Link, or all the jobs if
+        no link is given. The thumbnail Links are searched recursively, so
+        the Link returned by the upload methods returns all of its jobs.
+
+        :param link: A :class:`.Link` instance
+        :return: list of :class:`.MediaJob` instances
+        """
+        with self.conversion_jobs_lock:
+            conversion_jobs = list(self.conversion_jobs)
+
+        if link is None:
+            return conversion_jobs
+
+        links = []
+        while link is not None and not any(link is l_ for l_ in links):
+            links.append(link)
+            link = link.thumbnail
+
+        return [
+            job for job in conversion_jobs
+            if any(job.link is l_ for l_ in links)
+        ]
+
+    def wait_for_conversions(self, link=None, timeout=None):
+        """Waits for the conversion jobs of the given Link (or all the jobs)
+        to finish and updates the Link paths of them, the finished ones of
+        these jobs are removed from the job list. The jobs of the other Links
+        are kept, so their errors and Link path updates are not lost.
+
+        :param link: A :class:`.Link` instance
+        :param float timeout: The maximum time to wait in seconds for each job
+        """
+        jobs = self.get_conversion_jobs(link)
+        try:
+            MediaJobQueue.wait(jobs, timeout)
+        finally:
+            self.apply_conversion_results(jobs)
+            finished_jobs = [job for job in jobs if job.finished]
+            with self.conversion_jobs_lock:
+                self.conversion_jobs = [
+                    job for job in self.conversion_jobs
+                    if not any(job is f for f in finished_jobs)
+                ]
+
     def upload_with_request_params(self, file_params):
         """upload objects with request params
 
@@ -1112,6 +2949,33 @@ class MediaManager(object):
         :param str filename: The desired file name for the uploaded file. If it
           is skipped a unique temp filename will be generated.
         """
+        return self.upload_file_with_digest(
+            file_object, file_path, filename, hash_name=''
+        )[0]
+
+    def upload_file_with_digest(self, file_object, file_path=None,
+                                filename=None, hash_name=None):
+        """Uploads files to the given path like :meth:`.upload_file` and
+        returns the hex digest of the data together with the file path.
+
+        The data is hashed while it is written, so the uploaded file does not
+        need to be read again to calculate its hash. The data is flushed to
+        the disk before the temp file is renamed to the final path, so a
+        half written file never appears under the final path.
+
+        :param file_object: File like object holding the data.
+        :param str file_path: The path of the file to output the data to. If it
+          is skipped the data will be written to a temp folder.
+        :param str filename: The desired file name for the uploaded file. If it
+          is skipped a unique temp filename will be generated.
+        :param str hash_name: The :mod:`hashlib` algorithm name, defaults to
+          :attr:`.upload_hash_name`. Use an empty string to skip hashing.
+        :return: (str, str) The uploaded file path and the hex digest of the
+          data (None if the hashing is skipped).
+        """
+        if hash_name is None:
+            hash_name = self.upload_hash_name
+
         if file_path is None:
             file_path = tempfile.gettempdir()
 
@@ -1133,20 +2997,26 @@ class MediaManager(object):
         except OSError:  # Path exist
             pass
 
-        with open(temp_file_full_path, 'wb') as output_file:
-            file_object.seek(0)
-            while True:
-                data = file_object.read(2 << 16)
-                if not data:
-                    break
-                output_file.write(data)
+        try:
+            with open(temp_file_full_path, 'wb') as output_file:
+                file_object.seek(0)
+                digest = copy_file_object(
+                    file_object, output_file, hash_name,
+                    self.upload_buffer_size
+                )
+                output_file.flush()
+                os.fsync(output_file.fileno())
+        except BaseException:
+            if os.path.exists(temp_file_full_path):
+                os.remove(temp_file_full_path)
+            raise
 
         # data is written completely, rename temp file to original file
         os.rename(temp_file_full_path, file_full_path)
 
-        return file_full_path
+        return file_full_path, digest
 
-    def upload_reference(self, task, file_object, filename):
+    def upload_reference(self, task, file_object, filename, wait=True):
         """Uploads a reference for the given task to
         Task.path/References/Stalker_Pyramid/ folder and create a Link object
         to there. Again the Link object will have a Repository root relative
@@ -1163,6 +3033,10 @@ class MediaManager(object):
         :param file_object: The file like object holding the content of the
           uploaded file.
         :param str filename: The original filename.
+        :param bool wait: If False, the Link is returned right after the
+          original file is uploaded and the web version and thumbnail are
+          generated in the background, use :meth:`.wait_for_conversions` or
+          :meth:`.get_conversion_jobs` to wait for or poll them.
         :returns: :class:`.Link` instance.
         """
         ############################################################
@@ -1198,10 +3072,8 @@ class MediaManager(object):
         ############################################################
         # WEB VERSION
         ############################################################
-        web_version_temp_full_path = \
-            self.generate_media_for_web(reference_file_full_path)
         web_version_extension = \
-            os.path.splitext(web_version_temp_full_path)[-1]
+            self.get_media_extension(reference_file_full_path, for_web=True)
 
         web_version_file_name = '%s%s' % (reference_file_base_name,
                                           web_version_extension)
@@ -1218,20 +3090,12 @@ class MediaManager(object):
             original_filename=web_version_file_name
         )
 
-        # move it to repository
-        try:
-            os.makedirs(os.path.dirname(web_version_full_path))
-        except OSError:  # path exists
-            pass
-        shutil.move(web_version_temp_full_path, web_version_full_path)
-
         ############################################################
         # THUMBNAIL
         ############################################################
         # finally generate a Thumbnail
-        thumbnail_temp_full_path = \
-            self.generate_thumbnail(reference_file_full_path)
-        thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
+        thumbnail_extension = \
+            self.get_media_extension(reference_file_full_path)
         thumbnail_file_name = '%s%s' % (reference_file_base_name,
                                         thumbnail_extension)
 
@@ -1248,12 +3112,14 @@ class MediaManager(object):
             original_filename=thumbnail_file_name
         )
 
-        # move it to repository
-        try:
-            os.makedirs(os.path.dirname(thumbnail_full_path))
-        except OSError:  # path exists
-            pass
-        shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
+        self.submit_conversion(
+            self.generate_media_for_web, reference_file_full_path,
+            web_version_full_path, web_version_link, repo.make_relative
+        )
+        self.submit_conversion(
+            self.generate_thumbnail, reference_file_full_path,
+            thumbnail_full_path, thumbnail_link, repo.make_relative
+        )
 
         ############################################################
         # LINK Objects
@@ -1264,6 +3130,9 @@ class MediaManager(object):
         link.thumbnail = web_version_link
         web_version_link.thumbnail = thumbnail_link
 
+        if wait:
+            self.wait_for_conversions(link)
+
         return link
 
     def upload_version(self, task, file_object, take_name=None, extension=''):
@@ -1297,7 +3166,8 @@ class MediaManager(object):
 
         return v
 
-    def upload_version_output(self, version, file_object, filename):
+    def upload_version_output(self, version, file_object, filename,
+                              wait=True):
         """Uploads a file as an output for the given :class:`.Version`
         instance. Will store the file in
         {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ folder.
@@ -1307,12 +3177,21 @@ class MediaManager(object):
         web friendly version (PNG for images, WebM for video files) under
         {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ForWeb folder.
 
+        If a :attr:`.content_store` is set, the uploaded file is replaced with
+        a link to the stored file with the same content, and the web version
+        and thumbnail of the stored file are linked instead of being
+        generated again.
+
         :param version: A :class:`.Version` instance that the output is
           uploaded for.
         :type version: :class:`.Version`
         :param file_object: The file like object holding the content of the
           uploaded file.
         :param str filename: The original filename.
+        :param bool wait: If False, the Link is returned right after the
+          original file is uploaded and the web version and thumbnail are
+          generated in the background, use :meth:`.wait_for_conversions` or
+          :meth:`.get_conversion_jobs` to wait for or poll them.
         :returns: :class:`.Link` instance.
         """
         ############################################################
@@ -1324,8 +3203,17 @@ class MediaManager(object):
         )
 
         # upload it
-        version_output_file_full_path = \
-            self.upload_file(file_object, file_path, filename)
+        digest = None
+        if self.content_store is None:
+            version_output_file_full_path = \
+                self.upload_file(file_object, file_path, filename)
+        else:
+            version_output_file_full_path, digest = \
+                self.upload_file_with_digest(
+                    file_object, file_path, filename,
+                    hash_name=self.content_store.hash_name
+                )
+            self.content_store.add(version_output_file_full_path, digest)
 
         version_output_file_name = \
             os.path.basename(version_output_file_full_path)
@@ -1353,10 +3241,9 @@ class MediaManager(object):
         ############################################################
         web_version_link = None
         try:
-            web_version_temp_full_path = \
-                self.generate_media_for_web(version_output_file_full_path)
-            web_version_extension = \
-                os.path.splitext(web_version_temp_full_path)[-1]
+            web_version_extension = self.get_media_extension(
+                version_output_file_full_path, for_web=True
+            )
             web_version_full_path = \
                 os.path.join(
                     os.path.dirname(version_output_file_full_path),
@@ -1368,13 +3255,11 @@ class MediaManager(object):
                 full_path=repo.to_os_independent_path(web_version_full_path),
                 original_filename=filename
             )
-
-            # move it to repository
-            try:
-                os.makedirs(os.path.dirname(web_version_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(web_version_temp_full_path, web_version_full_path)
+            self.submit_stored_conversion(
+                self.generate_media_for_web, 'ForWeb', digest,
+                version_output_file_full_path, web_version_full_path,
+                web_version_link, repo.to_os_independent_path
+            )
         except RuntimeError:
             # not an image or video so skip it
             pass
@@ -1385,9 +3270,8 @@ class MediaManager(object):
         # finally generate a Thumbnail
         thumbnail_link = None
         try:
-            thumbnail_temp_full_path = \
-                self.generate_thumbnail(version_output_file_full_path)
-            thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
+            thumbnail_extension = \
+                self.get_media_extension(version_output_file_full_path)
 
             thumbnail_full_path = \
                 os.path.join(
@@ -1400,13 +3284,11 @@ class MediaManager(object):
                 full_path=repo.to_os_independent_path(thumbnail_full_path),
                 original_filename=filename
             )
-
-            # move it to repository
-            try:
-                os.makedirs(os.path.dirname(thumbnail_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
+            self.submit_stored_conversion(
+                self.generate_thumbnail, 'Thumbnail', digest,
+                version_output_file_full_path, thumbnail_full_path,
+                thumbnail_link, repo.to_os_independent_path
+            )
         except RuntimeError:
             # not an image or video so skip it
             pass
@@ -1422,8 +3304,220 @@ class MediaManager(object):
             if thumbnail_link:
                 web_version_link.thumbnail = thumbnail_link
 
+        if wait:
+            self.wait_for_conversions(link)
+
+        return link
+
+    def upload_image_sequence_output(self, version, sequence, wait=True,
+                                     file_objects=None):
+        """Uploads the given image sequence as one output for the given
+        :class:`.Version` instance.
+
+        The frames are stored as a zip file in
+        {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ folder, the web
+        version is a video generated from the whole sequence and the
+        thumbnail is generated from three frames of the sequence.
+
+        :param version: A :class:`.Version` instance that the output is
+          uploaded for.
+        :param sequence: An :class:`.ImageSequence` instance
+        :param bool wait: If False, the Link is returned right after the zip
+          file is created and the web version and thumbnail are generated in
+          the background.
+        :param dict file_objects: A dictionary of the frame paths and the file
+          like objects holding the data of the frames, the zip file is written
+          from these objects (see :meth:`.generate_image_sequence_zip`).
+        :returns: :class:`.Link` instance.
+        """
+        file_path = os.path.join(
+            os.path.join(version.absolute_path),
+            self.version_output_path
+        )
+        try:
+            os.makedirs(file_path)
+        except OSError:  # path exists
+            pass
+
+        filename = '%s.zip' % self.format_filename(sequence.name)
+        zip_full_path = os.path.join(file_path, filename)
+        if os.path.exists(zip_full_path):
+            zip_full_path = self.randomize_file_name(zip_full_path)
+        self.generate_image_sequence_zip(
+            sequence, zip_full_path, file_objects
+        )
+
+        base_name = os.path.splitext(os.path.basename(zip_full_path))[0]
+        original_filename = os.path.basename(sequence.hash_pattern)
+
+        repo = version.task.project.repository
+
+        from stalker import Link
+        link = Link(
+            full_path=repo.to_os_independent_path(zip_full_path),
+            original_filename=original_filename
+        )
+
+        web_version_full_path = os.path.join(
+            file_path, 'ForWeb',
+            base_name + self.get_media_extension(sequence, for_web=True)
+        )
+        web_version_link = Link(
+            full_path=repo.to_os_independent_path(web_version_full_path),
+            original_filename=original_filename
+        )
+        self.submit_conversion(
+            self.generate_image_sequence_for_web, sequence,
+            web_version_full_path, web_version_link,
+            repo.to_os_independent_path
+        )
+
+        thumbnail_full_path = os.path.join(
+            file_path, 'Thumbnail',
+            base_name + self.get_media_extension(sequence)
+        )
+        thumbnail_link = Link(
+            full_path=repo.to_os_independent_path(thumbnail_full_path),
+            original_filename=original_filename
+        )
+        self.submit_conversion(
+            self.generate_image_sequence_thumbnail, sequence,
+            thumbnail_full_path, thumbnail_link, repo.to_os_independent_path
+        )
+
+        version.outputs.append(link)
+        link.thumbnail = web_version_link
+        web_version_link.thumbnail = thumbnail_link
+
+        if wait:
+            self.wait_for_conversions(link)
+
         return link
 
+    @classmethod
+    def remove_when_finished(cls, path, jobs):
+        """Removes the given folder when all of the given jobs are finished,
+        in the thread that runs the last job. The folder is removed
+        immediately if there are no jobs.
+
+        :param str path: The path of the folder
+        :param jobs: A list of :class:`.MediaJob` instances
+        """
+        remaining = [len(jobs)]
+        lock = threading.Lock()
+
+        def job_finished(job):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            shutil.rmtree(path, ignore_errors=True)
+
+        if not jobs:
+            shutil.rmtree(path, ignore_errors=True)
+
+        for job in jobs:
+            job.add_done_callback(job_finished)
+
+    def upload_version_outputs(self, version, file_params, wait=True):
+        """Uploads the given files as outputs for the given
+        :class:`.Version` instance. The frames of image sequences are grouped
+        and uploaded as one output per sequence with
+        :meth:`.upload_image_sequence_output`, the other files are uploaded
+        with :meth:`.upload_version_output`.
+
+        :param version: A :class:`.Version` instance that the outputs are
+          uploaded for.
+        :param file_params: A list of objects with ``filename`` and ``file``
+          attributes (see :meth:`.upload_with_request_params`).
+        :param bool wait: Waits for the web versions and thumbnails if True.
+          Otherwise the temp folder holding the frames of the image sequences
+          is removed when their web versions and thumbnails are generated.
+        :returns: list of :class:`.Link` instances.
+        """
+        # the frames are written to the temp folder while they are zipped,
+        # the web versions and thumbnails of the sequences are generated from
+        # them, the other files are uploaded directly
+        upload_path = tempfile.mkdtemp()
+        file_paths = []
+        file_objects = {}
+        duplicates = []
+        for file_param in file_params:
+            file_full_path = os.path.join(
+                upload_path, self.format_filename(file_param.filename)
+            )
+            if file_full_path in file_objects:
+                duplicates.append(file_param)
+            else:
+                file_paths.append(file_full_path)
+                file_objects[file_full_path] = file_param.file
+
+        sequences, singles = ImageSequence.find(file_paths)
+
+        # only image files can be a sequence
+        for sequence in list(sequences):
+            if sequence.extension.lower() not in self.image_formats:
+                sequences.remove(sequence)
+                singles.extend(sequence.files)
+
+        links = []
+        sequence_links = []
+        try:
+            for sequence in sequences:
+                link = self.upload_image_sequence_output(
+                    version, sequence, wait=False, file_objects=file_objects
+                )
+                links.append(link)
+                sequence_links.append(link)
+
+            for file_full_path in singles:
+                links.append(
+                    self.upload_version_output(
+                        version, file_objects[file_full_path],
+                        os.path.basename(file_full_path), wait=False
+                    )
+                )
+
+            for file_param in duplicates:
+                links.append(
+                    self.upload_version_output(
+                        version, file_param.file, file_param.filename,
+                        wait=False
+                    )
+                )
+
+            if wait:
+                for link in links:
+                    self.wait_for_conversions(link)
+        except BaseException:
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise
+
+        if wait:
+            shutil.rmtree(upload_path, ignore_errors=True)
+        else:
+            jobs = []
+            for link in sequence_links:
+                jobs.extend(self.get_conversion_jobs(link))
+            self.remove_when_finished(upload_path, jobs)
+
+        return links
+
+
+def _generate_image_thumbnail_and_web(args):
+    """Generates the thumbnail and the web version of an image in a worker
+    process of :meth:`.MediaManager.generate_images_thumbnail_and_web`.
+
+    :param args: A tuple of the image path and the image settings of the
+      MediaManager
+    :return: (str, str) The thumbnail and the web version paths
+    """
+    file_full_path, settings = args
+    media_manager = MediaManager()
+    for attr_name, value in settings.items():
+        setattr(media_manager, attr_name, value)
+    return media_manager.generate_image_thumbnail_and_web(file_full_path)
+
 
 class Exposure(object):
     """A class for photo exposure calculation
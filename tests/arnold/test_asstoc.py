@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from anima.render.arnold import asstoc
+
+
+class AssTocTestCase(unittest.TestCase):
+    """tests the anima.render.arnold.asstoc module
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+
+    def test_get_asstoc_path(self):
+        """testing if the get_asstoc_path() is working properly
+        """
+        self.assertEqual(
+            '/tmp/test.0001.asstoc',
+            asstoc.get_asstoc_path('/tmp/test.0001.ass')
+        )
+        self.assertEqual(
+            '/tmp/test.0001.asstoc',
+            asstoc.get_asstoc_path('/tmp/test.0001.ass.gz')
+        )
+
+    def test_write_and_read(self):
+        """testing if the written table of contents can be read back
+        """
+        path = os.path.join(self.temp_path, 'test.asstoc')
+        toc = asstoc.AssToc(
+            bounds=(-1.0, -2.0, -3.0, 1.0, 2.0, 3.0),
+            nodes=[
+                asstoc.AssTocNode(
+                    'mesh1', 'polymesh', 8, 6,
+                    (-1.0, -2.0, -3.0, 1.0, 2.0, 3.0), 0, 120
+                ),
+                asstoc.AssTocNode(
+                    'hair1', 'curves', 100, 10,
+                    (-0.5, 0.0, -0.5, 0.5, 1.5, 0.5), 120, 3000
+                ),
+            ]
+        )
+        toc.write(path)
+
+        with open(path) as f:
+            self.assertEqual(
+                'bounds -1.0 -2.0 -3.0 1.0 2.0 3.0', f.readline().strip()
+            )
+
+        read_toc = asstoc.AssToc.read(path)
+        self.assertEqual(toc.bounds, read_toc.bounds)
+        self.assertEqual(
+            [node.to_line() for node in toc.nodes],
+            [node.to_line() for node in read_toc.nodes]
+        )
+        self.assertTrue('hair1' in read_toc)
+        self.assertEqual(120, read_toc['hair1'].offset)
+        self.assertEqual(3000, read_toc['hair1'].length)
+        self.assertRaises(KeyError, read_toc.__getitem__, 'not_a_node')
+
+    def test_names_with_spaces(self):
+        """testing if the node names with spaces, double quotes and
+        backslashes can be written and read back
+        """
+        path = os.path.join(self.temp_path, 'test.asstoc')
+        names = ['mesh 1', 'mesh "2"', 'mesh\\3', 'mesh4']
+        toc = asstoc.AssToc(
+            nodes=[asstoc.AssTocNode(name, 'polymesh') for name in names]
+        )
+        toc.write(path)
+
+        read_toc = asstoc.AssToc.read(path)
+        self.assertEqual(names, [node.name for node in read_toc.nodes])
+
+    def test_read_unquoted_names(self):
+        """testing if the node lines with unquoted names can be read
+        """
+        node = asstoc.AssTocNode.from_line(
+            'node mesh1 polymesh 8 6 -1 -1 -1 1 1 1 0 120'
+        )
+        self.assertEqual('mesh1', node.name)
+        self.assertEqual(120, node.length)
+
+    def test_read_bounds_only(self):
+        """testing if the .asstoc files with only the bounds line can be read
+        """
+        path = os.path.join(self.temp_path, 'test.asstoc')
+        with open(path, 'w') as f:
+            f.write('bounds 0 0 0 1 1 1')
+
+        toc = asstoc.AssToc.read(path)
+        self.assertEqual((0, 0, 0, 1, 1, 1), toc.bounds)
+        self.assertEqual([], toc.nodes)
+
+    def test_invalid_node_line(self):
+        """testing if a ValueError will be raised for invalid node lines
+        """
+        self.assertRaises(
+            ValueError, asstoc.AssTocNode.from_line, 'node mesh1 polymesh 8'
+        )
+
+    def check_read_node_data(self, ass_path, file_handler):
+        """writes two nodes to the given path and reads them back
+        """
+        data = ['\npoints\n{\n name p1\n}', '\npolymesh\n{\n name m1\n}']
+        f = file_handler(ass_path, 'wb')
+        f.write('### header\n')
+        toc = asstoc.AssToc()
+        for i, node_data in enumerate(data):
+            toc.nodes.append(
+                asstoc.AssTocNode(
+                    'node%s' % i, 'points', offset=f.tell(),
+                    length=len(node_data)
+                )
+            )
+            f.write(node_data)
+        f.close()
+        toc.write(asstoc.get_asstoc_path(ass_path))
+
+        self.assertEqual(data[1], asstoc.read_node_data(ass_path, 'node1'))
+        self.assertEqual(
+            data[0], asstoc.read_node_data(ass_path, 'node0', toc=toc)
+        )
+
+    def test_read_node_data(self):
+        """testing if the node data can be read from .ass files
+        """
+        self.check_read_node_data(
+            os.path.join(self.temp_path, 'test.ass'), open
+        )
+
+    def test_read_node_data_gzip(self):
+        """testing if the node data can be read from .ass.gz files
+        """
+        self.check_read_node_data(
+            os.path.join(self.temp_path, 'test.ass.gz'), gzip.open
+        )
@@ -189,3 +189,299 @@ class Base85TestCase(unittest.TestCase):
             list(struct.unpack('%sf' % len(raw_data),
                                base85.arnold_b85_decode(encoded_data)))
         )
+
+
+class Base85SpecialValuesTestCase(unittest.TestCase):
+    """tests the special value handling of the arnold encoder and decoder
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.use_numpy = base85.use_numpy
+        self.numpy_threshold = base85.numpy_threshold
+
+        # words that are encoded with leading or trailing "$" characters,
+        # when they are next to each other the encoded data contains "$$$$$"
+        # across the word boundaries
+        self.tricky_words = [
+            0, 0x3f800000, 1, 5, 85, 7225, 614125, 52200625, 85 * 7225,
+            0x3f800000 + 1, 0x3f800000 - 1
+        ]
+
+    def tearDown(self):
+        """clean the test
+        """
+        base85.use_numpy = self.use_numpy
+        base85.numpy_threshold = self.numpy_threshold
+
+    def check_round_trip(self, words):
+        """checks if the given words survive the round trip and the special
+        values are used only for whole words
+        """
+        data = struct.pack('<%sI' % len(words), *words)
+        encoded_data = base85.arnold_b85_encode(data)
+        number_of_special_words = \
+            len([w for w in words if w in (0, 0x3f800000)])
+        self.assertEqual(
+            5 * (len(words) - number_of_special_words) +
+            number_of_special_words,
+            len(encoded_data)
+        )
+        self.assertEqual(data, base85.arnold_b85_decode(encoded_data))
+        return encoded_data
+
+    def test_special_values_do_not_match_across_word_boundaries(self):
+        """testing if the special values are not matched across the word
+        boundaries
+        """
+        base85.use_numpy = False
+        # 614125 is encoded as "$%$$$" and 5 as "$$$$)" so there is a "$$$$$"
+        # across the boundary of these words
+        encoded_data = self.check_round_trip([85 * 7225, 5, 7225, 0])
+        self.assertEqual('$%$$$$$$$)$$%$$z', encoded_data)
+
+    def test_round_trip_with_adversarial_data(self):
+        """testing if the data is encoded and decoded properly when the data
+        is full of words that generate "$" and special characters
+        """
+        import random
+        r = random.Random(85)
+        for use_numpy in [False, base85.numpy is not None]:
+            base85.use_numpy = use_numpy
+            base85.numpy_threshold = 0
+            for i in range(100):
+                words = [
+                    r.choice(self.tricky_words) if r.random() < 0.8
+                    else r.randint(0, 0xffffffff)
+                    for _ in range(r.randint(0, 100))
+                ]
+                self.check_round_trip(words)
+
+    def test_numpy_codec_generates_the_same_data(self):
+        """testing if the NumPy codec generates the same data with the pure
+        Python codec when there are special values
+        """
+        if base85.numpy is None:
+            self.skipTest('NumPy is not installed')
+        import random
+        r = random.Random(58)
+        words = [r.choice(self.tricky_words) for _ in range(1000)]
+        data = struct.pack('<%sI' % len(words), *words)
+
+        base85.use_numpy = False
+        python_encoded_data = base85.arnold_b85_encode(data)
+
+        base85.use_numpy = True
+        base85.numpy_threshold = 0
+        numpy_encoded_data = base85.arnold_b85_encode(data)
+
+        self.assertEqual(python_encoded_data, numpy_encoded_data)
+        self.assertEqual(data, base85.arnold_b85_decode(numpy_encoded_data))
+
+
+@unittest.skipIf(base85.numpy is None, 'NumPy is not installed')
+class Base85NumpyTestCase(unittest.TestCase):
+    """tests the NumPy codec of the base85 module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.use_numpy = base85.use_numpy
+        self.numpy_threshold = base85.numpy_threshold
+        self.numpy_chunk_size = base85.numpy_chunk_size
+
+        # use a small chunk size to test the chunking
+        base85.numpy_threshold = 0
+        base85.numpy_chunk_size = 7
+
+        import random
+        r = random.Random(85)
+        self.test_data = [
+            ''.join(chr(r.randint(0, 255)) for _ in range(length))
+            for length in [1, 2, 3, 4, 5, 27, 28, 100, 1001]
+        ]
+        self.test_data.append(struct.pack('4I', 0, 0xffffffff, 1, 85))
+
+    def tearDown(self):
+        """clean the test
+        """
+        base85.use_numpy = self.use_numpy
+        base85.numpy_threshold = self.numpy_threshold
+        base85.numpy_chunk_size = self.numpy_chunk_size
+
+    def check_codec(self, encode, decode):
+        """checks if the NumPy codec generates the same output with the pure
+        Python codec
+        """
+        for data in self.test_data:
+            base85.use_numpy = False
+            python_encoded_data = encode(data)
+            python_decoded_data = decode(python_encoded_data)
+
+            base85.use_numpy = True
+            numpy_encoded_data = encode(data)
+            numpy_decoded_data = decode(numpy_encoded_data)
+
+            self.assertEqual(python_encoded_data, numpy_encoded_data)
+            self.assertEqual(python_decoded_data, numpy_decoded_data)
+            self.assertEqual(data, numpy_decoded_data[:len(data)])
+
+    def test_b85_numpy_codec_is_working_properly(self):
+        """testing if the NumPy codec is generating the same data with the
+        pure Python codec for the standard LUT
+        """
+        self.check_codec(base85.b85_encode, base85.b85_decode)
+
+    def test_rfc1924_b85_numpy_codec_is_working_properly(self):
+        """testing if the NumPy codec is generating the same data with the
+        pure Python codec for the RFC1924 LUT
+        """
+        self.check_codec(base85.rfc1924_b85_encode, base85.rfc1924_b85_decode)
+
+    def test_arnold_b85_numpy_codec_is_working_properly(self):
+        """testing if the NumPy codec is generating the same data with the
+        pure Python codec for the Arnold LUT
+        """
+        self.check_codec(base85.arnold_b85_encode, base85.arnold_b85_decode)
+
+    def test_arnold_b85_numpy_encode_real_world_data(self):
+        """testing if the NumPy codec is encoding real world data properly
+        """
+        base85.use_numpy = True
+        raw_data = [0, 1, 9, 8, 1, 2, 10, 9, 2, 3, 11, 10, 3, 4, 12, 11, 4, 5,
+                    13, 12, 5, 6, 14, 13, 6, 7, 15, 14]
+        encoded_data = "&UOP6&psb:'7Bt>'Rg1B'n6CF(4ZUJ(P)gN"
+        data_format = '%sB' % len(raw_data)
+        self.assertEqual(
+            encoded_data,
+            base85.arnold_b85_encode(struct.pack(data_format, *raw_data))
+        )
+        self.assertEqual(
+            raw_data,
+            list(struct.unpack(data_format,
+                               base85.arnold_b85_decode(encoded_data)))
+        )
+
+
+class B85WriterTestCase(unittest.TestCase):
+    """tests the B85Encoder and B85Writer classes
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        import random
+        r = random.Random(500)
+        values = [r.choice([0.0, 1.0, r.random()]) for _ in range(1000)]
+        self.raw_data = struct.pack('<%sf' % len(values), *values)
+
+    def test_encoder_generates_the_same_data_with_one_pass_encoding(self):
+        """testing if B85Encoder generates the same data with encoding the
+        whole data at once when the data is given in unaligned pieces
+        """
+        encoder = base85.B85Encoder()
+        parts = []
+        for i in range(0, len(self.raw_data), 7):
+            parts.append(encoder.encode(self.raw_data[i:i + 7]))
+        parts.append(encoder.flush())
+        self.assertEqual(
+            base85.arnold_b85_encode(self.raw_data),
+            ''.join(parts)
+        )
+
+    def test_encoder_pads_the_last_word(self):
+        """testing if B85Encoder pads the remaining bytes on flush
+        """
+        encoder = base85.B85Encoder(base85.rfc1924_b85_encode)
+        self.assertEqual('', encoder.encode('abc'))
+        self.assertEqual(base85.rfc1924_b85_encode('abc'), encoder.flush())
+        self.assertEqual('', encoder.flush())
+
+    def test_writer_writes_fixed_width_lines(self):
+        """testing if B85Writer writes the data in fixed width lines
+        """
+        from cStringIO import StringIO
+        from anima.render.arnold.h2a import split_data
+
+        output = StringIO()
+        writer = base85.B85Writer(output, line_width=500, chunk_size=64)
+        writer.writelines(
+            self.raw_data[i:i + 13] for i in range(0, len(self.raw_data), 13)
+        )
+        writer.close()
+
+        expected = '%s\n' % split_data(
+            base85.arnold_b85_encode(self.raw_data), 500
+        )
+        self.assertEqual(expected, output.getvalue())
+
+    def test_writer_ends_the_line_for_complete_lines(self):
+        """testing if B85Writer doesn't write an empty line if the data fills
+        the last line completely
+        """
+        from cStringIO import StringIO
+        output = StringIO()
+        writer = base85.B85Writer(output, line_width=5)
+        writer.write(struct.pack('<2f', 2, 3.484236717224121))
+        writer.close()
+        self.assertEqual('8TFfd\n8^RH(\n', output.getvalue())
+
+    def test_writer_writes_an_empty_line_for_empty_data(self):
+        """testing if B85Writer writes an empty line for empty data
+        """
+        from cStringIO import StringIO
+        output = StringIO()
+        writer = base85.B85Writer(output)
+        writer.write('')
+        writer.close()
+        self.assertEqual('\n', output.getvalue())
+
+
+class B85EncoderPoolTestCase(unittest.TestCase):
+    """tests the B85EncoderPool class
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """setup the test in class level
+        """
+        # use small chunks to force the data to be split between the workers
+        cls.pool = base85.B85EncoderPool(processes=3, min_chunk_size=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        """clean the test in class level
+        """
+        cls.pool.close()
+
+    def test_plan_uses_the_current_process_for_small_data(self):
+        """testing if B85EncoderPool.plan() returns a single worker for data
+        that fits in to one chunk
+        """
+        self.assertEqual((1, 64), self.pool.plan(64))
+        self.assertEqual((2, 64), self.pool.plan(100))
+
+    def test_plan_limits_the_worker_count(self):
+        """testing if B85EncoderPool.plan() limits the worker count with the
+        process count and aligns the chunk size to 32-bit words
+        """
+        number_of_workers, chunk_size = self.pool.plan(10001)
+        self.assertEqual(3, number_of_workers)
+        self.assertEqual(0, chunk_size % 4)
+        self.assertTrue(chunk_size * 3 * 4 >= 10001)
+
+    def test_encode_is_working_properly(self):
+        """testing if B85EncoderPool.encode() generates the same data with the
+        single process encoders
+        """
+        import random
+        r = random.Random(3)
+        for length in [0, 3, 64, 129, 1000, 4001]:
+            data = ''.join(chr(r.randint(0, 255)) for _ in range(length))
+            for name in ['standard', 'rfc1924', 'arnold']:
+                self.assertEqual(
+                    base85.ENCODERS[name](data),
+                    self.pool.encode(data, name)
+                )
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from anima.render.arnold import asstoc, batch, h2a
+from tests.arnold.test_h2a import Geometry, Hou, Node
+
+
+class FakeGeometryProvider(object):
+    """returns a moving quad strip for every frame
+    """
+
+    def __init__(self, snapshot=False):
+        self.frames = []
+        self.snapshot = snapshot
+
+    def __call__(self, frame):
+        self.frames.append(frame)
+        points = []
+        for i in range(10):
+            points.append((float(i), float(frame), 0.0))
+            points.append((float(i), float(frame), 1.0))
+        prims = [[2 * i, 2 * i + 2, 2 * i + 3, 2 * i + 1] for i in range(9)]
+        node = Node(Geometry(points, prims))
+        if self.snapshot:
+            return batch.FrozenNode(
+                node.path(), batch.GeometrySnapshot(node.geometry())
+            )
+        return node
+
+
+class BatchExporterTestCase(unittest.TestCase):
+    """tests the anima.render.arnold.batch.BatchExporter class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.use_encoder_pool = h2a.use_encoder_pool
+        h2a.use_encoder_pool = False
+        self.hou = h2a.hou
+        h2a.hou = Hou()
+        self.temp_path = tempfile.mkdtemp()
+        self.path_template = os.path.join(self.temp_path, 'mesh.####.ass.gz')
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.use_encoder_pool = self.use_encoder_pool
+        h2a.hou = self.hou
+        shutil.rmtree(self.temp_path)
+
+    def test_get_frame_path(self):
+        """testing if the frame paths are generated properly
+        """
+        self.assertEqual(
+            '/tmp/mesh.0012.ass.gz',
+            batch.get_frame_path('/tmp/mesh.####.ass.gz', 12)
+        )
+        self.assertEqual(
+            '/tmp/mesh.012.ass', batch.get_frame_path('/tmp/mesh.###.ass', 12)
+        )
+
+    def check_export(self, workers, snapshot=False):
+        """exports the frames with the given number of workers
+        """
+        provider = FakeGeometryProvider(snapshot=snapshot)
+        exporter = batch.BatchExporter(
+            provider, self.path_template, 'mesh', workers=workers,
+            export_type=1
+        )
+        paths = exporter.export(1, 5)
+
+        self.assertEqual([1, 2, 3, 4, 5], provider.frames)
+        self.assertEqual(
+            [batch.get_frame_path(self.path_template, i) for i in range(1, 6)],
+            paths
+        )
+        for frame, path in zip(range(1, 6), paths):
+            f = gzip.open(path, 'rb')
+            data = f.read()
+            f.close()
+            self.assertEqual(
+                h2a.polygon2ass(FakeGeometryProvider()(frame), 'mesh'), data
+            )
+            toc = asstoc.AssToc.read(asstoc.get_asstoc_path(path))
+            self.assertEqual(float(frame), toc.bounds[1])
+            self.assertEqual('polymesh', toc['mesh'].type)
+
+        self.assertEqual(range(1, 6), sorted(exporter.timings.keys()))
+        for timings in exporter.timings.values():
+            for stage in batch.STAGES:
+                self.assertTrue(timings[stage] >= 0)
+
+        report = exporter.report()
+        for stage in batch.STAGES:
+            self.assertIn('Total %s' % stage, report)
+
+    def test_export_with_multiple_workers(self):
+        """testing if the frames are exported properly with multiple workers
+        """
+        self.check_export(workers=3)
+
+    def test_export_with_single_worker(self):
+        """testing if the frames are exported properly with a single worker
+        """
+        self.check_export(workers=1)
+
+    def test_export_snapshots(self):
+        """testing if the frames are exported properly from geometry
+        snapshots
+        """
+        self.check_export(workers=3, snapshot=True)
+
+    def test_snapshot_of_curves(self):
+        """testing if the curves exported from a geometry snapshot are the
+        same with the ones exported from the geometry
+        """
+        points = [(float(i), float(i % 3), 0.0) for i in range(9)]
+        geo = Geometry(points, [[0, 1, 2, 3], [4, 5], [6, 7, 8]])
+        geo.vertex_attributes['width'] = (1, [0.1] * len(points))
+        geo.point_attributes['pprime'] = (3, points)
+        geo.prim_attributes['uv_u'] = (1, [0.5] * 3)
+        geo.prim_attributes['uv_v'] = (1, [0.5] * 3)
+
+        snapshot = batch.GeometrySnapshot(geo, export_type=0)
+        self.assertEqual(1, geo.iter_prims_call_count)
+        self.assertEqual(
+            h2a.curves2ass(Node(geo), 'hair'),
+            h2a.curves2ass(batch.FrozenNode('/obj/geo1/OUT', snapshot), 'hair')
+        )
+        # the point counts are not read from the primitives again
+        self.assertEqual(2, geo.iter_prims_call_count)
+
+    def test_snapshot_of_curves_without_width(self):
+        """testing if the widths of the curves without a point or vertex width
+        attribute are read from the primitives while creating the snapshot
+        """
+        points = [(float(i), float(i % 3), 0.0) for i in range(9)]
+        geo = Geometry(points, [[0, 1, 2, 3], [4, 5], [6, 7, 8]])
+        geo.prim_attributes['width'] = (1, [0.1, 0.2, 0.3])
+        geo.prim_attributes['uv_u'] = (1, [0.5] * 3)
+        geo.prim_attributes['uv_v'] = (1, [0.5] * 3)
+
+        snapshot = batch.GeometrySnapshot(geo, export_type=0)
+        self.assertEqual(
+            h2a.curves2ass(Node(geo), 'hair'),
+            h2a.curves2ass(batch.FrozenNode('/obj/geo1/OUT', snapshot), 'hair')
+        )
+
+    def test_snapshot_of_particles_without_radius_and_color(self):
+        """testing if the particles without pscale and particle_color
+        attributes are exported from a geometry snapshot like from the
+        geometry
+        """
+        points = [(float(i), float(i % 3), 0.0) for i in range(9)]
+        geo = Geometry(points, [])
+        snapshot = batch.GeometrySnapshot(geo, export_type=2)
+        self.assertRaises(
+            Hou.OperationFailed,
+            snapshot.pointFloatAttribValuesAsString, 'pscale'
+        )
+        self.assertEqual(
+            h2a.particle2ass(Node(geo), 'particles', export_color=True),
+            h2a.particle2ass(
+                batch.FrozenNode('/obj/geo1/OUT', snapshot), 'particles',
+                export_color=True
+            )
+        )
+
+    def test_export_particles_without_radius_and_color(self):
+        """testing if the particles without pscale and particle_color
+        attributes are exported from geometry snapshots
+        """
+        def provider(frame):
+            points = [(float(i), float(frame), 0.0) for i in range(9)]
+            return batch.FrozenNode(
+                '/obj/geo1/OUT',
+                batch.GeometrySnapshot(Geometry(points, []), export_type=2)
+            )
+
+        exporter = batch.BatchExporter(
+            provider, self.path_template, 'particles', workers=2,
+            export_type=2
+        )
+        paths = exporter.export(1, 3)
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
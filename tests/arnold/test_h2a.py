@@ -0,0 +1,763 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import array
+import os
+import shutil
+import struct
+import tempfile
+import types
+import unittest
+
+from anima.render.arnold import asstoc, base85, h2a
+
+
+class Attrib(object):
+    """A stand-in for hou.Attrib
+    """
+
+    def __init__(self, name, size):
+        self._name = name
+        self._size = size
+
+    def name(self):
+        return self._name
+
+    def size(self):
+        return self._size
+
+
+class Point(object):
+    """A stand-in for hou.Point
+    """
+
+    def __init__(self, number):
+        self._number = number
+
+    def number(self):
+        return self._number
+
+
+class Vertex(object):
+    """A stand-in for hou.Vertex, which reads the primitive attributes if
+    there is no vertex attribute with the same name like HOM
+    """
+
+    def __init__(self, point_number, prim_attribute_values=None):
+        self._point = Point(point_number)
+        self._prim_attribute_values = prim_attribute_values or {}
+
+    def point(self):
+        return self._point
+
+    def attribValue(self, name):
+        if name not in self._prim_attribute_values:
+            raise Hou.OperationFailed('Invalid attribute name: %s' % name)
+        return self._prim_attribute_values[name]
+
+
+class Prim(object):
+    """A stand-in for hou.Prim
+    """
+
+    def __init__(self, point_numbers, attribute_values=None):
+        self._vertices = [
+            Vertex(i, attribute_values) for i in point_numbers
+        ]
+
+    def numVertices(self):
+        return len(self._vertices)
+
+    def vertices(self):
+        return self._vertices
+
+
+class Geometry(object):
+    """A stand-in for hou.Geometry, which is able to create the integer
+    attributes that h2a uses to read the polygon indices in bulk
+    """
+
+    def __init__(self, points, prims, index_attributes=False):
+        self.points = points
+        self._prims = prims
+        self.point_attributes = {'P': (3, points)}
+        self.prim_attributes = {}
+        self.vertex_attributes = {}
+        if index_attributes:
+            self.prim_attributes[h2a.vertex_count_attribute_name] = \
+                (1, [len(prim) for prim in prims])
+            self.vertex_attributes[h2a.vertex_point_attribute_name] = \
+                (1, [i for prim in prims for i in prim])
+        self.iter_prims_call_count = 0
+
+    def attribValue(self, name):
+        values = [point[i] for point in self.points for i in range(3)]
+        if name == 'bound_min':
+            return tuple(min(values[i::3]) for i in range(3))
+        elif name == 'bound_max':
+            return tuple(max(values[i::3]) for i in range(3))
+        raise KeyError(name)
+
+    def intrinsicValueDict(self):
+        return {
+            'primitivecount': len(self._prims),
+            'pointcount': len(self.points),
+            'vertexcount': sum(map(len, self._prims)),
+        }
+
+    def iterPrims(self):
+        self.iter_prims_call_count += 1
+        return iter(self.prims())
+
+    def prims(self):
+        return [
+            Prim(
+                prim,
+                dict(
+                    (name, values[i])
+                    for name, (size, values) in self.prim_attributes.items()
+                )
+            )
+            for i, prim in enumerate(self._prims)
+        ]
+
+    @classmethod
+    def find_attrib(cls, attributes, name):
+        if name in attributes:
+            return Attrib(name, attributes[name][0])
+
+    @classmethod
+    def float_values_as_string(cls, attributes, name):
+        if name not in attributes:
+            raise Hou.OperationFailed('Invalid attribute name: %s' % name)
+        data = []
+        for value in attributes[name][1]:
+            if isinstance(value, tuple):
+                data.extend(value)
+            else:
+                data.append(value)
+        return struct.pack('%sf' % len(data), *data)
+
+    def findPointAttrib(self, name):
+        return self.find_attrib(self.point_attributes, name)
+
+    def findPrimAttrib(self, name):
+        return self.find_attrib(self.prim_attributes, name)
+
+    def findVertexAttrib(self, name):
+        return self.find_attrib(self.vertex_attributes, name)
+
+    def intrinsicValue(self, name):
+        return self.intrinsicValueDict()[name]
+
+    def primFloatAttribValuesAsString(self, name):
+        return self.float_values_as_string(self.prim_attributes, name)
+
+    def primIntAttribValuesAsString(self, name):
+        return array.array('i', self.prim_attributes[name][1]).tostring()
+
+    def vertexIntAttribValuesAsString(self, name):
+        return array.array('i', self.vertex_attributes[name][1]).tostring()
+
+    def pointFloatAttribValuesAsString(self, name):
+        return self.float_values_as_string(self.point_attributes, name)
+
+    def vertexFloatAttribValuesAsString(self, name):
+        return self.float_values_as_string(self.vertex_attributes, name)
+
+
+class AttribWrangleVerb(object):
+    """A stand-in for the attribwrangle hou.SopVerb, which computes the
+    polygon index attributes instead of running the VEX snippet
+    """
+
+    def __init__(self):
+        self.parms = {}
+        self.execute_call_count = 0
+
+    def setParms(self, parms):
+        self.parms = parms
+
+    def execute(self, output_geo, input_geos):
+        self.execute_call_count += 1
+        input_geo = input_geos[0]
+        output_geo.points = input_geo.points
+        output_geo._prims = input_geo._prims
+        output_geo.point_attributes = dict(input_geo.point_attributes)
+        output_geo.prim_attributes = dict(input_geo.prim_attributes)
+        output_geo.vertex_attributes = dict(input_geo.vertex_attributes)
+        prims = input_geo._prims
+        if self.parms['class'] == 1:
+            output_geo.prim_attributes[h2a.vertex_count_attribute_name] = \
+                (1, [len(prim) for prim in prims])
+        else:
+            output_geo.vertex_attributes[h2a.vertex_point_attribute_name] = \
+                (1, [i for prim in prims for i in prim])
+
+
+class Hou(object):
+    """A stand-in for the hou module, for the SOP verbs
+    """
+
+    class OperationFailed(Exception):
+        pass
+
+    def __init__(self):
+        self.verb = AttribWrangleVerb()
+
+    def sopNodeTypeCategory(self):
+        return self
+
+    def nodeVerb(self, name):
+        return self.verb
+
+    def Geometry(self):
+        return Geometry([], [])
+
+
+class Node(object):
+    """A stand-in for hou.SopNode
+    """
+
+    def __init__(self, geometry):
+        self._geometry = geometry
+
+    def geometry(self):
+        return self._geometry
+
+    def path(self):
+        return '/obj/geo1/OUT'
+
+
+def decode_uint_array(encoded_data):
+    """decodes the data written by h2a.write_uint_array()
+    """
+    encoded_data = encoded_data.replace('\n', '')
+    if encoded_data.startswith('B'):
+        return list(
+            array.array('B', base85.arnold_b85_decode(encoded_data[1:]))
+        )
+    return list(array.array('I', base85.arnold_b85_decode(encoded_data)))
+
+
+class Polygon2AssTestCase(unittest.TestCase):
+    """tests the h2a.polygon2ass() function
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.use_encoder_pool = h2a.use_encoder_pool
+        h2a.use_encoder_pool = False
+
+        self.points = [(float(i), 0.0, float(i % 3)) for i in range(300)]
+        self.prims = []
+        for i in range(0, 296, 2):
+            if i % 4:
+                self.prims.append([i, i + 1, i + 2])
+            else:
+                self.prims.append([i, i + 1, i + 2, i + 3])
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.use_encoder_pool = self.use_encoder_pool
+
+    def get_section(self, data, header, next_header):
+        """returns the data between the given headers
+        """
+        start = data.index(header) + len(header)
+        end = data.index(next_header, start)
+        return data[start:end]
+
+    def check_indices(self, geo):
+        """checks the nsides and vidxs sections of the exported data
+        """
+        data = h2a.polygon2ass(Node(geo), 'test_mesh')
+
+        nsides = self.get_section(
+            data, ' nsides %i 1 b85UINT\n' % len(self.prims), ' vidxs'
+        )
+        self.assertEqual(
+            [len(prim) for prim in self.prims],
+            decode_uint_array(nsides)[:len(self.prims)]
+        )
+
+        vertex_count = sum(map(len, self.prims))
+        vidxs = self.get_section(
+            data, ' vidxs %i 1 b85UINT\n' % vertex_count, ' vlist'
+        )
+        self.assertEqual(
+            [i for prim in self.prims for i in prim],
+            decode_uint_array(vidxs)
+        )
+
+    def test_indices_are_read_from_attributes(self):
+        """testing if the polygon indices are read from the integer attributes
+        without iterating over the primitives
+        """
+        geo = Geometry(self.points, self.prims, index_attributes=True)
+        self.check_indices(geo)
+        self.assertEqual(0, geo.iter_prims_call_count)
+
+    def test_indices_are_collected_from_prims(self):
+        """testing if the polygon indices are collected from the primitives if
+        the geometry has no index attributes
+        """
+        geo = Geometry(self.points, self.prims)
+        self.check_indices(geo)
+        self.assertEqual(1, geo.iter_prims_call_count)
+
+    def test_stale_attributes_are_not_used(self):
+        """testing if the index attributes that do not match the topology of
+        the geometry are not used
+        """
+        geo = Geometry(self.points, self.prims, index_attributes=True)
+        # the last primitive is deleted after the attributes are created
+        self.prims = self.prims[:-1]
+        geo._prims = self.prims
+        geo.vertex_attributes[h2a.vertex_point_attribute_name] = \
+            (1, [i for prim in self.prims for i in prim])
+        self.check_indices(geo)
+        self.assertEqual(1, geo.iter_prims_call_count)
+
+    def test_indices_are_computed_with_sop_verbs(self):
+        """testing if the index attributes are computed with SOP verbs
+        instead of iterating over the vertices if the geometry has no index
+        attributes
+        """
+        hou = h2a.hou
+        h2a.hou = Hou()
+        try:
+            geo = Geometry(self.points, self.prims)
+            self.check_indices(geo)
+            self.assertEqual(0, geo.iter_prims_call_count)
+            self.assertEqual(2, h2a.hou.verb.execute_call_count)
+            # the original geometry is not modified
+            self.assertEqual({}, geo.prim_attributes)
+        finally:
+            h2a.hou = hou
+
+    def test_small_values_are_packed_as_bytes(self):
+        """testing if the values that fit in to a byte are packed as bytes
+        """
+        geo = Geometry(self.points, self.prims)
+        data = h2a.polygon2ass(Node(geo), 'test_mesh')
+        nsides = self.get_section(
+            data, ' nsides %i 1 b85UINT\n' % len(self.prims), ' vidxs'
+        )
+        vidxs = self.get_section(
+            data, ' vidxs %i 1 b85UINT\n' % sum(map(len, self.prims)),
+            ' vlist'
+        )
+        self.assertTrue(nsides.startswith('B'))
+        self.assertFalse(vidxs.startswith('B'))
+
+
+class Polygon2AssAttributesTestCase(unittest.TestCase):
+    """tests the uv and normal export of the h2a.polygon2ass() function
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.use_encoder_pool = h2a.use_encoder_pool
+        h2a.use_encoder_pool = False
+        self.numpy = h2a.numpy
+
+        # a strip of quads
+        self.points = []
+        for i in range(20):
+            self.points.append((float(i), 0.0, 0.0))
+            self.points.append((float(i), 0.0, 1.0))
+        self.prims = [
+            [2 * i, 2 * i + 2, 2 * i + 3, 2 * i + 1] for i in range(19)
+        ]
+
+        # every quad has the full uv space, so there are only 4 unique uvs
+        self.uvs = []
+        for prim in self.prims:
+            self.uvs.extend([
+                (0.0, 0.0, 0.0), (1.0, 0.0, 0.0),
+                (1.0, 1.0, 0.0), (0.0, 1.0, 0.0)
+            ])
+
+        # all the normals are pointing up except the first two points
+        self.normals = [(0.0, 1.0, 0.0)] * len(self.points)
+        self.normals[0] = (1.0, 0.0, 0.0)
+        self.normals[1] = (0.0, 0.0, 1.0)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.use_encoder_pool = self.use_encoder_pool
+        h2a.numpy = self.numpy
+
+    def create_geometry(self):
+        """creates the test geometry
+        """
+        geo = Geometry(self.points, self.prims)
+        geo.vertex_attributes['uv'] = (3, self.uvs)
+        geo.point_attributes['N'] = (3, self.normals)
+        return geo
+
+    def get_section(self, data, header):
+        """returns the data after the given header until the next parameter
+        """
+        start = data.index(header) + len(header)
+        end = data.index('\n ', start)
+        return data[start:end]
+
+    def decode_floats(self, encoded_data):
+        """decodes the given float data
+        """
+        return list(
+            array.array(
+                'f', base85.arnold_b85_decode(encoded_data.replace('\n', ''))
+            )
+        )
+
+    def check_attributes(self, data):
+        """checks the exported uvs and normals
+        """
+        vertex_count = 4 * len(self.prims)
+
+        uvlist = self.decode_floats(
+            self.get_section(data, ' uvlist 4 1 b85POINT2\n')
+        )
+        uvidxs = decode_uint_array(
+            self.get_section(data, ' uvidxs %s 1 b85UINT\n' % vertex_count)
+        )[:vertex_count]
+        self.assertEqual(
+            [uv[:2] for uv in self.uvs],
+            [tuple(uvlist[2 * i:2 * i + 2]) for i in uvidxs]
+        )
+
+        nlist = self.decode_floats(
+            self.get_section(data, ' nlist 3 1 b85VECTOR\n')
+        )
+        nidxs = decode_uint_array(
+            self.get_section(data, ' nidxs %s 1 b85UINT\n' % vertex_count)
+        )[:vertex_count]
+        self.assertEqual(
+            [self.normals[i] for prim in self.prims for i in prim],
+            [tuple(nlist[3 * i:3 * i + 3]) for i in nidxs]
+        )
+
+    def test_uvs_and_normals_are_indexed(self):
+        """testing if the uvs and normals are exported as unique values and
+        indices
+        """
+        data = h2a.polygon2ass(Node(self.create_geometry()), 'test_mesh')
+        self.check_attributes(data)
+
+    def test_uvs_and_normals_are_indexed_without_numpy(self):
+        """testing if the uvs and normals are exported as unique values and
+        indices without numpy
+        """
+        h2a.numpy = None
+        data = h2a.polygon2ass(Node(self.create_geometry()), 'test_mesh')
+        self.check_attributes(data)
+
+    def test_numpy_and_python_results_are_identical(self):
+        """testing if the numpy and the pure python implementations produce
+        the same data
+        """
+        if self.numpy is None:
+            self.skipTest('numpy is not installed')
+        numpy_data = \
+            h2a.polygon2ass(Node(self.create_geometry()), 'test_mesh')
+        h2a.numpy = None
+        python_data = \
+            h2a.polygon2ass(Node(self.create_geometry()), 'test_mesh')
+        self.assertEqual(numpy_data, python_data)
+
+    def test_export_can_be_disabled(self):
+        """testing if the uvs and normals are skipped if they are disabled
+        """
+        data = h2a.polygon2ass(
+            Node(self.create_geometry()), 'test_mesh', export_uvs=False,
+            export_normals=False
+        )
+        self.assertNotIn(' uvlist', data)
+        self.assertNotIn(' nlist', data)
+
+    def test_motion_repeats_normals(self):
+        """testing if the normals are repeated for every motion key
+        """
+        geo = self.create_geometry()
+        geo.point_attributes['pprime'] = (3, self.points)
+        data = h2a.polygon2ass(Node(geo), 'test_mesh', export_motion=True)
+        nlist = self.decode_floats(
+            self.get_section(data, ' nlist 3 2 b85VECTOR\n')
+        )
+        self.assertEqual(nlist[:9], nlist[9:18])
+
+
+class Curves2AssTestCase(unittest.TestCase):
+    """tests the h2a.curves2ass() function
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.use_encoder_pool = h2a.use_encoder_pool
+        h2a.use_encoder_pool = False
+        self.numpy = h2a.numpy
+
+        # curves with varying number of points
+        self.create_points([4, 2, 7, 1, 5])
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.use_encoder_pool = self.use_encoder_pool
+        h2a.numpy = self.numpy
+
+    def create_points(self, point_counts):
+        """creates the test points and curves with the given point counts
+        """
+        self.point_counts = point_counts
+        self.points = []
+        self.prims = []
+        for i, count in enumerate(point_counts):
+            prim = []
+            for j in range(count):
+                prim.append(len(self.points))
+                self.points.append((float(i), float(j), 0.5 * i))
+            self.prims.append(prim)
+
+    def create_geometry(self, index_attributes=False):
+        """creates the test geometry
+        """
+        geo = Geometry(self.points, self.prims, index_attributes)
+        geo.point_attributes['width'] = (1, [0.1] * len(self.points))
+        geo.point_attributes['pprime'] = \
+            (3, [(x + 1.0, y, z) for x, y, z in self.points])
+        geo.prim_attributes['uv_u'] = (1, [0.5] * len(self.prims))
+        geo.prim_attributes['uv_v'] = (1, [0.5] * len(self.prims))
+        return geo
+
+    def padded_points(self, points):
+        """returns the expected point positions
+        """
+        padded_points = []
+        for prim in self.prims:
+            curve = [points[i] for i in prim]
+            padded_points.extend([curve[0]] + curve + [curve[-1]])
+        return padded_points
+
+    def decode_points(self, encoded_data):
+        """decodes the given point positions
+        """
+        values = array.array(
+            'f', base85.arnold_b85_decode(encoded_data.replace('\n', ''))
+        )
+        return [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+
+    def check_curves(self, data, sample_count=1):
+        """checks the num_points and points sections
+        """
+        num_points_header = ' num_points %s %s b85UINT\n' % (
+            len(self.prims), sample_count
+        )
+        start = data.index(num_points_header) + len(num_points_header)
+        end = data.index(' points', start)
+        self.assertEqual(
+            [count + 2 for count in self.point_counts] * sample_count,
+            decode_uint_array(data[start:end])[:len(self.prims) * sample_count]
+        )
+
+        points_header = ' points %s %s b85POINT\n' % (
+            len(self.points) + 2 * len(self.prims), sample_count
+        )
+        start = data.index(points_header) + len(points_header)
+        end = data.index(' radius', start)
+        expected_points = self.padded_points(self.points)
+        if sample_count == 2:
+            expected_points += self.padded_points(
+                [(x + 1.0, y, z) for x, y, z in self.points]
+            )
+        self.assertEqual(
+            expected_points, self.decode_points(data[start:end].strip())
+        )
+
+    def test_varying_point_counts(self):
+        """testing if the curves can have different number of points
+        """
+        data = h2a.curves2ass(Node(self.create_geometry()), 'hair')
+        self.check_curves(data)
+
+    def test_varying_point_counts_without_numpy(self):
+        """testing if the curves can have different number of points without
+        numpy
+        """
+        h2a.numpy = None
+        data = h2a.curves2ass(Node(self.create_geometry()), 'hair')
+        self.check_curves(data)
+
+    def test_point_counts_are_read_from_attribute(self):
+        """testing if the point counts are read from the integer primitive
+        attribute without iterating over the primitives
+        """
+        geo = self.create_geometry(index_attributes=True)
+        data = h2a.curves2ass(Node(geo), 'hair')
+        self.check_curves(data)
+        self.assertEqual(0, geo.iter_prims_call_count)
+
+    def test_motion(self):
+        """testing if the pprime positions are padded as the second key
+        """
+        data = h2a.curves2ass(
+            Node(self.create_geometry()), 'hair', export_motion=True
+        )
+        self.check_curves(data, sample_count=2)
+
+    def test_uniform_point_counts(self):
+        """testing if the uniform curves are padded as before
+        """
+        self.create_points([3] * 4)
+        point_positions = self.create_geometry()\
+            .pointFloatAttribValuesAsString('P')
+        # the previous implementation
+        expected = ''.join(
+            map(
+                lambda x: '%s%s%s' % (x[:12], x, x[-12:]),
+                map(''.join, zip(*[iter(point_positions)] * (3 * 4 * 3)))
+            )
+        )
+        counts = array.array('I', self.point_counts)
+        self.assertEqual(
+            expected, h2a.pad_curve_points(point_positions, counts)
+        )
+        h2a.numpy = None
+        self.assertEqual(
+            expected, h2a.pad_curve_points(point_positions, counts)
+        )
+
+    def test_curves_without_points(self):
+        """testing if a ValueError is raised for the curves without points
+        instead of mixing the points of the other curves
+        """
+        self.create_points([3, 0, 2])
+        point_positions = self.create_geometry()\
+            .pointFloatAttribValuesAsString('P')
+        counts = array.array('I', self.point_counts)
+        self.assertRaises(
+            ValueError, h2a.pad_curve_points, point_positions, counts
+        )
+        h2a.numpy = None
+        self.assertRaises(
+            ValueError, h2a.pad_curve_points, point_positions, counts
+        )
+
+        # the last curve
+        self.create_points([3, 2, 0])
+        self.assertRaises(
+            ValueError, h2a.curves2ass, Node(self.create_geometry()), 'hair'
+        )
+
+
+class Geometry2AssTestCase(unittest.TestCase):
+    """tests the h2a.geometry2ass() function
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.use_encoder_pool = h2a.use_encoder_pool
+        h2a.use_encoder_pool = False
+        self.use_parallel_gzip = h2a.use_parallel_gzip
+        self.hou = h2a.hou
+        self.temp_path = tempfile.mkdtemp()
+
+        points = [(float(i), float(i % 2), 2.0) for i in range(8)]
+        prims = [[0, 1, 3, 2], [2, 3, 5, 4], [4, 5, 7, 6]]
+        self.node = Node(Geometry(points, prims))
+
+        h2a.hou = types.ModuleType('hou')
+        h2a.hou.pwd = lambda: self.node
+        h2a.hou.OperationFailed = Hou.OperationFailed
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.use_encoder_pool = self.use_encoder_pool
+        h2a.use_parallel_gzip = self.use_parallel_gzip
+        h2a.hou = self.hou
+        shutil.rmtree(self.temp_path)
+
+    def check_asstoc(self, ass_path, **kwargs):
+        """exports the test geometry and checks the .asstoc file
+        """
+        h2a.geometry2ass(
+            ass_path, 'test_mesh', 0.5, 'ribbon', 1, False, False, 0,
+            **kwargs
+        )
+
+        toc = asstoc.AssToc.read(asstoc.get_asstoc_path(ass_path))
+        self.assertEqual((0.0, 0.0, 2.0, 7.0, 1.0, 2.0), toc.bounds)
+        self.assertEqual(1, len(toc.nodes))
+
+        node = toc['test_mesh']
+        self.assertEqual('polymesh', node.type)
+        self.assertEqual(8, node.point_count)
+        self.assertEqual(3, node.primitive_count)
+        self.assertEqual(toc.bounds, node.bounds)
+
+        node_data = asstoc.read_node_data(ass_path, 'test_mesh')
+        self.assertEqual(
+            h2a.polygon2ass(self.node, 'test_mesh'), node_data
+        )
+
+    def test_asstoc(self):
+        """testing if the .asstoc file is written properly for .ass files
+        """
+        self.check_asstoc(os.path.join(self.temp_path, 'test.ass'))
+
+    def test_asstoc_gzip(self):
+        """testing if the .asstoc file is written properly for .ass.gz files
+        """
+        self.check_asstoc(os.path.join(self.temp_path, 'test.ass.gz'))
+
+    def test_asstoc_gzip_without_parallel_gzip(self):
+        """testing if the .asstoc file is written properly for .ass.gz files
+        that are written with the gzip module
+        """
+        h2a.use_parallel_gzip = False
+        self.check_asstoc(os.path.join(self.temp_path, 'test.ass.gz'))
+
+    def test_compression_level(self):
+        """testing if the compression level can be set with the
+        compression_level keyword argument
+        """
+        ass_path = os.path.join(self.temp_path, 'test.ass.gz')
+        self.check_asstoc(ass_path, compression_level=0)
+        uncompressed_size = os.path.getsize(ass_path)
+        self.check_asstoc(ass_path, compression_level=9)
+        self.assertTrue(os.path.getsize(ass_path) < uncompressed_size)
+
+    def test_asstoc_curves(self):
+        """testing if the .asstoc node of a curves export has the name that is
+        written in to the .ass file
+        """
+        geo = self.node.geometry()
+        geo.point_attributes['width'] = (1, [0.1] * len(geo.points))
+        geo.point_attributes['pprime'] = (3, geo.points)
+        geo.prim_attributes['uv_u'] = (1, [0.5] * len(geo._prims))
+        geo.prim_attributes['uv_v'] = (1, [0.5] * len(geo._prims))
+
+        ass_path = os.path.join(self.temp_path, 'test.ass')
+        h2a.geometry2ass(
+            ass_path, 'test_hair', 0.5, 'ribbon', 0, False, False, 0
+        )
+
+        toc = asstoc.AssToc.read(asstoc.get_asstoc_path(ass_path))
+        node_name = '_obj_geo1_OUT'
+        self.assertEqual([node_name], [node.name for node in toc.nodes])
+        self.assertEqual('curves', toc[node_name].type)
+        node_data = asstoc.read_node_data(ass_path, node_name)
+        self.assertTrue(' name %s\n' % node_name in node_data)
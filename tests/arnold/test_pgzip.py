@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import gzip
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from anima.render.arnold import pgzip
+
+
+class ParallelGzipFileTestCase(unittest.TestCase):
+    """tests the anima.render.arnold.pgzip.ParallelGzipFile class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_path, 'test.ass.gz')
+        r = random.Random(0)
+        self.data = ''.join(
+            [chr(r.randint(32, 126)) * r.randint(1, 20) for i in range(5000)]
+        )
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+
+    def write(self, **kwargs):
+        """writes the test data in uneven pieces
+        """
+        f = pgzip.open_file(self.path, 'w', **kwargs)
+        i = 0
+        step = 1
+        while i < len(self.data):
+            f.write(self.data[i:i + step])
+            i += step
+            step = step * 2 + 1
+            self.assertEqual(min(i, len(self.data)), f.tell())
+        f.close()
+        return f
+
+    def read(self):
+        """reads the file back with the gzip module
+        """
+        f = gzip.open(self.path, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_data_is_written_in_multiple_members(self):
+        """testing if the data is compressed in multiple members which can be
+        read back with the gzip module
+        """
+        f = self.write(threads=3, block_size=1000)
+        self.assertEqual(len(self.data) // 1000 + 1, f.member_count)
+        self.assertEqual(self.data, self.read())
+
+    def test_shared_pool(self):
+        """testing if the files use the shared compression pool if the thread
+        count is skipped and the pool is not closed with the files
+        """
+        f1 = pgzip.open_file(self.path, 'w', block_size=1000)
+        f2 = pgzip.open_file(
+            os.path.join(self.temp_path, 'test2.ass.gz'), 'w',
+            block_size=1000
+        )
+        if f1.pool is None:
+            # single CPU
+            f1.close()
+            f2.close()
+            return
+        pool = pgzip.get_compression_pool()
+        self.assertIs(pool, f1.pool)
+        self.assertIs(pool, f2.pool)
+        f1.write(self.data)
+        f1.close()
+        f2.close()
+        self.assertEqual(self.data, self.read())
+        # the pool is still usable
+        self.assertEqual(1, pool.apply(len, ('a', )))
+
+    def test_single_thread(self):
+        """testing if the data is compressed properly with a single thread
+        """
+        self.write(threads=1, block_size=1000)
+        self.assertEqual(self.data, self.read())
+
+    def test_compression_level(self):
+        """testing if the compression level is used
+        """
+        self.write(threads=2, block_size=10000, compresslevel=0)
+        uncompressed_size = os.path.getsize(self.path)
+        self.assertEqual(self.data, self.read())
+
+        self.write(threads=2, block_size=10000, compresslevel=9)
+        self.assertTrue(os.path.getsize(self.path) < uncompressed_size)
+        self.assertEqual(self.data, self.read())
+
+    def test_invalid_compression_level(self):
+        """testing if a ValueError will be raised for invalid compression
+        levels
+        """
+        self.assertRaises(
+            ValueError, pgzip.ParallelGzipFile, self.path, compresslevel=10
+        )
+
+    def test_read_mode(self):
+        """testing if a ValueError will be raised for read modes
+        """
+        self.assertRaises(ValueError, pgzip.ParallelGzipFile, self.path, 'r')
+
+    def test_empty_file(self):
+        """testing if an empty file is still a valid gzip file
+        """
+        pgzip.open_file(self.path, 'w').close()
+        self.assertEqual('', self.read())
+
+    def test_gunzip(self):
+        """testing if the file can be decompressed with gunzip
+        """
+        self.write(threads=3, block_size=1000)
+        try:
+            process = subprocess.Popen(
+                ['gzip', '-dc', self.path], stdout=subprocess.PIPE
+            )
+        except OSError:
+            self.skipTest('gzip is not available')
+        stdout, stderr = process.communicate()
+        self.assertEqual(0, process.returncode)
+        self.assertEqual(self.data, stdout)
@@ -4,18 +4,110 @@
 # This module is part of anima-tools and is released under the BSD 2
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 """Tests the speed of the base85 encode operation
+
+Run it with ``compare`` argument to compare the pure Python codec with the
+NumPy codec::
+
+  python test_speed.py compare
+
+Run it with ``gzip`` argument to compare the gzip module with the parallel gzip
+writer, an optional compression level can be given::
+
+  python test_speed.py gzip 6
 """
+import gzip
+import os
+import sys
+import tempfile
 import time
 import re
 
-from anima.render.arnold import base85
+from anima.render.arnold import base85, pgzip
 from struct import pack, unpack
 
 
+def measure_encode(title, encode, data, repeat):
+    """encodes the given data with the given function and prints the timings
+
+    :param str title: The title of the measurement
+    :param encode: The encode function
+    :param str data: The data to be encoded
+    :param int repeat: Repetition count
+    :return: str
+    """
+    print('%s' % (' %s ' % title).center(24, '*'))
+    encoded_data = None
+    start = time.time()
+    for i in range(repeat):
+        encoded_data = encode(data)
+    end = time.time()
+    encode_duration = end - start
+    print('Encoding %3i times took : %.3f seconds' % (repeat, encode_duration))
+    print('Averaging               : %.3f seconds' % (encode_duration / repeat))
+    return encoded_data, encode_duration
+
+
+def measure_decode(title, data, repeat):
+    """decodes the given data with the current base85 settings and prints the
+    timings
+
+    :param str title: The title of the measurement
+    :param str data: The data to be decoded
+    :param int repeat: Repetition count
+    :return: str
+    """
+    print('%s' % (' %s ' % title).center(24, '*'))
+    decoded_data = None
+    start = time.time()
+    for i in range(repeat):
+        decoded_data = base85.arnold_b85_decode(data)
+    end = time.time()
+    decode_duration = end - start
+    print('Decoding %3i times took : %.3f seconds' % (repeat, decode_duration))
+    print('Averaging               : %.3f seconds' % (decode_duration / repeat))
+    return decoded_data, decode_duration
+
+
+def measure_write(title, file_handler, data, compression_level):
+    """writes the given data in 500 character lines with the given gzip file
+    handler and prints the timings
+
+    :param str title: The title of the measurement
+    :param file_handler: A function similar to :func:`gzip.open`
+    :param str data: The data to be written
+    :param int compression_level: The compression level
+    :return: (float, int) The duration and the file size
+    """
+    print('%s' % (' %s ' % title).center(24, '*'))
+    fd, path = tempfile.mkstemp(suffix='.ass.gz')
+    os.close(fd)
+    try:
+        start = time.time()
+        f = file_handler(path, 'w', compression_level)
+        for i in range(0, len(data), 1 << 20):
+            f.write(data[i:i + (1 << 20)])
+        f.close()
+        end = time.time()
+        write_duration = end - start
+        file_size = os.path.getsize(path)
+
+        f = gzip.open(path, 'rb')
+        assert f.read() == data
+        f.close()
+    finally:
+        os.remove(path)
+
+    print('Writing took            : %.3f seconds' % write_duration)
+    print('File size               : %s bytes' % file_size)
+    return write_duration, file_size
+
+
 if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'normal'
     repeat = 1
     num_of_data = 50000000
 
+    print('Mode                    : %s' % mode)
     print('Repetition              : %s' % repeat)
     print('Number of Data          : %s' % num_of_data)
 
@@ -31,22 +123,62 @@ if __name__ == '__main__':
     unpacking_data = end - start
     print('length of unpacked data : %s' % len(unpacked_data))
     print('Unpacking data          : %.3f seconds' % unpacking_data)
+    del unpacked_data
 
-    print('******** NORMAL ********')
-    start = time.time()
-    normal_encoded_data = base85.arnold_b85_encode(data)
-    end = time.time()
-    encode_duration = end - start
-    print('Encoding %3i times took : %.3f seconds' % (repeat, encode_duration))
-    print('Averaging               : %.3f seconds' % (encode_duration / repeat))
+    if mode == 'gzip':
+        compression_level = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+        print('Compression Level       : %s' % compression_level)
+        encoded_data = base85.arnold_b85_encode(data)
 
-    print('**** MULTI-THREADED ****')
-    start = time.time()
-    thread_encoded_data = base85.arnold_b85_encode_multithreaded(data)
-    end = time.time()
-    encode_duration = end - start
-    print('Encoding %3i times took : %.3f seconds' % (repeat, encode_duration))
-    print('Averaging               : %.3f seconds' % (encode_duration / repeat))
+        gzip_duration, gzip_size = measure_write(
+            'GZIP', gzip.open, encoded_data, compression_level
+        )
+        pgzip_duration, pgzip_size = measure_write(
+            'PARALLEL GZIP', pgzip.open_file, encoded_data, compression_level
+        )
+
+        print('************************')
+        print('Write speed up          : %.2fx' %
+              (gzip_duration / pgzip_duration))
+        print('Size ratio              : %.4f' %
+              (float(pgzip_size) / gzip_size))
+        sys.exit(0)
+
+    if mode == 'compare':
+        if base85.numpy is None:
+            print('NumPy is not installed, can not compare!')
+            sys.exit(1)
+
+        base85.use_numpy = False
+        python_encoded_data, python_encode_duration = measure_encode(
+            'PURE PYTHON', base85.arnold_b85_encode, data, repeat
+        )
+        python_decoded_data, python_decode_duration = \
+            measure_decode('PURE PYTHON', python_encoded_data, repeat)
+
+        base85.use_numpy = True
+        numpy_encoded_data, numpy_encode_duration = measure_encode(
+            'NUMPY', base85.arnold_b85_encode, data, repeat
+        )
+        numpy_decoded_data, numpy_decode_duration = \
+            measure_decode('NUMPY', numpy_encoded_data, repeat)
+
+        assert python_encoded_data == numpy_encoded_data
+        assert python_decoded_data == numpy_decoded_data == data
+
+        print('************************')
+        print('Encode speed up         : %.2fx' %
+              (python_encode_duration / numpy_encode_duration))
+        print('Decode speed up         : %.2fx' %
+              (python_decode_duration / numpy_decode_duration))
+        sys.exit(0)
+
+    normal_encoded_data, encode_duration = \
+        measure_encode('NORMAL', base85.arnold_b85_encode, data, repeat)
+
+    thread_encoded_data, encode_duration = measure_encode(
+        'MULTI-THREADED', base85.arnold_b85_encode_multithreaded, data, repeat
+    )
 
     assert normal_encoded_data == thread_encoded_data
 
@@ -66,4 +198,3 @@ if __name__ == '__main__':
     list_splitted_data = '\n'.join(list_splitted_data)
     end = time.time()
     print('Using List Append       : %.3f seconds' % (end - start))
-
@@ -7,6 +7,7 @@
 import logging
 
 import unittest
+from sqlalchemy import event
 from stalker import (db, Repository, Project, Structure, FilenameTemplate,
                      Status, StatusList, Task, Version)
 from stalker.db import DBSession
@@ -620,3 +621,154 @@ class EnvironmentBaseTestCase(unittest.TestCase):
             '/Volumes/S/TP2/Test_Task_1/Test_Task_1_Main_v001'
         )
         self.assertEqual(trimmed_path, expected_value2)
+
+
+class EnvironmentBaseVersionLookupTestCase(unittest.TestCase):
+    """tests the batched Version lookups of the EnvironmentBase class
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """set up the test in class level
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        """cleanup the test
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+
+    def setUp(self):
+        """set up the test
+        """
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+
+        repo = Repository(
+            name='Test Repo',
+            linux_path='/mnt/T/',
+            windows_path='T:/',
+            osx_path='/Volumes/T/'
+        )
+        task_ft = FilenameTemplate(
+            name='Task Filename Template',
+            target_entity_type='Task',
+            path='$REPO{{project.repository.id}}/{{project.code}}/'
+                 '{%- for parent_task in parent_tasks -%}'
+                 '{{parent_task.nice_name}}/{%- endfor -%}',
+            filename='{{task.nice_name}}_{{version.take_name}}'
+                     '_v{{"%03d"|format(version.version_number)}}',
+        )
+        structure = Structure(
+            name='Commercial Project Structure',
+            templates=[task_ft]
+        )
+        status = Status(name='Status 1', code='STS1')
+        project = Project(
+            name='Test Project 1',
+            code='TP1',
+            repositories=[repo],
+            structure=structure,
+            status_list=StatusList(
+                name='Project Statuses',
+                target_entity_type='Project',
+                statuses=[status]
+            )
+        )
+        self.task = Task(
+            name='Test Task 1',
+            project=project,
+            status_list=StatusList(
+                name='Task Statuses',
+                target_entity_type='Task',
+                statuses=[status]
+            )
+        )
+        self.version_status_list = StatusList(
+            name='Version Statuses',
+            target_entity_type='Version',
+            statuses=[status]
+        )
+        DBSession.add(self.task)
+        DBSession.commit()
+
+        self.versions = [self.create_version() for i in range(3)]
+        self.env = EnvironmentBase()
+
+        self.statements = []
+        self.engine = DBSession.connection().engine
+        event.listen(self.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        event.remove(self.engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        """counts the executed statements
+        """
+        self.statements.append(args)
+
+    def create_version(self):
+        """creates a new version
+        """
+        version = Version(
+            task=self.task,
+            status_list=self.version_status_list
+        )
+        DBSession.add(version)
+        DBSession.commit()
+        version.update_paths()
+        DBSession.commit()
+        return version
+
+    def test_get_versions_from_full_paths(self):
+        """testing if the versions of all the paths are found with one query
+        for the repositories and one query for the versions
+        """
+        paths = [
+            '/mnt/T/TP1/Test_Task_1/Test_Task_1_Main_v001',
+            'T:\\TP1\\Test_Task_1\\Test_Task_1_Main_v002',
+            '/Volumes/T/TP1/Test_Task_1/Test_Task_1_Main_v003',
+            '/mnt/T/TP1/Test_Task_1/../Test_Task_1/Test_Task_1_Main_v001',
+            '/mnt/T/TP1/Test_Task_1/Test_Task_1_Main_v004',
+        ]
+        versions = self.env.get_versions_from_full_paths(paths)
+
+        self.assertEqual(2, len(self.statements))
+        self.assertEqual(
+            [v.id for v in self.versions + [self.versions[0]]],
+            [versions[path].id for path in paths[:4]]
+        )
+        self.assertIsNone(versions[paths[4]])
+
+    def test_lookups_are_cached(self):
+        """testing if the found versions and the missing paths are not
+        queried again
+        """
+        paths = [
+            '/mnt/T/TP1/Test_Task_1/Test_Task_1_Main_v001',
+            '/mnt/T/TP1/Test_Task_1/Test_Task_1_Main_v004',
+        ]
+        self.env.get_versions_from_full_paths(paths)
+        self.assertEqual(2, len(self.statements))
+
+        self.assertEqual(
+            self.versions[0].id,
+            self.env.get_version_from_full_path(paths[0]).id
+        )
+        self.assertIsNone(self.env.get_version_from_full_path(paths[1]))
+        self.assertEqual(2, len(self.statements))
+
+    def test_cache_is_cleared_on_commit(self):
+        """testing if the cache is cleared when the session is committed
+        """
+        path = '/mnt/T/TP1/Test_Task_1/Test_Task_1_Main_v004'
+        self.assertIsNone(self.env.get_version_from_full_path(path))
+
+        version4 = self.create_version()
+        self.assertEqual(
+            version4.id, self.env.get_version_from_full_path(path).id
+        )
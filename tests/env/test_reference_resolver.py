@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import unittest
+
+from sqlalchemy import event
+from stalker import (db, Repository, Project, Status, StatusList, Structure,
+                     Task, Version)
+from stalker.db import DBSession
+
+from anima.env import ReferenceResolver, empty_reference_resolution
+from anima.env.testing import TestEnvironment
+
+
+def walk_and_resolve(version):
+    """resolves the references of the given version by walking the inputs
+    and querying the latest published versions one by one, which is the
+    resolution the ReferenceResolver should give
+    """
+    reference_resolution = empty_reference_resolution(root=version.inputs)
+    dfs_version_references = list(version.walk_inputs())
+    dfs_version_references.pop(0)
+
+    for v in reversed(dfs_version_references):
+        to_be_updated_list = [
+            ref_v for ref_v in v.inputs
+            if not ref_v.is_latest_published_version()
+        ]
+
+        if to_be_updated_list:
+            action = 'create'
+            latest_published_version = v.latest_published_version
+            if latest_published_version and \
+               not v.is_latest_published_version():
+                if all([ref_v.latest_published_version
+                        in latest_published_version.inputs
+                        for ref_v in to_be_updated_list]):
+                    action = 'update'
+        else:
+            if v.is_latest_published_version():
+                action = 'leave'
+            else:
+                action = 'update'
+
+            if any(rev_v in reference_resolution['update'] or
+                   rev_v in reference_resolution['create']
+                   for rev_v in v.inputs):
+                action = 'create'
+
+        reference_resolution[action].append(v)
+
+    return reference_resolution
+
+
+class ReferenceResolverTestCase(unittest.TestCase):
+    """tests the ReferenceResolver class
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """set up the test in class level
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        """cleanup the test
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+
+    def setUp(self):
+        """set up the test
+        """
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+        db.init()
+
+        repo = Repository(name='Test Repo', linux_path='/mnt/T/',
+                          windows_path='T:/', osx_path='/Volumes/T/')
+        structure = Structure(name='Project Structure')
+        project_status_list = StatusList(
+            name='Project Statuses',
+            target_entity_type='Project',
+            statuses=[Status(name='New', code='NEW')]
+        )
+        self.project = Project(name='Test Project', code='TP',
+                               repositories=[repo], structure=structure,
+                               status_list=project_status_list)
+        DBSession.add(self.project)
+        DBSession.commit()
+
+        self.test_environment = TestEnvironment()
+
+    def create_task(self, name):
+        """creates a task
+        """
+        task = Task(name=name, project=self.project)
+        DBSession.add(task)
+        DBSession.commit()
+        return task
+
+    def create_version(self, task, inputs=None, is_published=True,
+                       take_name='Main'):
+        """creates a version with the given inputs
+        """
+        version = Version(task=task, take_name=take_name)
+        version.is_published = is_published
+        version.inputs = inputs or []
+        DBSession.add(version)
+        DBSession.commit()
+        return version
+
+    def create_shared_inputs(self):
+        """creates versions that are referenced by many versions, some of
+        them have newer published versions, and returns the versions with
+        the scene version as the last one
+        """
+        tasks = [self.create_task('Task%s' % i) for i in range(5)]
+        versions = []
+        for i, task in enumerate(tasks):
+            for j in range(3):
+                inputs = [
+                    v for k, v in enumerate(versions)
+                    if (i + j + k) % 3 == 0 and v.task != task
+                ][-2:]
+                versions.append(
+                    self.create_version(task, inputs, is_published=j != 2,
+                                        take_name=['Main', 'Alt'][j % 2])
+                )
+        versions.append(
+            self.create_version(self.create_task('Scene'), versions[-6:])
+        )
+        return versions
+
+    def resolve(self, version):
+        """resolves the references of the given version with the
+        TestEnvironment
+        """
+        # nothing is loaded after the commits, as in a newly opened scene
+        self.test_environment._version = version
+        return self.test_environment.check_referenced_versions()
+
+    def assert_resolution(self, expected, resolution):
+        """checks the resolution by the version ids, the expected resolution
+        may have duplicate versions
+        """
+        for key in ['leave', 'update', 'create']:
+            ids = [v.id for v in resolution[key]]
+            self.assertEqual(len(set(ids)), len(ids), key)
+            self.assertEqual(
+                sorted(set(v.id for v in expected[key])), sorted(ids), key
+            )
+
+    def test_leave(self):
+        """testing if the latest published versions are left as they are
+        """
+        model = self.create_task('Model')
+        rig = self.create_task('Rig')
+        layout = self.create_task('Layout')
+
+        model_v1 = self.create_version(model)
+        rig_v1 = self.create_version(rig, [model_v1])
+        layout_v1 = self.create_version(layout, [rig_v1])
+
+        resolution = self.resolve(layout_v1)
+        self.assertEqual([model_v1.id, rig_v1.id],
+                         [v.id for v in resolution['leave']])
+        self.assertEqual([], resolution['update'])
+        self.assertEqual([], resolution['create'])
+        self.assertEqual([rig_v1.id], [v.id for v in resolution['root']])
+
+    def test_update_and_create(self):
+        """testing if the versions with a newer published version are updated
+        and the versions referencing them are created
+        """
+        model = self.create_task('Model')
+        rig = self.create_task('Rig')
+        anim = self.create_task('Anim')
+        layout = self.create_task('Layout')
+
+        model_v1 = self.create_version(model)
+        rig_v1 = self.create_version(rig, [model_v1])
+        anim_v1 = self.create_version(anim, [rig_v1])
+        model_v2 = self.create_version(model)
+        self.create_version(model, is_published=False)
+        rig_v2 = self.create_version(rig, [model_v2])
+        layout_v1 = self.create_version(layout, [model_v1, rig_v1, anim_v1])
+
+        resolution = self.resolve(layout_v1)
+        self.assertEqual(
+            [model_v1.id, rig_v1.id],
+            sorted(v.id for v in set(resolution['update']))
+        )
+        self.assertEqual([anim_v1.id], [v.id for v in resolution['create']])
+        self.assertEqual([], resolution['leave'])
+        self.assertNotIn(rig_v2.id, [v.id for v in resolution['update']])
+
+    def test_same_as_walking_the_inputs(self):
+        """testing if the resolution is the same with the resolution that is
+        calculated by walking the inputs
+        """
+        root = self.create_shared_inputs()[-1]
+
+        expected = walk_and_resolve(root)
+        self.assertTrue(any(expected[key] for key in ['update', 'create']))
+        self.assert_resolution(expected, self.resolve(root))
+
+    def test_sorted_inputs(self):
+        """testing if every version is listed once and after its inputs
+        """
+        versions = self.create_shared_inputs()
+        root = versions[-1]
+        resolver = ReferenceResolver()
+        resolver.load(root)
+        sorted_inputs = resolver.sorted_inputs(root)
+
+        ids = [v.id for v in sorted_inputs]
+        self.assertEqual(
+            sorted(set(v.id for v in root.walk_inputs()) - set([root.id])),
+            sorted(ids)
+        )
+        for i, v in enumerate(sorted_inputs):
+            for input_version in v.inputs:
+                self.assertIn(input_version.id, ids[:i])
+
+    def test_number_of_queries(self):
+        """testing if the inputs are loaded with one query per depth level
+        """
+        task = self.create_task('Asset')
+        version = self.create_version(task)
+        versions = [version]
+        for i in range(30):
+            inputs = versions[-3:]
+            versions.append(
+                self.create_version(self.create_task('Task%s' % i), inputs)
+            )
+
+        version = versions[-1]
+        version.id  # load the version, it is expired by the commit
+
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            resolution = ReferenceResolver().resolve(version)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        self.assertTrue(resolution['leave'])
+        # 2 queries per level and 2 queries for the latest published versions
+        self.assertTrue(len(statements) <= 2 * 31 + 3)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import threading
+import time
+import unittest
+
+from sqlalchemy import event
+from stalker import db, Status, User
+from stalker.db import DBSession
+
+import anima
+from anima import LookupTable
+
+
+class LookupTableTestCase(unittest.TestCase):
+    """tests the anima.LookupTable class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.calls = []
+        self.users = {1: 'User1', 2: 'User2'}
+
+        def loader(keys=None):
+            self.calls.append(keys)
+            time.sleep(0.01)
+            if keys is None:
+                return dict(self.users)
+            return dict((k, self.users[k]) for k in keys if k in self.users)
+
+        self.table = LookupTable(loader)
+
+    def test_data_is_loaded_on_first_access(self):
+        """testing if the loader is called on the first access only
+        """
+        self.assertFalse(self.table.is_loaded)
+        self.assertEqual([], self.calls)
+        self.assertEqual('User1', self.table[1])
+        self.assertEqual('User2', self.table[2])
+        self.assertTrue(2 in self.table)
+        self.assertEqual(2, len(self.table))
+        self.assertEqual([None], self.calls)
+
+    def test_invalidate(self):
+        """testing if the data is loaded again after it is invalidated
+        """
+        self.table.load()
+        self.table.invalidate()
+        self.assertFalse(self.table.is_loaded)
+        self.assertEqual([1, 2], sorted(self.table))
+        self.assertEqual([None, None], self.calls)
+
+    def test_invalidate_a_key(self):
+        """testing if only the given key is loaded again after it is
+        invalidated
+        """
+        self.table.load()
+        self.users[1] = 'Renamed User'
+        self.table.invalidate(1)
+        self.assertEqual('Renamed User', self.table[1])
+        self.assertEqual([None, [1]], self.calls)
+
+    def test_data_is_loaded_once_by_many_threads(self):
+        """testing if the loader is called once when the table is accessed
+        from many threads at the same time
+        """
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.table[1]))
+            for i in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['User1'] * 10, results)
+        self.assertEqual([None], self.calls)
+
+    def test_ttl(self):
+        """testing if the data is loaded again when it is older than ttl
+        seconds
+        """
+        self.table.ttl = 0.05
+        self.table.load()
+        self.assertTrue(self.table.is_loaded)
+        time.sleep(0.1)
+        self.assertFalse(self.table.is_loaded)
+        self.users[3] = 'User3'
+        self.assertEqual([1, 2, 3], sorted(self.table.keys()))
+        self.assertEqual([None, None], self.calls)
+
+    def test_missing_keys_are_loaded(self):
+        """testing if the keys that are added after the data is loaded are
+        loaded on access and the missing keys raise KeyError
+        """
+        self.table.load()
+        self.users[3] = 'User3'
+        self.assertEqual('User3', self.table[3])
+        self.assertRaises(KeyError, self.table.__getitem__, 4)
+        self.assertEqual('default', self.table.get(4, 'default'))
+        self.assertEqual([None, [3], [4]], self.calls)
+
+    def test_missing_keys_are_cached(self):
+        """testing if the keys which are not found are not queried again
+        until the data is invalidated or expired
+        """
+        self.table.load()
+        self.assertFalse(4 in self.table)
+        self.assertFalse(4 in self.table)
+        self.assertEqual(None, self.table.get(4))
+        self.table.warm_up([4])
+        self.assertEqual([None, [4]], self.calls)
+
+        # invalidating the key
+        self.users[4] = 'User4'
+        self.table.invalidate(4)
+        self.assertEqual('User4', self.table[4])
+        self.assertEqual([None, [4], [4]], self.calls)
+
+        # invalidating all the data
+        self.assertFalse(5 in self.table)
+        self.users[5] = 'User5'
+        self.table.invalidate()
+        self.assertEqual('User5', self.table[5])
+        self.assertEqual([None, [4], [4], [5], None], self.calls)
+
+        # expired data
+        self.table.ttl = 0.05
+        self.assertFalse(6 in self.table)
+        self.users[6] = 'User6'
+        time.sleep(0.1)
+        self.assertEqual('User6', self.table[6])
+        self.assertEqual([None, [4], [4], [5], None, [6], None], self.calls)
+
+    def test_warm_up(self):
+        """testing if the missing keys are loaded with one call
+        """
+        self.table.load()
+        self.users[3] = 'User3'
+        self.users[4] = 'User4'
+        self.table.warm_up([1, 3, 4, None, 3])
+        self.assertEqual(None, self.calls[0])
+        self.assertEqual([3, 4], sorted(self.calls[1]))
+
+        self.table.warm_up([1, 2, 3, 4])
+        self.assertEqual(2, len(self.calls))
+
+    def test_hit_and_miss_counters(self):
+        """testing if the hits and misses are counted
+        """
+        self.users[3] = 'User3'
+        self.table[1]
+        self.table[1]
+        self.table[3]
+        self.assertRaises(KeyError, self.table.__getitem__, 4)
+        self.assertEqual(3, self.table.hits)
+        self.assertEqual(1, self.table.misses)
+
+        self.table.reset_stats()
+        self.assertEqual(0, self.table.hits)
+        self.assertEqual(0, self.table.misses)
+
+
+class LookupTablesTestCase(unittest.TestCase):
+    """tests the lookup tables in anima
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """set up the test in class level
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        """cleanup the test
+        """
+        DBSession.remove()
+        DBSession.configure(extension=None)
+        anima.invalidate_lookup_tables()
+
+    def setUp(self):
+        """set up the test
+        """
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+        db.init()
+        anima.invalidate_lookup_tables()
+
+    def create_user(self, name):
+        """creates a user with the given name
+        """
+        user = User(name=name, login=name.lower(),
+                    email='%s@test.com' % name.lower(), password='1234')
+        DBSession.add(user)
+        DBSession.commit()
+        return user
+
+    def test_new_users(self):
+        """testing if the Users created after the table is loaded are found
+        """
+        user1 = self.create_user('User1')
+        self.assertEqual('User1', anima.user_names_lut[user1.id])
+
+        user2 = self.create_user('User2')
+        self.assertEqual('User2', anima.user_names_lut[user2.id])
+        self.assertEqual(user2.id, anima.user_ids_by_name['User2'])
+
+    def test_session_is_kept(self):
+        """testing if loading the tables does not remove the objects from the
+        current session
+        """
+        user = self.create_user('User1')
+        anima.user_names_lut.load()
+        anima.user_names_lut.invalidate()
+        anima.user_names_lut.load()
+        self.assertTrue(user in DBSession)
+
+    def test_status_lookups(self):
+        """testing if the Task status colors and the Status ids are looked up
+        """
+        status_wip = Status.query.filter(Status.code == 'WIP').first()
+        self.assertEqual(
+            anima.status_colors['wip'],
+            anima.status_colors_by_id[status_wip.id]
+        )
+        self.assertEqual(status_wip.id, anima.status_ids_by_code['WIP'])
+
+    def test_warm_up_uses_one_query(self):
+        """testing if the names of many users are loaded with one query
+        """
+        anima.user_names_lut.load()
+        users = [self.create_user('User%s' % i) for i in range(10)]
+        user_ids = [user.id for user in users]
+
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            anima.user_names_lut.warm_up(user_ids)
+            names = [anima.user_names_lut[user_id] for user_id in user_ids]
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        self.assertEqual(['User%s' % i for i in range(10)], names)
+        self.assertEqual(1, len(statements))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import subprocess
+import sys
+import unittest
+
+import anima
+
+
+# runs in a new interpreter, records the db and network access while
+# importing the given modules and prints the records and the import time
+import_script = """
+import json
+import socket
+import sys
+import time
+
+records = []
+
+import sqlalchemy
+import sqlalchemy.engine
+
+create_engine = sqlalchemy.engine.create_engine
+
+
+def patched_create_engine(*args, **kwargs):
+    records.append('create_engine')
+    return create_engine(*args, **kwargs)
+
+sqlalchemy.create_engine = patched_create_engine
+sqlalchemy.engine.create_engine = patched_create_engine
+
+connect = socket.socket.connect
+
+
+def patched_connect(self, address):
+    records.append('connect %%s' %% (address, ))
+    return connect(self, address)
+
+socket.socket.connect = patched_connect
+
+start = time.time()
+for module_name in %(module_names)r:
+    __import__(module_name)
+import_time = time.time() - start
+
+import anima
+if anima.log_file_handler.stream is not None:
+    records.append('open %%s' %% anima.log_file_path)
+
+print(json.dumps({'records': records, 'import_time': import_time}))
+"""
+
+
+def import_in_new_interpreter(module_names):
+    """imports the given modules in a new python interpreter and returns the
+    recorded db and network accesses and the import time
+    """
+    import json
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(anima.__file__))] +
+        [p for p in [env.get('PYTHONPATH')] if p]
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-c', import_script % {'module_names': module_names}],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env
+    )
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr)
+    result = json.loads(stdout.strip().splitlines()[-1])
+    return result['records'], result['import_time']
+
+
+class StartupTestCase(unittest.TestCase):
+    """tests if importing anima is free of db and network access
+    """
+
+    # a generous budget, which still catches a connection attempt waiting
+    # for a timeout
+    max_import_time = 5  # in seconds
+
+    def assert_import_time(self, module_name, import_time):
+        """asserts that the given import time is in the budget
+        """
+        self.assertTrue(
+            import_time < self.max_import_time,
+            'import %s took %0.3f sec, the budget is %s sec' % (
+                module_name, import_time, self.max_import_time
+            )
+        )
+
+    def test_import_anima_edit(self):
+        """testing if importing anima.edit does not connect to the database
+        or to the network and does not open the log file
+        """
+        records, import_time = import_in_new_interpreter(['anima.edit'])
+        self.assertEqual([], records)
+        self.assert_import_time('anima.edit', import_time)
+
+    def test_import_base85(self):
+        """testing if importing anima.render.arnold.base85 does not connect
+        to the database or to the network and does not open the log file
+        """
+        records, import_time = \
+            import_in_new_interpreter(['anima.render.arnold.base85'])
+        self.assertEqual([], records)
+        self.assert_import_time('anima.render.arnold.base85', import_time)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import logging
+
+from anima.ui import SET_PYSIDE, IS_PYSIDE, IS_PYQT4
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+SET_PYSIDE()
+
+if IS_PYSIDE():
+    logger.debug('environment is set to pyside, importing pyside')
+    from PySide import QtGui
+elif IS_PYQT4():
+    logger.debug('environment is set to pyqt4, importing pyqt4')
+    import sip
+    sip.setapi('QString', 2)
+    sip.setapi('QVariant', 2)
+    from PyQt4 import QtGui
+
+from stalker import db, User
+
+from anima.ui.utils import BackgroundLoader
+
+
+def query_user_names():
+    """returns the user names and the name of the thread running the query
+    """
+    names = [name for (name, ) in db.DBSession.query(User.name).all()]
+    return names, threading.current_thread().name
+
+
+class BackgroundLoaderTestCase(unittest.TestCase):
+    """tests the BackgroundLoader class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        if not QtGui.QApplication.instance():
+            logger.debug('creating a new QApplication')
+            self.app = QtGui.QApplication(sys.argv)
+        else:
+            self.app = QtGui.QApplication.instance()
+
+        # use a file, the queries run in other threads
+        self.db_path = tempfile.mktemp(suffix='.db')
+        db.DBSession.remove()
+        db.setup({'sqlalchemy.url': 'sqlite:///%s' % self.db_path})
+        db.init()
+
+        self.loader = BackgroundLoader()
+        self.results = []
+
+    def tearDown(self):
+        """clean up the test
+        """
+        db.DBSession.remove()
+        os.remove(self.db_path)
+
+    def test_query_runs_in_another_thread(self):
+        """testing if the query runs in a worker thread and the callback is
+        called on the main thread
+        """
+        def callback(result):
+            self.results.append(
+                (result, threading.current_thread().name)
+            )
+
+        self.loader.load('users', query_user_names, callback)
+        self.assertTrue(self.loader.is_loading('users'))
+        self.loader.wait()
+
+        self.assertFalse(self.loader.is_loading('users'))
+        main_thread_name = threading.current_thread().name
+        (names, query_thread_name), callback_thread_name = self.results[0]
+        self.assertEqual(['admin'], names)
+        self.assertNotEqual(main_thread_name, query_thread_name)
+        self.assertEqual(main_thread_name, callback_thread_name)
+
+    def test_stale_results_are_dropped(self):
+        """testing if only the result of the last job with the same name is
+        applied
+        """
+        event = threading.Event()
+
+        def slow_query(value):
+            event.wait()
+            return value
+
+        self.loader.load('versions', slow_query, self.results.append, 1)
+        self.loader.load('versions', slow_query, self.results.append, 2)
+        self.loader.load('takes', slow_query, self.results.append, 3)
+        self.loader.cancel('takes')
+        event.set()
+        self.loader.wait()
+        self.assertEqual([2], self.results)
+
+    def test_call_after(self):
+        """testing if the callbacks are called after the job is applied or
+        immediately if the job is not loading
+        """
+        self.loader.call_after('users', self.results.append, 'now')
+        self.assertEqual(['now'], self.results)
+
+        self.loader.load('users', query_user_names, self.results.append)
+        self.loader.call_after('users', self.results.append, 'after')
+        self.assertEqual(['now'], self.results)
+        self.loader.wait()
+        self.assertEqual('after', self.results[-1])
+        self.assertEqual(3, len(self.results))
+
+    def test_failed_job(self):
+        """testing if the error callback is called and the callbacks waiting
+        the job are still called if the job fails
+        """
+        errors = []
+        self.loader.error_callback = \
+            lambda name, error: errors.append((name, str(error)))
+
+        def failing_query():
+            raise RuntimeError('no connection')
+
+        self.loader.load('users', failing_query, self.results.append)
+        self.loader.call_after('users', self.results.append, 'after')
+        self.loader.wait()
+
+        self.assertFalse(self.loader.is_loading('users'))
+        self.assertEqual([('users', 'no connection')], errors)
+        self.assertEqual(['after'], self.results)
+
+    def test_in_memory_database(self):
+        """testing if the jobs run synchronously for an in memory SQLite
+        database
+        """
+        db.DBSession.remove()
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+        db.init()
+
+        self.loader.load('users', query_user_names, self.results.append)
+        self.assertEqual(1, len(self.results))
+        self.assertEqual(
+            threading.current_thread().name,
+            self.results[0][1]
+        )
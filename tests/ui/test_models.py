@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+import os
+import sys
+import tempfile
+import unittest
+import logging
+
+from sqlalchemy import event
+
+from anima.ui import SET_PYSIDE, IS_PYSIDE, IS_PYQT4
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+SET_PYSIDE()
+
+if IS_PYSIDE():
+    logger.debug('environment is set to pyside, importing pyside')
+    from PySide import QtCore, QtGui
+elif IS_PYQT4():
+    logger.debug('environment is set to pyqt4, importing pyqt4')
+    import sip
+    sip.setapi('QString', 2)
+    sip.setapi('QVariant', 2)
+    from PyQt4 import QtCore, QtGui
+
+import anima
+from stalker import (db, User, Project, Repository, Structure, Status,
+                     StatusList, Task, Version)
+
+from anima.env import empty_reference_resolution
+from anima.ui.models import (TaskTreeModel, TaskChildrenPrefetcher,
+                             VersionTreeModel, query_task_children)
+
+
+class TaskTreeModelTestCase(unittest.TestCase):
+    """tests the TaskTreeModel and the TaskItem classes
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        if not QtGui.QApplication.instance():
+            logger.debug('creating a new QApplication')
+            self.app = QtGui.QApplication(sys.argv)
+        else:
+            self.app = QtGui.QApplication.instance()
+
+        # use a file, the prefetcher queries in another thread
+        self.db_path = tempfile.mktemp(suffix='.db')
+        db.DBSession.remove()
+        db.setup({'sqlalchemy.url': 'sqlite:///%s' % self.db_path})
+        db.init()
+
+        self.user = User.query.first()
+        project_status_list = StatusList(
+            name='Project Statuses',
+            target_entity_type='Project',
+            statuses=[Status.query.filter_by(code='WIP').first()]
+        )
+        self.project = Project(
+            name='Test Project',
+            code='TP',
+            repositories=[
+                Repository(name='Test Repo', linux_path='/mnt/T/',
+                           windows_path='T:/', osx_path='/Volumes/T/')
+            ],
+            structure=Structure(name='Project Structure'),
+            status_list=project_status_list
+        )
+        self.sequence = Task(name='Sequence', project=self.project)
+        self.shots = [
+            Task(name='Shot%03d' % i, parent=self.sequence)
+            for i in range(20)
+        ]
+        # every other shot has children
+        for shot in self.shots[::2]:
+            Task(name='Anim', parent=shot)
+            Task(name='Lighting', parent=shot)
+        self.asset = Task(name='Asset', project=self.project)
+        db.DBSession.add(self.project)
+        db.DBSession.commit()
+
+        anima.invalidate_lookup_tables()
+        anima.status_colors_by_id.load()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        db.DBSession.remove()
+        anima.invalidate_lookup_tables()
+        os.remove(self.db_path)
+
+    def count_queries(self, callable_, *args):
+        """calls the given callable and returns the number of queries
+        """
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        engine = db.DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            callable_(*args)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        return len(statements)
+
+    def create_model(self, prefetch_children=False):
+        """creates a TaskTreeModel with the test project
+        """
+        model = TaskTreeModel()
+        model.user = self.user
+        model.prefetch_children = prefetch_children
+        model.populateTree([self.project])
+        return model
+
+    def test_query_task_children(self):
+        """testing if the children of the Tasks and the Projects are returned
+        with their has children flags
+        """
+        children_data = query_task_children(
+            task_ids=[self.sequence.id, self.asset.id],
+            project_ids=[self.project.id]
+        )
+        self.assertEqual(
+            [(self.asset.id, True), (self.sequence.id, True)],
+            [(d[0], d[4]) for d in children_data[self.project.id]]
+        )
+        self.assertEqual(
+            [(shot.id, i % 2 == 0) for i, shot in enumerate(self.shots)],
+            [(d[0], d[4]) for d in children_data[self.sequence.id]]
+        )
+        self.assertEqual([], children_data[self.asset.id])
+
+    def test_expanding_uses_one_query(self):
+        """testing if the children of an item and their has children flags
+        are queried with one query
+        """
+        model = self.create_model()
+        project_item = model.item(0, 0)
+        self.assertEqual(1, self.count_queries(project_item.fetchMore))
+
+        sequence_item = project_item.child(1, 0)
+        self.assertEqual('Sequence', sequence_item.text())
+        self.assertEqual(1, self.count_queries(sequence_item.fetchMore))
+        self.assertEqual(20, sequence_item.rowCount())
+
+        def check_shots():
+            for i in range(20):
+                shot_item = sequence_item.child(i, 0)
+                self.assertEqual(i % 2 == 0, shot_item.hasChildren())
+                self.assertEqual(i % 2 == 0, shot_item.canFetchMore())
+
+        self.assertEqual(0, self.count_queries(check_shots))
+
+    def test_prefetch(self):
+        """testing if the children of the next level are prefetched in the
+        background
+        """
+        model = self.create_model(prefetch_children=True)
+        prefetcher = model.children_prefetcher
+        # record the prefetched ids instead of starting the threads
+        prefetched_task_ids = []
+        prefetcher.prefetch = prefetched_task_ids.append
+
+        project_item = model.item(0, 0)
+        project_item.fetchMore()
+        self.assertEqual(
+            [sorted([self.asset.id, self.sequence.id])],
+            map(sorted, prefetched_task_ids)
+        )
+
+        # as the background thread does
+        prefetcher.fetch(prefetched_task_ids.pop())
+
+        sequence_item = project_item.child(1, 0)
+        self.assertEqual(0, self.count_queries(sequence_item.fetchMore))
+        self.assertEqual(20, sequence_item.rowCount())
+        self.assertEqual(
+            [[shot.id for shot in self.shots[::2]]],
+            prefetched_task_ids
+        )
+
+    def test_prefetcher(self):
+        """testing if the TaskChildrenPrefetcher queries the children in
+        another thread
+        """
+        prefetcher = TaskChildrenPrefetcher()
+        prefetcher.prefetch([shot.id for shot in self.shots]).join()
+        self.assertEqual(
+            ['Anim', 'Lighting'],
+            [d[1] for d in prefetcher.pop(self.shots[0].id)]
+        )
+        self.assertEqual([], prefetcher.pop(self.shots[1].id))
+        self.assertIsNone(prefetcher.pop(self.shots[0].id))
+
+
+class VersionTreeModelTestCase(unittest.TestCase):
+    """tests the VersionTreeModel and the VersionItem classes
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        if not QtGui.QApplication.instance():
+            logger.debug('creating a new QApplication')
+            self.app = QtGui.QApplication(sys.argv)
+        else:
+            self.app = QtGui.QApplication.instance()
+
+        db.DBSession.remove()
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+        db.init()
+        anima.invalidate_lookup_tables()
+
+        self.user = User(name='Test User', login='tuser',
+                         email='tuser@users.com', password='secret')
+        project_status_list = StatusList(
+            name='Project Statuses',
+            target_entity_type='Project',
+            statuses=[Status.query.filter_by(code='WIP').first()]
+        )
+        self.project = Project(
+            name='Test Project',
+            code='TP',
+            repositories=[
+                Repository(name='Test Repo', linux_path='/mnt/T/',
+                           windows_path='T:/', osx_path='/Volumes/T/')
+            ],
+            structure=Structure(name='Project Structure'),
+            status_list=project_status_list
+        )
+        db.DBSession.add_all([self.user, self.project])
+        db.DBSession.commit()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        db.DBSession.remove()
+        anima.invalidate_lookup_tables()
+
+    def create_version(self, task, is_published=True, inputs=None,
+                       description=''):
+        """creates a version
+        """
+        version = Version(task=task, take_name='Main')
+        version.is_published = is_published
+        version.inputs = inputs or []
+        version.description = description
+        version.updated_by = self.user
+        db.DBSession.add(version)
+        db.DBSession.commit()
+        return version
+
+    def count_queries(self, callable_, *args):
+        """calls the given callable and returns the number of queries
+        """
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        engine = db.DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            callable_(*args)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        return len(statements)
+
+    def test_rows(self):
+        """testing if the rows show the latest published version data and
+        the actions of the reference resolution
+        """
+        model_task = Task(name='Model', project=self.project)
+        rig_task = Task(name='Rig', project=self.project)
+        model_v1 = self.create_version(model_task)
+        self.create_version(model_task, description='new model')
+        rig_v1 = self.create_version(rig_task, inputs=[model_v1])
+        look_dev_task = Task(name='LookDev', project=self.project)
+        look_dev_v1 = self.create_version(look_dev_task, is_published=False)
+
+        reference_resolution = empty_reference_resolution(
+            root=[model_v1, rig_v1, look_dev_v1]
+        )
+        reference_resolution['update'].append(model_v1)
+        reference_resolution['create'].append(rig_v1)
+        reference_resolution['leave'].append(look_dev_v1)
+
+        model = VersionTreeModel()
+        model.reference_resolution = reference_resolution
+        model.populateTree(reference_resolution['root'])
+
+        self.assertEqual(3, model.rowCount())
+        rows = [
+            [model.item(i, column).text() for column in range(9)]
+            for i in range(3)
+        ]
+        self.assertEqual(
+            ['1', '2', 'update', 'Test User', 'new model'], rows[0][4:]
+        )
+        self.assertEqual(['1', '1', 'create', 'Test User', ''], rows[1][4:])
+        self.assertEqual(
+            ['1', 'No Published Version', '', '', ''], rows[2][4:]
+        )
+        self.assertEqual(QtCore.Qt.Checked, model.item(0, 0).checkState())
+        self.assertFalse(model.item(0, 0).hasChildren())
+        self.assertTrue(model.item(1, 0).hasChildren())
+
+        # the inputs are appended when the item is expanded
+        model.item(1, 0).fetchMore()
+        self.assertEqual(1, model.item(1, 0).rowCount())
+        self.assertEqual('update', model.item(1, 0).child(0, 6).text())
+
+    def test_populate_tree_number_of_queries(self):
+        """testing if the rows of many versions are generated with a fixed
+        number of queries
+        """
+        versions = []
+        for i in range(50):
+            task = Task(name='Task%s' % i, project=self.project)
+            versions.append(self.create_version(task))
+            self.create_version(task)
+
+        reference_resolution = empty_reference_resolution(root=versions)
+        reference_resolution['update'] = list(versions)
+        # nothing is loaded after the commits, as in a newly opened scene
+        for version in versions:
+            version.id
+
+        model = VersionTreeModel()
+        model.reference_resolution = reference_resolution
+        number_of_queries = self.count_queries(model.populateTree, versions)
+
+        self.assertEqual(50, model.rowCount())
+        self.assertTrue(number_of_queries < 20)
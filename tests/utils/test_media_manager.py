@@ -0,0 +1,1237 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from StringIO import StringIO
+
+from anima.utils import (ContentStore, ImageSequence, MediaJob,
+                         MediaJobQueue, MediaManager, copy_file_object,
+                         md5_checksum)
+
+
+class RecordingMediaManager(MediaManager):
+    """A MediaManager that records the ffmpeg calls instead of running them
+    """
+
+    def __init__(self):
+        super(RecordingMediaManager, self).__init__()
+        self.ffmpeg_calls = []
+        self.create_outputs = True
+        self.media_info = {
+            'video_info': {'duration': '10.000000'},
+            'stream_info': [
+                {'codec_type': 'audio'},
+                {
+                    'codec_type': 'video',
+                    'r_frame_rate': '25/1',
+                    'nb_frames': '250',
+                    'duration': '10.000000',
+                },
+            ]
+        }
+
+    def get_video_info(self, full_path):
+        return self.media_info
+
+    def ffmpeg(self, **kwargs):
+        self.ffmpeg_calls.append(kwargs)
+        if self.create_outputs:
+            with open(kwargs['o'], 'w') as f:
+                f.write('')
+        return []
+
+
+class MediaManagerVideoThumbnailTestCase(unittest.TestCase):
+    """tests the video thumbnail generation of the MediaManager
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.media_manager = RecordingMediaManager()
+        self.thumbnail_path = None
+
+    def tearDown(self):
+        """clean up the test
+        """
+        if self.thumbnail_path and os.path.exists(self.thumbnail_path):
+            os.remove(self.thumbnail_path)
+
+    def test_get_video_frame_info(self):
+        """testing if the frame count and the frame rate are read from the
+        video stream
+        """
+        self.assertEqual(
+            (250, 25.0),
+            self.media_manager.get_video_frame_info('/tmp/test.mov')
+        )
+
+    def test_get_video_frame_info_without_nb_frames(self):
+        """testing if the frame count is calculated from the duration if the
+        video stream has no nb_frames
+        """
+        self.media_manager.media_info['stream_info'][1]['nb_frames'] = 'N/A'
+        self.media_manager.media_info['stream_info'][1]['r_frame_rate'] = \
+            '30000/1001'
+        self.assertEqual(
+            299, self.media_manager.get_video_frame_info('/tmp/test.mov')[0]
+        )
+
+    def test_get_video_frame_info_with_zero_frame_rate(self):
+        """testing if the frame rate falls back to the framerate tag if the
+        r_frame_rate of the video stream is "0/0"
+        """
+        self.media_manager.media_info['stream_info'][1]['r_frame_rate'] = \
+            '0/0'
+        self.media_manager.media_info['video_info']['TAG:framerate'] = '24'
+        self.assertEqual(
+            (250, 24.0),
+            self.media_manager.get_video_frame_info('/tmp/test.mov')
+        )
+
+        del self.media_manager.media_info['video_info']['TAG:framerate']
+        self.assertEqual(
+            (250, 23.976),
+            self.media_manager.get_video_frame_info('/tmp/test.mov')
+        )
+
+    def test_single_pass(self):
+        """testing if the thumbnail is generated with one ffmpeg call that
+        seeks to the three frames on the input side
+        """
+        self.thumbnail_path = \
+            self.media_manager.generate_video_thumbnail('/tmp/test.mov')
+        self.assertEqual(1, len(self.media_manager.ffmpeg_calls))
+
+        kwargs = self.media_manager.ffmpeg_calls[0]
+        self.assertEqual(
+            [
+                ('/tmp/test.mov', {'ss': '1.000'}),
+                ('/tmp/test.mov', {'ss': '5.000'}),
+                ('/tmp/test.mov', {'ss': '8.960'}),
+            ],
+            kwargs['inputs']
+        )
+        self.assertEqual(1, kwargs['frames:v'])
+        self.assertEqual(self.thumbnail_path, kwargs['o'])
+
+    def test_falls_back_to_multi_pass(self):
+        """testing if the multi pass thumbnail generation is used if the
+        single pass fails
+        """
+        self.media_manager.create_outputs = False
+        self.thumbnail_path = \
+            self.media_manager.generate_video_thumbnail('/tmp/test.mov')
+        # 1 single pass + 3 frames + 1 composite
+        self.assertEqual(5, len(self.media_manager.ffmpeg_calls))
+        self.assertTrue('inputs' in self.media_manager.ffmpeg_calls[0])
+        self.assertEqual(
+            "select='eq(n,125)'", self.media_manager.ffmpeg_calls[2]['vf']
+        )
+
+    def test_multi_pass(self):
+        """testing if the single pass can be disabled
+        """
+        self.media_manager.single_pass_video_thumbnails = False
+        self.thumbnail_path = \
+            self.media_manager.generate_video_thumbnail('/tmp/test.mov')
+        self.assertEqual(4, len(self.media_manager.ffmpeg_calls))
+        frame_calls = self.media_manager.ffmpeg_calls[:3]
+        self.assertEqual(
+            ["select='eq(n,25)'", "select='eq(n,125)'", "select='eq(n,224)'"],
+            [kwargs['vf'] for kwargs in frame_calls]
+        )
+        self.assertEqual(
+            [1, 1, 1], [kwargs['vframes'] for kwargs in frame_calls]
+        )
+
+
+class ProbingMediaManager(MediaManager):
+    """A MediaManager that returns a predefined ffprobe output
+    """
+
+    probe_output = [
+        '{\n',
+        '    "streams": [\n',
+        '        {\n',
+        '            "index": 0,\n',
+        '            "codec_type": "video",\n',
+        '            "r_frame_rate": "24/1",\n',
+        '            "nb_frames": "48",\n',
+        '            "width": 1920,\n',
+        '            "disposition": {"default": 1},\n',
+        '            "tags": {"language": "eng"}\n',
+        '        }\n',
+        '    ],\n',
+        '    "format": {\n',
+        '        "duration": "2.000000",\n',
+        '        "tags": {"framerate": "24"}\n',
+        '    }\n',
+        '}\n',
+    ]
+
+    def __init__(self):
+        super(ProbingMediaManager, self).__init__()
+        self.ffprobe_calls = []
+
+    def ffprobe(self, **kwargs):
+        self.ffprobe_calls.append(kwargs)
+        return list(self.probe_output)
+
+
+class MediaManagerVideoInfoTestCase(unittest.TestCase):
+    """tests the MediaManager.get_video_info() method
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        import anima
+        self.original_cache_folder = anima.local_cache_folder
+        self.temp_path = tempfile.mkdtemp()
+        anima.local_cache_folder = os.path.join(self.temp_path, 'cache')
+
+        self.video_path = os.path.join(self.temp_path, 'test.mov')
+        with open(self.video_path, 'w') as f:
+            f.write('not really a video')
+
+    def tearDown(self):
+        """clean up the test
+        """
+        import anima
+        anima.local_cache_folder = self.original_cache_folder
+        shutil.rmtree(self.temp_path)
+
+    def test_single_ffprobe_call(self):
+        """testing if the streams and the format info is read with one
+        ffprobe call
+        """
+        media_manager = ProbingMediaManager()
+        media_info = media_manager.get_video_info(self.video_path)
+        self.assertEqual(1, len(media_manager.ffprobe_calls))
+        self.assertEqual(
+            'json', media_manager.ffprobe_calls[0]['print_format']
+        )
+        self.assertEqual(
+            {'duration': '2.000000', 'TAG:framerate': '24'},
+            media_info['video_info']
+        )
+        self.assertEqual(1, len(media_info['stream_info']))
+        stream = media_info['stream_info'][0]
+        self.assertEqual('video', stream['codec_type'])
+        self.assertEqual('48', stream['nb_frames'])
+        self.assertEqual('1920', stream['width'])
+        self.assertEqual('eng', stream['TAG:language'])
+        self.assertEqual('1', stream['DISPOSITION:default'])
+
+    def test_invalid_output(self):
+        """testing if an invalid ffprobe output returns an empty info
+        """
+        self.assertEqual(
+            {'video_info': None, 'stream_info': []},
+            MediaManager.parse_video_info('not json')
+        )
+
+    def test_result_is_cached_on_disk(self):
+        """testing if the result is cached on disk and used by the other
+        MediaManager instances
+        """
+        media_manager1 = ProbingMediaManager()
+        media_info1 = media_manager1.get_video_info(self.video_path)
+        media_manager1.get_video_info(self.video_path)
+        self.assertEqual(1, len(media_manager1.ffprobe_calls))
+        self.assertTrue(
+            os.path.exists(
+                MediaManager.video_info_cache_file_full_path(self.video_path)
+            )
+        )
+
+        media_manager2 = ProbingMediaManager()
+        media_info2 = media_manager2.get_video_info(self.video_path)
+        self.assertEqual(0, len(media_manager2.ffprobe_calls))
+        self.assertEqual(media_info1, media_info2)
+
+    def test_stale_cache_is_invalidated(self):
+        """testing if the file is probed again if it is changed
+        """
+        media_manager = ProbingMediaManager()
+        media_manager.get_video_info(self.video_path)
+
+        with open(self.video_path, 'a') as f:
+            f.write(' anymore')
+
+        media_manager = ProbingMediaManager()
+        media_manager.get_video_info(self.video_path)
+        self.assertEqual(1, len(media_manager.ffprobe_calls))
+
+        # and the cache is updated
+        media_manager = ProbingMediaManager()
+        media_manager.get_video_info(self.video_path)
+        self.assertEqual(0, len(media_manager.ffprobe_calls))
+
+
+class MediaJobQueueTestCase(unittest.TestCase):
+    """tests the anima.utils.MediaJobQueue class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.job_queue = MediaJobQueue(max_workers=2)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        self.job_queue.shutdown()
+
+    def test_jobs_are_run_concurrently(self):
+        """testing if the jobs are run at the same time
+        """
+        started = [threading.Event(), threading.Event()]
+
+        def job_function(i):
+            started[i].set()
+            # wait for the other job to start
+            if not started[1 - i].wait(5):
+                raise RuntimeError('jobs are not concurrent')
+            return i * 10
+
+        jobs = [self.job_queue.submit(job_function, i) for i in range(2)]
+        self.assertEqual([0, 10], MediaJobQueue.wait(jobs, timeout=10))
+        self.assertEqual([MediaJob.DONE] * 2, [job.status for job in jobs])
+
+    def test_job_status(self):
+        """testing if the job status can be polled
+        """
+        release = threading.Event()
+
+        def job_function():
+            if not release.wait(5):
+                raise RuntimeError('not released')
+
+        job = self.job_queue.submit(job_function)
+        self.assertFalse(job.finished)
+        self.assertTrue(job.status in [MediaJob.PENDING, MediaJob.RUNNING])
+        release.set()
+        job.wait(10)
+        self.assertTrue(job.finished)
+        self.assertEqual(MediaJob.DONE, job.status)
+
+    def test_failed_job(self):
+        """testing if the error of a failed job is raised when waited
+        """
+        def job_function():
+            raise ValueError('conversion failed')
+
+        job = self.job_queue.submit(job_function)
+        self.assertRaises(ValueError, job.wait, 10)
+        self.assertEqual(MediaJob.FAILED, job.status)
+
+    def test_done_callback(self):
+        """testing if the done callbacks are called when the job is finished
+        or immediately if it is already finished
+        """
+        release = threading.Event()
+        finished_jobs = []
+        job = self.job_queue.submit(release.wait, 5)
+        job.add_done_callback(finished_jobs.append)
+        self.assertEqual([], finished_jobs)
+        release.set()
+        job.wait(10)
+        self.assertEqual([job], finished_jobs)
+
+        job.add_done_callback(finished_jobs.append)
+        self.assertEqual([job, job], finished_jobs)
+
+    def test_wait_timeout(self):
+        """testing if a RuntimeError is raised if the job is not finished in
+        time
+        """
+        release = threading.Event()
+        job = self.job_queue.submit(release.wait, 5)
+        self.assertRaises(RuntimeError, job.wait, 0.01)
+        release.set()
+        job.wait(10)
+
+
+class Repository(object):
+    """A stand-in for stalker.Repository
+    """
+
+    @classmethod
+    def to_os_independent_path(cls, path):
+        return path
+
+
+class ConvertingMediaManager(MediaManager):
+    """A MediaManager that generates fake web versions and thumbnails, and
+    waits for the release event before generating them
+    """
+
+    def __init__(self):
+        super(ConvertingMediaManager, self).__init__()
+        self.release = threading.Event()
+        self.failing_filenames = []
+
+    def generate_fake_media(self, file_full_path, extension):
+        if not self.release.wait(5):
+            raise RuntimeError('not released')
+        if os.path.basename(file_full_path) in self.failing_filenames:
+            raise RuntimeError('conversion failed')
+        path = tempfile.mktemp(suffix=extension)
+        with open(path, 'w') as f:
+            f.write(file_full_path)
+        return path
+
+    def generate_media_for_web(self, file_full_path):
+        return self.generate_fake_media(file_full_path, '.webm')
+
+    def generate_thumbnail(self, file_full_path):
+        return self.generate_fake_media(file_full_path, '.png')
+
+
+class MediaManagerUploadTestCase(unittest.TestCase):
+    """tests the uploads of the MediaManager
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.media_manager = ConvertingMediaManager()
+
+        class Version(object):
+            pass
+
+        self.version = Version()
+        self.version.absolute_path = self.temp_path
+        self.version.outputs = []
+        self.version.task = Version()
+        self.version.task.project = Version()
+        self.version.task.project.repository = Repository()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        self.media_manager.release.set()
+        if self.media_manager.job_queue:
+            self.media_manager.job_queue.shutdown()
+        shutil.rmtree(self.temp_path)
+
+    def upload(self, wait, filename='review.mov'):
+        """uploads a video output
+        """
+        return self.media_manager.upload_version_output(
+            self.version, StringIO('video data'), filename, wait=wait
+        )
+
+    def test_upload_without_waiting(self):
+        """testing if the Link is returned before the conversions are
+        finished
+        """
+        link = self.upload(wait=False)
+        web_version_link = link.thumbnail
+        thumbnail_link = web_version_link.thumbnail
+
+        output_path = os.path.join(
+            self.temp_path, self.media_manager.version_output_path
+        )
+        self.assertEqual(
+            os.path.join(output_path, 'ForWeb', 'review.webm'),
+            web_version_link.full_path
+        )
+        self.assertEqual(
+            os.path.join(output_path, 'Thumbnail', 'review.jpg'),
+            thumbnail_link.full_path
+        )
+        self.assertFalse(os.path.exists(web_version_link.full_path))
+
+        jobs = self.media_manager.get_conversion_jobs(link)
+        self.assertEqual(2, len(jobs))
+        self.assertFalse(any(job.finished for job in jobs))
+
+        self.media_manager.release.set()
+        self.media_manager.wait_for_conversions(link, timeout=10)
+        self.assertEqual([MediaJob.DONE] * 2, [job.status for job in jobs])
+        self.assertEqual([], self.media_manager.get_conversion_jobs())
+
+        # the thumbnail is generated as png, so the link is updated
+        self.assertEqual(
+            os.path.join(output_path, 'Thumbnail', 'review.png'),
+            thumbnail_link.full_path
+        )
+        self.assertTrue(os.path.exists(web_version_link.full_path))
+        self.assertTrue(os.path.exists(thumbnail_link.full_path))
+
+    def test_finished_jobs_are_forgotten(self):
+        """testing if the successful conversions that do not update their
+        Link are removed when they are finished, and the Links are not
+        updated by the job threads
+        """
+        link = self.upload(wait=False)
+        thumbnail_link = link.thumbnail.thumbnail
+        thumbnail_path = thumbnail_link.full_path
+        jobs = self.media_manager.get_conversion_jobs(link)
+        self.media_manager.release.set()
+        MediaJobQueue.wait(jobs, 10)
+
+        # only the thumbnail job, which generated a png, is kept
+        self.assertEqual(
+            [jobs[1]], self.media_manager.get_conversion_jobs()
+        )
+        self.assertEqual(thumbnail_path, thumbnail_link.full_path)
+
+        self.media_manager.wait_for_conversions()
+        self.assertEqual([], self.media_manager.get_conversion_jobs())
+        self.assertEqual(jobs[1].result, thumbnail_link.full_path)
+
+    def test_waiting_a_link_keeps_the_jobs_of_other_links(self):
+        """testing if waiting the conversions of a Link does not remove the
+        finished jobs of the other Links, so their errors are still raised
+        """
+        self.media_manager.failing_filenames = ['broken.mov']
+        link1 = self.upload(wait=False)
+        link2 = self.upload(wait=False, filename='broken.mov')
+        jobs2 = self.media_manager.get_conversion_jobs(link2)
+        self.assertEqual(2, len(jobs2))
+        self.media_manager.release.set()
+        for job in jobs2:
+            self.assertRaises(RuntimeError, job.wait, 10)
+
+        self.media_manager.wait_for_conversions(link1, timeout=10)
+        self.assertEqual(
+            jobs2, self.media_manager.get_conversion_jobs(link2)
+        )
+
+        self.assertRaises(
+            RuntimeError,
+            self.media_manager.wait_for_conversions, link2, 10
+        )
+        self.assertEqual([], self.media_manager.get_conversion_jobs())
+
+    def test_number_of_finished_jobs_is_limited(self):
+        """testing if the number of the finished jobs that are kept is
+        limited
+        """
+        self.media_manager.max_finished_conversion_jobs = 2
+        self.media_manager.release.set()
+        links = [self.upload(wait=False) for i in range(4)]
+        for link in links:
+            MediaJobQueue.wait(
+                self.media_manager.get_conversion_jobs(link), 10
+            )
+        self.assertEqual(2, len(self.media_manager.get_conversion_jobs()))
+
+    def test_upload_with_waiting(self):
+        """testing if the conversions are finished when the upload returns
+        """
+        self.media_manager.release.set()
+        link = self.upload(wait=True)
+        self.assertTrue(os.path.exists(link.full_path))
+        self.assertTrue(os.path.exists(link.thumbnail.full_path))
+        self.assertTrue(os.path.exists(link.thumbnail.thumbnail.full_path))
+        self.assertEqual([], self.media_manager.get_conversion_jobs())
+
+
+class ImageSequenceTestCase(unittest.TestCase):
+    """tests the ImageSequence class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.filenames = [
+            'plate.0001.exr', 'plate.0002.exr', 'plate.0003.exr',
+            'plate_v002_1001.jpg', 'plate_v002_1002.jpg', 'notes.txt',
+            'single.0001.png',
+        ]
+        for filename in self.filenames:
+            with open(os.path.join(self.temp_path, filename), 'w') as f:
+                f.write(filename)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+
+    def test_find_in_directory(self):
+        """testing if the sequences in a directory are found
+        """
+        sequences, singles = ImageSequence.find(self.temp_path)
+        self.assertEqual(2, len(sequences))
+        self.assertEqual(
+            sorted([
+                os.path.join(self.temp_path, 'notes.txt'),
+                os.path.join(self.temp_path, 'single.0001.png'),
+            ]),
+            sorted(singles)
+        )
+
+        plate = sequences[0]
+        self.assertEqual('plate', plate.name)
+        self.assertEqual([1, 2, 3], plate.frames)
+        self.assertEqual(1, plate.start_frame)
+        self.assertEqual(3, plate.end_frame)
+        self.assertEqual(
+            os.path.join(self.temp_path, 'plate.%04d.exr'), plate.pattern
+        )
+        self.assertEqual(
+            os.path.join(self.temp_path, 'plate.####.exr'),
+            plate.hash_pattern
+        )
+
+        plate_v002 = sequences[1]
+        self.assertEqual('plate_v002', plate_v002.name)
+        self.assertEqual([1001, 1002], plate_v002.frames)
+
+    def test_find_in_file_list(self):
+        """testing if the sequences in a list of files are found
+        """
+        paths = [
+            os.path.join(self.temp_path, filename)
+            for filename in reversed(self.filenames)
+        ]
+        sequences, singles = ImageSequence.find(paths, min_length=3)
+        self.assertEqual(1, len(sequences))
+        self.assertEqual(
+            [os.path.join(self.temp_path, 'plate.%04d.exr' % i)
+             for i in range(1, 4)],
+            sequences[0].files
+        )
+        self.assertEqual(4, len(singles))
+
+    def test_gaps(self):
+        """testing if the files are split in to sequences of consecutive
+        frames and the frames without neighbours are single files
+        """
+        paths = [
+            os.path.join(self.temp_path, 'IMG_%04d.jpg' % i)
+            for i in [120, 1, 7, 2, 3, 9, 10]
+        ]
+        sequences, singles = ImageSequence.find(paths)
+        self.assertEqual(
+            [[1, 2, 3], [9, 10]],
+            [sequence.frames for sequence in sequences]
+        )
+        self.assertEqual(
+            [os.path.join(self.temp_path, 'IMG_%04d.jpg' % i)
+             for i in [7, 120]],
+            singles
+        )
+
+        # unrelated photos are not grouped
+        sequences, singles = ImageSequence.find(paths[:3])
+        self.assertEqual([], sequences)
+        self.assertEqual(3, len(singles))
+
+
+class MediaManagerImageSequenceTestCase(unittest.TestCase):
+    """tests the image sequence support of the MediaManager
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        for i in range(1, 11):
+            path = os.path.join(self.temp_path, 'shot.%04d.jpg' % i)
+            with open(path, 'w') as f:
+                f.write('frame %s' % i)
+        self.sequence = ImageSequence.find(self.temp_path)[0][0]
+        self.media_manager = RecordingMediaManager()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        if self.media_manager.job_queue:
+            self.media_manager.job_queue.shutdown()
+        shutil.rmtree(self.temp_path)
+
+    def test_web_version_is_generated_in_one_call(self):
+        """testing if the web version of a sequence is generated with one
+        ffmpeg image2 call
+        """
+        path = self.media_manager.generate_media_for_web(self.temp_path)
+        self.assertTrue(path.endswith('.webm'))
+        self.assertEqual(1, len(self.media_manager.ffmpeg_calls))
+        call = self.media_manager.ffmpeg_calls[0]
+        self.assertEqual(
+            [(os.path.join(self.temp_path, 'shot.%04d.jpg'), {
+                'f': 'image2',
+                'framerate': 25,
+                'start_number': 1,
+            })],
+            call['inputs']
+        )
+        os.remove(path)
+
+    def test_thumbnail_is_generated_from_three_frames(self):
+        """testing if the thumbnail of a sequence is generated from three
+        frames in one ffmpeg call
+        """
+        path = self.media_manager.generate_thumbnail(self.sequence)
+        self.assertEqual(1, len(self.media_manager.ffmpeg_calls))
+        call = self.media_manager.ffmpeg_calls[0]
+        self.assertEqual(
+            [(os.path.join(self.temp_path, 'shot.%04d.jpg' % i), {})
+             for i in (2, 6, 9)],
+            call['inputs']
+        )
+        self.assertEqual(1, call['frames:v'])
+        os.remove(path)
+
+    def test_zip(self):
+        """testing if the frames are zipped
+        """
+        zip_path = os.path.join(self.temp_path, 'shot.zip')
+        self.media_manager.generate_image_sequence_zip(
+            self.sequence, zip_path
+        )
+        zip_file = zipfile.ZipFile(zip_path)
+        try:
+            self.assertEqual(
+                ['shot.%04d.jpg' % i for i in range(1, 11)],
+                zip_file.namelist()
+            )
+            self.assertEqual('frame 5', zip_file.read('shot.0005.jpg'))
+        finally:
+            zip_file.close()
+
+    def test_zip_from_file_objects(self):
+        """testing if the frames are zipped from the given file like objects
+        and written to the frame paths in the same pass
+        """
+        frames_path = os.path.join(self.temp_path, 'frames')
+        os.mkdir(frames_path)
+        frame_paths = [
+            os.path.join(frames_path, 'comp.%04d.png' % i)
+            for i in range(1, 4)
+        ]
+        sequence = ImageSequence.find(frame_paths)[0][0]
+        file_objects = dict(
+            (path, StringIO('frame %s' % i))
+            for i, path in enumerate(frame_paths, 1)
+        )
+
+        zip_path = os.path.join(self.temp_path, 'comp.zip')
+        self.media_manager.generate_image_sequence_zip(
+            sequence, zip_path, file_objects
+        )
+        zip_file = zipfile.ZipFile(zip_path)
+        try:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(
+                ['comp.%04d.png' % i for i in range(1, 4)],
+                zip_file.namelist()
+            )
+            self.assertEqual('frame 2', zip_file.read('comp.0002.png'))
+        finally:
+            zip_file.close()
+
+        for i, path in enumerate(frame_paths, 1):
+            with open(path) as f:
+                self.assertEqual('frame %s' % i, f.read())
+
+    def test_upload_version_outputs(self):
+        """testing if one Link is created per image sequence
+        """
+        class FileParam(object):
+            def __init__(self, filename, data):
+                self.filename = filename
+                self.file = StringIO(data)
+
+        class Version(object):
+            pass
+
+        version = Version()
+        version.absolute_path = os.path.join(self.temp_path, 'version')
+        version.outputs = []
+        version.task = Version()
+        version.task.project = Version()
+        version.task.project.repository = Repository()
+
+        file_params = [
+            FileParam('comp.%04d.png' % i, 'frame %s' % i)
+            for i in range(1, 6)
+        ]
+        links = self.media_manager.upload_version_outputs(
+            version, file_params
+        )
+
+        self.assertEqual(1, len(links))
+        link = links[0]
+        self.assertEqual([link], version.outputs)
+        self.assertEqual(
+            os.path.join(
+                version.absolute_path, 'Outputs', 'Stalker_Pyramid',
+                'comp.zip'
+            ),
+            link.full_path
+        )
+        self.assertEqual('comp_####.png', link.original_filename)
+        zip_file = zipfile.ZipFile(link.full_path)
+        try:
+            self.assertEqual(5, len(zip_file.namelist()))
+        finally:
+            zip_file.close()
+
+        self.assertTrue(link.thumbnail.full_path.endswith('.webm'))
+        self.assertTrue(
+            link.thumbnail.thumbnail.full_path.endswith(
+                self.media_manager.thumbnail_format
+            )
+        )
+        self.assertEqual(2, len(self.media_manager.ffmpeg_calls))
+
+        # the temp frames are removed
+        frames_path = os.path.dirname(
+            self.media_manager.ffmpeg_calls[0]['inputs'][0][0]
+        )
+        self.assertFalse(os.path.exists(frames_path))
+
+    def test_upload_version_outputs_with_gaps(self):
+        """testing if the files with gaps in their frame numbers are not
+        uploaded as one image sequence
+        """
+        class FileParam(object):
+            def __init__(self, filename, data):
+                self.filename = filename
+                self.file = StringIO(data)
+
+        class Version(object):
+            pass
+
+        version = Version()
+        version.absolute_path = os.path.join(self.temp_path, 'version')
+        version.outputs = []
+        version.task = Version()
+        version.task.project = Version()
+        version.task.project.repository = Repository()
+
+        file_params = [
+            FileParam('IMG_%04d.jpg' % i, 'photo %s' % i)
+            for i in [1, 7, 120]
+        ]
+        # the fake photos can not be converted, do not wait for them
+        links = self.media_manager.upload_version_outputs(
+            version, file_params, wait=False
+        )
+        self.assertEqual(
+            ['IMG_0001.jpg', 'IMG_0007.jpg', 'IMG_0120.jpg'],
+            [link.original_filename for link in links]
+        )
+
+    def test_temp_frames_are_removed_when_conversions_finish(self):
+        """testing if the temp frames are removed when the web version and
+        thumbnail are generated, if the conversions are not waited
+        """
+        class FileParam(object):
+            def __init__(self, filename, data):
+                self.filename = filename
+                self.file = StringIO(data)
+
+        class Version(object):
+            pass
+
+        version = Version()
+        version.absolute_path = os.path.join(self.temp_path, 'version')
+        version.outputs = []
+        version.task = Version()
+        version.task.project = Version()
+        version.task.project.repository = Repository()
+
+        file_params = [
+            FileParam('comp.%04d.png' % i, 'frame %s' % i)
+            for i in range(1, 6)
+        ]
+        file_params.append(FileParam('notes.txt', 'notes'))
+        links = self.media_manager.upload_version_outputs(
+            version, file_params, wait=False
+        )
+        self.assertEqual(2, len(links))
+        for link in links:
+            self.media_manager.wait_for_conversions(link)
+
+        with open(links[1].full_path) as f:
+            self.assertEqual('notes', f.read())
+
+        # the folder is removed by the thread of the last job
+        frames_path = os.path.dirname(
+            self.media_manager.ffmpeg_calls[0]['inputs'][0][0]
+        )
+        for i in range(50):
+            if not os.path.exists(frames_path):
+                break
+            time.sleep(0.1)
+        self.assertFalse(os.path.exists(frames_path))
+
+
+class MediaManagerUploadFileTestCase(unittest.TestCase):
+    """tests the MediaManager.upload_file() method
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.media_manager = MediaManager()
+        self.media_manager.upload_buffer_size = 1000
+        self.data = ''.join(chr(i % 256) for i in range(10000))
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+
+    def test_upload_file(self):
+        """testing if upload_file() returns the uploaded file path
+        """
+        path = self.media_manager.upload_file(
+            StringIO(self.data), self.temp_path, 'plate.exr'
+        )
+        self.assertEqual(os.path.join(self.temp_path, 'plate.exr'), path)
+        with open(path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+        self.assertEqual(['plate.exr'], os.listdir(self.temp_path))
+
+    def test_upload_file_with_digest(self):
+        """testing if the digest of the data is returned with the path
+        """
+        path, digest = self.media_manager.upload_file_with_digest(
+            StringIO(self.data), self.temp_path, 'plate.exr'
+        )
+        self.assertEqual(hashlib.sha1(self.data).hexdigest(), digest)
+        with open(path, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+
+    def test_upload_file_with_digest_from_real_file(self):
+        """testing if the data of a real file is hashed while it is copied
+        """
+        source_path = os.path.join(self.temp_path, 'source.bin')
+        with open(source_path, 'wb') as f:
+            f.write(self.data)
+
+        output_path = os.path.join(self.temp_path, 'output')
+        with open(source_path, 'rb') as f:
+            path, digest = self.media_manager.upload_file_with_digest(
+                f, output_path, 'plate.exr', hash_name='md5'
+            )
+        self.assertEqual(hashlib.md5(self.data).hexdigest(), digest)
+        self.assertEqual(md5_checksum(source_path), md5_checksum(path))
+
+    def test_failed_upload_is_cleaned_up(self):
+        """testing if the temp file is removed when the upload fails
+        """
+        class BrokenFile(object):
+            def seek(self, position):
+                pass
+
+            def read(self, size):
+                raise IOError('connection lost')
+
+        self.assertRaises(
+            IOError, self.media_manager.upload_file, BrokenFile(),
+            self.temp_path, 'plate.exr'
+        )
+        self.assertEqual([], os.listdir(self.temp_path))
+
+    def test_copy_file_object_without_hash(self):
+        """testing if copy_file_object() returns None without a hash name
+        """
+        output = StringIO()
+        self.assertIsNone(copy_file_object(StringIO(self.data), output))
+        self.assertEqual(self.data, output.getvalue())
+
+
+class ContentStoreTestCase(unittest.TestCase):
+    """tests the ContentStore class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.store = ContentStore(os.path.join(self.temp_path, 'store'))
+        self.digest = hashlib.sha1('content').hexdigest()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+
+    def create_file(self, name, data='content'):
+        """creates a file with the given name and data
+        """
+        path = os.path.join(self.temp_path, name)
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+    def test_link_type_is_validated(self):
+        """testing if a ValueError will be raised for unknown link types
+        """
+        self.assertRaises(
+            ValueError, ContentStore, self.temp_path, link_type='copy'
+        )
+
+    def test_add(self):
+        """testing if the files with the same content are hard linked
+        """
+        path1 = self.create_file('file1.mov')
+        path2 = self.create_file('file2.mov')
+        self.assertFalse(self.store.add(path1, self.digest))
+        self.assertTrue(self.store.add(path2, self.digest))
+
+        object_path = self.store.object_path(self.digest)
+        self.assertTrue(os.path.samefile(object_path, path1))
+        self.assertTrue(os.path.samefile(object_path, path2))
+        with open(path2) as f:
+            self.assertEqual('content', f.read())
+
+        stats = self.store.statistics()
+        self.assertEqual(1, stats['files'])
+        self.assertEqual(2, stats['links'])
+        self.assertEqual(7, stats['stored_size'])
+        self.assertEqual(7, stats['saved_size'])
+        self.assertIn('Saved size', self.store.report())
+
+    def test_add_with_symlinks(self):
+        """testing if the files are symlinked if the link_type is symlink
+        """
+        store = ContentStore(
+            os.path.join(self.temp_path, 'store'), link_type='symlink'
+        )
+        path = self.create_file('file1.mov')
+        store.add(path, self.digest)
+        self.assertTrue(os.path.islink(path))
+        self.assertEqual(
+            os.path.abspath(store.object_path(self.digest)),
+            os.readlink(path)
+        )
+
+    def test_derivatives(self):
+        """testing if the derivatives are stored and linked with their own
+        extension
+        """
+        self.assertIsNone(self.store.find_derivative(self.digest, 'ForWeb'))
+        self.assertIsNone(
+            self.store.link_derivative(
+                self.digest, 'ForWeb',
+                os.path.join(self.temp_path, 'out1.webm')
+            )
+        )
+
+        web_path = self.create_file('web.mp4', 'web version')
+        self.store.add_derivative(self.digest, 'ForWeb', web_path)
+        self.assertEqual(
+            self.store.derivative_path(self.digest, 'ForWeb', '.mp4'),
+            self.store.find_derivative(self.digest, 'ForWeb')
+        )
+
+        path = self.store.link_derivative(
+            self.digest, 'ForWeb',
+            os.path.join(self.temp_path, 'ForWeb', 'out2.webm')
+        )
+        self.assertEqual(
+            os.path.join(self.temp_path, 'ForWeb', 'out2.mp4'), path
+        )
+        self.assertTrue(os.path.samefile(web_path, path))
+
+
+class CountingMediaManager(ConvertingMediaManager):
+    """A ConvertingMediaManager that counts the generated media
+    """
+
+    def __init__(self):
+        super(CountingMediaManager, self).__init__()
+        self.generated = []
+
+    def generate_fake_media(self, file_full_path, extension):
+        self.generated.append(extension)
+        return super(CountingMediaManager, self).generate_fake_media(
+            file_full_path, extension
+        )
+
+
+class MediaManagerContentStoreTestCase(unittest.TestCase):
+    """tests the deduplication of the version outputs
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.media_manager = CountingMediaManager()
+        self.media_manager.release.set()
+        self.media_manager.content_store = \
+            ContentStore(os.path.join(self.temp_path, 'store'))
+
+    def tearDown(self):
+        """clean up the test
+        """
+        if self.media_manager.job_queue:
+            self.media_manager.job_queue.shutdown()
+        shutil.rmtree(self.temp_path)
+
+    def create_version(self, name):
+        """creates a fake version
+        """
+        class Version(object):
+            pass
+
+        version = Version()
+        version.absolute_path = os.path.join(self.temp_path, name)
+        version.outputs = []
+        version.task = Version()
+        version.task.project = Version()
+        version.task.project.repository = Repository()
+        return version
+
+    def test_duplicate_outputs_are_linked(self):
+        """testing if the same file uploaded to two versions is stored once
+        and its web version and thumbnail are generated once
+        """
+        link1 = self.media_manager.upload_version_output(
+            self.create_version('v001'), StringIO('video data'), 'review.mov'
+        )
+        link2 = self.media_manager.upload_version_output(
+            self.create_version('v002'), StringIO('video data'), 'review.mov'
+        )
+
+        self.assertEqual(
+            ['.png', '.webm'], sorted(self.media_manager.generated)
+        )
+        self.assertEqual([], self.media_manager.get_conversion_jobs())
+
+        self.assertNotEqual(link1.full_path, link2.full_path)
+        self.assertTrue(os.path.samefile(link1.full_path, link2.full_path))
+        self.assertTrue(
+            os.path.samefile(
+                link1.thumbnail.full_path, link2.thumbnail.full_path
+            )
+        )
+        self.assertTrue(
+            link2.thumbnail.thumbnail.full_path.endswith('review.png')
+        )
+        self.assertTrue(
+            os.path.samefile(
+                link1.thumbnail.thumbnail.full_path,
+                link2.thumbnail.thumbnail.full_path
+            )
+        )
+
+        stats = self.media_manager.content_store.statistics()
+        self.assertEqual(3, stats['files'])
+        self.assertEqual(6, stats['links'])
+
+
+class MediaManagerImageTestCase(unittest.TestCase):
+    """tests the image thumbnail and web version generation of the
+    MediaManager
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.media_manager = MediaManager()
+        self.media_manager.thumbnail_width = 64
+        self.media_manager.thumbnail_height = 64
+        self.media_manager.web_image_width = 256
+        self.media_manager.web_image_height = 256
+        self.generated_paths = []
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_path)
+        for path in self.generated_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def create_image(self, name, size=(1024, 512), orientation=None):
+        """creates a test image
+        """
+        from PIL import Image
+        path = os.path.join(self.temp_path, name)
+        img = Image.new('RGB', size, (255, 0, 0))
+        options = {}
+        if orientation is not None:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            options['exif'] = exif.tobytes()
+        img.save(path, **options)
+        return path
+
+    def image_size(self, path):
+        """returns the size of the given image
+        """
+        from PIL import Image
+        self.generated_paths.append(path)
+        return Image.open(path).size
+
+    def test_generate_image_thumbnail(self):
+        """testing if the thumbnail fits in to the thumbnail size
+        """
+        path = self.create_image('plate.jpg')
+        self.assertEqual(
+            (64, 32),
+            self.image_size(
+                self.media_manager.generate_image_thumbnail(path)
+            )
+        )
+
+    def test_small_images_are_not_scaled_up(self):
+        """testing if the images smaller than the web size are kept as is
+        """
+        path = self.create_image('plate.png', size=(100, 50))
+        self.assertEqual(
+            (100, 50),
+            self.image_size(self.media_manager.generate_image_for_web(path))
+        )
+
+    def test_orientation_is_read_from_the_open_image(self):
+        """testing if the rotated images are re-oriented by using the EXIF
+        data of the open image
+        """
+        from PIL import Image
+        path = self.create_image('plate.jpg', orientation=8)
+        img = Image.open(path)
+        self.assertEqual(8, MediaManager.get_image_orientation(img))
+        self.assertEqual(
+            (32, 64),
+            self.image_size(
+                self.media_manager.generate_image_thumbnail(path)
+            )
+        )
+
+    def test_generate_images_thumbnail_and_web(self):
+        """testing if the thumbnails and the web versions of all the images
+        are returned in order
+        """
+        paths = [
+            self.create_image('plate%s.jpg' % i, size=(1024, 256 * (i + 1)))
+            for i in range(3)
+        ]
+        for processes in [1, 2]:
+            results = self.media_manager.generate_images_thumbnail_and_web(
+                paths, processes=processes
+            )
+            self.assertEqual(
+                [((64, 16), (256, 64)),
+                 ((64, 32), (256, 128)),
+                 ((64, 48), (256, 192))],
+                [(self.image_size(thumbnail_path), self.image_size(web_path))
+                 for thumbnail_path, web_path in results]
+            )
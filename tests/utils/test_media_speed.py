@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Compares the speed of the single pass and the multi pass video thumbnail
+generation of the MediaManager, run it with a video file::
+
+  python test_media_speed.py /path/to/review.mov
+"""
+import os
+import sys
+import time
+
+from anima.utils import MediaManager
+
+
+def measure_thumbnail(title, generate, file_full_path, repeat):
+    """generates the thumbnail of the given video with the given function and
+    prints the timings
+
+    :param str title: The title of the measurement
+    :param generate: The thumbnail generation function
+    :param str file_full_path: The video file path
+    :param int repeat: Repetition count
+    :return: float
+    """
+    print('%s' % (' %s ' % title).center(24, '*'))
+    start = time.time()
+    for i in range(repeat):
+        thumbnail_path = generate(file_full_path)
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
+    end = time.time()
+    duration = end - start
+    print('Generating %3i times    : %.3f seconds' % (repeat, duration))
+    print('Averaging               : %.3f seconds' % (duration / repeat))
+    return duration
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    video_path = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    media_manager = MediaManager()
+    # probe once, so both methods use the cached video info
+    media_manager.get_video_info(video_path)
+
+    multi_pass_duration = measure_thumbnail(
+        'MULTI PASS', media_manager.generate_video_thumbnail_multi_pass,
+        video_path, repeat
+    )
+    single_pass_duration = measure_thumbnail(
+        'SINGLE PASS', media_manager.generate_video_thumbnail_single_pass,
+        video_path, repeat
+    )
+
+    print('************************')
+    print('Speed up                : %.2fx' %
+          (multi_pass_duration / single_pass_duration))
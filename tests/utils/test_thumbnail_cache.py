@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from anima.utils import StalkerThumbnailCache
+
+
+class StalkerServer(ThreadingMixIn, HTTPServer):
+    """A stand-in for the Stalker server, which serves the thumbnails to the
+    logged in users and records the requests
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StalkerRequestHandler)
+        self.files = {}
+        self.logins = 0
+        self.connections = 0
+        self.downloads = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    @property
+    def address(self):
+        return 'http://127.0.0.1:%s' % self.server_address[1]
+
+
+class StalkerRequestHandler(BaseHTTPRequestHandler):
+    """serves the files of the StalkerServer
+    """
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, data='', headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        import urlparse
+        length = int(self.headers.getheader('content-length', 0))
+        form = urlparse.parse_qs(self.rfile.read(length))
+        if self.path != '/login':
+            self.send(404)
+        elif form.get('password') != ['anima']:
+            # the login page is returned again without a session
+            self.send(200, 'login page')
+        else:
+            with self.server.lock:
+                self.server.logins += 1
+            self.send(200, headers={'Set-Cookie': 'auth_tkt=1; Path=/'})
+
+    def do_GET(self):
+        if 'auth_tkt=1' not in (self.headers.getheader('cookie') or ''):
+            self.send(403)
+            return
+
+        path = self.path.lstrip('/')
+        if path not in self.server.files:
+            self.send(404)
+            return
+
+        data = self.server.files[path]
+        etag = '"%s"' % hash(data)
+        if self.headers.getheader('if-none-match') == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send(304, headers={'ETag': etag})
+            return
+
+        with self.server.lock:
+            self.server.downloads += 1
+        self.send(200, data, headers={'ETag': etag})
+
+
+class StalkerThumbnailCacheTestCase(unittest.TestCase):
+    """tests the StalkerThumbnailCache class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        self.temp_path = tempfile.mkdtemp()
+        self.server = StalkerServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        for i in range(10):
+            self.server.files['SPL/Task%s/Thumbnail/thumbnail.jpg' % i] = \
+                'thumbnail %s' % i * 10
+
+        self.cache = self.create_cache()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_path)
+
+    def create_cache(self, **kwargs):
+        """creates a cache for the test server
+        """
+        kwargs.setdefault('max_size', 1 << 20)
+        kwargs.setdefault('max_age', 300)
+        return StalkerThumbnailCache(
+            server_address=self.server.address,
+            cache_path=os.path.join(self.temp_path, 'cache'),
+            login='anima',
+            password='anima',
+            **kwargs
+        )
+
+    def test_login_and_connection_are_reused(self):
+        """testing if the cache logs in once and downloads all the files
+        through the same connection
+        """
+        for i in range(5):
+            path = 'SPL/Task%s/Thumbnail/thumbnail.jpg' % i
+            cached_path = self.cache.get(path)
+            with open(cached_path, 'rb') as f:
+                self.assertEqual(self.server.files[path], f.read())
+
+        self.assertEqual(1, self.server.logins)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(5, self.server.downloads)
+
+    def test_failed_login(self):
+        """testing if a failed login raises RuntimeError and the returned
+        page is not cached as the thumbnail
+        """
+        cache = self.create_cache()
+        cache.password = 'wrong password'
+        path = 'SPL/Task0/Thumbnail/thumbnail.jpg'
+        self.assertRaises(RuntimeError, cache.get, path)
+        self.assertFalse(cache.logged_in)
+        self.assertFalse(os.path.exists(cache.cached_file_full_path(path)))
+        self.assertEqual(0, self.server.downloads)
+
+        cache.password = 'anima'
+        with open(cache.get(path), 'rb') as f:
+            self.assertEqual(self.server.files[path], f.read())
+
+    def test_unicode_paths(self):
+        """testing if the thumbnails with non ASCII unicode paths are
+        cached
+        """
+        path = u'SPL/\u015eirket/Thumbnail/thumbnail.jpg'
+        self.assertEqual(
+            self.cache.cached_file_full_path(path),
+            self.cache.cached_file_full_path(path.encode('utf-8'))
+        )
+
+    def test_same_file_names_are_cached_separately(self):
+        """testing if the thumbnails with the same file name in different
+        folders are not mixed
+        """
+        path1 = self.cache.get('SPL/Task0/Thumbnail/thumbnail.jpg')
+        path2 = self.cache.get('SPL/Task1/Thumbnail/thumbnail.jpg')
+        self.assertNotEqual(path1, path2)
+
+    def test_fresh_files_are_not_revalidated(self):
+        """testing if the files checked in max_age seconds are served from
+        the cache without a request
+        """
+        path = 'SPL/Task0/Thumbnail/thumbnail.jpg'
+        self.cache.get(path)
+        self.cache.get(path)
+        self.assertEqual(1, self.server.downloads)
+        self.assertEqual(0, self.server.not_modified)
+
+    def test_revalidation(self):
+        """testing if the old files are revalidated with their ETag and
+        downloaded again only if they are changed
+        """
+        cache = self.create_cache(max_age=0)
+        path = 'SPL/Task0/Thumbnail/thumbnail.jpg'
+        cache.get(path)
+        cache.get(path)
+        self.assertEqual(1, self.server.downloads)
+        self.assertEqual(1, self.server.not_modified)
+
+        self.server.files[path] = 'new thumbnail'
+        cached_path = cache.get(path)
+        self.assertEqual(2, self.server.downloads)
+        with open(cached_path, 'rb') as f:
+            self.assertEqual('new thumbnail', f.read())
+
+    def test_index_is_persistent(self):
+        """testing if a new cache uses the files of the previous session
+        """
+        path = 'SPL/Task0/Thumbnail/thumbnail.jpg'
+        self.cache.get(path)
+        self.create_cache().get(path)
+        self.assertEqual(1, self.server.downloads)
+
+    def test_least_recently_used_files_are_evicted(self):
+        """testing if the least recently used files are removed when the
+        cache is over the size budget
+        """
+        cache = self.create_cache(max_size=250)  # holds two files
+        paths = ['SPL/Task%s/Thumbnail/thumbnail.jpg' % i for i in range(3)]
+        cached_paths = [cache.get(paths[0]), cache.get(paths[1])]
+        cache.get(paths[0])  # use the first file again
+        cached_paths.append(cache.get(paths[2]))
+
+        self.assertTrue(os.path.exists(cached_paths[0]))
+        self.assertFalse(os.path.exists(cached_paths[1]))
+        self.assertTrue(os.path.exists(cached_paths[2]))
+        self.assertTrue(cache.size <= 250)
+
+    def test_prefetch(self):
+        """testing if the files are downloaded concurrently with one login
+        and returned in order
+        """
+        paths = ['SPL/Task%s/Thumbnail/thumbnail.jpg' % i for i in range(10)]
+        paths.append('SPL/Missing/Thumbnail/thumbnail.jpg')
+        cached_paths = self.cache.prefetch(paths, max_workers=4)
+
+        self.assertEqual(
+            [self.cache.cached_file_full_path(path) for path in paths],
+            cached_paths
+        )
+        self.assertFalse(os.path.exists(cached_paths[-1]))
+        self.assertEqual(1, self.server.logins)
+        self.assertEqual(10, self.server.downloads)
+        self.assertTrue(self.server.connections <= 4)
+
+        # all from cache now
+        self.cache.prefetch(paths[:10], wait=False).get()
+        self.assertEqual(10, self.server.downloads)
+
+
+class UserThumbnailPathsTestCase(unittest.TestCase):
+    """tests the StalkerThumbnailCache.query_user_thumbnail_paths() method
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        from stalker import (db, Link, Project, Repository, Status,
+                             StatusList, Structure, Task, User)
+        db.DBSession.remove()
+        db.setup({'sqlalchemy.url': 'sqlite:///:memory:'})
+        db.init()
+
+        self.user = User.query.first()
+        other_user = User(
+            name='Other', login='other', email='other@users.com',
+            password='pass'
+        )
+        project = Project(
+            name='Test Project',
+            code='TP',
+            repositories=[Repository(name='Test Repo')],
+            structure=Structure(name='Project Structure'),
+            status_list=StatusList(
+                name='Project Statuses',
+                target_entity_type='Project',
+                statuses=[Status.query.filter_by(code='WIP').first()]
+            )
+        )
+
+        def thumbnail(name):
+            return Link(full_path='SPL/%s/Thumbnail/thumbnail.jpg' % name)
+
+        sequence = Task(
+            name='Sequence', project=project, thumbnail=thumbnail('Seq')
+        )
+        shot = Task(name='Shot', parent=sequence, thumbnail=thumbnail('Shot'))
+        Task(name='Anim', parent=shot, resources=[self.user])
+        Task(
+            name='Lighting', parent=shot, resources=[self.user],
+            thumbnail=thumbnail('Lighting')
+        )
+        Task(
+            name='Comp', parent=shot, resources=[other_user],
+            thumbnail=thumbnail('Comp')
+        )
+        db.DBSession.add(project)
+        db.DBSession.commit()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        from stalker import db
+        db.DBSession.remove()
+
+    def test_thumbnails_of_tasks_and_parents(self):
+        """testing if the thumbnails of the tasks of the user and of their
+        parents are returned once
+        """
+        self.assertEqual(
+            [
+                'SPL/Lighting/Thumbnail/thumbnail.jpg',
+                'SPL/Seq/Thumbnail/thumbnail.jpg',
+                'SPL/Shot/Thumbnail/thumbnail.jpg',
+            ],
+            StalkerThumbnailCache.query_user_thumbnail_paths(self.user.id)
+        )